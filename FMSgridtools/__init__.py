@@ -1,6 +1,20 @@
 from .shared.gridobj import GridObj
+from .make_hgrid.create_hgrid import HGRID_TYPES
+from .make_hgrid.create_hgrid import compute_grid_bound
+from .make_hgrid.create_hgrid import create_f_plane_grid
+from .make_hgrid.create_hgrid import create_regular_lonlat_grid
+from .make_hgrid.create_hgrid import create_simple_cartesian_grid
+from .make_hgrid.create_hgrid import create_tripolar_grid
+from .make_hgrid.create_gnomonic_grid import create_gnomonic_cubic_grid
+from .make_hgrid.create_gnomonic_grid import setup_aligned_nest
+from .make_mosaic.get_contact import get_contacts
 from .make_topog.topogobj import TopogObj
 from .shared.gridtools_utils import check_file_is_there
 from .shared.gridtools_utils import get_provenance_attrs
 from .shared.mosaicobj import MosaicObj
-from .shared.xgridobj import XGridObj
\ No newline at end of file
+from .shared.remapfile import BinaryRemap
+from .shared.remapfile import read_binary_remap
+from .shared.remapfile import write_binary_remap
+from .shared.xgridobj import XGridObj
+from .shared.xgridcache import XGridCache
+from .remap.remapobj import RemapObj
@@ -0,0 +1,696 @@
+import contextlib
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from gridtools.shared.gridobj import RADIUS, GridObj
+
+# tolerances of create_gnomonic_cubic_grid.c and mosaic_util.c
+_EPSLN4 = 1.0e-4
+_EPSLN5 = 1.0e-5
+_EPSLN7 = 1.0e-7
+_EPSLN8 = 1.0e-8
+_EPSLN10 = 1.0e-10
+
+# number of tiles of the cubed sphere
+_NTILES = 6
+
+# number of supergrid rows of a tile computed by one task of the executor
+_BLOCK_ROWS = 256
+
+
+"""
+_latlon2xyz:
+
+Returns the cartesian coordinates on the unit sphere of the points lon, lat
+given in radians, as latlon2xyz in mosaic_util.c.
+"""
+def _latlon2xyz(lon: npt.NDArray, lat: npt.NDArray) -> Tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
+    coslat = np.cos(lat)
+    return coslat*np.cos(lon), coslat*np.sin(lon), np.sin(lat)
+
+
+"""
+_xyz2latlon:
+
+Returns the longitudes in [0, 2pi) and latitudes in radians of the cartesian
+points x, y, z, as xyz2latlon in mosaic_util.c.
+"""
+def _xyz2latlon(x: npt.NDArray, y: npt.NDArray, z: npt.NDArray) -> Tuple[npt.NDArray, npt.NDArray]:
+    dist = np.sqrt(x*x + y*y + z*z)
+    x, y, z = x/dist, y/dist, z/dist
+    lon = np.where(np.abs(x) + np.abs(y) < _EPSLN10, 0.0, np.arctan2(y, x))
+    lon = np.where(lon < 0.0, 2.0*np.pi + lon, lon)
+    return lon, np.arcsin(z)
+
+
+"""
+_mean_latlon:
+
+Returns the longitudes and latitudes of the normalized sum of the cartesian
+points in xyz, a sequence of (x, y, z) tuples, as cell_center, cell_east and
+cell_north.
+"""
+def _mean_latlon(*xyz: Tuple[npt.NDArray, npt.NDArray, npt.NDArray]) -> Tuple[npt.NDArray, npt.NDArray]:
+    x, y, z = xyz[0]
+    for px, py, pz in xyz[1:]:
+        x, y, z = x + px, y + py, z + pz
+    dd = np.sqrt(x*x + y*y + z*z)
+    return _xyz2latlon(x/dd, y/dd, z/dd)
+
+
+"""
+_gnomonic_ed:
+
+Returns the (ni+1, ni+1) corner longitudes and latitudes in radians of the
+equal distance gnomonic tile centered on lon = pi, as gnomonic_ed.
+"""
+def _gnomonic_ed(ni: int) -> Tuple[npt.NDArray, npt.NDArray]:
+    nip = ni + 1
+    rsq3 = 1.0/np.sqrt(3.0)
+    alpha = np.arcsin(rsq3)
+    dely = 2.0*alpha/ni
+
+    lamda = np.zeros((nip, nip), dtype=np.float64)
+    theta = np.zeros((nip, nip), dtype=np.float64)
+
+    # East-West edges
+    lamda[:, 0] = 0.75*np.pi
+    lamda[:, ni] = 1.25*np.pi
+    theta[:, 0] = -alpha + dely*np.arange(nip)
+    theta[:, ni] = theta[:, 0]
+
+    # North-South edges by mirroring the West edge
+    p1 = np.array(_latlon2xyz(lamda[0, 0], theta[0, 0]))
+    p2 = np.array(_latlon2xyz(lamda[ni, ni], theta[ni, ni]))
+    nb = np.cross(p1, p2)
+    nb = nb/np.sqrt(nb[0]*nb[0] + nb[1]*nb[1] + nb[2]*nb[2])
+    p0 = _latlon2xyz(lamda[1:ni, 0], theta[1:ni, 0])
+    pdot = p0[0]*nb[0] + p0[1]*nb[1] + p0[2]*nb[2]
+    lamda[0, 1:ni], theta[0, 1:ni] = _xyz2latlon(*(p0[k] - 2*pdot*nb[k] for k in range(3)))
+    lamda[ni, 1:ni] = lamda[0, 1:ni]
+    theta[ni, 1:ni] = -theta[0, 1:ni]
+
+    # map the edges on the sphere back to the cube face x = -rsq3
+    x, y, z = (np.zeros((nip, nip), dtype=np.float64) for _ in range(3))
+    for j, i in ((0, 0), (0, ni), (ni, 0), (ni, ni)):
+        x[j, i], y[j, i], z[j, i] = _latlon2xyz(lamda[j, i], theta[j, i])
+    ex, ey, ez = _latlon2xyz(lamda[1:ni, 0], theta[1:ni, 0])
+    y[1:ni, 0], z[1:ni, 0] = -ey*rsq3/ex, -ez*rsq3/ex
+    ex, ey, ez = _latlon2xyz(lamda[0, 1:ni], theta[0, 1:ni])
+    y[0, 1:ni], z[0, 1:ni] = -ey*rsq3/ex, -ez*rsq3/ex
+    x[:] = -rsq3
+    y[1:, 1:] = y[0, 1:]
+    z[1:, 1:] = z[1:, 0][:, np.newaxis]
+
+    return _xyz2latlon(x, y, z)
+
+
+"""
+_symm_ed:
+
+Makes the tile lamda, theta symmetric about its central row and column in
+place, as symm_ed.
+"""
+def _symm_ed(lamda: npt.NDArray, theta: npt.NDArray):
+    ni = lamda.shape[0] - 1
+    half = ni//2
+    lamda[1:, 1:ni] = lamda[0, 1:ni]
+
+    i, ip = np.arange(half), ni - np.arange(half)
+    avg = 0.5*(lamda[:, i] - lamda[:, ip])
+    lamda[:, i], lamda[:, ip] = avg + np.pi, np.pi - avg
+    avg = 0.5*(theta[:, i] + theta[:, ip])
+    theta[:, i], theta[:, ip] = avg, avg
+
+    j, jp = np.arange(half), ni - np.arange(half)
+    avg = 0.5*(lamda[j, 1:ni] + lamda[jp, 1:ni])
+    lamda[j, 1:ni], lamda[jp, 1:ni] = avg, avg
+    avg = 0.5*(theta[j, 1:ni] - theta[jp, 1:ni])
+    theta[j, 1:ni], theta[jp, 1:ni] = avg, -avg
+
+
+"""
+_rot_3d:
+
+Rotates the spherical points lon, lat in radians by angle degrees about axis
+(1 for x, 2 for y, 3 for z), as rot_3d with degrees and convert set.
+"""
+def _rot_3d(axis: int, lon: npt.NDArray, lat: npt.NDArray, angle: float) -> Tuple[npt.NDArray, npt.NDArray]:
+    # spherical_to_cartesian
+    x1 = RADIUS*np.cos(lon)*np.cos(lat)
+    y1 = RADIUS*np.sin(lon)*np.cos(lat)
+    z1 = -RADIUS*np.sin(lat)
+
+    angle = angle*(np.pi/180.0)
+    c, s = np.cos(angle), np.sin(angle)
+    if axis == 1:
+        x2, y2, z2 = x1, c*y1 + s*z1, -s*y1 + c*z1
+    elif axis == 2:
+        x2, y2, z2 = c*x1 - s*z1, y1, s*x1 + c*z1
+    else:
+        x2, y2, z2 = c*x1 + s*y1, -s*x1 + c*y1, z1
+
+    # cartesian_to_spherical
+    r = np.sqrt(x2*x2 + y2*y2 + z2*z2)
+    lon = np.where(np.abs(x2) + np.abs(y2) < _EPSLN10, 0.0, np.arctan2(y2, x2))
+    return lon, np.arccos(z2/r) - np.pi/2.0
+
+
+"""
+_mirror_grid:
+
+Makes tile 1 of xc, yc (6, ni+1, ni+1) symmetric across the 0-longitude and
+the equator and rotates it onto the other five tiles, as mirror_grid.
+"""
+def _mirror_grid(xc: npt.NDArray, yc: npt.NDArray):
+    ni = xc.shape[1] - 1
+    nip = ni + 1
+    half = -(-nip//2)
+    mid = (nip - 1)//2
+    odd = nip % 2 == 1
+
+    j = np.arange(half)[:, np.newaxis]
+    i = np.arange(half)[np.newaxis, :]
+    quad = ((j, i), (j, ni-i), (ni-j, i), (ni-j, ni-i))
+    for field in (xc[0], yc[0]):
+        mean = 0.25*(np.abs(field[quad[0]]) + np.abs(field[quad[1]])
+                     + np.abs(field[quad[2]]) + np.abs(field[quad[3]]))
+        signs = [np.where(field[q] >= 0, 1.0, -1.0) for q in quad]
+        for q, sign in zip(quad, signs):
+            field[q] = mean*sign
+    if odd:
+        xc[0, :half, mid] = 0.0
+        xc[0, ni-np.arange(half), mid] = 0.0
+
+    x, y = xc[0], yc[0]
+    xc[1], yc[1] = _rot_3d(3, x, y, -90.0)
+
+    xc[2], yc[2] = _rot_3d(1, *_rot_3d(3, x, y, -90.0), 90.0)
+    if odd:
+        xc[2, mid, mid], yc[2, mid, mid] = 0.0, np.pi*0.5
+        xc[2, mid, :mid] = 0.0
+        xc[2, mid, mid+1:] = np.pi
+
+    xc[3], yc[3] = _rot_3d(1, *_rot_3d(3, x, y, -180.0), 90.0)
+    if odd:
+        xc[3, mid, :] = np.pi
+
+    xc[4], yc[4] = _rot_3d(2, *_rot_3d(3, x, y, 90.0), 90.0)
+
+    xc[5], yc[5] = _rot_3d(3, *_rot_3d(2, x, y, 90.0), 0.0)
+    if odd:
+        xc[5, mid, mid], yc[5, mid, mid] = 0.0, -np.pi*0.5
+        xc[5, mid+1:, mid] = 0.0
+        xc[5, :mid, mid] = np.pi
+
+
+"""
+_stitch_tiles:
+
+Copies the shared edges of the tiles of xc, yc (6, ni+1, ni+1) so that the
+neighbouring tiles agree on them, in the order of create_gnomonic_cubic_grid.
+"""
+def _stitch_tiles(xc: npt.NDArray, yc: npt.NDArray):
+    ni = xc.shape[1] - 1
+    rev = slice(None, None, -1)
+    for c in (xc, yc):
+        c[1, :, 0] = c[0, :, ni]         # 1E -> 2W
+        c[2, :, 0] = c[0, ni, rev]       # 1N -> 3W
+        c[4, ni, :] = c[0, rev, 0]       # 1W -> 5N
+        c[5, ni, :] = c[0, 0, :]         # 1S -> 6N
+        c[2, 0, :] = c[1, ni, :]         # 2N -> 3S
+        c[3, 0, :] = c[1, rev, ni]       # 2E -> 4S
+        c[5, :, ni] = c[1, 0, rev]       # 2S -> 6E
+        c[3, :, 0] = c[2, :, ni]         # 3E -> 4W
+        c[4, :, 0] = c[2, ni, rev]       # 3N -> 5W
+        c[4, 0, :] = c[3, ni, :]         # 4N -> 5S
+        c[5, 0, :] = c[3, rev, ni]       # 4E -> 6S
+        c[5, :, 0] = c[4, :, ni]         # 5E -> 6W
+
+
+"""
+_stretch_tile:
+
+Applies the Schmidt transformation to the tile lon, lat in place, followed
+by the rotation of the south pole to lon_p, lat_p (radians), as
+direct_transform. With cube the longitudes are first rotated by pi, as
+cube_transform.
+"""
+def _stretch_tile(lon: npt.NDArray, lat: npt.NDArray, stretch_factor: float, lon_p: float,
+                  lat_p: float, cube: bool = False):
+    c2p1 = 1.0 + stretch_factor*stretch_factor
+    c2m1 = 1.0 - stretch_factor*stretch_factor
+    sin_p, cos_p = np.sin(lat_p), np.cos(lat_p)
+
+    if abs(c2m1) > _EPSLN7:
+        sin_lat = np.sin(lat)
+        lat_t = np.arcsin((c2m1 + c2p1*sin_lat)/(c2p1 + c2m1*sin_lat))
+    else:
+        lat_t = lat
+    sin_lat, cos_lat = np.sin(lat_t), np.cos(lat_t)
+    lon0 = lon + np.pi if cube else lon
+    sin_o = -(sin_p*sin_lat + cos_p*cos_lat*np.cos(lon0))
+    new_lon = lon_p + np.arctan2(-cos_lat*np.sin(lon0), -sin_lat*cos_p + cos_lat*sin_p*np.cos(lon0))
+    new_lon = np.where(new_lon < 0.0, new_lon + 2.0*np.pi,
+                       np.where(new_lon >= 2.0*np.pi, new_lon - 2.0*np.pi, new_lon))
+
+    poles = (1.0 - np.abs(sin_o)) < _EPSLN7
+    lat[...] = np.where(poles, np.where(sin_o < 0, -0.5*np.pi, 0.5*np.pi), np.arcsin(np.clip(sin_o, -1.0, 1.0)))
+    lon[...] = np.where(poles, 0.0, new_lon)
+
+
+"""
+_slerp:
+
+Interpolates with the weight beta along the great circles from the points
+lon1, lat1 to lon2, lat2 in radians, as spherical_linear_interpolation.
+Colocated points are returned unchanged.
+"""
+def _slerp(beta: npt.NDArray, lon1: npt.NDArray, lat1: npt.NDArray, lon2: npt.NDArray,
+           lat2: npt.NDArray) -> Tuple[npt.NDArray, npt.NDArray]:
+    e1 = np.array(_latlon2xyz(lon1, lat1))
+    e2 = np.array(_latlon2xyz(lon2, lat2))
+    e1 = e1/np.sqrt(e1[0]*e1[0] + e1[1]*e1[1] + e1[2]*e1[2])
+    e2 = e2/np.sqrt(e2[0]*e2[0] + e2[1]*e2[1] + e2[2]*e2[2])
+    colocated = (np.abs(lon1 - lon2) < _EPSLN8) & (np.abs(lat1 - lat2) < _EPSLN8)
+
+    omega = np.arccos(e1[0]*e2[0] + e1[1]*e2[1] + e1[2]*e2[2])
+    if np.any((np.abs(omega) < _EPSLN5) & ~colocated):
+        raise ValueError("spherical_linear_interpolation: interpolation not well defined between antipodal points")
+    omega = np.where(colocated, 0.5*np.pi, omega)
+    eb = (np.sin(beta*omega)*e2 + np.sin((1.0 - beta)*omega)*e1)/np.sin(omega)
+    lon, lat = _xyz2latlon(eb[0], eb[1], eb[2])
+    return np.where(colocated, lon1, lon), np.where(colocated, lat1, lat)
+
+
+"""
+_aligned_nest:
+
+Returns the corners in radians of the nest refining the cells istart to iend
+and jstart to jend (counted from 1) of the parent corners parent_xc,
+parent_yc by refine_ratio, as setup_aligned_nest.
+"""
+def _aligned_nest(parent_xc: npt.NDArray, parent_yc: npt.NDArray, halo: int, refine_ratio: int,
+                  istart: int, iend: int, jstart: int, jend: int) -> Tuple[npt.NDArray, npt.NDArray]:
+    parent_nj, parent_ni = parent_xc.shape[0] - 1, parent_xc.shape[1] - 1
+    if jstart - halo < 1 or istart - halo < 1 or jend + halo > parent_nj or iend + halo > parent_ni:
+        raise ValueError("setup_aligned_nest: nested grid lies outside its parent")
+
+    j = np.arange((jend - jstart + 1)*refine_ratio + 1)
+    i = np.arange((iend - istart + 1)*refine_ratio + 1)
+    jc = (jstart - 1 + j//refine_ratio)[:, np.newaxis]
+    ic = (istart - 1 + i//refine_ratio)[np.newaxis, :]
+    jmod = (j % refine_ratio)[:, np.newaxis]
+    imod = (i % refine_ratio)[np.newaxis, :]
+    jp = np.minimum(jc + 1, parent_nj)
+    ip = np.minimum(ic + 1, parent_ni)
+
+    # points along the parent edges jc between the columns ic and ic+1
+    beta = jmod/refine_ratio
+    q1 = _slerp(beta, parent_xc[jc, ic], parent_yc[jc, ic], parent_xc[jp, ic], parent_yc[jp, ic])
+    q2 = _slerp(beta, parent_xc[jc, ip], parent_yc[jc, ip], parent_xc[jp, ip], parent_yc[jp, ip])
+    q1 = [np.where(jmod == 0, p[jc, ic], q) for p, q in zip((parent_xc, parent_yc), q1)]
+    q2 = [np.where(jmod == 0, p[jc, ip], q) for p, q in zip((parent_xc, parent_yc), q2)]
+
+    t = _slerp(imod/refine_ratio, q1[0], q1[1], q2[0], q2[1])
+    xc = np.where(imod == 0, q1[0], t[0])
+    yc = np.where(imod == 0, q1[1], t[1])
+    xc = np.where(xc > 2.0*np.pi, xc - 2.0*np.pi, xc)
+    xc = np.where(xc < 0.0, xc + 2.0*np.pi, xc)
+    return xc, yc
+
+
+"""
+_parent_corners:
+
+Returns the (6, ni+1, ni+1) corners in radians of the six tiles of the
+gnomonic_ed cubed sphere, optionally stretched, as create_gnomonic_cubic_grid.
+"""
+def _parent_corners(ni: int, shift_fac: float, do_schmidt: bool, do_cube_transform: bool,
+                    stretch_factor: float, target_lon: float,
+                    target_lat: float) -> Tuple[npt.NDArray, npt.NDArray]:
+    lon, lat = _gnomonic_ed(ni)
+    _symm_ed(lon, lat)
+
+    xc = np.empty((_NTILES, ni+1, ni+1), dtype=np.float64)
+    yc = np.empty((_NTILES, ni+1, ni+1), dtype=np.float64)
+    xc[0] = lon - np.pi
+    yc[0] = lat
+    _mirror_grid(xc, yc)
+
+    if not do_schmidt and not do_cube_transform and shift_fac > _EPSLN4:
+        xc -= np.pi/18.0
+    xc[xc < 0.0] += 2.0*np.pi
+    xc[np.abs(xc) < _EPSLN10] = 0.0
+    yc[np.abs(yc) < _EPSLN10] = 0.0
+    _stitch_tiles(xc, yc)
+
+    if do_schmidt or do_cube_transform:
+        for n in range(_NTILES):
+            _stretch_tile(xc[n], yc[n], stretch_factor, np.deg2rad(target_lon), np.deg2rad(target_lat),
+                          cube=not do_schmidt)
+    return xc, yc
+
+
+"""
+_row_blocks:
+
+Returns the (start, end) ranges of _BLOCK_ROWS rows covering nrows rows.
+"""
+def _row_blocks(nrows: int) -> List[Tuple[int, int]]:
+    return [(r, min(r + _BLOCK_ROWS, nrows)) for r in range(0, nrows, _BLOCK_ROWS)]
+
+
+"""
+_fill_supergrid:
+
+Fills the supergrid rows of x, y (radians) holding the cells j0 to j1 of the
+tile corners xc, yc with the corners, cell centers and the east and north
+edge midpoints, as cell_center, cell_east and cell_north. The block ending
+on the last cell also fills the last corner row.
+"""
+def _fill_supergrid(xc: npt.NDArray, yc: npt.NDArray, x: npt.NDArray, y: npt.NDArray, j0: int, j1: int):
+    nj = xc.shape[0] - 1
+    jn = j1 + 1 if j1 == nj else j1
+    p = _latlon2xyz(xc[j0:j1+1], yc[j0:j1+1])
+    sw = tuple(c[:-1, :-1] for c in p)
+    se = tuple(c[:-1, 1:] for c in p)
+    ne = tuple(c[1:, 1:] for c in p)
+    nw = tuple(c[1:, :-1] for c in p)
+    rows = tuple(c[:jn-j0] for c in p)
+
+    x[2*j0:2*jn:2, 0::2] = xc[j0:jn]
+    y[2*j0:2*jn:2, 0::2] = yc[j0:jn]
+    x[2*j0+1:2*j1:2, 1::2], y[2*j0+1:2*j1:2, 1::2] = _mean_latlon(sw, se, ne, nw)
+    x[2*j0+1:2*j1:2, 0::2], y[2*j0+1:2*j1:2, 0::2] = _mean_latlon(
+        tuple(c[:-1] for c in p), tuple(c[1:] for c in p))
+    x[2*j0:2*jn:2, 1::2], y[2*j0:2*jn:2, 1::2] = _mean_latlon(
+        tuple(c[:, :-1] for c in rows), tuple(c[:, 1:] for c in rows))
+
+
+"""
+_gc_distance:
+
+Returns the great circle distances in m between the points in radians
+lon1, lat1 and lon2, lat2, as great_circle_distance in mosaic_util.c.
+"""
+def _gc_distance(lon1: npt.NDArray, lat1: npt.NDArray, lon2: npt.NDArray, lat2: npt.NDArray) -> npt.NDArray:
+    sdlat = np.sin((lat1 - lat2)/2.0)
+    sdlon = np.sin((lon1 - lon2)/2.0)
+    return RADIUS*(2.0*np.arcsin(np.sqrt(sdlat*sdlat + np.cos(lat1)*np.cos(lat2)*(sdlon*sdlon))))
+
+
+"""
+_spherical_angle:
+
+Returns the angles at the cartesian points v1 between the great circles to
+v2 and to v3, as spherical_angle in mosaic_util.c.
+"""
+def _spherical_angle(v1: Tuple, v2: Tuple, v3: Tuple) -> npt.NDArray:
+    px = v1[1]*v2[2] - v1[2]*v2[1]
+    py = v1[2]*v2[0] - v1[0]*v2[2]
+    pz = v1[0]*v2[1] - v1[1]*v2[0]
+    qx = v1[1]*v3[2] - v1[2]*v3[1]
+    qy = v1[2]*v3[0] - v1[0]*v3[2]
+    qz = v1[0]*v3[1] - v1[1]*v3[0]
+    ddd = (px*px + py*py + pz*pz)*(qx*qx + qy*qy + qz*qz)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cos_angle = (px*qx + py*qy + pz*qz)/np.sqrt(ddd)
+        angle = np.where(cos_angle > 1.0, 0.0, np.where(cos_angle < -1.0, np.pi, np.arccos(cos_angle)))
+    return np.where(ddd <= 0.0, 0.0, angle)
+
+
+"""
+_excess_area:
+
+Returns the areas in m2 of the cells of the supergrid corners x, y in
+radians from the sum of their corner angles, as calc_cell_area.
+"""
+def _excess_area(x: npt.NDArray, y: npt.NDArray) -> npt.NDArray:
+    p = _latlon2xyz(x, y)
+    ll = tuple(c[:-1, :-1] for c in p)
+    lr = tuple(c[:-1, 1:] for c in p)
+    ur = tuple(c[1:, 1:] for c in p)
+    ul = tuple(c[1:, :-1] for c in p)
+    angles = _spherical_angle(ll, lr, ul) + _spherical_angle(lr, ur, ll) \
+        + _spherical_angle(ur, ul, lr) + _spherical_angle(ul, ur, ll)
+    return (angles - 2.0*np.pi)*RADIUS*RADIUS
+
+
+"""
+_fill_metrics:
+
+Fills the rows r0 to r1 of the supergrid cell metrics of one tile: dx (and
+its last row with the last block), dy if dy is given and area if area is
+given.
+"""
+def _fill_metrics(x: npt.NDArray, y: npt.NDArray, dx: Optional[npt.NDArray], dy: Optional[npt.NDArray],
+                  area: Optional[npt.NDArray], r0: int, r1: int):
+    ny = x.shape[0] - 1
+    if dx is not None:
+        re = r1 + 1 if r1 == ny else r1
+        dx[r0:re] = _gc_distance(x[r0:re, :-1], y[r0:re, :-1], x[r0:re, 1:], y[r0:re, 1:])
+    if dy is not None:
+        dy[r0:r1] = _gc_distance(x[r0:r1], y[r0:r1], x[r0+1:r1+1], y[r0+1:r1+1])
+    if area is not None:
+        area[r0:r1] = _excess_area(x[r0:r1+1], y[r0:r1+1])
+
+
+"""
+_fill_angles:
+
+Fills the rows r0 to r1 of the rotation angles in degrees of tile n of the
+(6, nx+1, nx+1) supergrid x, y in radians from the neighbouring points across
+the tile edges, as calc_rotation_angle2. The cosine of the latitude is taken
+of the latitude in radians converted as if it were in degrees, as in the C.
+"""
+def _fill_angles(x: npt.NDArray, y: npt.NDArray, angle_dx: npt.NDArray, angle_dy: npt.NDArray,
+                 n: int, r0: int, r1: int):
+    nxp = x.shape[1]
+    nx = nxp - 1
+    flat_x, flat_y = x.reshape(-1), y.reshape(-1)
+    j, i = np.meshgrid(np.arange(r0, r1), np.arange(nxp), indexing="ij")
+    lon_scale = np.cos(y[n, r0:r1]*(np.pi/180.0))
+    even = n % 2 == 0
+
+    def angle(tp, jp, ip, tm, jm, im):
+        n2 = (tp*nxp + jp)*nxp + ip
+        n3 = (tm*nxp + jm)*nxp + im
+        return np.arctan2(flat_y[n2] - flat_y[n3], (flat_x[n2] - flat_x[n3])*lon_scale)*(180.0/np.pi)
+
+    # x-direction neighbours
+    tp, jp, ip = np.full_like(j, n), j.copy(), i + 1
+    tm, jm, im = np.full_like(j, n), j.copy(), i - 1
+    east, west = ip >= nxp, im < 0
+    if even:
+        tp[east], ip[east] = n + 1, 0
+        tm[west], jm[west], im[west] = (n - 2) % _NTILES, nx, nx - j[west]
+    else:
+        tp[east], ip[east], jp[east] = (n + 2) % _NTILES, nx - j[east] - 1, 0
+        tm[west], im[west] = n - 1, nx
+    angle_dx[r0:r1] = angle(tp, jp, ip, tm, jm, im)
+
+    # y-direction neighbours
+    tp, jp, ip = np.full_like(j, n), j + 1, i.copy()
+    tm, jm, im = np.full_like(j, n), j - 1, i.copy()
+    north, south = jp >= nxp, jm < 0
+    if even:
+        tp[north], jp[north], ip[north] = (n + 2) % _NTILES, nx - i[north], 0
+        tm[south], jm[south] = (n - 1) % _NTILES, nx
+    else:
+        tp[north], jp[north] = (n + 1) % _NTILES, 0
+        tm[south], im[south], jm[south] = (n - 2) % _NTILES, nx, nx - i[south]
+    angle_dy[r0:r1] = angle(tp, jp, ip, tm, jm, im)
+
+
+"""
+_to_degrees:
+
+Converts the rows r0 to r1 of the supergrid x, y from radians to degrees in
+place.
+"""
+def _to_degrees(x: npt.NDArray, y: npt.NDArray, r0: int, r1: int):
+    x[r0:r1] *= 180.0/np.pi
+    y[r0:r1] *= 180.0/np.pi
+
+
+"""
+_run_tasks:
+
+Runs the (function, *args) tasks on executor, on a pool of jobs threads or
+serially, and waits for all of them. The tasks write their results in place
+into shared arrays, so they must run in threads of this process.
+"""
+def _run_tasks(tasks: List[Tuple], jobs: int, executor: Optional[Executor]):
+    pool = ThreadPoolExecutor(max_workers=jobs) if executor is None and jobs > 1 and len(tasks) > 1 else None
+    with pool or contextlib.nullcontext():
+        run = (executor or pool).map if executor or pool else map
+        for _ in run(lambda task: task[0](*task[1:]), tasks):
+            pass
+
+
+"""
+_tile_grids:
+
+Computes the supergrids and metrics of the tiles with the corners in
+radians xc[n], yc[n] into supergrid arrays allocated here, and returns them
+as GridObjs. The first six tiles are the cubed sphere, the others nests.
+"""
+def _tile_grids(xc: List[npt.NDArray], yc: List[npt.NDArray], stretched: bool, same_area: bool,
+                output_length_angle: bool, jobs: int, executor: Optional[Executor]) -> List[GridObj]:
+    ntiles = len(xc)
+    shapes = [(2*c.shape[0] - 1, 2*c.shape[1] - 1) for c in xc]
+    nxp = shapes[0][1]
+    nx = nxp - 1
+
+    # the cubed sphere tiles are stacked for the rotation angles
+    parent_x = np.empty((_NTILES, nxp, nxp), dtype=np.float64)
+    parent_y = np.empty((_NTILES, nxp, nxp), dtype=np.float64)
+    x = list(parent_x) + [np.empty(shape, dtype=np.float64) for shape in shapes[_NTILES:]]
+    y = list(parent_y) + [np.empty(shape, dtype=np.float64) for shape in shapes[_NTILES:]]
+    area = [np.empty((ny-1, nx_-1), dtype=np.float64) for ny, nx_ in shapes]
+    if output_length_angle:
+        dx = [np.empty((ny, nx_-1), dtype=np.float64) for ny, nx_ in shapes]
+        dy = [np.empty((ny-1, nx_), dtype=np.float64) for ny, nx_ in shapes]
+    else:
+        dx = dy = [None]*ntiles
+
+    _run_tasks([(_fill_supergrid, xc[n], yc[n], x[n], y[n], j0, j1)
+                for n in range(ntiles) for j0, j1 in _row_blocks(xc[n].shape[0] - 1)], jobs, executor)
+
+    # unstretched cubed sphere tiles share the areas of tile 1 and have dy = dx.T
+    transposed = [n < _NTILES and not stretched for n in range(ntiles)]
+    copied = [0 < n < _NTILES and same_area for n in range(ntiles)]
+    _run_tasks([(_fill_metrics, x[n], y[n], dx[n], None if transposed[n] else dy[n],
+                 None if copied[n] else area[n], r0, r1)
+                for n in range(ntiles) for r0, r1 in _row_blocks(shapes[n][0] - 1)], jobs, executor)
+    for n in range(ntiles):
+        if copied[n]:
+            area[n][...] = area[0]
+        if transposed[n] and output_length_angle:
+            dy[n][...] = dx[n].T
+
+    if output_length_angle:
+        # ensure consistency on the boundaries between tiles
+        rev = slice(nx-1, None, -1)
+        dy[0][:, 0] = dx[4][nx, rev]     # 5N -> 1W
+        dy[0][:, nx] = dy[1][:, 0]       # 2W -> 1E
+        dy[1][:, nx] = dx[3][0, rev]     # 4S -> 2E
+        dy[2][:, 0] = dx[0][nx, rev]     # 1N -> 3W
+        dy[2][:, nx] = dy[3][:, 0]       # 4W -> 3E
+        dy[3][:, nx] = dx[5][0, rev]     # 6S -> 4E
+        dy[4][:, 0] = dx[2][nx, rev]     # 3N -> 5W
+        dy[4][:, nx] = dy[5][:, 0]       # 6W -> 5E
+        dy[5][:, nx] = dx[1][0, rev]     # 2S -> 6E
+
+        # the nests have no rotation angles
+        angle_dx = list(np.empty_like(parent_x)) + [np.zeros(shape) for shape in shapes[_NTILES:]]
+        angle_dy = list(np.empty_like(parent_x)) + [np.zeros(shape) for shape in shapes[_NTILES:]]
+        _run_tasks([(_fill_angles, parent_x, parent_y, angle_dx[n], angle_dy[n], n, r0, r1)
+                    for n in range(_NTILES) for r0, r1 in _row_blocks(nxp)], jobs, executor)
+    else:
+        angle_dx = angle_dy = [None]*ntiles
+
+    _run_tasks([(_to_degrees, x[n], y[n], r0, r1) for n in range(ntiles)
+                for r0, r1 in _row_blocks(shapes[n][0])], jobs, executor)
+
+    return [GridObj(tile=f"tile{n+1}", x=x[n], y=y[n], dx=dx[n], dy=dy[n], area=area[n],
+                    angle_dx=angle_dx[n], angle_dy=angle_dy[n], arcx="great_circle")
+            for n in range(ntiles)]
+
+
+"""
+_nest_bounds:
+
+Returns the parent cell range istart, iend, jstart, jend counted from 1 of a
+nest given by its parent supergrid indices counted from 1.
+"""
+def _nest_bounds(istart_nest: int, iend_nest: int, jstart_nest: int, jend_nest: int) -> Tuple[int, int, int, int]:
+    if (istart_nest + 1) % 2 or (jstart_nest + 1) % 2:
+        raise ValueError("setup_aligned_nest: istart_nest+1 and jstart_nest+1 should be divisible by 2")
+    if iend_nest % 2 or jend_nest % 2:
+        raise ValueError("setup_aligned_nest: iend_nest and jend_nest should be divisible by 2")
+    return (istart_nest + 1)//2, iend_nest//2, (jstart_nest + 1)//2, jend_nest//2
+
+
+"""
+create_gnomonic_cubic_grid:
+
+Returns the GridObjs of the six tiles of the gnomonic_ed cubed sphere with
+nlon supergrid cells along each tile edge, followed by those of the nests,
+as create_gnomonic_cubic_grid.c. The tile corners are generated first, then
+the supergrid points, dx, dy, areas and rotation angles of the tiles are
+computed in blocks of rows by executor or a pool of jobs threads. With
+do_schmidt or do_cube_transform the tiles are stretched by stretch_factor
+towards target_lon, target_lat (degrees), otherwise they are shifted west by
+10 degrees if shift_fac is larger than 1e-4.
+
+Each nest is a dict with the keys parent_tile (1 to 6, or 6+m for the m-th
+nest), refine_ratio and istart_nest, iend_nest, jstart_nest, jend_nest, the
+parent supergrid indices counted from 1 of its extent; halo is checked to fit
+within the parent of every nest. The nests have zero rotation angles. With
+output_length_angle False only x, y and area are computed.
+"""
+def create_gnomonic_cubic_grid(nlon: int, shift_fac: float = 18.0, do_schmidt: bool = False,
+                               do_cube_transform: bool = False, stretch_factor: float = 1.0,
+                               target_lon: float = 0.0, target_lat: float = 0.0,
+                               nests: Sequence[dict] = (), halo: int = 0,
+                               output_length_angle: bool = True, jobs: int = 1,
+                               executor: Optional[Executor] = None) -> List[GridObj]:
+    if nlon <= 0 or nlon % 2:
+        raise ValueError("create_gnomonic_cubic_grid: supergrid size should be a positive multiple of 2")
+    if do_schmidt and do_cube_transform:
+        raise ValueError("create_gnomonic_cubic_grid: do_schmidt and do_cube_transform are exclusive")
+    xc, yc = _parent_corners(nlon//2, shift_fac, do_schmidt, do_cube_transform, stretch_factor,
+                             target_lon, target_lat)
+    xc, yc = list(xc), list(yc)
+
+    for m, nest in enumerate(nests):
+        parent = nest["parent_tile"]
+        if parent < 1 or parent > _NTILES + m:
+            raise ValueError(f"create_gnomonic_cubic_grid: invalid parent_tile {parent} of nest {m+1}, "
+                             "the global refinement (parent_tile 0) is not supported")
+        nest_xc, nest_yc = _aligned_nest(xc[parent-1], yc[parent-1], halo, nest["refine_ratio"],
+                                         *_nest_bounds(nest["istart_nest"], nest["iend_nest"],
+                                                       nest["jstart_nest"], nest["jend_nest"]))
+        xc.append(nest_xc)
+        yc.append(nest_yc)
+
+    stretched = (do_schmidt or do_cube_transform) and abs(stretch_factor - 1.0) > _EPSLN5
+    return _tile_grids(xc, yc, stretched, not (do_schmidt or do_cube_transform), output_length_angle,
+                       jobs, executor)
+
+
+"""
+setup_aligned_nest:
+
+Returns the GridObj of the nest refining by refine_ratio the supergrid
+indices istart_nest to iend_nest and jstart_nest to jend_nest (counted from 1)
+of the existing parent grid, whose supergrid x, y are read for the corners
+and are not regenerated. The nest has zero rotation angles and is named
+tile, tile1 by default.
+"""
+def setup_aligned_nest(parent: GridObj, refine_ratio: int, istart_nest: int, iend_nest: int,
+                       jstart_nest: int, jend_nest: int, halo: int = 0, tile: str = "tile1",
+                       jobs: int = 1, executor: Optional[Executor] = None) -> GridObj:
+    parent_xc = np.deg2rad(np.asarray(parent.x)[::2, ::2])
+    parent_yc = np.deg2rad(np.asarray(parent.y)[::2, ::2])
+    xc, yc = _aligned_nest(parent_xc, parent_yc, halo, refine_ratio,
+                           *_nest_bounds(istart_nest, iend_nest, jstart_nest, jend_nest))
+    shape = (2*xc.shape[0] - 1, 2*xc.shape[1] - 1)
+    x = np.empty(shape, dtype=np.float64)
+    y = np.empty(shape, dtype=np.float64)
+    dx = np.empty((shape[0], shape[1]-1), dtype=np.float64)
+    dy = np.empty((shape[0]-1, shape[1]), dtype=np.float64)
+    area = np.empty((shape[0]-1, shape[1]-1), dtype=np.float64)
+
+    _run_tasks([(_fill_supergrid, xc, yc, x, y, j0, j1) for j0, j1 in _row_blocks(xc.shape[0] - 1)],
+               jobs, executor)
+    _run_tasks([(_fill_metrics, x, y, dx, dy, area, r0, r1) for r0, r1 in _row_blocks(shape[0] - 1)],
+               jobs, executor)
+    _to_degrees(x, y, 0, shape[0])
+    return GridObj(tile=tile, x=x, y=y, dx=dx, dy=dy, area=area, angle_dx=np.zeros(shape),
+                   angle_dy=np.zeros(shape), arcx="great_circle")
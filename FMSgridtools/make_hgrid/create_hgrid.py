@@ -0,0 +1,336 @@
+from typing import Sequence
+
+import numpy as np
+import numpy.typing as npt
+
+from gridtools.shared.gridobj import RADIUS, GridObj
+from FREnctools_lib.pyfrenctools.shared.create_xgrid import get_grid_area, get_grid_great_circle_area
+
+"""
+Grid types generated by make_hgrid, each is created by the create_<grid type>
+function of this module
+"""
+HGRID_TYPES = ("regular_lonlat_grid", "tripolar_grid", "simple_cartesian_grid", "f_plane_grid")
+
+# tolerance in degrees of the tripolar transformation, SMALL in tool_util.c
+_SMALL = 1.0e-4
+
+
+"""
+_cubic_spline_sp:
+
+Interpolates data1 given on the monotonic increasing grid1 onto grid2 with the
+shape preserving piecewise cubic of cubic_spline_sp in interp.c. The slopes
+and coefficients are computed in the same order as the C code, so that the
+results are identical.
+"""
+def _cubic_spline_sp(grid1: npt.NDArray, grid2: npt.NDArray, data1: npt.NDArray) -> npt.NDArray:
+    if grid1.size < 2:
+        raise ValueError("cubic_spline_sp: the size of input grid should be at least 2")
+    if np.any(np.diff(grid1) <= 0.0):
+        raise ValueError("cubic_spline_sp: grid1 is not monotonic increasing")
+    if grid1.size == 2:
+        p = (data1[1]-data1[0])/(grid1[1]-grid1[0])
+        return p*(grid2 - grid1[0]) + data1[0]
+
+    dh = np.diff(grid1)
+    delta = np.diff(data1)/dh
+
+    # interior slopes
+    d = np.zeros(grid1.size, dtype=np.float64)
+    w1 = 2.0*dh[1:] + dh[:-1]
+    w2 = dh[1:] + 2.0*dh[:-1]
+    monotonic = delta[1:]*delta[:-1] > 0.0
+    with np.errstate(divide="ignore"):
+        d[1:-1] = np.where(monotonic, (w1+w2)/(w1/delta[:-1] + w2/delta[1:]), 0.0)
+
+    # end slopes
+    d[0] = ((2.0*dh[0] + dh[1])*delta[0] - dh[0]*delta[1])/(dh[0]+dh[1])
+    if d[0]*delta[0] < 0.0:
+        d[0] = 0.0
+    elif delta[0]*delta[1] < 0.0 and abs(d[0]) > abs(3.0*delta[0]):
+        d[0] = 3.0*delta[0]
+    d[-1] = ((2.0*dh[-1] + dh[-2])*delta[-1] - dh[-1]*delta[-2])/(dh[-1]+dh[-2])
+    if d[-1]*delta[-1] < 0.0:
+        d[-1] = 0.0
+    elif delta[-1]*delta[-2] < 0.0 and abs(d[-1]) > abs(3.0*delta[-1]):
+        d[-1] = 3.0*delta[-1]
+
+    c = (3.0*delta - 2.0*d[:-1] - d[1:])/dh
+    b = (d[:-1] - 2.0*delta + d[1:])/(dh*dh)
+
+    klo = np.clip(np.searchsorted(grid1, grid2, side="left") - 1, 0, grid1.size-2)
+    s = grid2 - grid1[klo]
+    return data1[klo] + s*(d[klo] + s*(c[klo] + s*b[klo]))
+
+
+"""
+compute_grid_bound:
+
+Returns the 1-D grid locations through the boundaries bnds with npts[n] grid
+cells between bnds[n] and bnds[n+1], as compute_grid_bound in tool_util.c.
+With center "none" the cell boundaries are returned, with "t_cell" or
+"c_cell" the supergrid is returned, whose even points are the cell boundaries
+(t_cell) or are centered between the cell centers (c_cell). npts must be even
+for t_cell and c_cell.
+"""
+def compute_grid_bound(bnds: Sequence[float], npts: Sequence[int], center: str = "none") -> npt.NDArray:
+    bnds = np.asarray(bnds, dtype=np.float64)
+    npts = np.asarray(npts, dtype=np.int64)
+    if center == "none":
+        refine = 1
+    elif center in ("t_cell", "c_cell"):
+        refine = 2
+    else:
+        raise ValueError("center should be 'none', 'c_cell' or 't_cell'")
+    if npts.size != bnds.size - 1:
+        raise ValueError(f"{bnds.size} bounds need {bnds.size - 1} numbers of grid cells, got {npts.size}")
+    if np.any(npts % refine):
+        raise ValueError("when center is not 'none', the numbers of grid cells should be divided by 2")
+
+    n = int(npts.sum())//refine
+    grid1 = np.concatenate(([0], np.cumsum(npts//refine))) + 1.0
+    tmp = _cubic_spline_sp(grid1, np.arange(1.0, n + 2.0), bnds)
+
+    if center == "none":
+        return tmp
+    grid = np.empty(2*n + 1, dtype=np.float64)
+    if center == "t_cell":
+        grid[0::2] = tmp
+        grid[1::2] = 0.5*(tmp[:-1] + tmp[1:])
+    else:
+        grid[1::2] = 0.5*(tmp[:-1] + tmp[1:])
+        grid[0] = tmp[0]
+        grid[2:-1:2] = 0.5*(grid[1:-2:2] + grid[3::2])
+        grid[-1] = tmp[-1]
+    return grid
+
+
+"""
+_nearest_index:
+
+Returns the index of the point of the monotonic increasing array nearest to
+value, as nearest_index in mosaic_util.c.
+"""
+def _nearest_index(value: float, array: npt.NDArray) -> int:
+    if value < array[0]:
+        return 0
+    if value > array[-1]:
+        return array.size - 1
+    i = max(int(np.searchsorted(array, value, side="left")), 1)
+    return i - 1 if array[i] - value > value - array[i-1] else i
+
+
+"""
+_lat_dist:
+
+Returns the distance in degrees between the longitudes x1 and x2 along a
+latitude circle.
+"""
+def _lat_dist(x1: npt.NDArray, x2: float) -> npt.NDArray:
+    return np.minimum(np.fmod(x1 - x2 + 720.0, 360.0), np.fmod(x2 - x1 + 720.0, 360.0))
+
+
+"""
+_lon_in_range:
+
+Returns lon shifted by multiples of 360 into [lon_ref, lon_ref+360], lon
+within _SMALL of either end is set to lon_ref.
+"""
+def _lon_in_range(lon: npt.NDArray, lon_ref: npt.NDArray) -> npt.NDArray:
+    lon_end = lon_ref + 360.0
+    shift = np.where(lon < lon_ref, np.ceil((lon_ref - lon)/360.0),
+                     np.where(lon > lon_end, -np.ceil((lon - lon_end)/360.0), 0.0))
+    snap = (np.abs(lon - lon_ref) < _SMALL) | (np.abs(lon - lon_end) < _SMALL)
+    return np.where(snap, lon_ref, lon + 360.0*shift)
+
+
+"""
+_supergrid:
+
+Allocates the supergrid arrays of a grid with the nominal 1-D locations xb and
+yb, and sets x and y. dx, dy, area and angle_dx are left to be filled in place
+by the grid type.
+"""
+def _supergrid(xb: npt.NDArray, yb: npt.NDArray) -> dict:
+    nx, ny = xb.size - 1, yb.size - 1
+    grid = dict(x = np.empty((ny+1, nx+1), dtype=np.float64),
+                y = np.empty((ny+1, nx+1), dtype=np.float64),
+                dx = np.empty((ny+1, nx), dtype=np.float64),
+                dy = np.empty((ny, nx+1), dtype=np.float64),
+                area = np.empty((ny, nx), dtype=np.float64),
+                angle_dx = np.zeros((ny+1, nx+1), dtype=np.float64))
+    grid["x"][:] = xb
+    grid["y"][:] = yb[:, np.newaxis]
+    return grid
+
+
+"""
+_lonlat_lengths:
+
+Fills the zonal lengths dx and meridional lengths dy in m of the edges of a
+lon/lat grid with the corners x and y in degrees, spherical_dist in
+tool_util.c. The last row of x and y is only used for dy, so that the edges of
+a part of the rows of a grid can be computed.
+"""
+def _lonlat_lengths(x: npt.NDArray, y: npt.NDArray, dx: npt.NDArray, dy: npt.NDArray):
+    nrows = dx.shape[0]
+    dx[:] = np.abs(np.diff(x[:nrows], axis=1))*np.deg2rad(1.0)*(RADIUS*np.cos(np.deg2rad(y[:nrows, :-1])))
+    dy[:] = np.abs(np.diff(y, axis=0))*np.deg2rad(1.0)*RADIUS
+
+
+"""
+_box_area:
+
+Fills the areas in m2 of the cells of a lon/lat grid with the corners x and y
+in degrees, box_area in mosaic_util.c.
+"""
+def _box_area(x: npt.NDArray, y: npt.NDArray, area: npt.NDArray):
+    dlon = np.deg2rad(x[1:, 1:]) - np.deg2rad(x[:-1, :-1])
+    dlon = np.where(dlon > np.pi, dlon - 2.0*np.pi, np.where(dlon < -np.pi, dlon + 2.0*np.pi, dlon))
+    area[:] = dlon*(np.sin(np.deg2rad(y[1:, 1:])) - np.sin(np.deg2rad(y[:-1, :-1])))*RADIUS*RADIUS
+
+
+"""
+create_regular_lonlat_grid:
+
+Returns the GridObj of a regular lon/lat grid through the longitudes xbnds and
+latitudes ybnds in degrees, with nlon[n] and nlat[n] grid cells between
+consecutive bounds, as create_regular_lonlat_grid in create_hgrid.h. All
+fields are computed with whole array operations and the arrays are stored in
+the GridObj as allocated.
+"""
+def create_regular_lonlat_grid(xbnds: Sequence[float], ybnds: Sequence[float], nlon: Sequence[int],
+                               nlat: Sequence[int], center: str = "none",
+                               use_great_circle_algorithm: bool = False) -> GridObj:
+    grid = _supergrid(compute_grid_bound(xbnds, nlon, center), compute_grid_bound(ybnds, nlat, center))
+    x, y = grid["x"], grid["y"]
+    _lonlat_lengths(x, y, grid["dx"], grid["dy"])
+    if use_great_circle_algorithm:
+        grid["area"][:] = get_grid_great_circle_area(np.deg2rad(x), np.deg2rad(y))
+    else:
+        _box_area(x, y, grid["area"])
+    return GridObj(tile="tile1", arcx="great_circle" if use_great_circle_algorithm else "small_circle", **grid)
+
+
+"""
+create_simple_cartesian_grid:
+
+Returns the GridObj of a cartesian grid with nlon by nlat cells of size
+simple_dx by simple_dy in m, whose nominal locations go linearly from xbnds[0]
+to xbnds[1] and ybnds[0] to ybnds[1], as create_simple_cartesian_grid in
+create_hgrid.h.
+"""
+def create_simple_cartesian_grid(xbnds: Sequence[float], ybnds: Sequence[float], nlon: int, nlat: int,
+                                 simple_dx: float, simple_dy: float) -> GridObj:
+    if len(xbnds) != 2 or len(ybnds) != 2:
+        raise ValueError("simple_cartesian_grid needs two x and two y bounds")
+    grid = _supergrid(compute_grid_bound(xbnds, [nlon]), compute_grid_bound(ybnds, [nlat]))
+    grid["dx"].fill(simple_dx)
+    grid["dy"].fill(simple_dy)
+    grid["area"].fill(simple_dx*simple_dy)
+    return GridObj(tile="tile1", **grid)
+
+
+"""
+create_f_plane_grid:
+
+Returns the GridObj of an f-plane grid, a lon/lat grid whose zonal lengths and
+areas are those at the latitude f_plane_latitude, as create_f_plane_grid in
+create_hgrid.h.
+"""
+def create_f_plane_grid(xbnds: Sequence[float], ybnds: Sequence[float], nlon: Sequence[int],
+                        nlat: Sequence[int], f_plane_latitude: float, center: str = "none") -> GridObj:
+    grid = _supergrid(compute_grid_bound(xbnds, nlon, center), compute_grid_bound(ybnds, nlat, center))
+    x, y = grid["x"], grid["y"]
+    coslat = np.cos(np.deg2rad(f_plane_latitude))
+    grid["dx"][:] = np.abs(np.diff(x, axis=1))*np.deg2rad(1.0)*RADIUS*coslat
+    grid["dy"][:] = np.abs(np.diff(y, axis=0))*np.deg2rad(1.0)*RADIUS
+    grid["area"][:] = (x[1:, 1:] - x[:-1, :-1])*np.deg2rad(1.0)*((y[1:, 1:] - y[:-1, :-1])*np.deg2rad(1.0)) \
+        * coslat*RADIUS*RADIUS
+    return GridObj(tile="tile1", **grid)
+
+
+"""
+_bipolar_coords:
+
+Returns the longitude and latitude in degrees in the bipolar coordinates of
+the points x, y, bp_lam and bp_phi in tool_util.c, and the metric term of
+eqn. 3 of R. Murray (1996) at the points.
+"""
+def _bipolar_coords(x: npt.NDArray, y: npt.NDArray, lon_bpeq: float, lon_bpsp: float,
+                    lon_bpnp: float, rp: float) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
+    bp_lon = np.rad2deg(2.0*np.arctan(np.tan((0.5*np.pi - np.deg2rad(y))/2)/rp))
+    bp_lon = np.where(_lat_dist(x, lon_bpeq) < 90.0, -bp_lon, bp_lon)
+    dist_sp = _lat_dist(x, lon_bpsp)
+    bp_lat = np.where(dist_sp < 90.0, -90.0 + dist_sp, 90.0 - _lat_dist(x, lon_bpnp))
+    chic = np.arccos(np.cos(np.deg2rad(bp_lon))*np.cos(np.deg2rad(bp_lat)))
+    metric = rp*(1/np.cos(chic/2)**2)/(1 + rp**2*np.tan(chic/2)**2)
+    regular = (np.abs(y - 90.0) >= _SMALL) & (np.abs(np.deg2rad(bp_lon)) < _SMALL) \
+        & (np.abs(np.deg2rad(bp_lat)) < _SMALL)
+    return bp_lon, bp_lat, np.where(regular, 1.0, metric)
+
+
+"""
+create_tripolar_grid:
+
+Returns the GridObj of a tripolar grid, a regular lon/lat grid south of
+lat_join whose rows north of lat_join are transformed to the bipolar grid of
+R. Murray (1996), as create_tripolar_grid in create_hgrid.h. The grid is
+computed with whole array operations, only the longitudes of the bipolar rows
+are made continuous by a sweep along the columns. The areas of the bipolar
+cells are computed by the compiled grid area kernels.
+"""
+def create_tripolar_grid(xbnds: Sequence[float], ybnds: Sequence[float], nlon: Sequence[int],
+                         nlat: Sequence[int], lat_join: float = 65.0, center: str = "none",
+                         use_great_circle_algorithm: bool = False) -> GridObj:
+    xb = compute_grid_bound(xbnds, nlon, center)
+    yb = compute_grid_bound(ybnds, nlat, center)
+    grid = _supergrid(xb, yb)
+    x, y, dx, dy, area = grid["x"], grid["y"], grid["dx"], grid["dy"], grid["area"]
+
+    j_join = _nearest_index(lat_join, yb)
+    lon_start = float(xbnds[0])
+    lon_bpeq, lon_bpnp, lon_bpsp = lon_start + 90.0, lon_start, lon_start + 180.0
+    lam0 = np.fmod(np.deg2rad(lon_bpeq) + 2*np.pi, 2*np.pi)
+    rp = np.tan((0.5*np.pi - np.deg2rad(yb[j_join]))/2.0)
+
+    # the edge lengths are computed on the untransformed grid, the regular rows
+    # are those of a lon/lat grid, the lengths of the bipolar rows are scaled
+    # by the metric term
+    _lonlat_lengths(x[:j_join+1], y[:j_join+1], dx[:j_join], dy[:j_join])
+    bp_lon, bp_lat, metric = _bipolar_coords(x[j_join:], y[j_join:], lon_bpeq, lon_bpsp, lon_bpnp, rp)
+    dx[j_join:] = np.abs(np.diff(bp_lat, axis=1))*np.deg2rad(1.0) \
+        * (metric[:, :-1]*RADIUS + metric[:, 1:]*RADIUS)/2.0
+    h1 = metric*RADIUS*np.cos(np.deg2rad(bp_lat))
+    dy[j_join:] = np.abs(np.diff(bp_lon, axis=0))*np.deg2rad(1.0)*(h1[:-1] + h1[1:])/2.0
+
+    # transform the bipolar rows to geographic coordinates, tp_trans in tool_util.c
+    lamc, phic = np.deg2rad(bp_lon), np.deg2rad(bp_lat)
+    chic = np.arccos(np.cos(lamc)*np.cos(phic))
+    lat = np.rad2deg(0.5*np.pi - 2*np.arctan(rp*np.tan(chic/2)))
+    with np.errstate(divide="ignore"):
+        lon = np.rad2deg(np.fmod(lam0 + np.pi + np.pi/2 - np.arctan2(np.sin(lamc), np.tan(phic)), 2*np.pi))
+    at_pole = np.abs(y[j_join:] - 90.0) < _SMALL
+    lon = np.where(at_pole, np.where(phic > 0, lon_start, lon_start + 180.0), lon)
+    keep_ref = ~at_pole & (np.abs(lamc) < _SMALL) & (np.abs(phic) < _SMALL)
+    no_range = at_pole & (phic <= 0)
+    y[j_join:] = np.where(keep_ref, 90.0, lat)
+    lon_ref = x[j_join:, 0].copy()
+    for i in range(x.shape[1]):
+        lon_i = np.where(no_range[:, i], lon[:, i], _lon_in_range(lon[:, i], lon_ref))
+        lon_ref = np.where(keep_ref[:, i], lon_ref, lon_i)
+        x[j_join:, i] = lon_ref
+
+    if use_great_circle_algorithm:
+        area[:] = get_grid_great_circle_area(np.deg2rad(x), np.deg2rad(y))
+    else:
+        _box_area(x[:j_join+1], y[:j_join+1], area[:j_join])
+        area[j_join:] = get_grid_area(np.deg2rad(x[j_join:]), np.deg2rad(y[j_join:]))
+
+    # rotation angle at the vertices of the bipolar rows, 0 along the boundaries
+    angle = grid["angle_dx"][j_join:, 1:-1]
+    lon_scale = np.cos(np.deg2rad(y[j_join:, 1:-1]))
+    np.rad2deg(np.arctan2(y[j_join:, 2:] - y[j_join:, :-2], (x[j_join:, 2:] - x[j_join:, :-2])*lon_scale),
+               out=angle)
+    return GridObj(tile="tile1", arcx="great_circle" if use_great_circle_algorithm else "small_circle", **grid)
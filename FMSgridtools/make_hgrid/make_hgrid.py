@@ -1 +1,203 @@
-# TODO: Add work from 'hold_hgrid' branch
\ No newline at end of file
+# make_hgrid entrypoint script
+
+import click
+from typing import List, Optional
+
+from gridtools import HGRID_TYPES
+from gridtools import create_f_plane_grid
+from gridtools import create_gnomonic_cubic_grid
+from gridtools import create_regular_lonlat_grid
+from gridtools import create_simple_cartesian_grid
+from gridtools import create_tripolar_grid
+
+GRID_TYPES = HGRID_TYPES + ("gnomonic_ed",)
+
+GRID_TYPE_OPT_HELP="Specify the type of the horizontal grid, one of " + ", ".join(GRID_TYPES)
+XBNDS_OPT_HELP="Comma separated boundaries in degrees of the regions of the x-direction, e.g. 0,90,360"
+YBNDS_OPT_HELP="Comma separated boundaries in degrees of the regions of the y-direction, e.g. -90,-30,90"
+NLON_OPT_HELP="Comma separated numbers of supergrid cells in the regions of the x-direction. For gnomonic_ed " \
+    "the number of supergrid cells along the edges of the cubed sphere tiles"
+NEST_OPT_HELP="Comma separated {} of the nests of gnomonic_ed, one value per nest"
+NLAT_OPT_HELP="Comma separated numbers of supergrid cells in the regions of the y-direction"
+CENTER_OPT_HELP="Grid cell centering of the supergrid, 'none', 't_cell' or 'c_cell'. Default value is none"
+
+
+def _floats(value: Optional[str]) -> Optional[List[float]]:
+    return None if value is None else [float(v) for v in value.split(",")]
+
+
+def _ints(value: Optional[str]) -> Optional[List[int]]:
+    return None if value is None else [int(v) for v in value.split(",")]
+
+
+@click.command()
+@click.option("--grid_type",
+              type = click.Choice(GRID_TYPES),
+              help = GRID_TYPE_OPT_HELP,
+              required = True)
+@click.option("--xbnds",
+              type = str,
+              help = XBNDS_OPT_HELP)
+@click.option("--ybnds",
+              type = str,
+              help = YBNDS_OPT_HELP)
+@click.option("--nlon",
+              type = str,
+              help = NLON_OPT_HELP,
+              required = True)
+@click.option("--nlat",
+              type = str,
+              help = NLAT_OPT_HELP)
+@click.option("--center",
+              type = click.Choice(["none", "t_cell", "c_cell"]),
+              default = "none",
+              help = CENTER_OPT_HELP)
+@click.option("--great_circle_algorithm",
+              is_flag = True,
+              help = "Compute the cell areas of regular_lonlat_grid and tripolar_grid with great circle edges")
+# tripolar
+@click.option("--lat_join",
+              type = float,
+              default = 65.,
+              help = "Latitude in degrees north of which tripolar_grid is bipolar. Default value is 65")
+# simple cartesian
+@click.option("--simple_dx",
+              type = float,
+              default = 0.,
+              help = "Zonal length in m of the cells of simple_cartesian_grid")
+@click.option("--simple_dy",
+              type = float,
+              default = 0.,
+              help = "Meridional length in m of the cells of simple_cartesian_grid")
+# f-plane
+@click.option("--f_plane_latitude",
+              type = float,
+              default = 100.,
+              help = "Latitude in degrees of the f-plane of f_plane_grid")
+# gnomonic cubed sphere
+@click.option("--shift_fac",
+              type = float,
+              default = 18.,
+              help = "Shift gnomonic_ed west by 180/shift_fac degrees unless it is stretched. Default value is 18")
+@click.option("--do_schmidt",
+              is_flag = True,
+              help = "Stretch gnomonic_ed with the Schmidt transformation towards --target_lon, --target_lat")
+@click.option("--do_cube_transform",
+              is_flag = True,
+              help = "Stretch gnomonic_ed with the cube transformation towards --target_lon, --target_lat")
+@click.option("--stretch_factor",
+              type = float,
+              default = 1.,
+              help = "Stretching factor of --do_schmidt and --do_cube_transform. Default value is 1")
+@click.option("--target_lon",
+              type = float,
+              default = 0.,
+              help = "Longitude in degrees of the center of the stretched tile")
+@click.option("--target_lat",
+              type = float,
+              default = 0.,
+              help = "Latitude in degrees of the center of the stretched tile")
+@click.option("--parent_tile",
+              type = str,
+              help = NEST_OPT_HELP.format("parent tiles, 1 to 6 or 6+m for the m-th nest,"))
+@click.option("--refine_ratio",
+              type = str,
+              help = NEST_OPT_HELP.format("refinement ratios"))
+@click.option("--istart_nest",
+              type = str,
+              help = NEST_OPT_HELP.format("starting parent supergrid indices in x"))
+@click.option("--iend_nest",
+              type = str,
+              help = NEST_OPT_HELP.format("ending parent supergrid indices in x"))
+@click.option("--jstart_nest",
+              type = str,
+              help = NEST_OPT_HELP.format("starting parent supergrid indices in y"))
+@click.option("--jend_nest",
+              type = str,
+              help = NEST_OPT_HELP.format("ending parent supergrid indices in y"))
+@click.option("--halo",
+              type = int,
+              default = 0,
+              help = "Halo size the nests must leave within their parent. Default value is 0")
+@click.option("--jobs",
+              type = int,
+              default = 1,
+              help = "Number of threads computing the gnomonic_ed tiles concurrently. Default value is 1")
+@click.option("--grid_name",
+              type = str,
+              default = "horizontal_grid",
+              help = "The created netCDF file is <grid_name>.nc, <grid_name>.tile<n>.nc for gnomonic_ed. "
+              "Default value is horizontal_grid")
+def make_hgrid(
+    grid_type : str = None,
+    xbnds : str = None,
+    ybnds : str = None,
+    nlon : str = None,
+    nlat : str = None,
+    center : Optional[str] = None,
+    great_circle_algorithm : Optional[bool] = None,
+    lat_join : Optional[float] = None,
+    simple_dx : Optional[float] = None,
+    simple_dy : Optional[float] = None,
+    f_plane_latitude : Optional[float] = None,
+    shift_fac : Optional[float] = None,
+    do_schmidt : Optional[bool] = None,
+    do_cube_transform : Optional[bool] = None,
+    stretch_factor : Optional[float] = None,
+    target_lon : Optional[float] = None,
+    target_lat : Optional[float] = None,
+    parent_tile : Optional[str] = None,
+    refine_ratio : Optional[str] = None,
+    istart_nest : Optional[str] = None,
+    iend_nest : Optional[str] = None,
+    jstart_nest : Optional[str] = None,
+    jend_nest : Optional[str] = None,
+    halo : Optional[int] = None,
+    jobs : Optional[int] = None,
+    grid_name : Optional[str] = None):
+
+    xbnds, ybnds = _floats(xbnds), _floats(ybnds)
+    nlon, nlat = _ints(nlon), _ints(nlat)
+
+    if (grid_type == "gnomonic_ed"):
+        if nlon is None or len(nlon) != 1:
+            raise click.BadParameter("gnomonic_ed takes a single nlon")
+        nest_opts = {"parent_tile": _ints(parent_tile), "refine_ratio": _ints(refine_ratio),
+                     "istart_nest": _ints(istart_nest), "iend_nest": _ints(iend_nest),
+                     "jstart_nest": _ints(jstart_nest), "jend_nest": _ints(jend_nest)}
+        nnests = len(nest_opts["parent_tile"] or [])
+        if any(len(v or []) != nnests for v in nest_opts.values()):
+            raise click.BadParameter("the nest options need one value per nest")
+        nests = [{k: v[m] for k, v in nest_opts.items()} for m in range(nnests)]
+        grids = create_gnomonic_cubic_grid(nlon[0], shift_fac=shift_fac, do_schmidt=do_schmidt,
+                                           do_cube_transform=do_cube_transform, stretch_factor=stretch_factor,
+                                           target_lon=target_lon, target_lat=target_lat, nests=nests,
+                                           halo=halo, jobs=jobs)
+        for grid in grids:
+            grid.write_out_grid(f"{grid_name}.{grid.tile}.nc")
+        return
+
+    if None in (xbnds, ybnds, nlon, nlat):
+        raise click.BadParameter(f"{grid_type} needs --xbnds, --ybnds, --nlon and --nlat")
+    if (grid_type == "regular_lonlat_grid"):
+        grid = create_regular_lonlat_grid(xbnds, ybnds, nlon, nlat, center=center,
+                                          use_great_circle_algorithm=great_circle_algorithm)
+    elif (grid_type == "tripolar_grid"):
+        grid = create_tripolar_grid(xbnds, ybnds, nlon, nlat, lat_join=lat_join, center=center,
+                                    use_great_circle_algorithm=great_circle_algorithm)
+    elif (grid_type == "simple_cartesian_grid"):
+        if len(nlon) != 1 or len(nlat) != 1:
+            raise click.BadParameter("simple_cartesian_grid takes a single nlon and nlat")
+        if simple_dx <= 0 or simple_dy <= 0:
+            raise click.BadParameter("simple_cartesian_grid needs positive --simple_dx and --simple_dy")
+        grid = create_simple_cartesian_grid(xbnds, ybnds, nlon[0], nlat[0], simple_dx, simple_dy)
+    else:
+        if abs(f_plane_latitude) > 90.:
+            raise click.BadParameter("f_plane_grid needs --f_plane_latitude between -90 and 90")
+        grid = create_f_plane_grid(xbnds, ybnds, nlon, nlat, f_plane_latitude, center=center)
+
+    grid.write_out_grid(f"{grid_name}.nc")
+
+
+if __name__ == "__main__":
+    make_hgrid()
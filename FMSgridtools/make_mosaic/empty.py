@@ -1 +0,0 @@
-# For git tracking, to be removed
\ No newline at end of file
@@ -0,0 +1,323 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from gridtools.shared.gridobj import GridObj
+
+# distance in degrees below which two grid points coincide, EPSLN in get_contact.c
+_EPSLN = 1.0e-10
+# tolerance in degrees of the folded north boundary, EPSLN2 in get_contact.c
+_EPSLN2 = 1.0e-7
+
+# size of the cells the points are quantized to, at least twice _EPSLN so that
+# coincident points fall in the same or in neighbouring cells
+_CELL = 2.0*_EPSLN
+
+# multipliers mixing the two quantized coordinates into one hash key
+_MIX_X = np.uint64(0x9E3779B97F4A7C15)
+_MIX_Y = np.uint64(0xC2B2AE3D27D4EB4F)
+
+# number of grid rows of a tile scanned at once for the overlap contacts
+_SCAN_ROWS = 512
+
+# the boundaries of a tile
+_WEST, _EAST, _SOUTH, _NORTH = range(4)
+
+"""
+Boundaries of tile1 and tile2 searched for aligned contacts by
+get_align_contact, in its order, with the direction in which they are
+periodic (1 for x, 2 for y, 0 for none). Within a tile only the east-west and
+south-north pairs are searched.
+"""
+_ALIGN_PAIRS = ((_EAST, _WEST, 1), (_EAST, _SOUTH, 0), (_SOUTH, _NORTH, 2), (_SOUTH, _EAST, 0),
+                (_WEST, _EAST, 1), (_WEST, _NORTH, 0), (_NORTH, _SOUTH, 2), (_NORTH, _WEST, 0))
+_SELF_PAIRS = (0, 2)
+
+# order of the contacts of a tile pair: the aligned contacts, the folded north
+# boundary of a tile and the overlap of nested tiles
+_FOLD_ORDER = len(_ALIGN_PAIRS)
+_OVERLAP_ORDER = len(_ALIGN_PAIRS) + 1
+
+
+"""
+_hash_keys:
+
+Returns the hash keys of the cells ix, iy of the quantized coordinates.
+"""
+def _hash_keys(ix: npt.NDArray, iy: npt.NDArray) -> npt.NDArray[np.uint64]:
+    return (ix.astype(np.uint64)*_MIX_X) ^ (iy.astype(np.uint64)*_MIX_Y)
+
+
+"""
+_PointIndex:
+
+Hashed index of points x, y quantized to cells of _CELL degrees. Every point
+is stored under the key of its cell and of the 8 neighbouring cells, so that
+a query probes the single cell of each query point and still finds all the
+points within _EPSLN of it. Hash collisions are removed by the final distance
+check.
+"""
+class _PointIndex:
+    def __init__(self, x: npt.NDArray, y: npt.NDArray):
+        ix = np.floor(x/_CELL).astype(np.int64)
+        iy = np.floor(y/_CELL).astype(np.int64)
+        offsets = np.array([-1, 0, 1])
+        keys = _hash_keys(*np.broadcast_arrays(ix[:, np.newaxis, np.newaxis] + offsets[:, np.newaxis],
+                                               iy[:, np.newaxis, np.newaxis] + offsets)).reshape(-1)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.ids = order//9
+        self.x = x
+        self.y = y
+
+    """
+    query:
+
+    Returns the indices of the query points x, y and of the indexed points
+    within _EPSLN of them, in both coordinates.
+    """
+    def query(self, x: npt.NDArray, y: npt.NDArray) -> Tuple[npt.NDArray, npt.NDArray]:
+        keys = _hash_keys(np.floor(x/_CELL).astype(np.int64), np.floor(y/_CELL).astype(np.int64))
+        lo = np.searchsorted(self.keys, keys, side="left")
+        counts = np.searchsorted(self.keys, keys, side="right") - lo
+        iq = np.repeat(np.arange(keys.size), counts)
+        start = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        ie = self.ids[start + np.arange(iq.size)]
+        close = (np.abs(x[iq] - self.x[ie]) < _EPSLN) & (np.abs(y[iq] - self.y[ie]) < _EPSLN)
+        return iq[close], ie[close]
+
+
+"""
+_boundaries:
+
+Returns the (x, y) points of the west, east, south and north boundaries of
+the supergrid x, y, as west_bound, east_bound, south_bound and north_bound.
+"""
+def _boundaries(x: npt.NDArray, y: npt.NDArray) -> List[Tuple[npt.NDArray, npt.NDArray]]:
+    return [(np.asarray(x[:, 0]), np.asarray(y[:, 0])), (np.asarray(x[:, -1]), np.asarray(y[:, -1])),
+            (np.asarray(x[0, :]), np.asarray(y[0, :])), (np.asarray(x[-1, :]), np.asarray(y[-1, :]))]
+
+
+"""
+_side_index:
+
+Returns the istart, iend, jstart, jend supergrid cell indices (counted from 1)
+of the contact from start to end along the boundary side of a tile with
+nxp, nyp points.
+"""
+def _side_index(side: int, nxp: int, nyp: int, start: int, end: int) -> Tuple[int, int, int, int]:
+    if side == _WEST:
+        return 1, 1, start, end
+    if side == _EAST:
+        return nxp-1, nxp-1, start, end
+    if side == _SOUTH:
+        return start, end, 1, 1
+    return start, end, nyp-1, nyp-1
+
+
+"""
+_contact_range:
+
+Returns the start and end cell indices along two boundaries from the
+positions pos1, pos2 of their coincident points, as get_contact_index: the
+contact runs from the first to the last coincident point of boundary 1, each
+paired with the first and the last coincident point of boundary 2. Returns
+None for contacts of a single point.
+"""
+def _contact_range(pos1: npt.NDArray, pos2: npt.NDArray) -> Tuple[int, int, int, int]:
+    start1, end1 = pos1.min(), pos1.max()
+    start2, end2 = pos2[pos1 == start1].min(), pos2[pos1 == end1].max()
+    start1, end1, start2, end2 = start1+1, end1+1, start2+1, end2+1
+    if start1 == end1 or start2 == end2:
+        return None
+    if start1 > end1:
+        start1 -= 1
+    else:
+        end1 -= 1
+    if start2 > end2:
+        start2 -= 1
+    else:
+        end2 -= 1
+    return int(start1), int(end1), int(start2), int(end2)
+
+
+"""
+_align_contacts:
+
+Returns the aligned contacts between and within the tiles with the
+boundaries bounds as (tile1, tile2, order, index) tuples. All the boundary
+points are put in one hashed index and every boundary point is looked up
+once, shifted by the periods for the periodic boundary pairs.
+"""
+def _align_contacts(bounds: List[List[Tuple[npt.NDArray, npt.NDArray]]], shapes: List[Tuple[int, int]],
+                    periodx: float, periody: float) -> List[Tuple]:
+    x, y, tile, side, pos = [], [], [], [], []
+    for t, tile_bounds in enumerate(bounds):
+        for s, (bx, by) in enumerate(tile_bounds):
+            x.append(bx)
+            y.append(by)
+            tile.append(np.full(bx.size, t))
+            side.append(np.full(bx.size, s))
+            pos.append(np.arange(bx.size))
+    x, y, tile, side, pos = (np.concatenate(a) for a in (x, y, tile, side, pos))
+    index = _PointIndex(x, y)
+
+    # pairs of coincident points, with the direction of the period separating them
+    shifts = [(0.0, 0.0, 0)]
+    if periodx:
+        shifts += [(periodx, 0.0, 1), (-periodx, 0.0, 1)]
+    if periody:
+        shifts += [(0.0, periody, 2), (0.0, -periody, 2)]
+    pair_code = np.full((4, 4, 3), -1)
+    for n, (side1, side2, periodic) in enumerate(_ALIGN_PAIRS):
+        pair_code[side1, side2, 0] = n
+        if periodic:
+            pair_code[side1, side2, periodic] = n
+
+    matches = []
+    for dx, dy, periodic in shifts:
+        a, b = index.query(x + dx, y + dy)
+        code = pair_code[side[a], side[b], periodic]
+        same = tile[a] == tile[b]
+        keep = (code >= 0) & ((tile[a] < tile[b]) | (same & np.isin(code, _SELF_PAIRS)))
+        a, b, code = a[keep], b[keep], code[keep]
+        matches.append(((tile[a]*len(bounds) + tile[b])*len(_ALIGN_PAIRS) + code, pos[a], pos[b]))
+    group, pos1, pos2 = (np.concatenate(m) for m in zip(*matches))
+
+    # the coincident points of each boundary pair are contiguous once sorted by group
+    contacts = []
+    order = np.argsort(group, kind="stable")
+    group, pos1, pos2 = group[order], pos1[order], pos2[order]
+    groups, starts = np.unique(group, return_index=True)
+    for g, members in zip(groups.tolist(), np.split(np.arange(group.size), starts[1:])):
+        pair = g % len(_ALIGN_PAIRS)
+        tile1, tile2 = divmod(g//len(_ALIGN_PAIRS), len(bounds))
+        contact = _contact_range(pos1[members], pos2[members])
+        if contact is None:
+            continue
+        side1, side2, _ = _ALIGN_PAIRS[pair]
+        contacts.append((tile1, tile2, pair, _side_index(side1, *shapes[tile1], contact[0], contact[1])
+                         + _side_index(side2, *shapes[tile2], contact[2], contact[3])))
+    return contacts
+
+
+"""
+_fold_contact:
+
+Returns the contact of the folded north boundary xb, yb of a tripolar tile
+with itself, or None if the boundary is not folded, as get_align_contact.
+"""
+def _fold_contact(xb: npt.NDArray, yb: npt.NDArray, nyp: int) -> Tuple[int, ...]:
+    nxp = xb.size
+    half = np.arange(nxp//2)
+    if np.any(np.abs(yb[half] - yb[nxp-half-1]) > _EPSLN2):
+        return None
+    dx = np.abs(xb[half] - xb[nxp-half-1])
+    shifted = (dx > _EPSLN2) & (np.abs(dx-360.0) > _EPSLN2)
+    if np.any(shifted & (np.abs(dx-180.0) >= _EPSLN2)) or np.count_nonzero(shifted) > 1:
+        return None
+    return (1, nxp//2, nyp-1, nyp-1, nxp-1, nxp//2+1, nyp-1, nyp-1)
+
+
+"""
+_first_corner_matches:
+
+Returns the (ntiles, ntiles*4) flat indices of the first point, in row
+major order, of each tile coincident with each corner of the tiles, -1 where
+there is none, as get_overlap_index. The corners of all the tiles are put in
+one hashed index and every tile is scanned once, a block of rows at a time.
+"""
+def _first_corner_matches(grids: Sequence[GridObj], corners: npt.NDArray) -> npt.NDArray:
+    ncorners = corners.shape[0]
+    index = _PointIndex(corners[:, 0], corners[:, 1])
+    first = np.full((len(grids), ncorners), -1, dtype=np.int64)
+    for t, grid in enumerate(grids):
+        nyp, nxp = grid.x.shape
+        for j in range(0, nyp, _SCAN_ROWS):
+            found = first[t] >= 0
+            if found.all():
+                break
+            x = np.asarray(grid.x[j:j+_SCAN_ROWS]).reshape(-1)
+            y = np.asarray(grid.y[j:j+_SCAN_ROWS]).reshape(-1)
+            point, corner = index.query(x, y)
+            point, corner = point[~found[corner]], corner[~found[corner]]
+            flat = np.full(ncorners, np.iinfo(np.int64).max)
+            np.minimum.at(flat, corner, point + j*nxp)
+            new = flat < np.iinfo(np.int64).max
+            first[t, new] = flat[new]
+    return first
+
+
+"""
+_overlap_contact:
+
+Returns the contact of a nest lying inside the other tile from the first
+points of tile1 coincident with the corners of tile2 and conversely, or
+None, as get_overlap_contact. The grids are assumed not to be rotated.
+"""
+def _overlap_contact(in1: npt.NDArray, in2: npt.NDArray, shape1: Tuple[int, int],
+                     shape2: Tuple[int, int]) -> Tuple[int, ...]:
+    # corners in the order southwest, southeast, northwest, northeast
+    def corners(nxp, nyp):
+        return [(0, 0), (nxp-1, 0), (0, nyp-1), (nxp-1, nyp-1)]
+
+    def points(flat, nxp):
+        return [(int(f) % nxp, int(f)//nxp) for f in flat]
+
+    if np.all(in1 >= 0):
+        p1, p2 = points(in1, shape1[0]), corners(*shape2)
+    elif np.all(in2 >= 0):
+        p1, p2 = corners(*shape1), points(in2, shape2[0])
+    else:
+        return None
+
+    for p in (p1, p2):
+        if p[0][1] != p[1][1] or p[0][0] != p[2][0] or p[2][1] != p[3][1] or p[1][0] != p[3][0]:
+            return None
+        # exclude the aligned contacts
+        if p[0][1] == p[2][1] or p[0][0] == p[1][0]:
+            return None
+    return (p1[0][0]+1, p1[1][0], p1[0][1]+1, p1[3][1], p2[0][0]+1, p2[1][0], p2[0][1]+1, p2[3][1])
+
+
+"""
+get_contacts:
+
+Returns the contacts between the tiles of the supergrids grids as a list of
+(tile1, tile2, (istart1, iend1, jstart1, jend1, istart2, iend2, jstart2,
+jend2)) tuples, with the tiles counted from 0 and the supergrid cell indices
+counted from 1, in the order of make_solo_mosaic. These are the aligned
+contacts along the tile boundaries, periodic in x with periodx and in y with
+periody degrees if they are not 0, the folded north boundary of tripolar
+tiles and the overlap contacts of nested tiles.
+
+Instead of searching the boundaries of every pair of tiles, the boundary
+points of all the tiles are quantized into one hashed index in which each
+point is looked up once, and each tile is scanned once for the corners of
+all the tiles.
+"""
+def get_contacts(grids: Sequence[GridObj], periodx: float = 0.0,
+                 periody: float = 0.0) -> List[Tuple[int, int, Tuple[int, ...]]]:
+    shapes = [(grid.x.shape[1], grid.x.shape[0]) for grid in grids]
+    bounds = [_boundaries(grid.x, grid.y) for grid in grids]
+    contacts = _align_contacts(bounds, shapes, periodx, periody)
+
+    for t, (nxp, nyp) in enumerate(shapes):
+        xb, yb = bounds[t][_NORTH]
+        fold = _fold_contact(xb, yb, nyp)
+        if fold is not None:
+            contacts.append((t, t, _FOLD_ORDER, fold))
+
+    corners = np.array([(b[side][0][k], b[side][1][k]) for b in bounds
+                        for side, k in ((_SOUTH, 0), (_SOUTH, -1), (_NORTH, 0), (_NORTH, -1))])
+    first = _first_corner_matches(grids, corners).reshape(len(grids), len(grids), 4)
+    # only the tiles with all the corners of the other tile can overlap
+    inside = np.all(first >= 0, axis=2)
+    for tile1, tile2 in zip(*np.nonzero(np.triu(inside | inside.T, k=1))):
+        overlap = _overlap_contact(first[tile1, tile2], first[tile2, tile1], shapes[tile1], shapes[tile2])
+        if overlap is not None:
+            contacts.append((int(tile1), int(tile2), _OVERLAP_ORDER, overlap))
+
+    contacts.sort(key=lambda contact: contact[:3])
+    return [(tile1, tile2, index) for tile1, tile2, _, index in contacts]
@@ -0,0 +1,61 @@
+# make_mosaic entrypoint script
+
+import click
+import os
+import numpy as np
+from typing import Optional
+
+from gridtools import GridObj
+from gridtools import MosaicObj
+
+TILE_FILE_OPT_HELP="Comma separated grid files of the tiles of the mosaic, relative to --dir"
+DIR_OPT_HELP="Directory of the tile grid files. Default value is ./"
+MOSAIC_NAME_OPT_HELP="The created netCDF file is <mosaic_name>.nc. Default value is mosaic"
+PERIODX_OPT_HELP="Period in degrees of the x-direction of the mosaic, 0 if it is not periodic. Default value is 0"
+PERIODY_OPT_HELP="Period in degrees of the y-direction of the mosaic, 0 if it is not periodic. Default value is 0"
+
+
+@click.command()
+@click.option("--tile_file",
+              type = str,
+              help = TILE_FILE_OPT_HELP,
+              required = True)
+@click.option("--dir",
+              "directory",
+              type = str,
+              default = "./",
+              help = DIR_OPT_HELP)
+@click.option("--mosaic_name",
+              type = str,
+              default = "mosaic",
+              help = MOSAIC_NAME_OPT_HELP)
+@click.option("--periodx",
+              type = float,
+              default = 0.0,
+              help = PERIODX_OPT_HELP)
+@click.option("--periody",
+              type = float,
+              default = 0.0,
+              help = PERIODY_OPT_HELP)
+def make_mosaic(
+    tile_file : str = None,
+    directory : Optional[str] = None,
+    mosaic_name : Optional[str] = None,
+    periodx : Optional[float] = None,
+    periody : Optional[float] = None):
+
+    tile_files = tile_file.split(",")
+    grids = [GridObj.from_file(os.path.join(directory, gridfile)) for gridfile in tile_files]
+    tiles = [grid.tile if grid.tile is not None else f"tile{n+1}" for n, grid in enumerate(grids)]
+    if len(set(tiles)) != len(tiles):
+        raise click.BadParameter("the tiles of the mosaic need distinct names")
+
+    mosaic = MosaicObj(output_file=f"{mosaic_name}.nc",
+                       ntiles=len(grids),
+                       mosaic_name=os.path.basename(mosaic_name),
+                       gridlocation=directory,
+                       gridfiles=np.array(tile_files, dtype="S255"),
+                       gridtiles=np.array(tiles, dtype="S255"),
+                       grid_dict=dict(zip(tiles, grids)))
+    mosaic.get_contacts(periodx, periody)
+    mosaic.write_out_mosaic()
@@ -6,6 +6,7 @@ import xarray
 from pathlib import Path
 from typing import Optional
 
+from gridtools import MosaicObj
 from gridtools import TopogObj
 from gridtools import check_file_is_there
 
@@ -39,6 +40,10 @@ TOPOG_FILE_OPT_HELP="Specific to 'realistic' topog_type option; path to a netCDF
               type = str,
               default = "topog.nc",
               help = "The name of the created netCDF file that contains mosaic topography. Default value is topog.nc")
+@click.option("--jobs",
+              type = int,
+              default = 1,
+              help = "Number of processes generating the tiles of the mosaic concurrently. Default value is 1")
 # shared between topog type opts
 # TODO change one of these args to either min/max depth or top/bottom depth
 @click.option("--bottom_depth",
@@ -248,39 +253,58 @@ def make_topog(
     dome_embayment_east : Optional[float] = None,
     dome_embayment_south : Optional[float] = None,
     dome_embayment_depth : Optional[float] = None,
-    output : Optional[str] = None):
+    output : Optional[str] = None,
+    jobs : Optional[int] = None):
 
 
     # check valid mosaic path and get tiles
     check_file_is_there(mosaic)
 
-    # read in object fields from file
-    mosaicGrid = "placeHolderForMosaicGridConstructor()"
+    # read in the supergrid of each tile
+    mosaicGrid = MosaicObj(mosaic_file=mosaic)
+    mosaicGrid.griddict(fields=["x", "y"])
+    grids = list(mosaicGrid.grid_dict.values())
 
     # create new TopogStruct for output
-    topogOut = TopogObj(output_name=output, ntiles=1)
+    topogOut = TopogObj(output_name=output, ntiles=len(grids), x_refine=x_refine, y_refine=y_refine,
+                        scale_factor=scale_factor)
+    topogOut.set_grid(grids)
 
-    # call the specified algorithm for generating topography data
+    # parameters of the specified algorithm for generating topography data
     if (topog_type == "realistic"):
-        topogOut.make_topog_realistic(mosaicGrid, x_refine, y_refine, min_depth, scale_factor, num_filter_pass,
-                                      flat_bottom, fill_first_row, filter_topog, round_shallow, fill_shallow,
-                                      deepen_shallow, smooth_topo_allow_deepening, vgrid_file)
+        params = dict(topog_file=topog_file, topog_field=topog_field, vgrid_file=vgrid_file,
+                      num_filter_pass=num_filter_pass, kmt_min=kmt_min, min_depth=min_depth,
+                      min_thickness=min_thickness, fraction_full_cell=fraction_full_cell,
+                      flat_bottom=flat_bottom, fill_first_row=fill_first_row, filter_topog=filter_topog,
+                      round_shallow=round_shallow, fill_shallow=fill_shallow, deepen_shallow=deepen_shallow,
+                      smooth_topo_allow_deepening=smooth_topo_allow_deepening, full_cell=full_cell,
+                      dont_fill_isolated_cells=dont_fill_isolated_cells, on_grid=on_grid,
+                      dont_change_landmask=dont_change_landmask, dont_adjust_topo=dont_adjust_topo,
+                      dont_open_very_this_cell=dont_open_very_this_cell)
     elif (topog_type == "rectangular_basin"):
-        topogOut.make_topog_rectangular_basin(mosaicGrid, x_refine, y_refine, scale_factor, bottom_depth)
+        params = dict(bottom_depth=bottom_depth)
     elif (topog_type == "gaussian"):
-        topogOut.make_topog_gaussian()
+        params = dict(gauss_scale=gauss_scale, gauss_amp=gauss_amp, slope_x=slope_x, slope_y=slope_y,
+                      bottom_depth=bottom_depth, min_depth=min_depth)
     elif (topog_type == "bowl"):
-        topogOut.make_topog_bowl()
+        params = dict(bottom_depth=bottom_depth, min_depth=min_depth, bowl_south=bowl_south,
+                      bowl_north=bowl_north, bowl_west=bowl_west, bowl_east=bowl_east)
     elif (topog_type == "idealized"):
-        topogOut.make_topog_idealized()
+        params = dict(bottom_depth=bottom_depth, min_depth=min_depth)
     elif (topog_type == "box_channel"):
-        topogOut.make_topog_box_channel()
+        params = dict(jwest_south=jwest_south, jwest_north=jwest_north, ieast_south=ieast_south,
+                      ieast_north=ieast_north, bottom_depth=bottom_depth)
     elif (topog_type == "dome"):
-        topogOut.make_topog_dome()
+        params = dict(dome_slope=dome_slope, dome_bottom=dome_bottom, dome_embayment_west=dome_embayment_west,
+                      dome_embayment_east=dome_embayment_east, dome_embayment_south=dome_embayment_south,
+                      dome_embayment_depth=dome_embayment_depth)
     else:
-        print("Error: invalid topog_type argument given, must be one of [realistic, gaussian, bowl, box_channel, dome]")
+        print("Error: invalid topog_type argument given, must be one of [realistic, rectangular_basin, gaussian, bowl, idealized, box_channel, dome]")
         exit(1)
 
+    # generate the tiles, jobs at a time
+    topogOut.make_topog(topog_type, jobs=jobs, **params)
+
     # write out the result
     topogOut.write_topog_file()
 
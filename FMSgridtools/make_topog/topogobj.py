@@ -1,13 +1,189 @@
-from typing import List
+import contextlib
+import os
+import tempfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import h5py
 import xarray as xr
 import numpy as np
 import numpy.typing as npt
 import dataclasses
+from gridtools.shared.gridobj import GridObj
+from FREnctools_lib.pyfrenctools.make_topog.topog import create_realistic_topog
+
+# metres per degree of latitude
+DEG2METRE = 111.324e3
+
+# default HDF5 chunk edge of the depth written by write_topog_file
+_CHUNK_SIZE = 512
+
+# make_topog method generating each topog_type
+TOPOG_TYPES = {
+    "realistic": "make_topog_realistic",
+    "rectangular_basin": "make_rectangular_basin",
+    "gaussian": "make_topog_gaussian",
+    "bowl": "make_topog_bowl",
+    "idealized": "make_topog_box_idealized",
+    "box_channel": "make_topog_box_channel",
+    "dome": "make_topog_dome",
+}
+
+# trapezoids (alat1, slon1, elon1, alat2, slon2, elon2) of land in the idealized world
+_IDEALIZED_LAND = [
+    # antarctica
+    (-90.0, 0.0, 360.0, -80.0, 0.0, 360.0),
+    (-80.0, 360.0-25.0, 360.0, -70.0, 360.0, 360.0),
+    (-80.0, 0.0, 360.0, -70.0, 0.0, 170.0),
+    (-80.0, 360.0-135.0, 360.0-60.0, -68.0, 360.0-75.0, 360.0-60.0),
+    (-70.0, 0.0, 155.0, -67.0, 50.0, 145.0),
+    # australia
+    (-35.0, 116.0, 120.0, -31.0, 114.0, 130.0),
+    (-38.0, 140.0, 151.0, -31.0, 130.0, 151.0),
+    (-31.0, 115.0, 153.0, -20.0, 113.0, 149.0),
+    (-20.0, 113.0, 149.0, -11.0, 131.0, 143.0),
+    # south america
+    (-50.0, 360.0-74.0, 360.0-68.0, -40.0, 360.0-73.0, 360.0-62.0),
+    (-40.0, 360.0-73.0, 360.0-62.0, -20.0, 360.0-70.0, 360.0-40.0),
+    (-20.0, 360.0-70.0, 360.0-40.0, -16.0, 360.0-81.0, 360.0-35.0),
+    (-16.0, 360.0-81.0, 360.0-35.0, 0.0, 360.0-80.0, 360.0-50.0),
+    (0.0, 360.0-80.0, 360.0-50.0, 11.0, 360.0-75.0, 360.0-60.0),
+    # central america
+    (6.0, 360.0-78.0, 360.0-75.0, 20.0, 360.0-105.0, 360.0-97.0),
+    (20.0, 360.0-105.0, 360.0-97.0, 30.0, 360.0-115.0, 360.0-94.0),
+    # north america
+    (25.0, 360.0-82.0, 360.0-80.0, 30.0, 360.0-85.0, 360.0-81.0),
+    (30.0, 360.0-115.0, 360.0-80.0, 40.0, 360.0-124.0, 360.0-74.0),
+    (40.0, 360.0-124.0, 360.0-74.0, 50.0, 360.0-124.0, 360.0-57.0),
+    (50.0, 360.0-124.0, 360.0-57.0, 60.0, 360.0-140.0, 360.0-64.0),
+    (60.0, 360.0-165.0, 360.0-64.0, 65.0, 360.0-140.0, 360.0-64.0),
+    (65.0, 360.0-140.0, 360.0-64.0, 70.0, 360.0-162.0, 360.0-72.0),
+    (70.0, 360.0-162.0, 360.0-140.0, 72.0, 360.0-157.0, 360.0-157.0),
+    (70.0, 360.0-130.0, 360.0-70.0, 75.0, 360.0-120.0, 360.0-80.0),
+    # greenland
+    (60.0, 360.0-45.0, 360.0-45.0, 75.0, 360.0-58.0, 360.0-19.0),
+    # africa
+    (-35.0, 19.0, 28.0, 6.0, 8.0, 50.0),
+    (6.0, 0.0, 50.0, 18.0, 0.0, 56.0),
+    (18.0, 0.0, 56.0, 26.0, 0.0, 59.0),
+    (6.0, 360.0-10.0, 360.0, 18.0, 360.0-18.0, 360.0),
+    (18.0, 360.0-18.0, 360.0, 26.0, 360.0-15.0, 360.0),
+    # northern africa and europe and asia
+    (26.0, 360.0-15.0, 360.0, 40.0, 360.0-7.0, 360.0),
+    (40.0, 360.0-7.0, 360.0, 50.0, 360.0, 360.0),
+    (8.0, 77.0, 78.0, 26.0, 65.0, 90.0),
+    (4.0, 99.0, 100.0, 26.0, 90.0, 115.0),
+    (26.0, 0.0, 126.0, 40.0, 0.0, 122.0),
+    (40.0, 0.0, 130.0, 50.0, 0.0, 140.0),
+    (50.0, 0.0, 140.0, 60.0, 8.0, 140.0),
+    (60.0, 8.0, 163.0, 65.0, 13.0, 180.0),
+    (65.0, 13.0, 188.0, 70.0, 20.0, 180.0),
+    (70.0, 70.0, 180.0, 75.0, 90.0, 100.0),
+]
+
+# "idealized" ridges in the idealized world, the depth is a fraction of the bottom depth
+_IDEALIZED_RIDGES = [
+    (0.666, (-20.0, 360.0-20.0, 360.0-10.0, 30.0, 360.0-45.0, 360.0-35.0)),
+    (0.666, (30.0, 360.0-45.0, 360.0-35.0, 60.0, 360.0-20.0, 360.0-30.0)),
+    (0.666, (-60.0, 360.0-100.0, 360.0-130.0, 40.0, 360.0-160.0, 180.0)),
+    (0.5, (-50.0, 360.0-120.0, 360.0-120.0, 30.0, 190.0, 190.0)),
+]
+
+def _nearest_index(value: float, array: npt.NDArray) -> int:
+    # index of the point of the monotonically increasing array closest to value,
+    # ties go to the lower index
+    i = int(np.searchsorted(array, value, side="left"))
+    if i == 0: return 0
+    if i == array.size: return array.size-1
+    return i-1 if array[i]-value > value-array[i-1] else i
+
+def _round_half_down(d: npt.NDArray) -> npt.NDArray:
+    i = np.ceil(d)
+    return np.where(i-d > 0.5, i-1, i).astype(int)
+
+def _snap_down(value: float, array: npt.NDArray) -> float:
+    # lower bound of the interval of the increasing array containing value
+    if value < array[0] or value > array[-1]: return value
+    return array[max(int(np.searchsorted(array, value, side="left"))-1, 0)]
+
+# (offset, dtype, shape) of the raw values of the contiguous, uncompressed variable
+# varname of the netcdf4 file filepath, None when it cannot be memory mapped
+def _field_layout(filepath: str, varname: str) -> Optional[Tuple[int, str, Tuple[int, ...]]]:
+    try:
+        with h5py.File(filepath, "r") as f:
+            var = f[varname]
+            if var.chunks is not None or var.compression is not None:
+                return None
+            offset, dtype, shape = var.id.get_offset(), var.dtype, var.shape
+    except (OSError, KeyError, TypeError):
+        return None
+    if offset is None or dtype.kind not in "fiu":
+        return None
+    return offset, dtype.str, shape
+
+# source topography of the realistic topography, opened once by make_topog and passed to
+# the tiles. The field is memory mapped from topog_file when it is stored contiguously,
+# otherwise it is copied once, _CHUNK_SIZE rows at a time, into a temporary file that is
+# mapped instead, so the worker processes share the page cache rather than each reading
+# their own copy. The raw values are mapped, missing and scale_factor are applied by the
+# C kernel as when it reads topog_file itself.
+@dataclasses.dataclass
+class _TopogSource():
+    path: str
+    offset: int
+    dtype: str
+    shape: Tuple[int, int]
+    xt: npt.NDArray[np.float64]
+    yt: npt.NDArray[np.float64]
+    missing: float
+    temporary: bool = False
+
+    @classmethod
+    def open(cls, topog_file: str, topog_field: str) -> "_TopogSource":
+        with xr.open_dataset(topog_file, mask_and_scale=False, decode_times=False) as ds:
+            field = ds[topog_field]
+            if field.ndim != 2:
+                raise RuntimeError(f"TopogObj: {topog_field} of {topog_file} should be a (y, x) field")
+            yname, xname = field.dims
+            xt = ds[xname].values.astype(np.float64)
+            yt = ds[yname].values.astype(np.float64)
+            missing = float(field.attrs.get("missing_value", field.attrs.get("_FillValue", np.nan)))
+            layout = _field_layout(topog_file, topog_field)
+            if layout is not None:
+                return cls(topog_file, *layout, xt, yt, missing)
+            fd, path = tempfile.mkstemp(suffix=".npy")
+            os.close(fd)
+            try:
+                copy = np.lib.format.open_memmap(path, mode="w+", dtype=field.dtype, shape=field.shape)
+                for j in range(0, field.shape[0], _CHUNK_SIZE):
+                    copy[j:j+_CHUNK_SIZE] = field[j:j+_CHUNK_SIZE].values
+                copy.flush()
+            except BaseException:
+                os.remove(path)
+                raise
+            return cls(path, copy.offset, copy.dtype.str, field.shape, xt, yt, missing, temporary=True)
+
+    # read only memory map of the (ny, nx) source field
+    def field(self) -> np.memmap:
+        return np.memmap(self.path, dtype=self.dtype, mode="r", offset=self.offset, shape=tuple(self.shape))
+
+    # removes the temporary copy of the field
+    def close(self):
+        if self.temporary and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 # represents topography output file created by make_topog
 # contains parameters for topography generation that aren't tied to a specific topography type
 # and depth values from specified topog_type algorithm once generated.
-# if multiple tiles are used, the third index of depth will be the the tile number
+# The depths of all tiles are stored in one contiguous (ntiles, ny, nx) array, depth is a
+# (ny, nx, ntiles) view of it, so the third index of depth is the tile number, and the
+# variables of the dataset are views of the single tiles.
+# x and y hold the lon/lat in degrees of the model cell corners, (ny+1, nx+1, ntiles)
 @dataclasses.dataclass
 class TopogObj():
     output_name: str = None
@@ -18,47 +194,141 @@ class TopogObj():
     y_refine: int = None
     scale_factor: float = None
     depth: npt.NDArray[np.float64] = None
+    x: npt.NDArray[np.float64] = None
+    y: npt.NDArray[np.float64] = None
     dataset: xr.Dataset = None
     __data_is_generated: bool = False
 
-    # sets up dataset variables
+    # sets up the depth storage and dataset variables
     def __post_init__(self):
-        depth_vars = dict()
-        depth_attrs = dict()
-        depth_attrs["standard_name"] = "topographic depth at T-cell centers"
-        depth_attrs["units"] = "meters"
-        depth_coords = xr.Coordinates( {'ny': np.empty(self.ny), 'nx': np.empty(self.nx)} )
-        # TODO check dims of depth
-        # if single tile exclude tile number in variable name
-        if (self.ntiles == 1):
-            depth_vars["depth"]= xr.DataArray(
-                coords=depth_coords,
-                dims=["ny", "nx"],
-                attrs=depth_attrs,
-            )
-        # loop through ntiles and add depth_tile<n> variable for each
-        else:
-            for i in range(1,self.ntiles+1):
-                depthVarName = "depth_tile" + str(i)
-                depth_vars[depthVarName] = xr.DataArray(
-                    coords=depth_coords,
-                    dims=["ny", "nx"],
-                    attrs=depth_attrs,
-                )
-        # create dataset from vars
-        self.ds = xr.Dataset(
-            data_vars = depth_vars,
-        )
-        self.ds = self.ds.expand_dims({'ntiles': self.ntiles})
-        self.ds = self.ds.drop_vars(['ny', 'nx'])
+        self._storage = None
+        self._num_levels = None
+        self.ds = xr.Dataset()
+        if self.depth is not None:
+            depth = np.asarray(self.depth, dtype=np.float64)
+            self._set_storage(depth if depth.ndim == 3 else depth[..., np.newaxis])
         # TODO add global attrs
 
-    # just writes out the file
-    def write_topog_file(self):
+    # sets x and y from the supergrid of each tile, keeping every x_refine/y_refine point
+    def set_grid(self, grids: List[GridObj]):
+        x_refine = self.x_refine if self.x_refine is not None else 1
+        y_refine = self.y_refine if self.y_refine is not None else 1
+        self.x = np.stack([grid.x[::y_refine, ::x_refine] for grid in grids], axis=-1)
+        self.y = np.stack([grid.y[::y_refine, ::x_refine] for grid in grids], axis=-1)
+        self.ny, self.nx = self.x.shape[0]-1, self.x.shape[1]-1
+
+    # cell centre lon/lat of all tiles as the average of the cell corners, (ny, nx, ntiles)
+    def _cell_centers(self) -> Tuple[npt.NDArray, npt.NDArray]:
+        if self.x is None or self.y is None:
+            raise RuntimeError("TopogObj: x and y are required, set them directly or with set_grid")
+        x = self.x if self.x.ndim == 3 else self.x[..., np.newaxis]
+        y = self.y if self.y.ndim == 3 else self.y[..., np.newaxis]
+        xt = 0.25*(x[:-1,:-1] + x[:-1,1:] + x[1:,:-1] + x[1:,1:])
+        yt = 0.25*(y[:-1,:-1] + y[:-1,1:] + y[1:,:-1] + y[1:,1:])
+        return xt, yt
+
+    # copies depth, (ny, nx, ntiles), into the contiguous tile storage
+    def _set_storage(self, depth: npt.NDArray):
+        ny, nx, ntiles = depth.shape
+        self._allocate_storage(ntiles, ny, nx)
+        self._storage[...] = np.moveaxis(depth, 2, 0)
+
+    # allocates the contiguous tile storage and points depth and the dataset variables at it
+    def _allocate_storage(self, ntiles: int, ny: int, nx: int):
+        if self._storage is None or self._storage.shape != (ntiles, ny, nx):
+            self._storage = np.empty((ntiles, ny, nx), dtype=np.float64)
+        self.depth = self._storage.transpose(1, 2, 0)
+        self._set_storage_vars()
+
+    # points the dataset variables at the tiles of the storage
+    def _set_storage_vars(self):
+        ntiles, self.ny, self.nx = self._storage.shape
+        self.ntiles = ntiles
+        depth_attrs = dict(standard_name = "topographic depth at T-cell centers", units = "meters")
+        # if single tile exclude tile number in variable name
+        names = ["depth"] if ntiles == 1 else [f"depth_tile{tile+1}" for tile in range(ntiles)]
+        data_vars = {name: xr.DataArray(self._storage[tile], dims=["ny", "nx"], attrs=depth_attrs)
+                     for tile, name in enumerate(names)}
+        # the number of vertical levels of each cell when the depth is fitted to a vertical grid
+        if self._num_levels is not None:
+            levels_attrs = dict(standard_name = "number of vertical T-cells", units = "none")
+            data_vars.update({name.replace("depth", "num_levels"):
+                              xr.DataArray(self._num_levels[tile], dims=["ny", "nx"], attrs=levels_attrs)
+                              for tile, name in enumerate(names)})
+        self.ds = xr.Dataset(data_vars = data_vars)
+
+    # stores the generated depth, (ny, nx, ntiles), in depth and the dataset, with the
+    # number of vertical levels of each cell, (ntiles, ny, nx), if they are known
+    def _set_depth(self, depth: npt.NDArray, num_levels: Optional[npt.NDArray] = None):
+        self._num_levels = num_levels
+        self._set_storage(depth)
+        self.__data_is_generated = True
+
+    # generates the topog_type topography of every tile with the parameters in kwargs, the
+    # tiles are computed by a pool of jobs processes or by executor and stored as they finish.
+    # The source topography of the realistic tiles is opened once here and shared by the tiles.
+    # The realistic kernel sets up the global mpp state of the process, so its tiles are only
+    # computed by worker processes, never by the threads of a ThreadPoolExecutor.
+    def make_topog(self, topog_type: str, jobs: int = 1, executor: Optional[Executor] = None, **kwargs):
+        if topog_type not in TOPOG_TYPES:
+            raise RuntimeError(f"TopogObj: invalid topog_type {topog_type}, must be one of {list(TOPOG_TYPES)}")
+        if self.x is None or self.y is None:
+            raise RuntimeError("TopogObj: x and y are required, set them directly or with set_grid")
+        x = self.x if self.x.ndim == 3 else self.x[..., np.newaxis]
+        y = self.y if self.y.ndim == 3 else self.y[..., np.newaxis]
+        ntiles = x.shape[2]
+        if topog_type == "realistic" and isinstance(executor, ThreadPoolExecutor):
+            raise RuntimeError("TopogObj: realistic tiles cannot be generated by threads, "
+                               "use jobs or a process executor")
+        source = None
+        if topog_type == "realistic" and kwargs.get("source") is None:
+            source = _TopogSource.open(kwargs.get("topog_file"), kwargs.get("topog_field"))
+            kwargs = dict(kwargs, source=source)
+        tasks = [(TOPOG_TYPES[topog_type], x[:,:,tile], y[:,:,tile], self.scale_factor, kwargs)
+                 for tile in range(ntiles)]
+        self._num_levels = None
+        self._allocate_storage(ntiles, x.shape[0]-1, x.shape[1]-1)
+        pool = ProcessPoolExecutor(max_workers=jobs) if executor is None and jobs > 1 and ntiles > 1 else None
+        with source or contextlib.nullcontext(), pool or contextlib.nullcontext():
+            results = (executor or pool).map if executor or pool else map
+            for tile, (depth, num_levels) in enumerate(results(_make_tile_topog, *zip(*tasks))):
+                self._storage[tile] = depth
+                if num_levels is not None:
+                    if self._num_levels is None:
+                        self._num_levels = np.zeros(self._storage.shape, dtype=np.int32)
+                    self._num_levels[tile] = num_levels
+        if self._num_levels is not None:
+            self._set_storage_vars()
+        self.__data_is_generated = True
+
+    # (ny, nx) view of the depth of tile, counted from 0
+    def get_tile_depth(self, tile: int) -> npt.NDArray[np.float64]:
+        if self._storage is None:
+            raise RuntimeError("TopogObj: depth data not yet generated")
+        return self._storage[tile]
+
+    # writes out the file one tile at a time, each tile in HDF5 chunks of chunks = (ny, nx)
+    # cells, 512x512 by default, which are deflated with complevel (1-9) if given
+    def write_topog_file(self, chunks: Optional[Tuple[int, int]] = None, complevel: Optional[int] = None):
+        if self._storage is None:
+            raise RuntimeError("TopogObj: depth data not yet generated")
         if(not self.__data_is_generated):
             print("Warning: write routine called but depth data not yet generated")
-        self.ds.to_netcdf(self.output_name)
+        if chunks is None:
+            chunks = (min(self.ny, _CHUNK_SIZE), min(self.nx, _CHUNK_SIZE))
+        encoding = dict(chunksizes=tuple(chunks), contiguous=False)
+        if complevel is not None:
+            encoding.update(zlib=True, shuffle=True, complevel=complevel)
+        for tile, name in enumerate(self.ds.data_vars):
+            self.ds[[name]].to_netcdf(self.output_name, mode="w" if tile == 0 else "a",
+                                      format="NETCDF4", encoding={name: encoding})
 
+    # remaps the source topography topog_field of topog_file onto every tile with the C
+    # create_realistic_topog kernel, on a single pe, and fits it to the vertical grid of
+    # vgrid_file when given. source is the _TopogSource of topog_file opened by make_topog,
+    # it is opened here otherwise. The source is read block_rows rows at a time, by default
+    # the latitude band covering the tile at once. min_depth is not used by the kernel, which
+    # is not thread safe: concurrent calls need separate processes.
     def make_topog_realistic( self,
         topog_file: str = None,
         topog_field: str = None,
@@ -80,19 +350,63 @@ class TopogObj():
         on_grid: bool = None,
         dont_change_landmask: bool = None,
         dont_adjust_topo: bool = None,
-        dont_open_very_this_cell: bool = None):
-        pass
+        dont_open_very_this_cell: bool = None,
+        tripolar_grid: bool = False,
+        cyclic_x: bool = False,
+        cyclic_y: bool = False,
+        block_rows: int = 0,
+        source: Optional[_TopogSource] = None):
+        x = self.x if self.x.ndim == 3 else self.x[..., np.newaxis]
+        y = self.y if self.y.ndim == 3 else self.y[..., np.newaxis]
+        opened = _TopogSource.open(topog_file, topog_field) if source is None else contextlib.nullcontext(source)
+        with opened as source:
+            field = source.field()
+            tiles = [create_realistic_topog(x[:,:,tile], y[:,:,tile], source.xt, source.yt, field, source.missing,
+                                            vgrid_file=vgrid_file,
+                                            scale_factor=self.scale_factor if self.scale_factor is not None else 1.0,
+                                            tripolar_grid=tripolar_grid, cyclic_x=cyclic_x, cyclic_y=cyclic_y,
+                                            fill_first_row=bool(fill_first_row), filter_topog=bool(filter_topog),
+                                            num_filter_pass=num_filter_pass if num_filter_pass is not None else 1,
+                                            smooth_topo_allow_deepening=bool(smooth_topo_allow_deepening),
+                                            round_shallow=bool(round_shallow), fill_shallow=bool(fill_shallow),
+                                            deepen_shallow=bool(deepen_shallow), full_cell=bool(full_cell),
+                                            flat_bottom=bool(flat_bottom), adjust_topo=not dont_adjust_topo,
+                                            fill_isolated_cells=not dont_fill_isolated_cells,
+                                            dont_change_landmask=bool(dont_change_landmask),
+                                            kmt_min=kmt_min if kmt_min is not None else 2,
+                                            min_thickness=min_thickness if min_thickness is not None else 0.1,
+                                            open_very_this_cell=not dont_open_very_this_cell,
+                                            fraction_full_cell=(fraction_full_cell if fraction_full_cell is not None
+                                                                else 0.2),
+                                            on_grid=bool(on_grid), block_rows=block_rows)
+                     for tile in range(x.shape[2])]
+        num_levels = np.stack([levels for _, levels in tiles]) if vgrid_file is not None else None
+        self._set_depth(np.stack([depth for depth, _ in tiles], axis=-1), num_levels)
 
     def make_rectangular_basin(self, bottom_depth: float = None):
-        pass
+        self._set_depth(np.full((self.ny, self.nx, self.ntiles), bottom_depth, dtype=np.float64))
 
+    # gaussian bump centred in each tile on a floor that rises by slope_x/slope_y metres per degree
     def make_topog_gaussian(self,
         gauss_scale: float = None,
         gauss_amp: float = None,
         slope_x: float = None,
-        slope_y: float = None):
-        pass
+        slope_y: float = None,
+        bottom_depth: float = None,
+        min_depth: float = None):
+        xt, yt = self._cell_centers()
+        xw, xe = xt.min(axis=(0,1)), xt.max(axis=(0,1))
+        ys, yn = yt.min(axis=(0,1)), yt.max(axis=(0,1))
+        bump_height = gauss_amp*bottom_depth
+        bump_scale = gauss_scale*np.minimum(xe-xw, yn-ys)
+        xcent, ycent = 0.5*(xe+xw), 0.5*(yn+ys)
+        arg = (xt-xcent)**2 + (yt-ycent)**2
+        bottom = bottom_depth - bump_height*np.exp(-arg/bump_scale**2)
+        bottom = bottom - slope_x*(xt-xw) - slope_y*(yt-ys)
+        self._set_depth(np.maximum(bottom, min_depth))
 
+    # From "Simulation of density-driven frictional downslope flow in z-coordinate ocean models"
+    # Winton et al. JPO, Vol 28, No 11, 2163-2174, November 1998
     def make_topog_bowl(self,
         bottom_depth: float = None,
         min_depth: float = None,
@@ -100,21 +414,76 @@ class TopogObj():
         bowl_north: float = None,
         bowl_west: float = None,
         bowl_east: float = None):
-        pass
+        xt, yt = self._cell_centers()
+        bowl = min_depth + bottom_depth \
+            * (1.0-np.exp(-((yt-bowl_south)/2.0)**2)) \
+            * (1.0-np.exp(-((yt-bowl_north)/2.0)**2)) \
+            * (1.0-np.exp(-((xt-bowl_west)/4.0)**2)) \
+            * (1.0-np.exp(-((xt-bowl_east)/4.0)**2))
+        outside = (xt <= bowl_west) | (xt >= bowl_east) | (yt <= bowl_south) | (yt >= bowl_north)
+        self._set_depth(np.where(outside, min_depth, bowl))
 
+    # highly "idealized" world with continents and ridges that maps onto any resolution,
+    # it somewhat resembles the real world but is NOT realistic
     def make_topog_box_idealized(self,
         bottom_depth: float = None,
         min_depth: float = None):
-        pass
+        x = self.x if self.x.ndim == 3 else self.x[..., np.newaxis]
+        y = self.y if self.y.ndim == 3 else self.y[..., np.newaxis]
+        depth = np.full((self.ny, self.nx, x.shape[2]), bottom_depth, dtype=np.float64)
+        # undulating bottom in the ocean
+        j = np.arange(1, self.ny+1)[:,np.newaxis]
+        i = np.arange(1, self.nx+1)[np.newaxis,:]
+        undulation = bottom_depth*(1-0.4*np.abs(np.cos(j*np.pi/(self.ny+1))*np.sin(i*2*np.pi/(self.nx+1))))
+        undulation = np.maximum(undulation, min_depth)
+        for tile in range(depth.shape[2]):
+            xbnd = 0.5*(x[0,:-1,tile] + x[0,1:,tile])
+            ybnd = 0.5*(y[:-1,0,tile] + y[1:,0,tile])
+            for trapezoid in _IDEALIZED_LAND:
+                self._set_trapezoid(xbnd, ybnd, trapezoid, 0.0, depth[:,:,tile])
+            depth[:,:,tile] = np.where(depth[:,:,tile] > 0.0, undulation, depth[:,:,tile])
+            for fraction, trapezoid in _IDEALIZED_RIDGES:
+                self._set_trapezoid(xbnd, ybnd, trapezoid, fraction*bottom_depth, depth[:,:,tile])
+        self._set_depth(depth)
 
+    # sets depth to depth_in inside the trapezoid with vertices (alat1,slon1), (alat1,elon1),
+    # (alat2,slon2) and (alat2,elon2) on a tile with cell centre lon/lat xbnd/ybnd
+    @staticmethod
+    def _set_trapezoid(xbnd: npt.NDArray, ybnd: npt.NDArray, trapezoid: Tuple[float, ...],
+                       depth_in: float, depth: npt.NDArray):
+        alat1, slon1, elon1, alat2, slon2, elon2 = trapezoid
+        js, je = sorted((_nearest_index(alat1, ybnd), _nearest_index(alat2, ybnd)))
+        is1, ie1 = sorted((_nearest_index(slon1, xbnd), _nearest_index(elon1, xbnd)))
+        is2, ie2 = sorted((_nearest_index(slon2, xbnd), _nearest_index(elon2, xbnd)))
+        rdj = 1.0 if js == je else 1.0/(je-js)
+        # each row uses the bounds interpolated at the row below, the nudging of 1.e-5
+        # keeps the result independent of the platform
+        j = np.arange(js, je+1)
+        jprev = np.maximum(j-1, js)
+        istart = np.where(j == js, is1, _round_half_down(rdj*((jprev-js)*is2 + (je-jprev)*is1) + 1.0e-5))
+        iend = np.where(j == js, ie1, _round_half_down(rdj*((jprev-js)*ie2 + (je-jprev)*ie1) + 1.0e-5))
+        i = np.arange(depth.shape[1])
+        inside = (i >= istart[:,np.newaxis]) & (i <= iend[:,np.newaxis])
+        depth[js:je+1][inside] = depth_in
+
+    # flat basin closed to the north and south, the western and eastern boundaries are
+    # open between jwest_south/jwest_north and ieast_south/ieast_north
     def make_topog_box_channel(self,
         jwest_south: int = None,
         jwest_north: int = None,
         ieast_south: int = None,
         ieast_north: int = None,
         bottom_depth: float = None):
-        pass
+        depth = np.full((self.ny, self.nx, self.ntiles), bottom_depth, dtype=np.float64)
+        depth[0,:] = 0.0
+        depth[-1,:] = 0.0
+        j = np.arange(self.ny)
+        depth[(j < jwest_south) | (j >= jwest_north), 0] = 0.0
+        depth[(j < ieast_south) | (j >= ieast_north), -1] = 0.0
+        self._set_depth(depth)
 
+    # domain similar to the DOME configuration of Legg, Hallberg, and Girton (2005) Ocean Modelling:
+    # a flat bottom rising to the north onto a shelf, with an embayment cut into the shelf
     def make_topog_dome(self,
         dome_slope: float = None,
         dome_bottom: float = None,
@@ -122,4 +491,32 @@ class TopogObj():
         dome_embayment_east: float = None,
         dome_embayment_south: float = None,
         dome_embayment_depth: float = None):
-        pass
+        xt, yt = self._cell_centers()
+        ntiles = xt.shape[2]
+        yn_embay = yt.max(axis=(0,1))
+        xw_embay, xe_embay, ys_embay, ys_slope = (np.empty(ntiles) for _ in range(4))
+        for tile in range(ntiles):
+            # snap the embayment and slope to the grid
+            xw_embay[tile] = _snap_down(dome_embayment_west, xt[0,:,tile])
+            xe_embay[tile] = _snap_down(dome_embayment_east, xt[0,:,tile])
+            ys_embay[tile] = _snap_down(dome_embayment_south, yt[:,0,tile])
+            ys_slope[tile] = _snap_down(ys_embay[tile] - (dome_bottom-dome_embayment_depth)/(dome_slope*DEG2METRE),
+                                        yt[:,0,tile])
+        yn_slope = ys_embay
+
+        depth = np.full(xt.shape, dome_bottom, dtype=np.float64)
+        slope = (yt >= ys_slope) & (yt < yn_slope)
+        depth = np.where(slope, dome_bottom - dome_slope*DEG2METRE*(yt-ys_slope), depth)
+        depth = np.where(yt >= yn_slope, 0.0, depth)
+        embayment = (xt >= xw_embay) & (xt <= xe_embay) & (yt >= ys_embay) & (yt <= yn_embay)
+        self._set_depth(np.where(embayment, dome_embayment_depth, depth))
+
+
+# runs in the worker processes, so it only takes picklable arguments, and returns the depth
+# of the tile with its number of vertical levels, None unless they are computed
+def _make_tile_topog(method: str, x: npt.NDArray, y: npt.NDArray, scale_factor: Optional[float],
+                     kwargs: dict) -> Tuple[npt.NDArray, Optional[npt.NDArray]]:
+    topog = TopogObj(ntiles=1, nx=x.shape[1]-1, ny=x.shape[0]-1, x=x[..., np.newaxis], y=y[..., np.newaxis],
+                     scale_factor=scale_factor)
+    getattr(topog, method)(**kwargs)
+    return topog.get_tile_depth(0), (topog._num_levels[0] if topog._num_levels is not None else None)
@@ -0,0 +1,249 @@
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+import numpy as np
+import numpy.typing as npt
+import xarray as xr
+from gridtools.shared.gridtools_utils import check_file_is_there
+from gridtools.shared.remapfile import is_binary_remap, read_binary_remap
+
+# remap operator built once from an exchange grid and applied to any number of fields.
+# The exchange grid is stored as a sparse matrix in compressed row form, one row per
+# destination cell: the exchange cells of destination cell n are
+# src_index[indptr[n]:indptr[n+1]] with areas area[indptr[n]:indptr[n+1]].
+# Second order remapping additionally needs the distance (radians of lon, lat) of each
+# exchange cell centroid from the centroid of its source cell, and the source grid
+# corners (degrees, shape (ny_src+1, nx_src+1)) to compute the source gradients.
+@dataclass
+class RemapObj():
+    src_shape: Tuple[int, int]
+    dst_shape: Tuple[int, int]
+    src_cell: npt.NDArray[np.int64]
+    dst_cell: npt.NDArray[np.int64]
+    xgrid_area: npt.NDArray[np.float64]
+    src_distance: Optional[npt.NDArray[np.float64]] = None
+    src_lon: Optional[npt.NDArray[np.float64]] = None
+    src_lat: Optional[npt.NDArray[np.float64]] = None
+    indptr: npt.NDArray[np.int64] = field(init=False)
+    src_index: npt.NDArray[np.int64] = field(init=False)
+    area: npt.NDArray[np.float64] = field(init=False)
+    weights: npt.NDArray[np.float64] = field(init=False)
+    dst_area: npt.NDArray[np.float64] = field(init=False)
+    distance: Optional[npt.NDArray[np.float64]] = field(init=False, default=None)
+    gradient_coef: Optional[npt.NDArray[np.float64]] = field(init=False, default=None)
+    src_periodic: bool = field(init=False, default=False)
+
+    def __post_init__(self):
+        ndst = self.dst_shape[0]*self.dst_shape[1]
+        dst_cell = np.asarray(self.dst_cell)
+        if np.all(dst_cell[1:] >= dst_cell[:-1]):
+            # already in destination order, e.g. the memory mapped columns of a binary remap file
+            order = slice(None)
+        else:
+            order = np.argsort(dst_cell, kind="stable")
+        self.src_index = np.asarray(self.src_cell, dtype=np.int64)[order]
+        self.area = np.asarray(self.xgrid_area, dtype=np.float64)[order]
+        counts = np.bincount(self.dst_cell, minlength=ndst)
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+        # destination cells are normalized by the area the source grid covers, as in conserve_interp
+        self.dst_area = np.bincount(self.dst_cell, weights=self.xgrid_area, minlength=ndst)
+        self.weights = self.area/np.repeat(self.dst_area, counts)
+        if self.src_distance is not None:
+            self.distance = np.asarray(self.src_distance, dtype=np.float64)[order]
+
+    @classmethod
+    def from_dataset(cls, dataset: xr.Dataset, src_shape: Tuple[int, int], dst_shape: Tuple[int, int],
+                     src_lon: Optional[npt.NDArray] = None, src_lat: Optional[npt.NDArray] = None) -> "RemapObj":
+        # one operator maps one source tile onto one destination tile, the cell indices
+        # of the tile pairs of a mosaic remap file do not share an index space
+        for name in ("tile1", "tile2"):
+            tile = dataset[name].values if name in dataset else None
+            if tile is not None and tile.size and tile.min() != tile.max():
+                raise ValueError(f"RemapObj: the remap dataset holds several {name} tiles, "
+                                 f"select one tile pair, e.g. dataset.isel(ncells=dataset.{name}.values == n)")
+        # remap datasets hold fortran (1-based) i,j cell indices
+        tile1_cell = dataset.tile1_cell.values.astype(np.int64)
+        tile2_cell = dataset.tile2_cell.values.astype(np.int64)
+        src_cell = (tile1_cell[:,1]-1)*src_shape[1] + tile1_cell[:,0]-1
+        dst_cell = (tile2_cell[:,1]-1)*dst_shape[1] + tile2_cell[:,0]-1
+        src_distance = dataset.tile1_distance.values if "tile1_distance" in dataset else None
+        return cls(src_shape=tuple(src_shape), dst_shape=tuple(dst_shape), src_cell=src_cell,
+                   dst_cell=dst_cell, xgrid_area=dataset.xgrid_area.values, src_distance=src_distance,
+                   src_lon=src_lon, src_lat=src_lat)
+
+    @classmethod
+    def from_file(cls, remap_file: str, src_shape: Tuple[int, int], dst_shape: Tuple[int, int],
+                  src_lon: Optional[npt.NDArray] = None, src_lat: Optional[npt.NDArray] = None) -> "RemapObj":
+        check_file_is_there(remap_file)
+        if is_binary_remap(remap_file):
+            # the columns stay memory mapped in destination order
+            return cls.from_dataset(read_binary_remap(remap_file).to_dataset(target_order=True),
+                                    src_shape, dst_shape, src_lon, src_lat)
+        with xr.open_dataset(remap_file) as dataset:
+            return cls.from_dataset(dataset.load(), src_shape, dst_shape, src_lon, src_lat)
+
+    @classmethod
+    def from_xgrid(cls, xgrid) -> "RemapObj":
+        # grid shapes are taken from the supergrids of the XGridObj
+        if xgrid.src_grid is None or xgrid.tgt_grid is None:
+            raise ValueError("RemapObj: from_xgrid needs the src_grid and tgt_grid of a single tile exchange grid, "
+                             "build mosaic remaps per tile pair with from_dataset")
+        src_shape = ((xgrid.src_grid.x.shape[0]-1)//2, (xgrid.src_grid.x.shape[1]-1)//2)
+        dst_shape = ((xgrid.tgt_grid.x.shape[0]-1)//2, (xgrid.tgt_grid.x.shape[1]-1)//2)
+        return cls.from_dataset(xgrid.dataset, src_shape, dst_shape,
+                                src_lon=xgrid.src_grid.x[::2,::2], src_lat=xgrid.src_grid.y[::2,::2])
+
+    def apply(self,
+              data: npt.NDArray,
+              src_mask: Optional[npt.NDArray] = None,
+              fill_value: float = 0.0,
+              chunk_size: int = 2**24,
+              order: int = 1) -> npt.NDArray:
+        """
+        Remaps data of shape (..., ny_src, nx_src) to (..., ny_dst, nx_dst). All
+        leading dimensions (fields, time levels) are remapped in one pass.
+        src_mask, broadcastable to data, excludes source cells where it is 0
+        and renormalizes by the remaining area. Destination cells that receive
+        no data are set to fill_value. chunk_size limits the number of
+        exchange cell values held in memory at once. order=2 corrects each
+        exchange cell value with the source gradient, f + grad.d, which needs
+        the exchange grid centroid distances and the source grid corners.
+        """
+        if order not in (1, 2):
+            raise ValueError(f"RemapObj: conservative order must be 1 or 2, got {order}")
+        data = np.asarray(data)
+        if data.shape[-2:] != tuple(self.src_shape):
+            raise ValueError(f"RemapObj: data has shape {data.shape}, expected (..., {self.src_shape[0]}, {self.src_shape[1]})")
+        lead = data.shape[:-2]
+        flat = data.reshape(-1, self.src_shape[0]*self.src_shape[1])
+        mask = None if src_mask is None else np.broadcast_to(src_mask, data.shape)
+
+        gradients = None
+        if order == 2:
+            grad_lon, grad_lat = self.gradients(data, mask)
+            gradients = (grad_lon.reshape(flat.shape), grad_lat.reshape(flat.shape))
+
+        if mask is None:
+            out = self._matmul(flat, self.weights, chunk_size, gradients)
+            covered = self.dst_area > 0
+        else:
+            mask = mask.reshape(flat.shape)
+            if gradients is not None: gradients = tuple(gradient*mask for gradient in gradients)
+            numerator = self._matmul(flat*mask, self.area, chunk_size, gradients)
+            covered = self._matmul(mask, self.area, chunk_size)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out = numerator/covered
+            covered = covered > 0
+        out = np.where(covered, out, fill_value)
+        return out.reshape(lead + tuple(self.dst_shape))
+
+    def gradients(self, data: npt.NDArray,
+                  src_mask: Optional[npt.NDArray] = None) -> Tuple[npt.NDArray, npt.NDArray]:
+        """
+        Returns the gradients of data (..., ny_src, nx_src) per radian of
+        longitude and latitude. This is grad_c2l in gradient_c2l.c applied to
+        whole tiles at once: corner values are the average of the four
+        neighbouring cells and the gradient follows from Green's theorem over
+        the cell edges. Tile boundaries are extrapolated linearly, or wrapped
+        when the tile is periodic in x. The gradient is zero where src_mask is
+        0 for any of the surrounding cells.
+        """
+        if self.distance is None or self.src_lon is None or self.src_lat is None:
+            raise RuntimeError("RemapObj: second order remapping needs tile1_distance and the source grid corners")
+        if self.gradient_coef is None:
+            self.gradient_coef, self.src_periodic = _gradient_coefficients(self.src_lon, self.src_lat)
+        coef = self.gradient_coef
+
+        q = _pad_halo(np.asarray(data, dtype=np.float64), self.src_periodic)
+        # a2b_ord2: values at the cell corners
+        pb = 0.25*(q[...,:-1,:-1] + q[...,:-1,1:] + q[...,1:,:-1] + q[...,1:,1:])
+        # mean value along the south, north, west and east cell edges
+        edges = (0.5*(pb[...,:-1,:-1] + pb[...,:-1,1:]), 0.5*(pb[...,1:,:-1] + pb[...,1:,1:]),
+                 0.5*(pb[...,:-1,:-1] + pb[...,1:,:-1]), 0.5*(pb[...,:-1,1:] + pb[...,1:,1:]))
+        grad_lon = sum(coef[0,n]*edge for n, edge in enumerate(edges))
+        grad_lat = sum(coef[1,n]*edge for n, edge in enumerate(edges))
+
+        if src_mask is not None:
+            valid = _pad_halo(np.asarray(src_mask, dtype=np.float64), self.src_periodic, extrapolate=False) != 0
+            ny, nx = self.src_shape
+            valid = np.logical_and.reduce([valid[...,j:j+ny,i:i+nx] for j in range(3) for i in range(3)])
+            grad_lon = np.where(valid, grad_lon, 0.0)
+            grad_lat = np.where(valid, grad_lat, 0.0)
+        return grad_lon, grad_lat
+
+    def _matmul(self, flat: npt.NDArray, weights: npt.NDArray, chunk_size: int,
+                gradients: Optional[Tuple[npt.NDArray, npt.NDArray]] = None) -> npt.NDArray:
+        # out[:, n] = sum of weights*(flat[:, src] + grad.d) over the exchange cells of destination cell n
+        ndst = self.dst_shape[0]*self.dst_shape[1]
+        out = np.zeros((flat.shape[0], ndst), dtype=np.result_type(flat.dtype, np.float64))
+        rows = np.flatnonzero(np.diff(self.indptr))
+        if rows.size == 0: return out
+        starts = self.indptr[rows]
+        nfields = max(1, chunk_size//max(1, self.src_index.size))
+        for first in range(0, flat.shape[0], nfields):
+            values = flat[first:first+nfields][:, self.src_index]
+            if gradients is not None:
+                values = values + gradients[0][first:first+nfields][:, self.src_index]*self.distance[:,0] \
+                                + gradients[1][first:first+nfields][:, self.src_index]*self.distance[:,1]
+            out[first:first+nfields, rows] = np.add.reduceat(values*weights, starts, axis=1)
+        return out
+
+
+def _pad_halo(q: npt.NDArray, periodic: bool, extrapolate: bool = True) -> npt.NDArray:
+    # adds a one cell halo to the last two axes, linearly extrapolated from the
+    # tile interior (or a copy of the edge cells) and wrapped in x for periodic tiles
+    def pad(q, axis):
+        first, last = np.take(q, [0], axis=axis), np.take(q, [-1], axis=axis)
+        if extrapolate and q.shape[axis] > 1:
+            first = 2*first - np.take(q, [1], axis=axis)
+            last = 2*last - np.take(q, [-2], axis=axis)
+        return np.concatenate((first, q, last), axis=axis)
+    if periodic:
+        q = np.concatenate((q[...,-1:], q, q[...,:1]), axis=-1)
+    else:
+        q = pad(q, -1)
+    return pad(q, -2)
+
+
+def _gradient_coefficients(lon: npt.NDArray, lat: npt.NDArray) -> Tuple[npt.NDArray, bool]:
+    # calc_c2l_grid_info on the unit sphere, folded into one coefficient per cell edge:
+    # coef[0] and coef[1] hold the weights of the south, north, west and east edge values
+    # in d/dlon and d/dlat
+    lon, lat = np.deg2rad(np.asarray(lon, dtype=np.float64)), np.deg2rad(np.asarray(lat, dtype=np.float64))
+    xyz = np.stack((np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)), axis=-1)
+
+    center = xyz[:-1,:-1] + xyz[:-1,1:] + xyz[1:,:-1] + xyz[1:,1:]
+    center /= np.linalg.norm(center, axis=-1, keepdims=True)
+    clon = np.arctan2(center[...,1], center[...,0])
+    clat = np.arcsin(np.clip(center[...,2], -1.0, 1.0))
+    vlon = np.stack((-np.sin(clon), np.cos(clon), np.zeros_like(clon)), axis=-1)
+    vlat = np.stack((-np.sin(clat)*np.cos(clon), -np.sin(clat)*np.sin(clon), np.cos(clat)), axis=-1)
+
+    def edge_normal(p1, p2):
+        # outward normal of the great circle edge from p1 to p2 scaled by the edge length
+        normal = np.cross(p1, p2)
+        length = 2*np.arcsin(np.clip(0.5*np.linalg.norm(p2 - p1, axis=-1), 0.0, 1.0))
+        return normal*(length/np.maximum(np.linalg.norm(normal, axis=-1), np.finfo(np.float64).tiny))[...,np.newaxis]
+    en_n = edge_normal(xyz[:,:-1], xyz[:,1:])
+    en_e = edge_normal(xyz[1:,:], xyz[:-1,:])
+
+    def triangle_area(a, b, c):
+        numerator = np.abs(np.einsum("...k,...k", a, np.cross(b, c)))
+        denominator = 1 + np.einsum("...k,...k", a, b) + np.einsum("...k,...k", b, c) + np.einsum("...k,...k", c, a)
+        return 2*np.arctan2(numerator, denominator)
+    area = triangle_area(xyz[:-1,:-1], xyz[:-1,1:], xyz[1:,1:]) + triangle_area(xyz[:-1,:-1], xyz[1:,1:], xyz[1:,:-1])
+
+    coef = np.empty((2, 4) + area.shape, dtype=np.float64)
+    for d, v in enumerate((vlon, vlat)):
+        coef[d,0] = -np.einsum("...k,...k", v, en_n[:-1])
+        coef[d,1] =  np.einsum("...k,...k", v, en_n[1:])
+        coef[d,2] = -np.einsum("...k,...k", v, en_e[:,:-1])
+        coef[d,3] =  np.einsum("...k,...k", v, en_e[:,1:])
+    coef /= area
+    # the edge normals of a spherical cell do not sum to zero exactly; remove the
+    # residual so that constant fields have no gradient
+    coef -= coef.mean(axis=1, keepdims=True)
+    # grad_c2l gives the gradient per radian of arc, the distances are in radians of longitude
+    coef[0] *= np.cos(clat)
+
+    periodic = lon.shape[1] > 2 and np.allclose(np.cos(lon[:,-1] - lon[:,0]), 1.0) and np.allclose(lat[:,-1], lat[:,0])
+    return coef, periodic
@@ -1,124 +1,237 @@
 import dataclasses
-from typing import List, Optional
+from typing import Dict, List, Optional
 
+import h5py
 import numpy as np
 import numpy.typing as npt
 import xarray as xr
 
 from FMSgridtools.shared.gridtools_utils import check_file_is_there
+from FREnctools_lib.pyfrenctools.shared.create_xgrid import get_grid_area, get_grid_cells_2dx2d, \
+    get_grid_great_circle_area, latlon2xyz
+
+"""
+_LazyGridField:
+
+Descriptor used for the array attributes of GridObj. A value that was passed
+in or assigned is returned as is; otherwise the variable is read from the grid
+storage the first time it is accessed and cached on the instance.
+"""
+class _LazyGridField:
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+        self.cache_name = "_" + name
+
+    def __get__(self, obj, objtype=None) -> Optional[npt.NDArray]:
+        # dataclass asks for the default value with obj=None
+        if obj is None:
+            return None
+        value = obj.__dict__.get(self.cache_name)
+        if value is None and self.name not in obj.__dict__.get("_missing_fields", ()):
+            value = obj._read_field(self.name)
+            if value is None:
+                obj.__dict__.setdefault("_missing_fields", set()).add(self.name)
+            else:
+                obj.__dict__[self.cache_name] = value
+            obj._close_if_loaded()
+        return value
+
+    def __set__(self, obj, value: Optional[npt.NDArray]):
+        if self.name in ("x", "y"):
+            obj.__dict__.pop("_agrid_cache", None)
+            obj.__dict__.pop("_geometry_cache", None)
+        if value is None:
+            obj.__dict__.pop(self.cache_name, None)
+        else:
+            obj.__dict__[self.cache_name] = value
+        obj.__dict__.get("_missing_fields", set()).discard(self.name)
+
+
+"""
+_memmap_field:
+
+Returns a copy-on-write memory map of the variable varname in the netcdf4/HDF5
+file filepath. None is returned when the variable cannot be mapped directly,
+i.e. the file is not HDF5 based, or the variable is chunked, compressed or
+needs to be decoded with scale_factor/add_offset/_FillValue.
+"""
+def _memmap_field(filepath: str, varname: str) -> Optional[np.memmap]:
+    try:
+        with h5py.File(filepath, "r") as f:
+            var = f[varname]
+            if var.chunks is not None or var.compression is not None:
+                return None
+            if "scale_factor" in var.attrs or "add_offset" in var.attrs:
+                return None
+            if "_FillValue" in var.attrs and not np.all(np.isnan(var.attrs["_FillValue"])):
+                return None
+            offset = var.id.get_offset()
+            dtype = var.dtype
+            shape = var.shape
+    except (OSError, KeyError, TypeError):
+        return None
+    if offset is None or dtype.kind not in "fiu":
+        return None
+    return np.memmap(filepath, dtype=dtype, mode="c", offset=offset, shape=shape)
+
+
+# earth radius in m, RADIUS in the cfrenctools constant.h
+RADIUS = 6371000.0
+
+# number of rows of cells processed at once by great_circle_area
+_AREA_ROWS = 512
+
+
+"""
+_triangle_excess:
+
+Returns the signed spherical excess of the triangles with the unit vector
+corners a, b and c, computed as 2*atan2(a.(b x c), 1 + a.b + b.c + c.a).
+Unlike the sum of the angles the formula keeps its precision for small
+triangles.
+"""
+def _triangle_excess(a: npt.NDArray, b: npt.NDArray, c: npt.NDArray) -> npt.NDArray:
+    triple = np.einsum("i...,i...->...", a, np.cross(b, c, axis=0))
+    denom = 1.0 + np.einsum("i...,i...->...", a, b) \
+        + np.einsum("i...,i...->...", b, c) + np.einsum("i...,i...->...", c, a)
+    return 2.0*np.arctan2(triple, denom)
+
+
+"""
+great_circle_area:
+
+Returns the (ny, nx) areas in m2 of the cells of a logically rectangular
+grid with the (ny+1, nx+1) corners lon and lat in degrees, whose edges are
+great circle arcs. Each cell is split into two spherical triangles and the
+whole grid is computed with array operations, a block of rows at a time to
+bound the memory used for large tiles.
+"""
+def great_circle_area(lon: npt.NDArray, lat: npt.NDArray, radius: float = RADIUS) -> npt.NDArray:
+    ny, nx = lon.shape[0] - 1, lon.shape[1] - 1
+    area = np.empty((ny, nx), dtype=np.float64)
+    for j in range(0, ny, _AREA_ROWS):
+        jend = min(j + _AREA_ROWS, ny)
+        xyz = latlon2xyz(np.deg2rad(lon[j:jend+1]), np.deg2rad(lat[j:jend+1]))
+        ll, lr = xyz[:, :-1, :-1], xyz[:, :-1, 1:]
+        ur, ul = xyz[:, 1:, 1:], xyz[:, 1:, :-1]
+        excess = _triangle_excess(ll, lr, ur) + _triangle_excess(ll, ur, ul)
+        area[j:jend] = np.abs(excess)
+    return area*radius**2
+
+
+"""
+great_circle_distance:
+
+Returns the great circle distances in m between the points lon1, lat1 and
+lon2, lat2 given in degrees.
+"""
+def great_circle_distance(lon1: npt.NDArray, lat1: npt.NDArray, lon2: npt.NDArray,
+                          lat2: npt.NDArray, radius: float = RADIUS) -> npt.NDArray:
+    p1 = latlon2xyz(np.deg2rad(lon1), np.deg2rad(lat1))
+    p2 = latlon2xyz(np.deg2rad(lon2), np.deg2rad(lat2))
+    cross = np.linalg.norm(np.cross(p1, p2, axis=0), axis=0)
+    return radius*np.arctan2(cross, np.einsum("i...,i...->...", p1, p2))
+
+
+# the lazily loaded array attributes of GridObj
+_GRID_FIELDS = ("x", "y", "dx", "dy", "area", "angle_dx", "angle_dy")
 
-# TODO: Remove direct attributes, use property decorators instead
 
 """
 GridObj:
 
-Dataclass for containing basic grid data to be used by other grid objects
+Dataclass for containing basic grid data to be used by other grid objects.
+The array attributes (x, y, dx, dy, area, angle_dx, angle_dy) are loaded
+lazily: nothing is read from grid_data or grid_file until an attribute is
+first accessed. For uncompressed netcdf4 grid files the arrays are memory
+mapped instead of being copied into memory. A grid_file opened by the
+GridObj is closed once every array has been read, or with close(); the
+GridObj can also be used as a context manager.
 """
 @dataclasses.dataclass
 class GridObj:
     grid_data: Optional[xr.Dataset] = None
     grid_file: Optional[str] = None
     tile: Optional[str] = None
-    x: Optional[npt.NDArray] = None
-    y: Optional[npt.NDArray] = None
-    dx: Optional[npt.NDArray] = None
-    dy: Optional[npt.NDArray] = None
-    area: Optional[npt.NDArray] = None
-    angle_dx: Optional[npt.NDArray] = None
-    angle_dy: Optional[npt.NDArray] = None
+    x: Optional[npt.NDArray] = _LazyGridField()
+    y: Optional[npt.NDArray] = _LazyGridField()
+    dx: Optional[npt.NDArray] = _LazyGridField()
+    dy: Optional[npt.NDArray] = _LazyGridField()
+    area: Optional[npt.NDArray] = _LazyGridField()
+    angle_dx: Optional[npt.NDArray] = _LazyGridField()
+    angle_dy: Optional[npt.NDArray] = _LazyGridField()
     arcx: Optional[str] = None
 
     def __post_init__(self):
+        if self.grid_data is None and self.grid_file is not None:
+            check_file_is_there(self.grid_file)
+            self.grid_data = xr.open_dataset(self.grid_file)
+            self._owns_grid_data = True
         if self.grid_data is not None:
             varlist = list(self.grid_data.data_vars)
-            if "tile" in varlist:
+            if "tile" in varlist and self.tile is None:
                 self.tile = self.grid_data.tile.values.item().decode('ascii')
-            if "x" in varlist:
-                self.x = np.ascontiguousarray(self.grid_data.x.values)
-            if "y" in varlist:
-                self.y = np.ascontiguousarray(self.grid_data.y.values)
-            if "dx" in varlist:
-                self.dx = np.ascontiguousarray(self.grid_data.dx.values)
-            if "dy" in varlist:
-                self.dy = np.ascontiguousarray(self.grid_data.dy.values)
-            if "area" in varlist:
-                self.area = np.ascontiguousarray(self.grid_data.area.values)
-            if "angle_dx" in varlist:
-                self.angle_dx = np.ascontiguousarray(self.grid_data.angle_dx.values)
-            if "angle_dy" in varlist:
-                self.angle_dy = np.ascontiguousarray(self.grid_data.angle_dy.values)
-            if "arcx" in varlist:
+            if "arcx" in varlist and self.arcx is None:
                 self.arcx = self.grid_data.arcx.values.item().decode('ascii')
-        elif self.grid_file is not None:
-            check_file_is_there(self.grid_file)
-            with xr.open_dataset(self.grid_file) as ds:
-                self.grid_data = ds
-                varlist = list(self.grid_data.data_vars)
-                if "tile" in varlist:
-                    self.tile = self.grid_data.tile.values.item().decode('ascii')
-                if "x" in varlist:
-                    self.x = np.ascontiguousarray(self.grid_data.x.values)
-                if "y" in varlist:
-                    self.y = np.ascontiguousarray(self.grid_data.y.values)
-                if "dx" in varlist:
-                    self.dx = np.ascontiguousarray(self.grid_data.dx.values)
-                if "dy" in varlist:
-                    self.dy = np.ascontiguousarray(self.grid_data.dy.values)
-                if "area" in varlist:
-                    self.area = np.ascontiguousarray(self.grid_data.area.values)
-                if "angle_dx" in varlist:
-                    self.angle_dx = np.ascontiguousarray(self.grid_data.angle_dx.values)
-                if "angle_dy" in varlist:
-                    self.angle_dy = np.ascontiguousarray(self.grid_data.angle_dy.values)
-                if "arcx" in varlist:
-                    self.arcx = self.grid_data.arcx.values.item().decode('ascii')
-        else:
-            pass
+
+    def __enter__(self) -> "GridObj":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    """
+    close:
+
+    Closes the file handle of grid_data if the GridObj opened it from
+    grid_file, a grid_data passed in is left to its owner. Arrays already
+    read stay available.
+    """
+    def close(self):
+        if self.__dict__.pop("_owns_grid_data", False):
+            self.grid_data.close()
+
+    """
+    _close_if_loaded:
+
+    Closes grid_file once all the array attributes have been read or found
+    missing, as nothing else is read from it.
+    """
+    def _close_if_loaded(self):
+        if not self.__dict__.get("_owns_grid_data"):
+            return
+        missing = self.__dict__.get("_missing_fields", ())
+        if all("_" + name in self.__dict__ or name in missing for name in _GRID_FIELDS):
+            self.close()
+
+    """
+    _read_field:
+
+    Reads the variable name from the grid storage, returns None if the
+    variable is not available.
+    """
+    def _read_field(self, name: str) -> Optional[npt.NDArray]:
+        if self.grid_data is None or name not in self.grid_data.data_vars:
+            return None
+        if self.grid_file is not None:
+            mapped = _memmap_field(self.grid_file, name)
+            if mapped is not None:
+                return mapped
+        return np.ascontiguousarray(self.grid_data[name].values)
 
     """
     from_file:
 
     This class method will return an instance of GridObj with attributes
     matching the contents of the passed netcdf file containing the grid
-    data.
+    data. The grid arrays are read on first access.
     """
     @classmethod
     def from_file(cls, filepath: str) -> "GridObj":
         check_file_is_there(filepath)
-        with xr.open_dataset(filepath) as ds:
-            varlist = list(ds.data_vars)
-            if "tile" in varlist:
-                _tile = ds.tile.values.item().decode('ascii')
-            if "x" in varlist:
-                _x = np.ascontiguousarray(ds.x.values)
-            if "y" in varlist:
-                _y = np.ascontiguousarray(ds.y.values)
-            if "dx" in varlist:
-                _dx = np.ascontiguousarray(ds.dx.values)
-            if "dy" in varlist:
-                _dy = np.ascontiguousarray(ds.dy.values)
-            if "area" in varlist:
-                _area = np.ascontiguousarray(ds.area.values)
-            if "angle_dx" in varlist:
-                _angle_dx = np.ascontiguousarray(ds.angle_dx.values)
-            if "angle_dy" in varlist:
-                _angle_dy = np.ascontiguousarray(ds.angle_dy.values)
-            if "arcx" in varlist:
-                _arcx = ds.arcx.values.item().decode('ascii')
-            return cls(
-                grid_data=ds,
-                grid_file=filepath,
-                tile = _tile,
-                x = _x,
-                y = _y,
-                dx = _dx,
-                dy = _dy,
-                area = _area,
-                angle_dx = _angle_dx,
-                angle_dy = _angle_dy,
-                arcx = _arcx,
-            )
-        
+        return cls(grid_file=filepath)
+
     """
     write_out_grid:
 
@@ -128,7 +241,7 @@ class GridObj:
     def write_out_grid(self, filepath: str):
         if self.tile is not None:
             tile = xr.DataArray(
-                [self.tile],
+                [self.tile.encode("ascii")],
                 attrs=dict(
                     standard_name = "grid_tile_spec",
                     geometry = "spherical",
@@ -137,7 +250,7 @@ class GridObj:
                     discretization = "logically_rectangular",
                     conformal = "FALSE",
                 )
-            ).encode
+            )
         else:
             tile = None
         if self.x is not None:
@@ -148,7 +261,7 @@ class GridObj:
                     units="degree_east",
                     standard_name="geographic_longitude",
                 )
-            ).encode
+            )
         else:
             x = None
         if self.y is not None:
@@ -159,7 +272,7 @@ class GridObj:
                     units="degree_north",
                     standard_name="geographic_latitude",
                 )
-            ).encode
+            )
         else:
             y = None
         if self.dx is not None:
@@ -170,7 +283,7 @@ class GridObj:
                     units="meters",
                     standard_name="grid_edge_x_distance",
                 )
-            ).encode
+            )
         else:
             dx = None
         if self.dy is not None:
@@ -181,7 +294,7 @@ class GridObj:
                     units="meters",
                     standard_name="grid_edge_y_distance",
                 )
-            ).encode
+            )
         else:
             dy = None
         if self.area is not None:
@@ -192,7 +305,7 @@ class GridObj:
                     units="m2",
                     standard_name="grid_cell_area",
                 )
-            ).encode
+            )
         else:
             area = None
         if self.angle_dx is not None:
@@ -203,7 +316,7 @@ class GridObj:
                     units="degrees_east",
                     standard_name="grid_vertex_x_angle_WRT_geographic_east",
                 )
-            ).encode
+            )
         else:
             angle_dx = None
         if self.angle_dy is not None:
@@ -214,17 +327,17 @@ class GridObj:
                     units="degrees_east",
                     standard_name="grid_vertex_x_angle_WRT_geographic_east",
                 )
-            ).encode
+            )
         else:
             angle_dy = None
         if self.arcx is not None:
             arcx = xr.DataArray(
-                [self.arcx],
+                [self.arcx.encode("ascii")],
                 attrs=dict(
                     standard_name = "grid_edge_x_arc_type",
                     north_pole = "0.0 90.0",
                 )
-            ).encode
+            )
         else:
             arcx = None
         out_grid_dataset = xr.Dataset(
@@ -245,29 +358,113 @@ class GridObj:
     """
     get_agrid_lonlat:
 
-    This method returns the lon and lat for the A-grid as calculated from the
-    x and y attributes of the GridObj.
+    This method returns the lon and lat in radians for the A-grid as
+    calculated from the x and y attributes of the GridObj. The cell centres
+    are taken from the odd points of the supergrid. By default the 1-D lon
+    along the first row of cells and the 1-D lat along the first column of
+    cells are returned; with full=True the (ny, nx) centre arrays are returned,
+    which is required for curvilinear grids. With cache=True the result is
+    kept on the object and reused until x or y is reassigned.
+    """
+    def get_agrid_lonlat(self, full: bool = False, cache: bool = False
+                         ) -> tuple[npt.NDArray, npt.NDArray]:
+        agrid_cache = self.__dict__.setdefault("_agrid_cache", {})
+        if full in agrid_cache:
+            return agrid_cache[full]
+        if self.x is None or self.y is None:
+            return None, None
+        if full:
+            a_lon = np.deg2rad(self.x[1::2, 1::2])
+            a_lat = np.deg2rad(self.y[1::2, 1::2])
+        else:
+            a_lon = np.deg2rad(self.x[1, 1::2])
+            a_lat = np.deg2rad(self.y[1::2, 1])
+        if cache:
+            agrid_cache[full] = (a_lon, a_lat)
+        return a_lon, a_lat
+
     """
-    def get_agrid_lonlat(self)-> tuple[npt.NDArray, npt.NDArray]:
-        D2R = np.pi/180
-        a_lon = None
-        a_lat = None
-        if self.x is not None and self.y is not None:
-            nx = (self.x.shape[1]-1)//2
-            ny = (self.x.shape[0]-1)//2
-            x_flat = self.x.flatten()
-            y_flat = self.y.flatten()
-
-            a_lon = np.zeros(shape=nx)
-            a_lat = np.zeros(shape=ny)
-
-            for i in range(nx):
-                a_lon[i] = x_flat[2*nx+1+2*i+1]*D2R
-            for j in range(ny):
-                a_lat[i] = y_flat[(2*j+1)*(2*nx+1)+1]*D2R
-
-        return np.ascontiguousarray(a_lon), np.ascontiguousarray(a_lat)
-    
+    get_cell_geometry:
+
+    This method returns a dictionary with the geometry of the model grid cells
+    derived from the x and y attributes: the (ny+1, nx+1) cell corners lon and
+    lat in radians, their (3, ny+1, nx+1) cartesian coordinates xyz on the unit
+    sphere, and the (ny, nx) cell centres lon_center and lat_center, latitude
+    bounds lat_min and lat_max and cell areas cell_area in m2. The areas are
+    those used by the exchange grid kernels, with great_circle=True the cell
+    edges are great circle arcs. Otherwise the per cell preprocessing of the
+    2dx2d kernels from get_grid_cells_2dx2d is also returned under cells.
+    The arrays are computed on first use and kept on the object until x or y
+    is reassigned, so that exchange grids against the same grid reuse them.
+    """
+    def get_cell_geometry(self, great_circle: bool = False) -> Optional[Dict[str, npt.NDArray]]:
+        geometry_cache = self.__dict__.setdefault("_geometry_cache", {})
+        if great_circle in geometry_cache:
+            return geometry_cache[great_circle]
+        if self.x is None or self.y is None:
+            return None
+        lon = np.ascontiguousarray(np.deg2rad(self.x[::2, ::2]))
+        lat = np.ascontiguousarray(np.deg2rad(self.y[::2, ::2]))
+        corner_lat = np.stack((lat[:-1, :-1], lat[:-1, 1:], lat[1:, 1:], lat[1:, :-1]))
+        geometry = dict(lon = lon,
+                        lat = lat,
+                        xyz = latlon2xyz(lon, lat),
+                        lon_center = np.deg2rad(self.x[1::2, 1::2]),
+                        lat_center = np.deg2rad(self.y[1::2, 1::2]),
+                        lat_min = corner_lat.min(axis=0),
+                        lat_max = corner_lat.max(axis=0))
+        if great_circle:
+            geometry["cell_area"] = get_grid_great_circle_area(lon, lat)
+        else:
+            geometry["cell_area"] = get_grid_area(lon, lat)
+            geometry["cells"] = get_grid_cells_2dx2d(lon, lat)
+        geometry_cache[great_circle] = geometry
+        return geometry
+
+    """
+    get_cell_area:
+
+    This method returns the (ny, nx) areas in m2 of the model grid cells
+    computed from the x and y attributes with great circle cell edges. By
+    default the cells are spanned by the corners of the supergrid; with
+    subcells=True each area is the sum of the four supergrid cells it
+    contains, which follows the supergrid edge midpoints.
+    """
+    def get_cell_area(self, subcells: bool = False) -> Optional[npt.NDArray]:
+        if self.x is None or self.y is None:
+            return None
+        if not subcells:
+            return great_circle_area(self.x[::2, ::2], self.y[::2, ::2])
+        area = great_circle_area(self.x, self.y)
+        return area[0::2, 0::2] + area[0::2, 1::2] + area[1::2, 0::2] + area[1::2, 1::2]
+
+    """
+    fill_metrics:
+
+    This method computes the supergrid area, dx and dy from the x and y
+    attributes and assigns those that are missing from the grid, or all of
+    them with overwrite=True. The areas are those of great_circle_area and dx
+    and dy are the great circle lengths of the supergrid edges in m, with the
+    shapes written by write_out_grid. Returns the list of the filled
+    attributes.
+    """
+    def fill_metrics(self, overwrite: bool = False) -> List[str]:
+        if self.x is None or self.y is None:
+            return []
+        filled = []
+        if overwrite or self.area is None:
+            self.area = great_circle_area(self.x, self.y)
+            filled.append("area")
+        if overwrite or self.dx is None:
+            self.dx = great_circle_distance(self.x[:, :-1], self.y[:, :-1],
+                                            self.x[:, 1:], self.y[:, 1:])
+            filled.append("dx")
+        if overwrite or self.dy is None:
+            self.dy = great_circle_distance(self.x[:-1, :], self.y[:-1, :],
+                                            self.x[1:, :], self.y[1:, :])
+            filled.append("dy")
+        return filled
+
     """
     get_variable_list:
 
@@ -1,9 +1,13 @@
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from dataclasses import dataclass,field
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 import xarray as xr
 import numpy as np
 import numpy.typing as npt
-from gridtools.shared import GridObj
+from gridtools.make_mosaic.get_contact import get_contacts
+from gridtools.shared.gridobj import GridObj
 from gridtools.shared.gridtools_utils import check_file_is_there
 
 @dataclass
@@ -20,6 +24,7 @@ class MosaicObj:
     contact_index: npt.NDArray[np.str_] = None
     dataset: object = field(init=False) 
     grid_dict: Optional[Dict] | None = field(default_factory=dict)
+    tile_load_times: Dict[str, float] = field(default_factory=dict)
 
     def __post_init__(self):
         if self.mosaic_file is not None and self.gridfiles is None:
@@ -40,10 +45,42 @@ class MosaicObj:
         except AttributeError:
             print("Error: Mosaic file not provided as an attribute, unable to return number of tiles")
 
-    def griddict(self):
+    def griddict(self, nthreads: int = 1, max_read_bytes: Optional[int] = None,
+                 fields: Optional[List[str]] = None):
+        """
+        Fills grid_dict with a GridObj for every tile in the mosaic.
+        Tiles are read by a pool of nthreads threads. fields lists the grid
+        variables (e.g. ["x", "y"]) to read up front instead of on first access;
+        max_read_bytes limits the number of bytes of these variables being
+        read at the same time. It is not a memory budget: the loaded tiles
+        stay in grid_dict and the variables not listed in fields are read,
+        or memory mapped, when first accessed. The time spent loading each
+        tile in seconds is stored in tile_load_times.
+        """
         gridtiles = [tile.decode('ascii') for tile in self.dataset.gridtiles.values]
-        for i in range(self.get_ntiles()):
-            self.grid_dict[gridtiles[i]] = GridObj.from_file(self.gridfiles[i])
+        read_limit = _ReadLimit(max_read_bytes) if max_read_bytes is not None else None
+        with ThreadPoolExecutor(max_workers=nthreads) as executor:
+            results = executor.map(lambda gridfile: _load_tile(gridfile, fields, read_limit),
+                                    self.gridfiles[:self.get_ntiles()])
+            for tile, (grid, load_time) in zip(gridtiles, results):
+                self.grid_dict[tile] = grid
+                self.tile_load_times[tile] = load_time
+
+    def get_contacts(self, periodx: float = 0.0, periody: float = 0.0):
+        """
+        Fills contacts, contact_index and ncontact with the contacts between
+        the tiles of grid_dict, found as make_mosaic does. The tiles are
+        periodic in x with periodx and in y with periody degrees if these
+        are not 0.
+        """
+        tiles = list(self.grid_dict)
+        contacts, contact_index = [], []
+        for tile1, tile2, index in get_contacts(list(self.grid_dict.values()), periodx, periody):
+            contacts.append(f"{self.mosaic_name}:{tiles[tile1]}::{self.mosaic_name}:{tiles[tile2]}")
+            contact_index.append("{}:{},{}:{}::{}:{},{}:{}".format(*index))
+        self.contacts = np.array(contacts, dtype="S255")
+        self.contact_index = np.array(contact_index, dtype="S255")
+        self.ncontact = len(contacts)
 
     def write_out_mosaic(self):
 
@@ -80,3 +117,44 @@ class MosaicObj:
 
         out.to_netcdf(self.output_file)
 
+
+class _ReadLimit:
+    """
+    Blocks a read until the bytes being read concurrently fit within max_bytes.
+    A tile larger than max_bytes is read once nothing else is in flight. The
+    bytes are released once read, whether or not they are kept in memory.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, nbytes: int):
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.in_flight == 0 or self.in_flight + nbytes <= self.max_bytes)
+            self.in_flight += nbytes
+
+    def release(self, nbytes: int):
+        with self._cond:
+            self.in_flight -= nbytes
+            self._cond.notify_all()
+
+
+def _load_tile(gridfile: str, fields: Optional[List[str]], read_limit: Optional[_ReadLimit]):
+    start = time.perf_counter()
+    grid = GridObj.from_file(gridfile)
+    if fields:
+        fields = [name for name in fields if name in grid.grid_data.data_vars]
+        nbytes = sum(grid.grid_data[name].nbytes for name in fields)
+        if read_limit is not None:
+            read_limit.acquire(nbytes)
+        try:
+            for name in fields:
+                getattr(grid, name)
+        finally:
+            if read_limit is not None:
+                read_limit.release(nbytes)
+    # fields read later reopen the file through xarray or memory map it
+    grid.close()
+    return grid, time.perf_counter() - start
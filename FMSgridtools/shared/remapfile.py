@@ -0,0 +1,195 @@
+"""
+Compact binary layout of the remap (exchange grid) files, readable with
+np.memmap. The file starts with
+
+    REMAP_MAGIC, the format version (<u4), 4 zero bytes and the length of the
+    json header (<u8)
+
+followed by the utf-8 json header describing the variables and by the
+arrays, aligned to REMAP_ALIGN bytes from the aligned end of the header.
+The ncells variables of the remap dataset are stored as columns sorted by
+target cell (tile2, j, i of tile2_cell), the integer variables as int32 and the floating point ones as
+float64. The distinct target cells are stored in targets as (tile2, i, j)
+rows, the exchange cells of targets[n] being the rows offsets[n] to
+offsets[n+1] of the columns. order holds the row of the remap dataset each
+column row came from, so that the dataset is restored exactly, with its
+original order, dtypes, dimensions and attributes.
+"""
+import json
+from dataclasses import dataclass
+from typing import Dict
+import numpy as np
+import numpy.typing as npt
+import xarray as xr
+
+REMAP_MAGIC = b"FMSREMAP"
+REMAP_VERSION = 1
+REMAP_ALIGN = 64
+
+_HEADER = np.dtype([("magic", "S8"), ("version", "<u4"), ("pad", "<u4"), ("length", "<u8")])
+_INDEX_DTYPE = np.dtype("<i4")
+_WEIGHT_DTYPE = np.dtype("<f8")
+
+@dataclass
+class BinaryRemap() :
+
+    """
+    Remap file in the binary layout, opened with read_binary_remap. columns
+    holds the memory mapped ncells variables in target cell order, targets
+    and offsets the distinct target cells and where their exchange cells
+    start, and order the dataset row of every column row. Nothing is read
+    from the file until the arrays are accessed.
+    """
+
+    path    : str
+    ncells  : int
+    columns : Dict[str, npt.NDArray]
+    targets : npt.NDArray[np.int32]
+    offsets : npt.NDArray[np.int64]
+    order   : npt.NDArray
+    header  : Dict
+
+
+    def cells(self, n : int) -> Dict[str, npt.NDArray] :
+        """
+        Returns the columns of the exchange cells of the target cell targets[n].
+        """
+        rows = slice(int(self.offsets[n]), int(self.offsets[n+1]))
+        return {name : column[rows] for name, column in self.columns.items()}
+
+
+    def to_dataset(self, target_order : bool = False) -> xr.Dataset :
+        """
+        Returns the remap dataset. With target_order the variables are the
+        memory mapped columns sorted by target cell, with their int32 and
+        float64 dtypes. Otherwise the dataset is read into memory and is
+        identical to the one written with write_binary_remap.
+        """
+        if not target_order :
+            inverse = np.empty_like(self.order)
+            inverse[self.order] = np.arange(self.ncells)
+        data_vars = {}
+        for name, variable in self.header["variables"].items() :
+            data = self.columns[name]
+            if not target_order : data = data[inverse].astype(variable["dtype"])
+            data_vars[name] = xr.DataArray( data = data,
+                                            dims = tuple(variable["dims"]),
+                                            attrs = _decode_attrs(variable["attrs"]) )
+        return xr.Dataset( data_vars = data_vars, attrs = _decode_attrs(self.header["attrs"]) )
+
+
+def is_binary_remap(path : str) -> bool :
+    with open(path, "rb") as f :
+        return f.read(len(REMAP_MAGIC)) == REMAP_MAGIC
+
+
+def write_binary_remap(dataset : xr.Dataset, path : str) :
+    """
+    Writes the remap dataset, with its ncells variables tile1_cell,
+    tile2_cell, xgrid_area and optionally tile1, tile2, tile1_distance, to
+    path in the binary layout.
+    """
+    if "tile2_cell" not in dataset : raise ValueError("write_binary_remap: the remap dataset has no tile2_cell")
+    ncells = dataset.sizes.get("ncells", 0)
+
+    values = {}
+    for name, variable in dataset.data_vars.items() :
+        if variable.dims[:1] != ("ncells",) :
+            raise ValueError(f"write_binary_remap: {name} is not an ncells variable")
+        data = variable.values
+        if np.issubdtype(data.dtype, np.integer) :
+            if data.size and (data.min() < np.iinfo(_INDEX_DTYPE).min or data.max() > np.iinfo(_INDEX_DTYPE).max) :
+                raise ValueError(f"write_binary_remap: {name} does not fit in int32")
+            values[name] = data.astype(_INDEX_DTYPE)
+        elif np.issubdtype(data.dtype, np.floating) :
+            values[name] = data.astype(_WEIGHT_DTYPE)
+        else :
+            raise ValueError(f"write_binary_remap: {name} has the non numeric dtype {data.dtype}")
+
+    # exchange cells sorted by target cell, tile2 then the fortran j, i indices of tile2_cell
+    tile2 = values["tile2"] if "tile2" in values else np.ones(ncells, dtype=_INDEX_DTYPE)
+    i2, j2 = values["tile2_cell"][:,0], values["tile2_cell"][:,1]
+    order = np.lexsort((i2, j2, tile2))
+    targets = np.column_stack((tile2, i2, j2))[order]
+    first = np.flatnonzero(np.concatenate(([ncells > 0], np.any(targets[1:] != targets[:-1], axis=1))))
+    arrays = dict(targets = np.ascontiguousarray(targets[first]),
+                  offsets = np.append(first, ncells).astype("<i8"),
+                  order = order.astype(_INDEX_DTYPE if ncells <= np.iinfo(_INDEX_DTYPE).max else "<i8"))
+
+    header = dict(ncells = ncells, attrs = _encode_attrs(dataset.attrs), variables = {}, arrays = {})
+    # the arrays are placed from the aligned end of the header
+    layout = []
+    def place(data) :
+        offset = _aligned(layout[-1][0]["offset"] + layout[-1][1].nbytes) if layout else 0
+        layout.append((dict(offset = offset, dtype = data.dtype.str, shape = list(data.shape)), data))
+        return layout[-1][0]
+    for name, data in values.items() :
+        variable = dataset[name]
+        header["variables"][name] = dict(dims = list(variable.dims), dtype = variable.dtype.str,
+                                         attrs = _encode_attrs(variable.attrs), array = place(data[order]))
+    for name, data in arrays.items() :
+        header["arrays"][name] = place(data)
+    end = _aligned(layout[-1][0]["offset"] + layout[-1][1].nbytes)
+    text = json.dumps(header).encode()
+    start = _aligned(_HEADER.itemsize + len(text))
+
+    with open(path, "wb") as f :
+        f.write(np.array((REMAP_MAGIC, REMAP_VERSION, 0, len(text)), dtype=_HEADER).tobytes())
+        f.write(text)
+        for entry, data in layout :
+            f.seek(start + entry["offset"])
+            f.write(np.ascontiguousarray(data).tobytes())
+        f.truncate(start + end)
+
+
+def read_binary_remap(path : str) -> BinaryRemap :
+    """
+    Opens the binary remap file path, memory mapping its arrays read only.
+    """
+    with open(path, "rb") as f :
+        fixed = np.frombuffer(f.read(_HEADER.itemsize), dtype=_HEADER)
+        if fixed.size == 0 or fixed["magic"][0] != REMAP_MAGIC :
+            raise ValueError(f"read_binary_remap: {path} is not a binary remap file")
+        if fixed["version"][0] != REMAP_VERSION :
+            raise ValueError(f"read_binary_remap: {path} has the unsupported version {fixed['version'][0]}")
+        header = json.loads(f.read(int(fixed["length"][0])).decode())
+    start = _aligned(_HEADER.itemsize + int(fixed["length"][0]))
+
+    def memmap(array) :
+        shape = tuple(array["shape"])
+        # mmap cannot map empty arrays
+        if np.prod(shape) == 0 : return np.empty(shape, dtype=array["dtype"])
+        return np.memmap(path, dtype=array["dtype"], mode="r", offset=start+array["offset"], shape=shape)
+
+    return BinaryRemap(path = path,
+                       ncells = header["ncells"],
+                       columns = {name : memmap(variable["array"]) for name, variable in header["variables"].items()},
+                       targets = memmap(header["arrays"]["targets"]),
+                       offsets = memmap(header["arrays"]["offsets"]),
+                       order = memmap(header["arrays"]["order"]),
+                       header = header)
+
+
+def _aligned(offset : int) -> int :
+    return -(-offset//REMAP_ALIGN)*REMAP_ALIGN
+
+
+def _encode_attrs(attrs : Dict) -> Dict :
+    # numpy attribute values keep their dtype, e.g. the attributes read from netcdf files
+    encoded = {}
+    for key, value in attrs.items() :
+        if isinstance(value, (np.ndarray, np.generic)) :
+            value = dict(__ndarray__ = np.asarray(value).tolist(), dtype = np.asarray(value).dtype.str,
+                         scalar = np.ndim(value) == 0)
+        encoded[key] = value
+    return encoded
+
+
+def _decode_attrs(attrs : Dict) -> Dict :
+    decoded = {}
+    for key, value in attrs.items() :
+        if isinstance(value, dict) and "__ndarray__" in value :
+            array = np.array(value["__ndarray__"], dtype=value["dtype"])
+            value = array[()] if value["scalar"] else array
+        decoded[key] = value
+    return decoded
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Optional
+import numpy as np
+import numpy.typing as npt
+import xarray as xr
+
+@dataclass
+class XGridCache() :
+
+    """
+    On-disk cache of exchange grid datasets. Entries are netcdf files in
+    cache_dir named by a hash of the grid corners, the mask, the conservative
+    order and the exchange grid algorithm. When the files in cache_dir grow
+    past max_size bytes the least recently used entries are removed.
+    hits, misses and evictions count the cache events since creation.
+    """
+
+    cache_dir : str
+    max_size  : Optional[int] = None
+    hits      : int = 0
+    misses    : int = 0
+    evictions : int = 0
+
+    def __post_init__(self) :
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+
+    def key(self, src_lon : npt.NDArray, src_lat : npt.NDArray, tgt_lon : npt.NDArray, tgt_lat : npt.NDArray,
+            order : int, algorithm : str, src_mask : Optional[npt.NDArray] = None) -> str :
+        sha = hashlib.sha256(f"{algorithm}:{order}".encode())
+        for array in (src_lon, src_lat, tgt_lon, tgt_lat, src_mask) :
+            if array is None :
+                sha.update(b"none")
+                continue
+            array = np.ascontiguousarray(array, dtype=np.float64)
+            sha.update(str(array.shape).encode())
+            sha.update(array.tobytes())
+        return sha.hexdigest()
+
+
+    def get(self, key : str) -> Optional[xr.Dataset] :
+        path = self.__path(key)
+        try :
+            dataset = xr.load_dataset(path)
+        except (FileNotFoundError, OSError, ValueError) :
+            self.misses += 1
+            return None
+        # the modification time orders entries for eviction
+        os.utime(path)
+        self.hits += 1
+        return dataset
+
+
+    def put(self, key : str, dataset : xr.Dataset) :
+        # write to a temporary file first so readers never see a partial entry
+        fd, tmpfile = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try :
+            dataset.to_netcdf(tmpfile)
+            os.replace(tmpfile, self.__path(key))
+        except BaseException :
+            if os.path.exists(tmpfile) : os.remove(tmpfile)
+            raise
+        self.evict()
+
+
+    def evict(self) :
+        if self.max_size is None : return
+        entries = []
+        for entry in os.scandir(self.cache_dir) :
+            if entry.name.endswith(".nc") :
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries) :
+            if total <= self.max_size : break
+            try :
+                os.remove(path)
+            except FileNotFoundError :
+                pass
+            total -= size
+            self.evictions += 1
+
+
+    def stats(self) -> Dict[str, int] :
+        return dict(hits = self.hits, misses = self.misses, evictions = self.evictions)
+
+
+    def __path(self, key : str) -> str :
+        return os.path.join(self.cache_dir, f"{key}.nc")
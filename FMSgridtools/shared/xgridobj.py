@@ -1,9 +1,18 @@
 import ctypes as ct
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import numpy.typing as npt
 import xarray as xr
 from gridtools.shared.gridtools_utils import check_file_is_there
 from gridtools.shared.gridobj import GridObj
+from gridtools.shared.mosaicobj import MosaicObj
+from gridtools.shared.remapfile import is_binary_remap, read_binary_remap, write_binary_remap
+from gridtools.shared.xgridcache import XGridCache
+from FREnctools_lib.pyfrenctools.shared.create_xgrid import XGRID_BACKENDS, create_xgrid_1dx2d, \
+    create_xgrid_2dx1d, create_xgrid_2dx2d, create_xgrid_great_circle, openacc_enabled
 
 @dataclass
 class XGridObj() :
@@ -17,6 +26,9 @@ class XGridObj() :
     debug    : Optional[bool] = False
     order    : Optional[int] = 1
     on_gpu   : Optional[bool] = False
+    backend  : Optional[str] = None
+    nthreads : Optional[int] = None
+    cache    : Optional[XGridCache] = None
 
     dataset : Optional[xr.Dataset] = None 
     __dataset_exists = False
@@ -39,17 +51,280 @@ class XGridObj() :
         
         
     def read_remap_file(self) :
-        self.dataset = xr.open_dataset(self.restart_remap_file)
+        """
+        Reads restart_remap_file, a netcdf remap file or a binary remap file
+        written with write_remap_file(binary=True).
+        """
+        if is_binary_remap(self.restart_remap_file) :
+            self.dataset = read_binary_remap(self.restart_remap_file).to_dataset()
+        else :
+            self.dataset = xr.open_dataset(self.restart_remap_file)
         self.__dataset_exists = True
         
                 
-    def write_remap_file(self) :
-        self.dataset.to_netcdf(self.out_remap_file)
+    def write_remap_file(self, binary : bool = False) :
+        """
+        Writes the exchange grid to out_remap_file as netcdf or, with binary,
+        in the memory mappable layout of remapfile, sorted by target cell.
+        """
+        if binary : write_binary_remap(self.dataset, self.out_remap_file)
+        else : self.dataset.to_netcdf(self.out_remap_file)
 
 
-    def create_xgrid(self) :
+    def create_xgrid(self, src_mask : Optional[npt.NDArray] = None, nprocs : int = 1,
+                     executor : Optional[Executor] = None) :
+        """
+        Creates the exchange grid between src_grid and tgt_grid, or between
+        every overlapping pair of tiles of src_mosaic and tgt_mosaic. For
+        mosaics, src_mask is a sequence with one mask (or None) per source
+        tile, and the tile pairs are computed by a pool of nprocs processes
+        or by executor, e.g. an mpi4py.futures.MPIPoolExecutor spanning
+        several nodes. The kernels run with backend: serial, openmp for the
+        threaded host kernels (the default), threads for the serial host
+        kernels on blocks of rows in a pool of nthreads python threads, or
+        openacc for the two-pass OpenACC kernels, which on_gpu also selects
+        when they are available. nthreads defaults to the cores, shared
+        between the nprocs processes of a mosaic.
+        """
         if not any( i == self.order for i in (1,2) ) : raise RuntimeError("conservative order must be 1 or 2")
-        #create_xgrid
+        if self.src_grid is None and self.tgt_grid is None and self.__check_mosaic() :
+            self.__create_mosaic_xgrid(src_mask, nprocs, executor)
+            return
+        if self.src_grid is None or self.tgt_grid is None :
+            raise RuntimeError("src_grid and tgt_grid are required to create the exchange grid")
+
+        # cell corners of the model grids in radians
+        src_lon, src_lat = np.deg2rad(self.src_grid.x[::2,::2]), np.deg2rad(self.src_grid.y[::2,::2])
+        tgt_lon, tgt_lat = np.deg2rad(self.tgt_grid.x[::2,::2]), np.deg2rad(self.tgt_grid.y[::2,::2])
+
+        if "great_circle" in (self.src_grid.arcx, self.tgt_grid.arcx) : algorithm = "great_circle"
+        elif self.__is_lonlat(src_lon, src_lat) : algorithm = "1dx2d"
+        elif self.__is_lonlat(tgt_lon, tgt_lat) : algorithm = "2dx1d"
+        else : algorithm = "2dx2d"
+        # the great circle kernel does not compute the exchange cell centroids
+        if algorithm == "great_circle" and self.order == 2 :
+            raise RuntimeError("conservative order 2 is not supported on great circle grids")
+
+        backend = self.__backend()
+        if self.debug : print(f"Creating the {algorithm} exchange grid with the {backend} backend")
+
+        if self.cache is not None :
+            key = self.cache.key(src_lon, src_lat, tgt_lon, tgt_lat, self.order, algorithm, src_mask)
+            self.dataset = self.cache.get(key)
+            if self.debug : print(f"Exchange grid cache {self.cache.cache_dir}: {self.cache.stats()}")
+            if self.dataset is not None :
+                self.__dataset_exists = True
+                return
+
+        if algorithm == "great_circle" :
+            # the cell corners in cartesian coordinates and the cell areas are kept on the grids
+            src_geometry = self.src_grid.get_cell_geometry(great_circle=True)
+            tgt_geometry = self.tgt_grid.get_cell_geometry(great_circle=True)
+            xgrid = create_xgrid_great_circle(src_lon, src_lat, tgt_lon, tgt_lat, src_mask,
+                                              src_geometry["xyz"], src_geometry["cell_area"],
+                                              tgt_geometry["xyz"], tgt_geometry["cell_area"], backend,
+                                              self.nthreads)
+        elif algorithm == "1dx2d" :
+            xgrid = create_xgrid_1dx2d(src_lon[0], src_lat[:,0], tgt_lon, tgt_lat, src_mask, self.order, backend,
+                                       self.nthreads)
+        elif algorithm == "2dx1d" :
+            xgrid = create_xgrid_2dx1d(src_lon, src_lat, tgt_lon[0], tgt_lat[:,0], src_mask, self.order, backend,
+                                       self.nthreads)
+        elif backend == "openacc" :
+            # the two-pass kernels compute the cell geometry on the device
+            xgrid = create_xgrid_2dx2d(src_lon, src_lat, tgt_lon, tgt_lat, src_mask, self.order, backend=backend)
+        else :
+            # the cell areas and target cell bounds are kept on the grids
+            src_geometry = self.src_grid.get_cell_geometry()
+            tgt_geometry = self.tgt_grid.get_cell_geometry()
+            xgrid = create_xgrid_2dx2d(src_lon, src_lat, tgt_lon, tgt_lat, src_mask, self.order,
+                                       src_geometry["cell_area"], tgt_geometry["cell_area"], tgt_geometry["cells"],
+                                       backend, self.nthreads)
+
+        self.dataset = self.__xgrid_to_dataset(xgrid, nx_src=src_lon.shape[1]-1)
+        self.__dataset_exists = True
+        if self.cache is not None : self.cache.put(key, self.dataset)
+
+
+    def update_xgrid(self, src_mask : Optional[npt.NDArray] = None, bbox : Optional[Sequence[float]] = None,
+                     src_cells : Optional[npt.NDArray] = None) :
+        """
+        Recomputes the part of an existing exchange grid, e.g. read from
+        restart_remap_file, that changed with src_grid, tgt_grid or src_mask,
+        and splices it into dataset. The change is given by bbox, the
+        (lon_min, lon_max, lat_min, lat_max) in degrees enclosing the edited
+        grid points of either grid, before and after the edit, and/or by
+        src_cells, a boolean array flagging the changed source cells, e.g.
+        where a land mask was edited. The changed region of bbox extends to
+        the target cells touching it, whose edges move with their corners.
+        All exchange cells of the source cells in the changed region are
+        recomputed against the target cells around them.
+        """
+        if not self.__dataset_exists or self.dataset is None :
+            raise RuntimeError("an existing exchange grid is required to update it")
+        if self.src_grid is None or self.tgt_grid is None :
+            raise RuntimeError("src_grid and tgt_grid are required to update the exchange grid")
+        if "tile2" in self.dataset :
+            raise RuntimeError("exchange grids between mosaics can not be updated, update the tile pairs instead")
+        if ("tile1_distance" in self.dataset) != (self.order == 2) :
+            raise RuntimeError(f"the exchange grid was not created with conservative order {self.order}")
+
+        src_bounds = _cell_bounds(self.src_grid)
+        changed = np.zeros(src_bounds[0].shape, dtype=bool)
+        if src_cells is not None :
+            if np.shape(src_cells) != changed.shape :
+                raise RuntimeError(f"src_cells must have the source grid shape {changed.shape}")
+            changed |= np.asarray(src_cells, dtype=bool)
+        if bbox is not None :
+            lon_min, lon_max, lat_min, lat_max = np.deg2rad(bbox)
+            width = min(lon_max - lon_min, 2*np.pi)
+            region = (np.mod(lon_min, 2*np.pi), width, lat_min, lat_max)
+            # the target cells with an edited corner reach past bbox, before and after the edit,
+            # so the region also covers every target cell touching bbox
+            tgt_bounds = _cell_bounds(self.tgt_grid)
+            touching = _bounds_overlap(tgt_bounds, region)
+            region = _bounds_hull(region, tuple(bound[touching] for bound in tgt_bounds))
+            changed |= _bounds_overlap(src_bounds, region)
+
+        # exchange cells of the changed source cells are dropped and recomputed
+        i_in, j_in = (self.dataset.tile1_cell.values - 1).T
+        keep = ~changed[j_in, i_in]
+        datasets = [self.dataset.isel(ncells=np.nonzero(keep)[0]).load()]
+        if self.debug : print(f"Recomputing {np.count_nonzero(~keep)} of {keep.size} exchange cells "
+                              f"for {np.count_nonzero(changed)} source cells")
+
+        if changed.any() :
+            rows, cols = np.nonzero(changed)
+            j0, j1, i0, i1 = rows.min(), rows.max()+1, cols.min(), cols.max()+1
+            src_grid = GridObj(x=self.src_grid.x[2*j0:2*j1+1, 2*i0:2*i1+1],
+                               y=self.src_grid.y[2*j0:2*j1+1, 2*i0:2*i1+1], arcx=self.src_grid.arcx)
+            mask = changed[j0:j1, i0:i1].astype(np.float64)
+            if src_mask is not None : mask *= src_mask[j0:j1, i0:i1]
+
+            # target cells touching the changed source cells, with one more cell around them
+            # for cell edges bulging past the corners
+            overlap = _bounds_overlap(_cell_bounds(self.tgt_grid), _tile_bounds(src_grid))
+            if overlap.any() :
+                rows, cols = np.nonzero(overlap)
+                ny, nx = overlap.shape
+                tj0, tj1 = max(rows.min()-1, 0), min(rows.max()+2, ny)
+                ti0, ti1 = max(cols.min()-1, 0), min(cols.max()+2, nx)
+                tgt_grid = GridObj(x=self.tgt_grid.x[2*tj0:2*tj1+1, 2*ti0:2*ti1+1],
+                                   y=self.tgt_grid.y[2*tj0:2*tj1+1, 2*ti0:2*ti1+1], arcx=self.tgt_grid.arcx)
+                region = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=self.order, on_gpu=self.on_gpu,
+                                  backend=self.backend, nthreads=self.nthreads, debug=self.debug)
+                region.create_xgrid(mask)
+                dataset = region.dataset
+                dataset.tile1_cell.values[:] += np.array([i0, j0], dtype=np.int32)
+                dataset.tile2_cell.values[:] += np.array([ti0, tj0], dtype=np.int32)
+                datasets.append(dataset)
+
+        # the existing dataset may still be open on the file it is replaced in
+        self.dataset.close()
+        self.dataset = xr.concat(datasets, dim="ncells")
+
+
+    def __backend(self) -> str :
+        # on_gpu selects the two-pass OpenACC kernels, which fall back to the
+        # threaded host kernels when the library is built without OpenACC
+        if self.backend is not None :
+            if self.backend not in XGRID_BACKENDS :
+                raise RuntimeError(f"backend must be one of {XGRID_BACKENDS}, got {self.backend}")
+            return self.backend
+        if self.on_gpu :
+            if openacc_enabled() : return "openacc"
+            if self.debug : print("The cfrenctools library is built without OpenACC, using the openmp backend")
+        return "openmp"
+
+
+    def __create_mosaic_xgrid(self, src_mask : Optional[Sequence[Optional[npt.NDArray]]], nprocs : int,
+                              executor : Optional[Executor]) :
+
+        src_tiles = _mosaic_grids(self.src_mosaic)
+        tgt_tiles = _mosaic_grids(self.tgt_mosaic)
+        if src_mask is None : src_mask = [None]*len(src_tiles)
+        if len(src_mask) != len(src_tiles) :
+            raise RuntimeError(f"src_mask has {len(src_mask)} masks for {len(src_tiles)} source tiles")
+        if self.order == 2 and any(grid.arcx == "great_circle" for grid in src_tiles + tgt_tiles) :
+            raise RuntimeError("conservative order 2 is not supported on great circle grids")
+
+        # only tile pairs with overlapping bounding boxes can share exchange cells
+        src_bounds = [_tile_bounds(grid) for grid in src_tiles]
+        tgt_bounds = [_tile_bounds(grid) for grid in tgt_tiles]
+        pairs = [(n1, n2) for n1 in range(len(src_tiles)) for n2 in range(len(tgt_tiles))
+                 if _bounds_overlap(src_bounds[n1], tgt_bounds[n2])]
+        backend = self.__backend()
+        # the threads of each tile pair share the cores with the other workers of the pool
+        nthreads = self.nthreads
+        if nthreads is None and executor is None and nprocs > 1 : nthreads = max((os.cpu_count() or 1)//nprocs, 1)
+        tasks = [(src_tiles[n1].x, src_tiles[n1].y, src_tiles[n1].arcx, tgt_tiles[n2].x, tgt_tiles[n2].y,
+                  tgt_tiles[n2].arcx, self.order, src_mask[n1], self.cache, backend, nthreads) for n1, n2 in pairs]
+        if self.debug : print(f"Creating exchange grids for {len(pairs)} of {len(src_tiles)*len(tgt_tiles)} tile pairs")
+
+        if executor is not None :
+            results = list(executor.map(_create_tile_xgrid, *zip(*tasks))) if tasks else []
+        elif nprocs > 1 and len(tasks) > 1 :
+            with ProcessPoolExecutor(max_workers=nprocs) as pool :
+                results = list(pool.map(_create_tile_xgrid, *zip(*tasks)))
+        else :
+            results = [_create_tile_xgrid(*task) for task in tasks]
+
+        datasets = []
+        for (n1, n2), dataset in zip(pairs, results) :
+            ncells = dataset.sizes.get("ncells", 0)
+            if ncells == 0 : continue
+            dataset["tile1"] = xr.DataArray( data = np.full(ncells, n1+1, dtype=np.int32),
+                                             dims = ("ncells"),
+                                             attrs = dict(standard_name = "tile_number_in_mosaic1") )
+            dataset["tile2"] = xr.DataArray( data = np.full(ncells, n2+1, dtype=np.int32),
+                                             dims = ("ncells"),
+                                             attrs = dict(standard_name = "tile_number_in_mosaic2") )
+            datasets.append(dataset)
+        if not datasets : raise RuntimeError("the source and target mosaics do not overlap")
+
+        self.dataset = xr.concat(datasets, dim="ncells")
+        self.__dataset_exists = True
+
+
+    def __is_lonlat(self, lon : npt.NDArray, lat : npt.NDArray) -> bool :
+        # regular lon/lat grids have constant lon along columns and constant lat along rows
+        return bool( np.all(lon == lon[0]) and np.all(lat == lat[:,:1]) )
+
+
+    def __xgrid_to_dataset(self, xgrid : Dict[str, npt.NDArray], nx_src : int) -> xr.Dataset :
+
+        ncells = xgrid["xgrid_area"].size
+        # remap files store fortran (1-based) cell indices
+        tile1 = xr.DataArray( data = np.ones(ncells, dtype=np.int32),
+                              dims = ("ncells"),
+                              attrs = dict(standard_name = "tile_number_in_mosaic1") )
+        tile1_cell = xr.DataArray( data = np.column_stack((xgrid["i_in"]+1, xgrid["j_in"]+1)),
+                                   dims = ("ncells", "two"),
+                                   attrs = dict(standard_name = "parent_cell_indices_in_mosaic1") )
+        tile2_cell = xr.DataArray( data = np.column_stack((xgrid["i_out"]+1, xgrid["j_out"]+1)),
+                                   dims = ("ncells", "two"),
+                                   attrs = dict(standard_name = "parent_cell_indices_in_mosaic2") )
+        xgrid_area = xr.DataArray( data = xgrid["xgrid_area"],
+                                   dims = ("ncells"),
+                                   attrs = dict(standard_name = "exchange_grid_area", units = "m2") )
+        data_vars = dict(tile1 = tile1, tile1_cell = tile1_cell, tile2_cell = tile2_cell, xgrid_area = xgrid_area)
+
+        if self.order == 2 :
+            # distance between the exchange cell centroid and the centroid of its parent source cell
+            src_cell = xgrid["j_in"]*nx_src + xgrid["i_in"]
+            area = xgrid["xgrid_area"]
+            src_area = np.bincount(src_cell, weights=area)
+            # exchange cells, or whole source cells, of zero area have no centroid and get no distance
+            valid = (area > 0) & (src_area[src_cell] > 0)
+            distance = np.zeros((ncells, 2), dtype=np.float64)
+            for l, centroid in enumerate((xgrid["xgrid_clon"], xgrid["xgrid_clat"])) :
+                src_centroid = np.bincount(src_cell, weights=centroid)[src_cell[valid]] / src_area[src_cell[valid]]
+                distance[valid,l] = centroid[valid]/area[valid] - src_centroid
+            data_vars["tile1_distance"] = xr.DataArray( data = distance,
+                                                        dims = ("ncells", "two"),
+                                                        attrs = dict(standard_name = "distance_from_parent1_cell_centroid") )
+
+        return xr.Dataset( data_vars = data_vars )
     
         
     def __check_dataset(self) :
@@ -71,13 +346,75 @@ class XGridObj() :
     def __check_mosaic(self) :
         
         if self.src_mosaic is not None and self.tgt_mosaic is not None :
-            # file checks are done in mosaic
-            # self.src_grid = MosaicObj(self.src_mosaic).get_grid(), MosaicObj(self.src_mosaic).grid ?
-            # self.tgt_grid = MosaicObj(self.tgt_mosaic).get_grid()
+            # file checks are done in mosaic, the tiles are read in create_xgrid
             return True
         else : return False
 
         
     def __check_grids(self) :
         return self.src_grid is not None and self.tgt_grid is not None
-        
+
+
+def _mosaic_grids(mosaic_file : str) -> List[GridObj] :
+    mosaic = MosaicObj(mosaic_file=mosaic_file)
+    mosaic.griddict(fields=["x", "y"])
+    return list(mosaic.grid_dict.values())
+
+
+def _tile_bounds(grid : GridObj) -> Tuple[float, float, float, float] :
+    # (western edge, width in longitude, southern edge, northern edge) in radians.
+    # Longitudes are continuous within a tile, tiles around a pole jump by 2*pi
+    # and are taken to cover all longitudes.
+    lon = np.deg2rad(grid.x[::2,::2])
+    lat = np.deg2rad(grid.y[::2,::2])
+    west, width = lon.min(), lon.max() - lon.min()
+    if width >= 2*np.pi or max(abs(lat.min()), abs(lat.max())) > np.pi/2 - 1.e-6 : west, width = 0.0, 2*np.pi
+    return np.mod(west, 2*np.pi), width, lat.min(), lat.max()
+
+
+def _cell_bounds(grid : GridObj) -> Tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray] :
+    # _tile_bounds of each model grid cell as (ny, nx) arrays. Cells crossing the
+    # longitude cut or touching a pole are taken to cover all longitudes.
+    lon = np.deg2rad(grid.x[::2,::2])
+    lat = np.deg2rad(grid.y[::2,::2])
+    corner_lon = np.stack((lon[:-1,:-1], lon[:-1,1:], lon[1:,1:], lon[1:,:-1]))
+    corner_lat = np.stack((lat[:-1,:-1], lat[:-1,1:], lat[1:,1:], lat[1:,:-1]))
+    west, width = corner_lon.min(axis=0), np.ptp(corner_lon, axis=0)
+    south, north = corner_lat.min(axis=0), corner_lat.max(axis=0)
+    all_lon = (width >= np.pi) | (np.maximum(np.abs(south), np.abs(north)) > np.pi/2 - 1.e-6)
+    return np.where(all_lon, 0.0, np.mod(west, 2*np.pi)), np.where(all_lon, 2*np.pi, width), south, north
+
+
+def _bounds_overlap(bounds1 : Tuple[float, float, float, float], bounds2 : Tuple[float, float, float, float],
+                    tolerance : float = 1.e-10) -> bool :
+    # also takes the arrays of _cell_bounds and then returns an array
+    west1, width1, south1, north1 = bounds1
+    west2, width2, south2, north2 = bounds2
+    # distance of each western edge east of the other
+    return (south1 <= north2 + tolerance) & (south2 <= north1 + tolerance) & \
+           ( (np.mod(west2 - west1, 2*np.pi) <= width1 + tolerance) |
+             (np.mod(west1 - west2, 2*np.pi) <= width2 + tolerance) )
+
+
+def _bounds_hull(bounds : Tuple[float, float, float, float],
+                 cells : Tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]) -> Tuple[float, float, float, float] :
+    # smallest _tile_bounds enclosing bounds and the _cell_bounds arrays cells
+    west, width, south, north = bounds
+    if cells[0].size == 0 : return bounds
+    # western edges of the cells counted from west, within half a turn
+    start = np.mod(cells[0] - west + np.pi, 2*np.pi) - np.pi
+    first, last = min(0.0, start.min()), max(width, (start + cells[1]).max())
+    if last - first >= 2*np.pi or np.any(cells[1] >= 2*np.pi) : west, first, last = 0.0, 0.0, 2*np.pi
+    return np.mod(west + first, 2*np.pi), last - first, min(south, cells[2].min()), max(north, cells[3].max())
+
+
+def _create_tile_xgrid(src_x : npt.NDArray, src_y : npt.NDArray, src_arcx : Optional[str],
+                       tgt_x : npt.NDArray, tgt_y : npt.NDArray, tgt_arcx : Optional[str],
+                       order : int, src_mask : Optional[npt.NDArray], cache : Optional[XGridCache],
+                       backend : str = "openmp", nthreads : Optional[int] = None) -> xr.Dataset :
+    # runs in the worker processes, so it only takes picklable arguments
+    xgrid = XGridObj(src_grid = GridObj(x=src_x, y=src_y, arcx=src_arcx),
+                     tgt_grid = GridObj(x=tgt_x, y=tgt_y, arcx=tgt_arcx),
+                     order = order, cache = cache, backend = backend, nthreads = nthreads)
+    xgrid.create_xgrid(src_mask)
+    return xgrid.dataset
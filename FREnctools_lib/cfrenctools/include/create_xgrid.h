@@ -30,6 +30,8 @@
 #ifndef MV
 #define MV 50
 #endif
+/* maximum number of vertices of a grid cell after fix_lon */
+#define MAX_V 8
 /* this value is small compare to earth area */
 
 double poly_ctrlon(const double lon[], const double lat[], int n, double clon);
@@ -37,8 +39,13 @@ double poly_ctrlat(const double lon[], const double lat[], int n);
 double box_ctrlon(double ll_lon, double ll_lat, double ur_lon, double ur_lat, double clon);
 double box_ctrlat(double ll_lon, double ll_lat, double ur_lon, double ur_lat);
 int get_maxxgrid(void);
+void set_xgrid_nthreads(const int *nthreads);
 void get_grid_area(const int *nlon, const int *nlat, const double *lon, const double *lat, double *area);
 void get_grid_great_circle_area(const int *nlon, const int *nlat, const double *lon, const double *lat, double *area);
+void get_grid_cells_2dx2d(const int *nlon, const int *nlat, const double *lon, const double *lat,
+			  double *lon_min_list, double *lon_max_list, double *lat_min_list,
+			  double *lat_max_list, double *lon_avg, int *n_list, double *lon_list,
+			  double *lat_list);
 //void get_grid_area_dimensionless(const int *nlon, const int *nlat, const double *lon, const double *lat, double *area);
 void get_grid_area_no_adjust(const int *nlon, const int *nlat, const double *lon, const double *lat, double *area);
 int clip(const double lon_in[], const double lat_in[], int n_in, double ll_lon, double ll_lat,
@@ -74,9 +81,67 @@ int create_xgrid_2dx2d_order2(const int *nlon_in, const int *nlat_in, const int
 int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const double z1_in[], int n1_in,
 			    const double x2_in[], const double y2_in[], const double z2_in [], int n2_in,
 			    double x_out[], double y_out[], double z_out[]);
+struct NodeList; /* mosaic_util.h */
+int clip_2dx2d_great_circle_r(struct NodeList *nodes, const double x1_in[], const double y1_in[],
+			      const double z1_in[], int n1_in, const double x2_in[], const double y2_in[],
+			      const double z2_in [], int n2_in, double x_out[], double y_out[], double z_out[]);
 int create_xgrid_great_circle(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
 			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
 			      const double *mask_in, int *i_in, int *j_in, int *i_out, int *j_out,
 			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat);
 
+/* the _sized variants write at most *maxxgrid cells and return the total number
+   of exchange cells, so callers can retry with larger arrays */
+int create_xgrid_1dx2d_order1_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out, const double *lon_in,
+			      const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out,
+			      int *j_out, double *xgrid_area);
+int create_xgrid_1dx2d_order2_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat);
+int create_xgrid_2dx1d_order1_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out, const double *lon_in,
+			      const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out,
+			      int *j_out, double *xgrid_area);
+int create_xgrid_2dx1d_order2_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat);
+int create_xgrid_2dx2d_order1_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out,
+			      int *j_out, double *xgrid_area);
+int create_xgrid_2dx2d_order2_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat);
+int create_xgrid_great_circle_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat);
+
+int create_xgrid_2dx2d_order1_cells(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *mask_in,
+			      const double *area_in, const double *area_out,
+			      const double *lon_out_min_list, const double *lon_out_max_list,
+			      const double *lat_out_min_list, const double *lat_out_max_list,
+			      const double *lon_out_avg, const int *n2_list, const double *lon_out_list,
+			      const double *lat_out_list, const int *maxxgrid,
+			      int *i_in, int *j_in, int *i_out, int *j_out, double *xgrid_area);
+int create_xgrid_2dx2d_order2_cells(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *mask_in,
+			      const double *area_in, const double *area_out,
+			      const double *lon_out_min_list, const double *lon_out_max_list,
+			      const double *lat_out_min_list, const double *lat_out_max_list,
+			      const double *lon_out_avg, const int *n2_list, const double *lon_out_list,
+			      const double *lat_out_list, const int *maxxgrid,
+			      int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat);
+int create_xgrid_great_circle_cells(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *x1, const double *y1, const double *z1, const double *area1,
+			      const double *x2, const double *y2, const double *z2, const double *area2,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat);
+
 #endif
@@ -59,4 +59,17 @@ int create_xgrid_great_circle_gpu(const int *nlon_input_cells, const int *nlat_i
                                   int *i_in, int *j_in, int *i_out, int *j_out,
                                   double *xgrid_area, double *xgrid_clon, double *xgrid_clat);
 
+int create_xgrid_2dx2d_order1_gpu_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+                                        const double *lon_in, const double *lat_in, const double *lon_out,
+                                        const double *lat_out, const double *mask_in, const int *maxxgrid,
+                                        int *i_in, int *j_in, int *i_out, int *j_out, double *xgrid_area);
+
+int create_xgrid_2dx2d_order2_gpu_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+                                        const double *lon_in, const double *lat_in, const double *lon_out,
+                                        const double *lat_out, const double *mask_in, const int *maxxgrid,
+                                        int *i_in, int *j_in, int *i_out, int *j_out,
+                                        double *xgrid_area, double *xgrid_clon, double *xgrid_clat);
+
+int xgrid_openacc_enabled(void);
+
 #endif
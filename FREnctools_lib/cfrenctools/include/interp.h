@@ -37,6 +37,10 @@ void conserve_interp(int nx_src, int ny_src, int nx_dst, int ny_dst, const doubl
 void conserve_interp_great_circle(int nx_src, int ny_src, int nx_dst, int ny_dst, const double *x_src,
 		     const double *y_src, const double *x_dst, const double *y_dst,
 		     const double *mask_src, const double *data_src, double *data_dst );
+void conserve_interp_accumulate(int nx_src, int ny_src, int nx_dst, int ny_dst, const double *x_src,
+				const double *y_src, const double *x_dst, const double *y_dst,
+				const double *mask_src, const double *data_src, int great_circle,
+				double *dst_area, double *dst_sum);
 void linear_vertical_interp(int nx, int ny, int nk1, int nk2, const double *grid1, const double *grid2,
 			    double *data1, double *data2);
 #endif
\ No newline at end of file
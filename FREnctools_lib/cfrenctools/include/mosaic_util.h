@@ -45,6 +45,17 @@ struct Node{
   struct Node *Next;
 };
 
+#ifndef MAXNODELIST
+#define MAXNODELIST 100
+#endif
+
+/* storage of the nodes of the clipping lists, owned by the caller so that
+   clipping can run concurrently from any number of threads */
+struct NodeList{
+  struct Node nodes[MAXNODELIST];
+  int curListPos;
+};
+
 
 void error_handler(const char *msg);
 int nearest_index(double value, const double *array, int ia);
@@ -81,16 +92,25 @@ int inside_a_polygon( double *lon1, double *lat1, int *npts, double *lon2, doubl
 
 void rewindList(void);
 struct Node *getNext();
+void rewindList_r(struct NodeList *nodes);
+struct Node *getNext_r(struct NodeList *nodes);
 void initNode(struct Node *node);
 void addEnd(struct Node *list, double x, double y, double z, int intersect, double u, int inbound, int inside);
+void addEnd_r(struct NodeList *nodes, struct Node *list, double x, double y, double z, int intersect, double u,
+              int inbound, int inside);
 int addIntersect(struct Node *list, double x, double y, double z, int intersect, double u1, double u2,
                 int inbound, int is1, int ie1, int is2, int ie2);
+int addIntersect_r(struct NodeList *nodes, struct Node *list, double x, double y, double z, int intersect,
+                   double u1, double u2, int inbound, int is1, int ie1, int is2, int ie2);
 void insertIntersect(struct Node *list, double x, double y, double z, double u1, double u2, int inbound,
                      double x2, double y2, double z2);
+void insertIntersect_r(struct NodeList *nodes, struct Node *list, double x, double y, double z, double u1,
+                       double u2, int inbound, double x2, double y2, double z2);
 int length(struct Node *list);
 int samePoint(double x1, double y1, double z1, double x2, double y2, double z2);
 int sameNode(struct Node node1, struct Node node2);
 void addNode(struct Node *list, struct Node nodeIn);
+void addNode_r(struct NodeList *nodes, struct Node *list, struct Node nodeIn);
 struct Node *getNode(struct Node *list, struct Node inNode);
 struct Node *getNextNode(struct Node *list);
 void copyNode(struct Node *node_out, struct Node node_in);
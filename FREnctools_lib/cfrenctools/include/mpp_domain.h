@@ -66,6 +66,7 @@ void mpp_global_field_int(domain2D domain, int sizex, int sizey, const int* ldat
 void mpp_global_field_double_3D(domain2D domain, int sizex, int sizey, int sizez,
 				const double* ldata, double* gdata);
 void mpp_global_field_all_double(domain2D domain, int sizex, int sizey, const double* ldata, double* gdata);
+void mpp_update_domain_double(domain2D domain, int halo, double *data);
 void mpp_gather_field_int(int lsize, int *ldata, int *gdata);
 void mpp_gather_field_double(int lsize, double *ldata, double *gdata);
 void mpp_gather_field_double_root(int lsize, double *ldata, double *gdata);
@@ -26,6 +26,9 @@ void create_gaussian_topog(int nx, int ny, const double *x, const double *y, dou
 			   double slope_y, double *depth);
 void create_idealized_topog( int nx, int ny, const double *x, const double *y,
 			     double bottom_depth, double min_depth, double *depth);
+/* copies the source topography rows jstart to jstart+nrows-1 into depth */
+typedef void (*topog_read_rows)(void *reader, int jstart, int nrows, double *depth);
+
 void create_realistic_topog(int nx_dst, int ny_dst, const double *x_dst, const double *y_dst, const char *vgrid_file, 
 			    const char* topog_file, const char* topog_field, double scale_factor,
 			    int tripolar_grid, int cyclic_x, int cyclic_y, 
@@ -35,7 +38,18 @@ void create_realistic_topog(int nx_dst, int ny_dst, const double *x_dst, const d
 			    int fill_isolated_cells, int dont_change_landmask, int kmt_min, double min_thickness,
 			    int open_very_this_cell, double fraction_full_cell, double *depth, 
                             int *num_levels, domain2D domain, int debug, int great_circle_algorithm,
-                int on_grid );
+                int on_grid, int block_rows );
+void create_realistic_topog_rows(int nx_dst, int ny_dst, const double *x_dst, const double *y_dst, const char *vgrid_file,
+				 int nx_src, int ny_src, const double *xt_src, const double *yt_src, double missing,
+				 topog_read_rows read_rows, void *reader, double scale_factor,
+				 int tripolar_grid, int cyclic_x, int cyclic_y,
+				 int fill_first_row, int filter_topog, int num_filter_pass,
+				 int smooth_topo_allow_deepening, int round_shallow, int fill_shallow,
+				 int deepen_shallow, int full_cell, int flat_bottom, int adjust_topo,
+				 int fill_isolated_cells, int dont_change_landmask, int kmt_min, double min_thickness,
+				 int open_very_this_cell, double fraction_full_cell, double *depth,
+				 int *num_levels, int debug, int use_great_circle_algorithm,
+				 int on_grid, int block_rows );
 
 void create_box_channel_topog(int nx, int ny, double basin_depth,
 			      double jwest_south, double jwest_north, double jeast_south,
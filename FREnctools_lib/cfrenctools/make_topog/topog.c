@@ -31,6 +31,17 @@
 
 
 const double deg2metre=111.324e3;
+void realistic_topog(int nx_dst, int ny_dst, const double *x_dst, const double *y_dst, const char *vgrid_file,
+		     int nx_src, int ny_src, const double *xt_src, const double *yt_src, double missing,
+		     topog_read_rows read_rows, void *reader, double scale_factor,
+		     int tripolar_grid, int cyclic_x, int cyclic_y,
+		     int fill_first_row, int filter_topog, int num_filter_pass,
+		     int smooth_topo_allow_deepening, int round_shallow, int fill_shallow,
+		     int deepen_shallow, int full_cell, int flat_bottom, int adjust_topo,
+		     int fill_isolated_cells, int dont_change_landmask, int kmt_min, double min_thickness,
+		     int open_very_this_cell, double fraction_full_cell, double *depth,
+		     int *num_levels, domain2D domain, int debug, int use_great_circle_algorithm,
+		     int on_grid, int block_rows );
 void filter_topo( int nx, int ny, int num_pass, int smooth_topo_allow_deepening, double *depth, domain2D domain);
 void set_depth(int nx, int ny, const double *xbnd, const double *ybnd, double alat1, double slon1,
 	       double elon1, double alat2, double slon2, double elon2, double depth_in, double *depth);
@@ -348,9 +359,47 @@ void set_depth(int nx, int ny, const double *xbnd, const double *ybnd, double al
 
 }; /* set_depth */
 
+/* source topography rows read from the netcdf field of create_realistic_topog */
+typedef struct {
+  int fid, vid, nx;
+  nc_type vartype;
+} topog_file_reader;
+
+/*********************************************************************
+   void read_topog_file_rows( )
+   reads the source rows jstart to jstart+nrows-1 of the netcdf field
+   described by the topog_file_reader reader into depth
+ ********************************************************************/
+void read_topog_file_rows(void *reader, int jstart, int nrows, double *depth)
+{
+  topog_file_reader *file = (topog_file_reader *)reader;
+  size_t start[4], nread[4];
+  int    *depth_int;
+  int    i;
+
+  for(i=0; i<4; i++) {
+     start[i] = 0;
+     nread[i] = 1;
+  }
+  start[0] = jstart;
+  nread[0] = nrows;
+  nread[1] = file->nx;
+  if(file->vartype == NC_INT) {
+     depth_int = (int *)malloc(file->nx*nrows*sizeof(int));
+     mpp_get_var_value_block(file->fid, file->vid, start, nread, depth_int);
+     for(i=0; i<file->nx*nrows; i++) depth[i] = depth_int[i];
+     free(depth_int);
+  }
+  else
+     mpp_get_var_value_block(file->fid, file->vid, start, nread, depth);
+
+}; /* read_topog_file_rows */
+
 /*********************************************************************
    void create_realistic_topog( )
    reading data from source data file topog_file and remap it onto current grid
+   the source is read block_rows rows at a time, block_rows <= 0 reads the
+   whole latitude band covering the current grid at once
  ********************************************************************/
 void create_realistic_topog(int nx_dst, int ny_dst, const double *x_dst, const double *y_dst, const char *vgrid_file,
 			    const char* topog_file, const char* topog_field, double scale_factor,
@@ -361,19 +410,114 @@ void create_realistic_topog(int nx_dst, int ny_dst, const double *x_dst, const d
 			    int fill_isolated_cells, int dont_change_landmask, int kmt_min, double min_thickness,
 			    int open_very_this_cell, double fraction_full_cell, double *depth,
 			    int *num_levels, domain2D domain, int debug, int use_great_circle_algorithm,
-                int on_grid )
+                int on_grid, int block_rows )
 {
   char xname[128], yname[128];
-  int nx_src, ny_src, nxp_src, nyp_src, i, j, count, n;
-  double *depth_src, *mask_src, *xt_src, *yt_src, *x_src, *y_src;
+  int nx_src, ny_src, vid;
+  double *xt_src, *yt_src;
+  double missing;
+  topog_file_reader file;
+
+  /* first read source topography data to get source grid and source topography */
+  file.fid = mpp_open(topog_file, MPP_READ);
+  file.vid = mpp_get_varid(file.fid, topog_field);
+  mpp_get_var_dimname(file.fid, file.vid, 1, xname);
+  mpp_get_var_dimname(file.fid, file.vid, 0, yname);
+  nx_src = mpp_get_dimlen( file.fid, xname );
+  ny_src = mpp_get_dimlen( file.fid, yname );
+  file.nx = nx_src;
+
+  xt_src    = (double *)malloc(nx_src*sizeof(double));
+  yt_src    = (double *)malloc(ny_src*sizeof(double));
+
+  mpp_get_var_att(file.fid, file.vid, "missing_value", &missing);
+  file.vartype = mpp_get_var_type(file.fid, file.vid);
+  if(file.vartype != NC_INT && file.vartype != NC_DOUBLE && file.vartype != NC_FLOAT)
+     mpp_error("topog.c: nc_type should be NC_DOUBLE, NC_FLOAT or NC_INT");
+  vid = mpp_get_varid(file.fid, xname);
+  mpp_get_var_value(file.fid, vid, xt_src);
+  vid = mpp_get_varid(file.fid, yname);
+  mpp_get_var_value(file.fid, vid, yt_src);
+
+  realistic_topog(nx_dst, ny_dst, x_dst, y_dst, vgrid_file, nx_src, ny_src, xt_src, yt_src, missing,
+		  read_topog_file_rows, &file, scale_factor, tripolar_grid, cyclic_x, cyclic_y,
+		  fill_first_row, filter_topog, num_filter_pass, smooth_topo_allow_deepening,
+		  round_shallow, fill_shallow, deepen_shallow, full_cell, flat_bottom, adjust_topo,
+		  fill_isolated_cells, dont_change_landmask, kmt_min, min_thickness, open_very_this_cell,
+		  fraction_full_cell, depth, num_levels, domain, debug, use_great_circle_algorithm,
+		  on_grid, block_rows);
+
+  mpp_close(file.fid);
+  free(xt_src);
+  free(yt_src);
+
+}; /* create_realistic_topog */
+
+/*********************************************************************
+   void create_realistic_topog_rows( )
+   same as create_realistic_topog on a single pe for a source topography
+   held by the caller, e.g. memory mapped or in shared memory. The source
+   grid has nx_src by ny_src cells centred at xt_src, yt_src, and read_rows
+   copies its rows jstart to jstart+nrows-1 into depth.
+ ********************************************************************/
+void create_realistic_topog_rows(int nx_dst, int ny_dst, const double *x_dst, const double *y_dst, const char *vgrid_file,
+				 int nx_src, int ny_src, const double *xt_src, const double *yt_src, double missing,
+				 topog_read_rows read_rows, void *reader, double scale_factor,
+				 int tripolar_grid, int cyclic_x, int cyclic_y,
+				 int fill_first_row, int filter_topog, int num_filter_pass,
+				 int smooth_topo_allow_deepening, int round_shallow, int fill_shallow,
+				 int deepen_shallow, int full_cell, int flat_bottom, int adjust_topo,
+				 int fill_isolated_cells, int dont_change_landmask, int kmt_min, double min_thickness,
+				 int open_very_this_cell, double fraction_full_cell, double *depth,
+				 int *num_levels, int debug, int use_great_circle_algorithm,
+				 int on_grid, int block_rows )
+{
+  domain2D domain;
+  int layout[2] = {1, 1};
+
+  if(mpp_npes() == 0) mpp_init(NULL, NULL);
+  mpp_domain_init();
+  mpp_define_domain2d(nx_dst, ny_dst, layout, 0, 0, &domain);
+
+  realistic_topog(nx_dst, ny_dst, x_dst, y_dst, vgrid_file, nx_src, ny_src, xt_src, yt_src, missing,
+		  read_rows, reader, scale_factor, tripolar_grid, cyclic_x, cyclic_y,
+		  fill_first_row, filter_topog, num_filter_pass, smooth_topo_allow_deepening,
+		  round_shallow, fill_shallow, deepen_shallow, full_cell, flat_bottom, adjust_topo,
+		  fill_isolated_cells, dont_change_landmask, kmt_min, min_thickness, open_very_this_cell,
+		  fraction_full_cell, depth, num_levels, domain, debug, use_great_circle_algorithm,
+		  on_grid, block_rows);
+
+  mpp_delete_domain2d(&domain);
+
+}; /* create_realistic_topog_rows */
+
+/*********************************************************************
+   void realistic_topog( )
+   remaps the source topography, whose rows are read with read_rows, onto
+   the current grid and processes it as described in create_realistic_topog
+ ********************************************************************/
+void realistic_topog(int nx_dst, int ny_dst, const double *x_dst, const double *y_dst, const char *vgrid_file,
+		     int nx_src, int ny_src, const double *xt_src, const double *yt_src, double missing,
+		     topog_read_rows read_rows, void *reader, double scale_factor,
+		     int tripolar_grid, int cyclic_x, int cyclic_y,
+		     int fill_first_row, int filter_topog, int num_filter_pass,
+		     int smooth_topo_allow_deepening, int round_shallow, int fill_shallow,
+		     int deepen_shallow, int full_cell, int flat_bottom, int adjust_topo,
+		     int fill_isolated_cells, int dont_change_landmask, int kmt_min, double min_thickness,
+		     int open_very_this_cell, double fraction_full_cell, double *depth,
+		     int *num_levels, domain2D domain, int debug, int use_great_circle_algorithm,
+		     int on_grid, int block_rows )
+{
+  int nxp_src, nyp_src, i, j;
+  double *depth_src, *mask_src, *x_src, *y_src;
   double *x_out, *y_out, *xc_src, *yc_src;
-  double missing, y_min, y_max, yy;
+  double y_min, y_max, yy;
   int    nzv, nk, k;
   double *zeta=NULL, *zw=NULL;
   int    jstart, jend, jj;
   int    fid, vid;
-  int    ny_now;
-  size_t start[4], nread[4];
+  int    ny_now, nblocks, jb, nrows;
+  double *dst_area=NULL, *dst_sum=NULL;
 
 
   /* read the vertical grid when vgrid_file is defined */
@@ -391,28 +535,11 @@ void create_realistic_topog(int nx_dst, int ny_dst, const double *x_dst, const d
     free(zeta);
   }
 
-  /* first read source topography data to get source grid and source topography */
-  fid = mpp_open(topog_file, MPP_READ);
-  vid = mpp_get_varid(fid, topog_field);
-  mpp_get_var_dimname(fid, vid, 1, xname);
-  mpp_get_var_dimname(fid, vid, 0, yname);
-  nx_src = mpp_get_dimlen( fid, xname );
-  ny_src = mpp_get_dimlen( fid, yname );
   nxp_src = nx_src + 1;
   nyp_src = ny_src + 1;
-
-  xt_src    = (double *)malloc(nx_src*sizeof(double));
-  yt_src    = (double *)malloc(ny_src*sizeof(double));
   xc_src    = (double *)malloc(nxp_src*sizeof(double));
   yc_src    = (double *)malloc(nyp_src*sizeof(double));
 
-  mpp_get_var_att(fid, vid, "missing_value", &missing);
-  vid = mpp_get_varid(fid, xname);
-  mpp_get_var_value(fid, vid, xt_src);
-  vid = mpp_get_varid(fid, yname);
-  mpp_get_var_value(fid, vid, yt_src);
-
-
   for(i=1; i<nx_src; i++) xc_src[i] = (xt_src[i-1] + xt_src[i])*0.5;
   xc_src[0] = 2*xt_src[0] - xc_src[1];
   xc_src[nx_src] = 2*xt_src[nx_src-1] - xc_src[nx_src-1];
@@ -448,76 +575,72 @@ void create_realistic_topog(int nx_dst, int ny_dst, const double *x_dst, const d
   jend   = min(ny_src-1, jend+1);
   ny_now = jend-jstart+1;
 
-  x_src    = (double *)malloc(nxp_src*(ny_now+1)*sizeof(double));
-  y_src    = (double *)malloc(nxp_src*(ny_now+1)*sizeof(double));
-  depth_src = (double *)malloc(nx_src*ny_now*sizeof(double));
-  mask_src = (double *)malloc(nx_src*ny_now*sizeof(double));
-
-  for(j=0; j<=ny_now; j++) {
-     jj = j+jstart;
-     for(i=0; i<nxp_src; i++) x_src[j*nxp_src+i] = xc_src[i];
-     for(i=0; i<nxp_src; i++) y_src[j*nxp_src+i] = yc_src[jj];
+  /* read and interpolate the source band block_rows rows at a time so the memory
+     used for the source data is bounded by the block size. A single block is
+     interpolated directly, otherwise the exchange grid contributions of each
+     block are accumulated and normalized once all blocks are read */
+  if(block_rows <= 0 || block_rows > ny_now) block_rows = ny_now;
+  nblocks = (ny_now + block_rows - 1)/block_rows;
+
+  x_src    = (double *)malloc(nxp_src*(block_rows+1)*sizeof(double));
+  y_src    = (double *)malloc(nxp_src*(block_rows+1)*sizeof(double));
+  depth_src = (double *)malloc(nx_src*block_rows*sizeof(double));
+  mask_src = (double *)malloc(nx_src*block_rows*sizeof(double));
+  if(nblocks > 1 && !on_grid) {
+    dst_area = (double *)calloc(nx_dst*ny_dst, sizeof(double));
+    dst_sum  = (double *)calloc(nx_dst*ny_dst, sizeof(double));
   }
 
+  if(on_grid) printf("We do no topography interpolation!\n");
 
-  for(i=0; i<4; i++) {
-     start[i] = 0;
-     nread[i] = 1;
-  }
-  start[0] = jstart;
-  nread[0] = ny_now;
-  nread[1] = nx_src;
-  vid = mpp_get_varid(fid, topog_field);
-  {
-     nc_type vartype;
-     int *depth_int=NULL;
-     vartype = mpp_get_var_type(fid, vid);
-     switch (vartype) {
-     case NC_DOUBLE:case NC_FLOAT:
-        mpp_get_var_value_block(fid, vid, start, nread, depth_src);
-        break;
-     case NC_INT:
-        depth_int = (int *)malloc(nx_src*ny_now*sizeof(int));
-        mpp_get_var_value_block(fid, vid, start, nread, depth_int);
-        for(i=0; i<nx_src*ny_now; i++) depth_src[i] = depth_int[i];
-        free(depth_int);
-        break;
-     default:
-        mpp_error("topog.c: nc_type should be NC_DOUBLE, NC_FLOAT or NC_INT");
-     }
-  }
+  for(jb=0; jb<ny_now; jb+=block_rows) {
+    nrows = min(block_rows, ny_now-jb);
+    for(j=0; j<=nrows; j++) {
+       jj = j+jb+jstart;
+       for(i=0; i<nxp_src; i++) x_src[j*nxp_src+i] = xc_src[i];
+       for(i=0; i<nxp_src; i++) y_src[j*nxp_src+i] = yc_src[jj];
+    }
 
-  mpp_close(fid);
+    read_rows(reader, jstart+jb, nrows, depth_src);
 
-  for(i=0; i<nx_src*ny_now; i++) {
-    if(depth_src[i] == missing)
-      mask_src[i] = 0.0;
-    else {
-      depth_src[i] = depth_src[i]*scale_factor;
-      if( depth_src[i] <= 0.0)
-	mask_src[i] = 0.0;
-      else
-	mask_src[i] = 1.0;
+    for(i=0; i<nx_src*nrows; i++) {
+      if(depth_src[i] == missing)
+        mask_src[i] = 0.0;
+      else {
+        depth_src[i] = depth_src[i]*scale_factor;
+        if( depth_src[i] <= 0.0)
+	  mask_src[i] = 0.0;
+        else
+	  mask_src[i] = 1.0;
+      }
+    }
+    if(on_grid) {
+       for(i=0; i<nx_src*nrows; i++) {
+          if(depth_src[i] == missing)
+            depth[jb*nx_src+i] = 0.0;
+          else
+            depth[jb*nx_src+i] = depth_src[i];
+       }
+    }
+    else if(nblocks == 1) {
+       if(use_great_circle_algorithm)
+         conserve_interp_great_circle(nx_src, nrows, nx_dst, ny_dst, x_src, y_src,
+	   	      x_out, y_out, mask_src, depth_src, depth );
+       else
+         conserve_interp(nx_src, nrows, nx_dst, ny_dst, x_src, y_src,
+	   	      x_out, y_out, mask_src, depth_src, depth );
     }
+    else
+       conserve_interp_accumulate(nx_src, nrows, nx_dst, ny_dst, x_src, y_src, x_out, y_out,
+				  mask_src, depth_src, use_great_circle_algorithm, dst_area, dst_sum);
+  }
+
+  if(nblocks > 1 && !on_grid) {
+    for(i=0; i<nx_dst*ny_dst; i++)
+      depth[i] = dst_area[i] > 0 ? dst_sum[i]/dst_area[i] : 0.0;
+    free(dst_area);
+    free(dst_sum);
   }
-  if(on_grid) {
-     printf("We do no topography interpolation!\n");
-     for(i=0; i<nx_src*ny_now; i++) {
-        if(depth_src[i] == missing)
-          depth[i] = 0.0;
-        else
-          depth[i] = depth_src[i];
-     }
-   }
-   else {
-
-     if(use_great_circle_algorithm)
-       conserve_interp_great_circle(nx_src, ny_now, nx_dst, ny_dst, x_src, y_src,
-	   	    x_out, y_out, mask_src, depth_src, depth );
-     else
-       conserve_interp(nx_src, ny_now, nx_dst, ny_dst, x_src, y_src,
-	   	    x_out, y_out, mask_src, depth_src, depth );
-   }
 
   if (filter_topog) filter_topo(nx_dst, ny_dst, num_filter_pass, smooth_topo_allow_deepening, depth, domain);
   if(debug) show_deepest(nk, zw, depth, domain);
@@ -541,12 +664,11 @@ void create_realistic_topog(int nx_dst, int ny_dst, const double *x_dst, const d
   free(y_src);
   free(xc_src);
   free(yc_src);
-  free(xt_src);
-  free(yt_src);
   free(x_out);
   free(y_out);
+  if(zw) free(zw);
 
-}; /* create_realistic_topog */
+}; /* realistic_topog */
 
 void process_topo(int nk, double *depth, int *num_levels, const double *zw,
 		  int tripolar_grid, int cyclic_x, int cyclic_y, int full_cell,
@@ -690,22 +812,22 @@ void process_topo(int nk, double *depth, int *num_levels, const double *zw,
 ********************************************************************/
 void filter_topo( int nx, int ny, int num_pass, int smooth_topo_allow_deepening, double *depth, domain2D domain)
 {
-  double *rmask, *s;
-  double *depth_global;
-  double f[9], d_old;
-  int n1, n2, i, j, n, m, ip, jp;
-  size_t *dims;
-  int is, ie, js, je, nxg, nyg, pos;
-
+  double *rmask, *d, *s, *tmp;
+  double f[9], d_old, sum;
+  int i, j, n, m, ip, jp, nxh, l;
+  int is, ie, js, je, nxg, nyg, i0, i1, j0, j1;
 
   mpp_get_compute_domain2d(domain, &is, &ie, &js, &je);
   if( ie-is+1 != nx && je-js+1 !=ny ) mpp_error("topog.c: nx and ny does not match compute domain");
   mpp_get_global_domain2d(domain, &nxg, &nyg);
-  depth_global = (double *)malloc(nxg*nyg*sizeof(double));
-  mpp_global_field_all_double(domain, nx, ny, depth, depth_global);
 
-  rmask = (double *)malloc(nxg*nyg*sizeof(double));
-  s     = (double *)malloc(nxg*nyg*sizeof(double));
+  /* the filter works on the compute domain with a halo of one point, which is
+     updated from the neighboring pe before each pass. d and s hold the depth
+     before and after a pass and are swapped between passes */
+  nxh = nx + 2;
+  rmask = (double *)malloc(nxh*(ny+2)*sizeof(double));
+  d     = (double *)malloc(nxh*(ny+2)*sizeof(double));
+  s     = (double *)malloc(nxh*(ny+2)*sizeof(double));
 
   /* 2D symmetric filter weights */
 
@@ -719,50 +841,59 @@ void filter_topo( int nx, int ny, int num_pass, int smooth_topo_allow_deepening,
   f[7] = 1.0/8.0;
   f[8] = 1.0/16.0;
 
+  for(i=0; i<nxh*(ny+2); i++) d[i] = 0.0;
+  for(j=0; j<ny; j++) for(i=0; i<nx; i++) d[(j+1)*nxh+i+1] = depth[j*nx+i];
+  mpp_update_domain_double(domain, 1, d);
+
   /* geometry mask */
-  for(i=0; i<nxg*nyg; i++) {
-    s[i] = depth_global[i];
-    if(depth_global[i] == 0.0)
+  for(i=0; i<nxh*(ny+2); i++) {
+    s[i] = d[i];
+    if(d[i] == 0.0)
       rmask[i] = 0.0;
     else
       rmask[i] = 1.0;
   }
 
-  for(n=1;n<=num_pass;n++) {
-    for(j=1;j<nyg-1;j++) {
-      for(i=1;i<nxg-1;i++) {
+  /* points on the boundary of the global domain are not filtered */
+  i0 = max(is, 1) - is + 1;
+  i1 = min(ie, nxg-2) - is + 1;
+  j0 = max(js, 1) - js + 1;
+  j1 = min(je, nyg-2) - js + 1;
 
-	      s[j*nxg+i] = 0.0;
-	      d_old = depth_global[j*nxg+i];
-
-	      for(ip=-1;ip<=1;ip++) {
-	        for(jp=-1;jp<=1;jp++) {
-	          m = (ip+1)*3 + jp+1;
-	          if (rmask[(j+jp)*nxg+i+ip] == 0.0)
-	            s[j*nxg+i] = s[j*nxg+i] + depth_global[j*nxg+i]*f[m];
+  for(n=1;n<=num_pass;n++) {
+    if(n > 1) mpp_update_domain_double(domain, 1, d);
+    for(j=j0;j<=j1;j++) {
+      for(i=i0;i<=i1;i++) {
+        l = j*nxh+i;
+        sum = 0.0;
+        d_old = d[l];
+
+        /* same order of summation as the global filter so results do not change */
+        for(ip=-1;ip<=1;ip++) {
+          for(jp=-1;jp<=1;jp++) {
+            m = (ip+1)*3 + jp+1;
+            if (rmask[l+jp*nxh+ip] == 0.0)
+              sum = sum + d_old*f[m];
             else
-	            s[j*nxg+i] = s[j*nxg+i] + depth_global[(j+jp)*nxg+i+ip]*f[m];
-	        }
-	      }
+              sum = sum + d[l+jp*nxh+ip]*f[m];
+          }
+        }
 
-      	if (! smooth_topo_allow_deepening) {
-	        if (s[j*nxg+i] > d_old)  s[j*nxg+i] = d_old;
-	      }
-	      s[j*nxg+i] = s[j*nxg+i]*rmask[j*nxg+i];
+        if (! smooth_topo_allow_deepening) {
+          if (sum > d_old)  sum = d_old;
+        }
+        s[l] = sum*rmask[l];
       }
     }
-    for(i=0; i<nxg*nyg; i++) depth_global[i] = s[i];
+    tmp = d;
+    d = s;
+    s = tmp;
   }
 
-  /* copy data back to local data */
-  pos = 0;
-  for(j=js; j<=je; j++) for(i=is; i<=ie; i++) {
-    depth[pos] = depth_global[j*nxg+i];
-    pos++;
-  }
+  for(j=0; j<ny; j++) for(i=0; i<nx; i++) depth[j*nx+i] = d[(j+1)*nxh+i+1];
 
-  free(depth_global);
   free(rmask);
+  free(d);
   free(s);
 
 }; /* filter_topog */
@@ -23,6 +23,9 @@
 #include "mosaic_util.h"
 #include "create_xgrid.h"
 #include "constant.h"
+#if defined(_OPENMP)
+#include <omp.h>
+#endif
 
 #define AREA_RATIO_THRESH (1.e-6)
 #define MASK_THRESH       (0.5)
@@ -52,6 +55,278 @@ int get_maxxgrid_(void)
   return get_maxxgrid();
 }
 
+/*******************************************************************************
+  Xgrid_block
+  exchange cells found by one chunk of work of the kernels. The arrays either
+  belong to the block and grow on demand, or wrap the caller's output arrays,
+  in which case cells past the capacity are counted but not stored.
+*******************************************************************************/
+typedef struct {
+  int n, size, owned, order2;
+  int *i_in, *j_in, *i_out, *j_out;
+  double *area, *clon, *clat;
+} Xgrid_block;
+
+static void xgrid_block_wrap(Xgrid_block *b, int size, int *i_in, int *j_in, int *i_out, int *j_out,
+			     double *area, double *clon, double *clat)
+{
+  b->n = 0;
+  b->size = size;
+  b->owned = 0;
+  b->order2 = (clon != NULL);
+  b->i_in = i_in; b->j_in = j_in; b->i_out = i_out; b->j_out = j_out;
+  b->area = area; b->clon = clon; b->clat = clat;
+}
+
+static void xgrid_block_init(Xgrid_block *b, int order2)
+{
+  xgrid_block_wrap(b, 0, NULL, NULL, NULL, NULL, NULL, NULL, NULL);
+  b->owned = 1;
+  b->order2 = order2;
+}
+
+static void xgrid_block_add(Xgrid_block *b, int i1, int j1, int i2, int j2,
+			    double area, double clon, double clat)
+{
+  if(b->n >= b->size) {
+    if(!b->owned) {
+      b->n++;
+      return;
+    }
+    b->size = b->size ? 2*b->size : 1024;
+    b->i_in  = (int *)realloc(b->i_in,  b->size*sizeof(int));
+    b->j_in  = (int *)realloc(b->j_in,  b->size*sizeof(int));
+    b->i_out = (int *)realloc(b->i_out, b->size*sizeof(int));
+    b->j_out = (int *)realloc(b->j_out, b->size*sizeof(int));
+    b->area  = (double *)realloc(b->area, b->size*sizeof(double));
+    if(b->order2) {
+      b->clon = (double *)realloc(b->clon, b->size*sizeof(double));
+      b->clat = (double *)realloc(b->clat, b->size*sizeof(double));
+    }
+    if(!b->i_in || !b->j_in || !b->i_out || !b->j_out || !b->area ||
+       (b->order2 && (!b->clon || !b->clat)))
+      error_handler("create_xgrid.c: failed to allocate exchange grid block");
+  }
+  b->i_in[b->n]  = i1;
+  b->j_in[b->n]  = j1;
+  b->i_out[b->n] = i2;
+  b->j_out[b->n] = j2;
+  b->area[b->n]  = area;
+  if(b->order2) {
+    b->clon[b->n] = clon;
+    b->clat[b->n] = clat;
+  }
+  b->n++;
+}
+
+/* copy the blocks, in order, into arrays holding maxxgrid cells and free them.
+   returns the total number of cells, which may exceed maxxgrid. */
+static int xgrid_block_merge(int nblocks, Xgrid_block *blocks, int maxxgrid, int *i_in, int *j_in,
+			     int *i_out, int *j_out, double *area, double *clon, double *clat)
+{
+  int m, i, nxgrid;
+
+  if(nblocks == 1 && !blocks[0].owned) return blocks[0].n;
+  nxgrid = 0;
+  for(m=0; m<nblocks; m++) {
+    Xgrid_block *b = blocks+m;
+    for(i=0; i<b->n; i++) {
+      if(nxgrid < maxxgrid) {
+	i_in[nxgrid]  = b->i_in[i];
+	j_in[nxgrid]  = b->j_in[i];
+	i_out[nxgrid] = b->i_out[i];
+	j_out[nxgrid] = b->j_out[i];
+	area[nxgrid]  = b->area[i];
+	if(clon) {
+	  clon[nxgrid] = b->clon[i];
+	  clat[nxgrid] = b->clat[i];
+	}
+      }
+      nxgrid++;
+    }
+    if(b->owned) {
+      free(b->i_in); free(b->j_in); free(b->i_out); free(b->j_out);
+      free(b->area); free(b->clon); free(b->clat);
+    }
+  }
+  return nxgrid;
+}
+
+/*******************************************************************************
+  The kernels split their outer loop over cells into many more chunks than
+  threads and hand the chunks out dynamically, so that threads drawing cheap
+  chunks (masked cells, polar rows, cells far from the other grid) take more
+  of them. Each chunk collects its exchange cells in its own block and the
+  blocks are merged in chunk order, so the exchange grid comes out in the same
+  order whatever the number of threads.
+*******************************************************************************/
+#define XGRID_CHUNKS_PER_THREAD 16
+
+/* number of threads of the kernels called from this thread, 0 for the OpenMP default */
+static int xgrid_max_threads = 0;
+#if defined(_OPENMP)
+#pragma omp threadprivate(xgrid_max_threads)
+#endif
+
+/*******************************************************************************
+  void set_xgrid_nthreads
+  Sets the number of threads used by the exchange grid kernels called from
+  the calling thread, 1 runs them serially and 0 restores the OpenMP default.
+*******************************************************************************/
+void set_xgrid_nthreads(const int *nthreads)
+{
+  xgrid_max_threads = *nthreads;
+}
+
+static int xgrid_nthreads(void)
+{
+#if defined(_OPENMP)
+  if(xgrid_max_threads > 0) return xgrid_max_threads;
+  return omp_get_max_threads();
+#else
+  return 1;
+#endif
+}
+
+static int xgrid_nchunks(int ncells)
+{
+  int nthreads, nchunks;
+
+  nthreads = xgrid_nthreads();
+  if(nthreads == 1 || ncells < 1) return 1;
+  nchunks = XGRID_CHUNKS_PER_THREAD*nthreads;
+  return (nchunks < ncells) ? nchunks : ncells;
+}
+
+/* first cell of chunk m when ncells cells are split into nchunks chunks */
+static int xgrid_chunk_start(int m, int nchunks, int ncells)
+{
+  return (int)(((long long)m*ncells)/nchunks);
+}
+
+/* a single chunk writes straight into the output arrays, otherwise every chunk
+   gets its own growable block */
+static Xgrid_block *xgrid_blocks_create(int nblocks, int maxxgrid, int *i_in, int *j_in, int *i_out,
+					int *j_out, double *area, double *clon, double *clat)
+{
+  Xgrid_block *blocks;
+  int m;
+
+  blocks = (Xgrid_block *)malloc(nblocks*sizeof(Xgrid_block));
+  if(nblocks == 1)
+    xgrid_block_wrap(blocks, maxxgrid, i_in, j_in, i_out, j_out, area, clon, clat);
+  else
+    for(m=0; m<nblocks; m++) xgrid_block_init(blocks+m, clon != NULL);
+  return blocks;
+}
+
+/*******************************************************************************
+  Xgrid_index
+  lat/lon bins over a range of output cells used by the 2dx2d kernels to find
+  the output cells whose bounding box may overlap an input cell. Longitudes are
+  binned modulo 2*PI, so the candidates are a superset of the cells passing the
+  bounding box tests in the kernels. Bins are stored in compressed row form:
+  the cells in bin b are cell[start[b]] ... cell[start[b+1]-1].
+*******************************************************************************/
+typedef struct {
+  int nlat, nlon, ij0, ncells;
+  double lat0, dlat, dlon;
+  int *start, *cell;
+} Xgrid_index;
+
+static void xgrid_index_bins(const Xgrid_index *idx, double lon_min, double lon_max, double lat_min,
+			     double lat_max, int *ja, int *jb, int *ka, int *kb)
+{
+  *ja = (int)floor((lat_min - idx->lat0)/idx->dlat);
+  *jb = (int)floor((lat_max - idx->lat0)/idx->dlat);
+  if(*ja < 0) *ja = 0;
+  if(*jb > idx->nlat-1) *jb = idx->nlat-1;
+  *ka = (int)floor(lon_min/idx->dlon);
+  *kb = (int)floor(lon_max/idx->dlon);
+  if(*kb - *ka >= idx->nlon-1) {
+    *ka = 0;
+    *kb = idx->nlon-1;
+  }
+}
+
+static void xgrid_index_init(Xgrid_index *idx, int ij0, int ij1, const double *lon_min_list,
+			     const double *lon_max_list, const double *lat_min_list, const double *lat_max_list)
+{
+  int ij, j, k, ja, jb, ka, kb, nbins;
+  double lat_min, lat_max;
+
+  idx->ij0 = ij0;
+  idx->ncells = ij1 - ij0 + 1;
+  lat_min = M_PI_2;
+  lat_max = -M_PI_2;
+  for(ij=ij0; ij<=ij1; ij++) {
+    lat_min = min(lat_min, lat_min_list[ij]);
+    lat_max = max(lat_max, lat_max_list[ij]);
+  }
+  /* about one cell per bin, with twice as many bins in longitude as in latitude */
+  idx->nlat = (int)sqrt(0.5*idx->ncells) + 1;
+  idx->nlon = 2*idx->nlat;
+  idx->lat0 = lat_min;
+  idx->dlat = (lat_max - lat_min)/idx->nlat;
+  if(idx->dlat <= 0) idx->dlat = M_PI/idx->nlat;
+  idx->dlon = TPI/idx->nlon;
+  nbins = idx->nlat*idx->nlon;
+
+  idx->start = (int *)calloc(nbins+1, sizeof(int));
+
+  /* count the cells in each bin, then fill the bins */
+  for(ij=ij0; ij<=ij1; ij++) {
+    xgrid_index_bins(idx, lon_min_list[ij], lon_max_list[ij], lat_min_list[ij], lat_max_list[ij], &ja, &jb, &ka, &kb);
+    for(j=ja; j<=jb; j++) for(k=ka; k<=kb; k++)
+      idx->start[j*idx->nlon + (k%idx->nlon + idx->nlon)%idx->nlon + 1]++;
+  }
+  for(k=0; k<nbins; k++) idx->start[k+1] += idx->start[k];
+  idx->cell = (int *)malloc(idx->start[nbins]*sizeof(int));
+  for(ij=ij0; ij<=ij1; ij++) {
+    xgrid_index_bins(idx, lon_min_list[ij], lon_max_list[ij], lat_min_list[ij], lat_max_list[ij], &ja, &jb, &ka, &kb);
+    for(j=ja; j<=jb; j++) for(k=ka; k<=kb; k++)
+      idx->cell[idx->start[j*idx->nlon + (k%idx->nlon + idx->nlon)%idx->nlon]++] = ij;
+  }
+  /* filling advanced start[b] to the end of bin b, shift it back */
+  for(k=nbins; k>0; k--) idx->start[k] = idx->start[k-1];
+  idx->start[0] = 0;
+}
+
+static int compare_int(const void *a, const void *b)
+{
+  return (*(const int *)a > *(const int *)b) - (*(const int *)a < *(const int *)b);
+}
+
+/* returns the number of candidate output cells for the input cell n1 in increasing
+   order in cand, so the exchange cells come out in the same order as a full scan.
+   stamp and cand hold ncells elements each and belong to the calling thread; stamp
+   starts out as -1 and marks the cells already listed for n1. */
+static int xgrid_index_query(const Xgrid_index *idx, int *stamp, int *cand, int n1, double lon_min,
+			     double lon_max, double lat_min, double lat_max)
+{
+  int j, k, l, ja, jb, ka, kb, b, ncand;
+
+  ncand = 0;
+  xgrid_index_bins(idx, lon_min, lon_max, lat_min, lat_max, &ja, &jb, &ka, &kb);
+  for(j=ja; j<=jb; j++) for(k=ka; k<=kb; k++) {
+    b = j*idx->nlon + (k%idx->nlon + idx->nlon)%idx->nlon;
+    for(l=idx->start[b]; l<idx->start[b+1]; l++) {
+      int ij = idx->cell[l];
+      if(stamp[ij-idx->ij0] == n1) continue;
+      stamp[ij-idx->ij0] = n1;
+      cand[ncand++] = ij;
+    }
+  }
+  qsort(cand, ncand, sizeof(int), compare_int);
+  return ncand;
+}
+
+static void xgrid_index_free(Xgrid_index *idx)
+{
+  free(idx->start);
+  free(idx->cell);
+}
+
 /*******************************************************************************
 void get_grid_area(const int *nlon, const int *nlat, const double *lon, const double *lat, const double *area)
   return the grid area.
@@ -100,6 +375,7 @@ void get_grid_great_circle_area(const int *nlon, const int *nlat, const double *
   int nx, ny, nxp, nyp, i, j, n_in;
   int n0, n1, n2, n3;
   double x_in[20], y_in[20], z_in[20];
+  struct NodeList nodes;
   struct Node *grid=NULL;
   double *x=NULL, *y=NULL, *z=NULL;
 
@@ -121,12 +397,12 @@ void get_grid_great_circle_area(const int *nlon, const int *nlat, const double *
     n1 = (j+1)*nxp+i;
     n2 = (j+1)*nxp+i+1;
     n3 = j*nxp+i+1;
-    rewindList();
-    grid = getNext();
-    addEnd(grid, x[n0], y[n0], z[n0], 0, 0, 0, -1);
-    addEnd(grid, x[n1], y[n1], z[n1], 0, 0, 0, -1);
-    addEnd(grid, x[n2], y[n2], z[n2], 0, 0, 0, -1);
-    addEnd(grid, x[n3], y[n3], z[n3], 0, 0, 0, -1);
+    rewindList_r(&nodes);
+    grid = getNext_r(&nodes);
+    addEnd_r(&nodes, grid, x[n0], y[n0], z[n0], 0, 0, 0, -1);
+    addEnd_r(&nodes, grid, x[n1], y[n1], z[n1], 0, 0, 0, -1);
+    addEnd_r(&nodes, grid, x[n2], y[n2], z[n2], 0, 0, 0, -1);
+    addEnd_r(&nodes, grid, x[n3], y[n3], z[n3], 0, 0, 0, -1);
     area[j*nx+i] = gridArea(grid);
   }
 
@@ -137,6 +413,58 @@ void get_grid_great_circle_area(const int *nlon, const int *nlat, const double *
 };  /* get_grid_great_circle_area */
 
 
+/*******************************************************************************
+  void get_grid_cells_2dx2d
+  Per cell preprocessing of a grid for the 2dx2d kernels: the latitude and
+  longitude bounds, the average longitude and the cell vertices after fix_lon,
+  at most MAX_V per cell. The arrays only depend on the grid, so callers that
+  remap repeatedly against the same grid can compute them once.
+*******************************************************************************/
+void get_grid_cells_2dx2d(const int *nlon, const int *nlat, const double *lon, const double *lat,
+			  double *lon_min_list, double *lon_max_list, double *lat_min_list,
+			  double *lat_max_list, double *lon_avg, int *n_list, double *lon_list,
+			  double *lat_list)
+{
+  int nx, ny, nxp, ij;
+
+  nx = *nlon;
+  ny = *nlat;
+  nxp = nx + 1;
+
+#if defined(_OPENMP)
+#pragma omp parallel for num_threads(xgrid_nthreads()) default(none) shared(nx,ny,nxp,lon,lat,lat_min_list, \
+                                              lat_max_list,lon_min_list,lon_max_list, \
+                                              lon_avg,n_list,lon_list,lat_list)
+#endif
+  for(ij=0; ij<nx*ny; ij++){
+    int i, j, n0, n1, n2, n3, n_in, l;
+    double x_in[MV], y_in[MV];
+    i = ij%nx;
+    j = ij/nx;
+    n0 = j*nxp+i; n1 = j*nxp+i+1;
+    n2 = (j+1)*nxp+i+1; n3 = (j+1)*nxp+i;
+    x_in[0] = lon[n0]; y_in[0] = lat[n0];
+    x_in[1] = lon[n1]; y_in[1] = lat[n1];
+    x_in[2] = lon[n2]; y_in[2] = lat[n2];
+    x_in[3] = lon[n3]; y_in[3] = lat[n3];
+
+    lat_min_list[ij] = minval_double(4, y_in);
+    lat_max_list[ij] = maxval_double(4, y_in);
+    n_in = fix_lon(x_in, y_in, 4, M_PI);
+    if(n_in > MAX_V) error_handler("create_xgrid.c: n2_in is greater than MAX_V");
+    lon_min_list[ij] = minval_double(n_in, x_in);
+    lon_max_list[ij] = maxval_double(n_in, x_in);
+    lon_avg[ij] = avgval_double(n_in, x_in);
+    n_list[ij] = n_in;
+    for(l=0; l<n_in; l++) {
+      lon_list[ij*MAX_V+l] = x_in[l];
+      lat_list[ij*MAX_V+l] = y_in[l];
+    }
+  }
+
+};  /* get_grid_cells_2dx2d */
+
+
 void get_grid_area_dimensionless(const int *nlon, const int *nlat, const double *lon, const double *lat, double *area)
 {
   int nx, ny, nxp, i, j, n_in;
@@ -205,24 +533,23 @@ int create_xgrid_1dx2d_order1_(const int *nlon_in, const int *nlat_in, const int
 
 };
 
-int create_xgrid_1dx2d_order1(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out, const double *lon_in,
+int create_xgrid_1dx2d_order1_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out, const double *lon_in,
 			      const double *lat_in, const double *lon_out, const double *lat_out,
-			      const double *mask_in, int *i_in, int *j_in, int *i_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out,
 			      int *j_out, double *xgrid_area)
 {
 
   int nx1, ny1, nx2, ny2, nx1p, nx2p;
-  int i1, j1, i2, j2, nxgrid;
-  double ll_lon, ll_lat, ur_lon, ur_lat, x_in[MV], y_in[MV], x_out[MV], y_out[MV];
-  double *area_in, *area_out, min_area;
+  int i1, j1, m, nchunks, nxgrid;
+  double *area_in, *area_out;
   double *tmpx, *tmpy;
+  Xgrid_block *blocks;
 
   nx1 = *nlon_in;
   ny1 = *nlat_in;
   nx2 = *nlon_out;
   ny2 = *nlat_out;
 
-  nxgrid = 0;
   nx1p = nx1 + 1;
   nx2p = nx2 + 1;
 
@@ -245,45 +572,57 @@ int create_xgrid_1dx2d_order1(const int *nlon_in, const int *nlat_in, const int
   free(tmpx);
   free(tmpy);
 
-  for(j1=0; j1<ny1; j1++) for(i1=0; i1<nx1; i1++) if( mask_in[j1*nx1+i1] > MASK_THRESH ) {
-
-    ll_lon = lon_in[i1];   ll_lat = lat_in[j1];
-    ur_lon = lon_in[i1+1]; ur_lat = lat_in[j1+1];
-    for(j2=0; j2<ny2; j2++) for(i2=0; i2<nx2; i2++) {
-      int n_in, n_out;
-      double Xarea;
-
-      y_in[0] = lat_out[j2*nx2p+i2];
-      y_in[1] = lat_out[j2*nx2p+i2+1];
-      y_in[2] = lat_out[(j2+1)*nx2p+i2+1];
-      y_in[3] = lat_out[(j2+1)*nx2p+i2];
-      if (  (y_in[0]<=ll_lat) && (y_in[1]<=ll_lat)
-	    && (y_in[2]<=ll_lat) && (y_in[3]<=ll_lat) ) continue;
-      if (  (y_in[0]>=ur_lat) && (y_in[1]>=ur_lat)
-	    && (y_in[2]>=ur_lat) && (y_in[3]>=ur_lat) ) continue;
-
-      x_in[0] = lon_out[j2*nx2p+i2];
-      x_in[1] = lon_out[j2*nx2p+i2+1];
-      x_in[2] = lon_out[(j2+1)*nx2p+i2+1];
-      x_in[3] = lon_out[(j2+1)*nx2p+i2];
-      n_in = fix_lon(x_in, y_in, 4, (ll_lon+ur_lon)/2);
-
-      if ( (n_out = clip ( x_in, y_in, n_in, ll_lon, ll_lat, ur_lon, ur_lat, x_out, y_out )) > 0 ) {
-	Xarea = poly_area (x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
-	min_area = min(area_in[j1*nx1+i1], area_out[j2*nx2+i2]);
-	if( Xarea/min_area > AREA_RATIO_THRESH ) {
-      	  xgrid_area[nxgrid] = Xarea;
-	  i_in[nxgrid]    = i1;
-	  j_in[nxgrid]    = j1;
-	  i_out[nxgrid]   = i2;
-	  j_out[nxgrid]   = j2;
-	  ++nxgrid;
-	  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  nchunks = xgrid_nchunks(nx1*ny1);
+  blocks = xgrid_blocks_create(nchunks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, NULL, NULL);
+
+#if defined(_OPENMP)
+#pragma omp parallel for schedule(dynamic) num_threads(xgrid_nthreads()) default(none) shared(nchunks,nx1,ny1,nx2,ny2,nx2p,lon_in,lat_in, \
+                                              lon_out,lat_out,mask_in,area_in,area_out,blocks)
+#endif
+  for(m=0; m<nchunks; m++) {
+    int n1, n1_end;
+
+    n1_end = xgrid_chunk_start(m+1, nchunks, nx1*ny1);
+    for(n1=xgrid_chunk_start(m, nchunks, nx1*ny1); n1<n1_end; n1++) {
+      int i1, j1, i2, j2;
+      double ll_lon, ll_lat, ur_lon, ur_lat, x_in[MV], y_in[MV], x_out[MV], y_out[MV];
+
+      if( mask_in[n1] <= MASK_THRESH ) continue;
+      i1 = n1%nx1;
+      j1 = n1/nx1;
+      ll_lon = lon_in[i1];   ll_lat = lat_in[j1];
+      ur_lon = lon_in[i1+1]; ur_lat = lat_in[j1+1];
+      for(j2=0; j2<ny2; j2++) for(i2=0; i2<nx2; i2++) {
+	int n_in, n_out;
+	double Xarea, min_area;
+
+	y_in[0] = lat_out[j2*nx2p+i2];
+	y_in[1] = lat_out[j2*nx2p+i2+1];
+	y_in[2] = lat_out[(j2+1)*nx2p+i2+1];
+	y_in[3] = lat_out[(j2+1)*nx2p+i2];
+	if (  (y_in[0]<=ll_lat) && (y_in[1]<=ll_lat)
+	      && (y_in[2]<=ll_lat) && (y_in[3]<=ll_lat) ) continue;
+	if (  (y_in[0]>=ur_lat) && (y_in[1]>=ur_lat)
+	      && (y_in[2]>=ur_lat) && (y_in[3]>=ur_lat) ) continue;
+
+	x_in[0] = lon_out[j2*nx2p+i2];
+	x_in[1] = lon_out[j2*nx2p+i2+1];
+	x_in[2] = lon_out[(j2+1)*nx2p+i2+1];
+	x_in[3] = lon_out[(j2+1)*nx2p+i2];
+	n_in = fix_lon(x_in, y_in, 4, (ll_lon+ur_lon)/2);
+
+	if ( (n_out = clip ( x_in, y_in, n_in, ll_lon, ll_lat, ur_lon, ur_lat, x_out, y_out )) > 0 ) {
+	  Xarea = poly_area (x_out, y_out, n_out ) * mask_in[n1];
+	  min_area = min(area_in[n1], area_out[j2*nx2+i2]);
+	  if( Xarea/min_area > AREA_RATIO_THRESH )
+	    xgrid_block_add(blocks+m, i1, j1, i2, j2, Xarea, 0, 0);
 	}
       }
     }
   }
 
+  nxgrid = xgrid_block_merge(nchunks, blocks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, NULL, NULL);
+  free(blocks);
   free(area_in);
   free(area_out);
 
@@ -291,6 +630,21 @@ int create_xgrid_1dx2d_order1(const int *nlon_in, const int *nlat_in, const int
 
 }; /* create_xgrid_1dx2d_order1 */
 
+int create_xgrid_1dx2d_order1(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, int *i_in, int *j_in, int *i_out,
+			      int *j_out, double *xgrid_area)
+{
+  int nxgrid, maxxgrid = MAXXGRID;
+
+  nxgrid = create_xgrid_1dx2d_order1_sized(nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, lon_out, lat_out, mask_in,
+			       &maxxgrid, i_in, j_in, i_out, j_out, xgrid_area);
+  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  return nxgrid;
+
+};
+
+
 
 /********************************************************************************
   void create_xgrid_1dx2d_order2
@@ -309,24 +663,23 @@ int create_xgrid_1dx2d_order2_(const int *nlon_in, const int *nlat_in, const int
   return nxgrid;
 
 };
-int create_xgrid_1dx2d_order2(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+int create_xgrid_1dx2d_order2_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
 			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
-			      const double *mask_in, int *i_in, int *j_in, int *i_out, int *j_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
 			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
 {
 
   int nx1, ny1, nx2, ny2, nx1p, nx2p;
-  int i1, j1, i2, j2, nxgrid, n;
-  double ll_lon, ll_lat, ur_lon, ur_lat, x_in[MV], y_in[MV], x_out[MV], y_out[MV];
-  double *area_in, *area_out, min_area;
+  int i1, j1, m, nchunks, nxgrid;
+  double *area_in, *area_out;
   double *tmpx, *tmpy;
+  Xgrid_block *blocks;
 
   nx1 = *nlon_in;
   ny1 = *nlat_in;
   nx2 = *nlon_out;
   ny2 = *nlat_out;
 
-  nxgrid = 0;
   nx1p = nx1 + 1;
   nx2p = nx2 + 1;
 
@@ -343,47 +696,62 @@ int create_xgrid_1dx2d_order2(const int *nlon_in, const int *nlat_in, const int
   free(tmpx);
   free(tmpy);
 
-  for(j1=0; j1<ny1; j1++) for(i1=0; i1<nx1; i1++) if( mask_in[j1*nx1+i1] > MASK_THRESH ) {
-
-    ll_lon = lon_in[i1];   ll_lat = lat_in[j1];
-    ur_lon = lon_in[i1+1]; ur_lat = lat_in[j1+1];
-    for(j2=0; j2<ny2; j2++) for(i2=0; i2<nx2; i2++) {
-      int n_in, n_out;
-      double xarea, lon_in_avg;
-
-      y_in[0] = lat_out[j2*nx2p+i2];
-      y_in[1] = lat_out[j2*nx2p+i2+1];
-      y_in[2] = lat_out[(j2+1)*nx2p+i2+1];
-      y_in[3] = lat_out[(j2+1)*nx2p+i2];
-      if (  (y_in[0]<=ll_lat) && (y_in[1]<=ll_lat)
-	    && (y_in[2]<=ll_lat) && (y_in[3]<=ll_lat) ) continue;
-      if (  (y_in[0]>=ur_lat) && (y_in[1]>=ur_lat)
-	    && (y_in[2]>=ur_lat) && (y_in[3]>=ur_lat) ) continue;
-
-      x_in[0] = lon_out[j2*nx2p+i2];
-      x_in[1] = lon_out[j2*nx2p+i2+1];
-      x_in[2] = lon_out[(j2+1)*nx2p+i2+1];
-      x_in[3] = lon_out[(j2+1)*nx2p+i2];
-      n_in = fix_lon(x_in, y_in, 4, (ll_lon+ur_lon)/2);
-      lon_in_avg = avgval_double(n_in, x_in);
-
-      if (  (n_out = clip ( x_in, y_in, n_in, ll_lon, ll_lat, ur_lon, ur_lat, x_out, y_out )) > 0 ) {
-	xarea = poly_area (x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
-        min_area = min(area_in[j1*nx1+i1], area_out[j2*nx2+i2]);
-	if(xarea/min_area > AREA_RATIO_THRESH ) {
-	  xgrid_area[nxgrid] = xarea;
-	  xgrid_clon[nxgrid] = poly_ctrlon(x_out, y_out, n_out, lon_in_avg);
-	  xgrid_clat[nxgrid] = poly_ctrlat (x_out, y_out, n_out );
-	  i_in[nxgrid]    = i1;
-	  j_in[nxgrid]    = j1;
-	  i_out[nxgrid]   = i2;
-	  j_out[nxgrid]   = j2;
-	  ++nxgrid;
-	  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  nchunks = xgrid_nchunks(nx1*ny1);
+  blocks = xgrid_blocks_create(nchunks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
+
+#if defined(_OPENMP)
+#pragma omp parallel for schedule(dynamic) num_threads(xgrid_nthreads()) default(none) shared(nchunks,nx1,ny1,nx2,ny2,nx2p,lon_in,lat_in, \
+                                              lon_out,lat_out,mask_in,area_in,area_out,blocks)
+#endif
+  for(m=0; m<nchunks; m++) {
+    int n1, n1_end;
+
+    n1_end = xgrid_chunk_start(m+1, nchunks, nx1*ny1);
+    for(n1=xgrid_chunk_start(m, nchunks, nx1*ny1); n1<n1_end; n1++) {
+      int i1, j1, i2, j2;
+      double ll_lon, ll_lat, ur_lon, ur_lat, x_in[MV], y_in[MV], x_out[MV], y_out[MV];
+
+      if( mask_in[n1] <= MASK_THRESH ) continue;
+      i1 = n1%nx1;
+      j1 = n1/nx1;
+      ll_lon = lon_in[i1];   ll_lat = lat_in[j1];
+      ur_lon = lon_in[i1+1]; ur_lat = lat_in[j1+1];
+      for(j2=0; j2<ny2; j2++) for(i2=0; i2<nx2; i2++) {
+	int n_in, n_out;
+	double xarea, min_area, lon_in_avg;
+
+	y_in[0] = lat_out[j2*nx2p+i2];
+	y_in[1] = lat_out[j2*nx2p+i2+1];
+	y_in[2] = lat_out[(j2+1)*nx2p+i2+1];
+	y_in[3] = lat_out[(j2+1)*nx2p+i2];
+	if (  (y_in[0]<=ll_lat) && (y_in[1]<=ll_lat)
+	      && (y_in[2]<=ll_lat) && (y_in[3]<=ll_lat) ) continue;
+	if (  (y_in[0]>=ur_lat) && (y_in[1]>=ur_lat)
+	      && (y_in[2]>=ur_lat) && (y_in[3]>=ur_lat) ) continue;
+
+	x_in[0] = lon_out[j2*nx2p+i2];
+	x_in[1] = lon_out[j2*nx2p+i2+1];
+	x_in[2] = lon_out[(j2+1)*nx2p+i2+1];
+	x_in[3] = lon_out[(j2+1)*nx2p+i2];
+	n_in = fix_lon(x_in, y_in, 4, (ll_lon+ur_lon)/2);
+	/* centroids are taken relative to the input cell, as in the other order2 kernels,
+	   so that all exchange cells of an input cell share the same reference longitude */
+	lon_in_avg = (ll_lon+ur_lon)/2;
+
+	if (  (n_out = clip ( x_in, y_in, n_in, ll_lon, ll_lat, ur_lon, ur_lat, x_out, y_out )) > 0 ) {
+	  xarea = poly_area (x_out, y_out, n_out ) * mask_in[n1];
+	  min_area = min(area_in[n1], area_out[j2*nx2+i2]);
+	  if(xarea/min_area > AREA_RATIO_THRESH )
+	    xgrid_block_add(blocks+m, i1, j1, i2, j2, xarea, poly_ctrlon(x_out, y_out, n_out, lon_in_avg),
+			    poly_ctrlat(x_out, y_out, n_out));
 	}
       }
     }
   }
+
+  nxgrid = xgrid_block_merge(nchunks, blocks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area,
+			     xgrid_clon, xgrid_clat);
+  free(blocks);
   free(area_in);
   free(area_out);
 
@@ -391,6 +759,21 @@ int create_xgrid_1dx2d_order2(const int *nlon_in, const int *nlat_in, const int
 
 }; /* create_xgrid_1dx2d_order2 */
 
+int create_xgrid_1dx2d_order2(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
+{
+  int nxgrid, maxxgrid = MAXXGRID;
+
+  nxgrid = create_xgrid_1dx2d_order2_sized(nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, lon_out, lat_out, mask_in,
+			       &maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
+  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  return nxgrid;
+
+};
+
+
 /*******************************************************************************
   void create_xgrid_2dx1d_order1
   This routine generate exchange grids between two grids for the first order
@@ -410,24 +793,23 @@ int create_xgrid_2dx1d_order1_(const int *nlon_in, const int *nlat_in, const int
   return nxgrid;
 
 };
-int create_xgrid_2dx1d_order1(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out, const double *lon_in,
+int create_xgrid_2dx1d_order1_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out, const double *lon_in,
 			      const double *lat_in, const double *lon_out, const double *lat_out,
-			      const double *mask_in, int *i_in, int *j_in, int *i_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out,
 			      int *j_out, double *xgrid_area)
 {
 
   int nx1, ny1, nx2, ny2, nx1p, nx2p;
-  int i1, j1, i2, j2, nxgrid;
-  double ll_lon, ll_lat, ur_lon, ur_lat, x_in[MV], y_in[MV], x_out[MV], y_out[MV];
-  double *area_in, *area_out, min_area;
+  int i2, j2, m, nchunks, nxgrid;
+  double *area_in, *area_out;
   double *tmpx, *tmpy;
+  Xgrid_block *blocks;
 
   nx1 = *nlon_in;
   ny1 = *nlat_in;
   nx2 = *nlon_out;
   ny2 = *nlat_out;
 
-  nxgrid = 0;
   nx1p = nx1 + 1;
   nx2p = nx2 + 1;
   area_in = (double *)malloc(nx1*ny1*sizeof(double));
@@ -444,46 +826,57 @@ int create_xgrid_2dx1d_order1(const int *nlon_in, const int *nlat_in, const int
   free(tmpx);
   free(tmpy);
 
-  for(j2=0; j2<ny2; j2++) for(i2=0; i2<nx2; i2++) {
-
-    ll_lon = lon_out[i2];   ll_lat = lat_out[j2];
-    ur_lon = lon_out[i2+1]; ur_lat = lat_out[j2+1];
-    for(j1=0; j1<ny1; j1++) for(i1=0; i1<nx1; i1++) if( mask_in[j1*nx1+i1] > MASK_THRESH ) {
-      int n_in, n_out;
-      double Xarea;
-
-      y_in[0] = lat_in[j1*nx1p+i1];
-      y_in[1] = lat_in[j1*nx1p+i1+1];
-      y_in[2] = lat_in[(j1+1)*nx1p+i1+1];
-      y_in[3] = lat_in[(j1+1)*nx1p+i1];
-      if (  (y_in[0]<=ll_lat) && (y_in[1]<=ll_lat)
-	    && (y_in[2]<=ll_lat) && (y_in[3]<=ll_lat) ) continue;
-      if (  (y_in[0]>=ur_lat) && (y_in[1]>=ur_lat)
-	    && (y_in[2]>=ur_lat) && (y_in[3]>=ur_lat) ) continue;
-
-      x_in[0] = lon_in[j1*nx1p+i1];
-      x_in[1] = lon_in[j1*nx1p+i1+1];
-      x_in[2] = lon_in[(j1+1)*nx1p+i1+1];
-      x_in[3] = lon_in[(j1+1)*nx1p+i1];
-
-      n_in = fix_lon(x_in, y_in, 4, (ll_lon+ur_lon)/2);
-
-      if ( (n_out = clip ( x_in, y_in, n_in, ll_lon, ll_lat, ur_lon, ur_lat, x_out, y_out )) > 0 ) {
-	Xarea = poly_area ( x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
-	min_area = min(area_in[j1*nx1+i1], area_out[j2*nx2+i2]);
-	if( Xarea/min_area > AREA_RATIO_THRESH ) {
-      	  xgrid_area[nxgrid] = Xarea;
-	  i_in[nxgrid]    = i1;
-	  j_in[nxgrid]    = j1;
-	  i_out[nxgrid]   = i2;
-	  j_out[nxgrid]   = j2;
-	  ++nxgrid;
-	  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  nchunks = xgrid_nchunks(nx2*ny2);
+  blocks = xgrid_blocks_create(nchunks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, NULL, NULL);
+
+#if defined(_OPENMP)
+#pragma omp parallel for schedule(dynamic) num_threads(xgrid_nthreads()) default(none) shared(nchunks,nx1,ny1,nx1p,nx2,ny2,lon_in,lat_in, \
+                                              lon_out,lat_out,mask_in,area_in,area_out,blocks)
+#endif
+  for(m=0; m<nchunks; m++) {
+    int n2, n2_end;
+
+    n2_end = xgrid_chunk_start(m+1, nchunks, nx2*ny2);
+    for(n2=xgrid_chunk_start(m, nchunks, nx2*ny2); n2<n2_end; n2++) {
+      int i1, j1, i2, j2;
+      double ll_lon, ll_lat, ur_lon, ur_lat, x_in[MV], y_in[MV], x_out[MV], y_out[MV];
+
+      i2 = n2%nx2;
+      j2 = n2/nx2;
+      ll_lon = lon_out[i2];   ll_lat = lat_out[j2];
+      ur_lon = lon_out[i2+1]; ur_lat = lat_out[j2+1];
+      for(j1=0; j1<ny1; j1++) for(i1=0; i1<nx1; i1++) if( mask_in[j1*nx1+i1] > MASK_THRESH ) {
+	int n_in, n_out;
+	double xarea, min_area;
+
+	y_in[0] = lat_in[j1*nx1p+i1];
+	y_in[1] = lat_in[j1*nx1p+i1+1];
+	y_in[2] = lat_in[(j1+1)*nx1p+i1+1];
+	y_in[3] = lat_in[(j1+1)*nx1p+i1];
+	if (  (y_in[0]<=ll_lat) && (y_in[1]<=ll_lat)
+	      && (y_in[2]<=ll_lat) && (y_in[3]<=ll_lat) ) continue;
+	if (  (y_in[0]>=ur_lat) && (y_in[1]>=ur_lat)
+	      && (y_in[2]>=ur_lat) && (y_in[3]>=ur_lat) ) continue;
+
+	x_in[0] = lon_in[j1*nx1p+i1];
+	x_in[1] = lon_in[j1*nx1p+i1+1];
+	x_in[2] = lon_in[(j1+1)*nx1p+i1+1];
+	x_in[3] = lon_in[(j1+1)*nx1p+i1];
+
+	n_in = fix_lon(x_in, y_in, 4, (ll_lon+ur_lon)/2);
+
+	if ( (n_out = clip ( x_in, y_in, n_in, ll_lon, ll_lat, ur_lon, ur_lat, x_out, y_out )) > 0 ) {
+	  xarea = poly_area ( x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
+	  min_area = min(area_in[j1*nx1+i1], area_out[n2]);
+	  if( xarea/min_area > AREA_RATIO_THRESH )
+	    xgrid_block_add(blocks+m, i1, j1, i2, j2, xarea, 0, 0);
 	}
       }
     }
   }
 
+  nxgrid = xgrid_block_merge(nchunks, blocks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, NULL, NULL);
+  free(blocks);
   free(area_in);
   free(area_out);
 
@@ -491,6 +884,21 @@ int create_xgrid_2dx1d_order1(const int *nlon_in, const int *nlat_in, const int
 
 }; /* create_xgrid_2dx1d_order1 */
 
+int create_xgrid_2dx1d_order1(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, int *i_in, int *j_in, int *i_out,
+			      int *j_out, double *xgrid_area)
+{
+  int nxgrid, maxxgrid = MAXXGRID;
+
+  nxgrid = create_xgrid_2dx1d_order1_sized(nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, lon_out, lat_out, mask_in,
+			       &maxxgrid, i_in, j_in, i_out, j_out, xgrid_area);
+  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  return nxgrid;
+
+};
+
+
 
 /********************************************************************************
   void create_xgrid_2dx1d_order2
@@ -511,30 +919,27 @@ int create_xgrid_2dx1d_order2_(const int *nlon_in, const int *nlat_in, const int
 
 };
 
-int create_xgrid_2dx1d_order2(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+int create_xgrid_2dx1d_order2_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
 			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
-			      const double *mask_in, int *i_in, int *j_in, int *i_out, int *j_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
 			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
 {
 
   int nx1, ny1, nx2, ny2, nx1p, nx2p;
-  int i1, j1, i2, j2, nxgrid, n;
-  double ll_lon, ll_lat, ur_lon, ur_lat, x_in[MV], y_in[MV], x_out[MV], y_out[MV];
+  int i2, j2, m, nchunks, nxgrid;
+  double *area_in, *area_out;
   double *tmpx, *tmpy;
-  double *area_in, *area_out, min_area;
-  double  lon_in_avg;
+  Xgrid_block *blocks;
 
   nx1 = *nlon_in;
   ny1 = *nlat_in;
   nx2 = *nlon_out;
   ny2 = *nlat_out;
 
-  nxgrid = 0;
   nx1p = nx1 + 1;
   nx2p = nx2 + 1;
-
-  area_in      = (double *)malloc(nx1*ny1*sizeof(double));
-  area_out     = (double *)malloc(nx2*ny2*sizeof(double));
+  area_in = (double *)malloc(nx1*ny1*sizeof(double));
+  area_out = (double *)malloc(nx2*ny2*sizeof(double));
   tmpx = (double *)malloc((nx2+1)*(ny2+1)*sizeof(double));
   tmpy = (double *)malloc((nx2+1)*(ny2+1)*sizeof(double));
   for(j2=0; j2<=ny2; j2++) for(i2=0; i2<=nx2; i2++) {
@@ -547,49 +952,59 @@ int create_xgrid_2dx1d_order2(const int *nlon_in, const int *nlat_in, const int
   free(tmpx);
   free(tmpy);
 
-  for(j2=0; j2<ny2; j2++) for(i2=0; i2<nx2; i2++) {
-
-    ll_lon = lon_out[i2];   ll_lat = lat_out[j2];
-    ur_lon = lon_out[i2+1]; ur_lat = lat_out[j2+1];
-    for(j1=0; j1<ny1; j1++) for(i1=0; i1<nx1; i1++) if( mask_in[j1*nx1+i1] > MASK_THRESH ) {
-      int n_in, n_out;
-      double xarea;
-
-      y_in[0] = lat_in[j1*nx1p+i1];
-      y_in[1] = lat_in[j1*nx1p+i1+1];
-      y_in[2] = lat_in[(j1+1)*nx1p+i1+1];
-      y_in[3] = lat_in[(j1+1)*nx1p+i1];
-      if (  (y_in[0]<=ll_lat) && (y_in[1]<=ll_lat)
-	    && (y_in[2]<=ll_lat) && (y_in[3]<=ll_lat) ) continue;
-      if (  (y_in[0]>=ur_lat) && (y_in[1]>=ur_lat)
-	    && (y_in[2]>=ur_lat) && (y_in[3]>=ur_lat) ) continue;
-
-      x_in[0] = lon_in[j1*nx1p+i1];
-      x_in[1] = lon_in[j1*nx1p+i1+1];
-      x_in[2] = lon_in[(j1+1)*nx1p+i1+1];
-      x_in[3] = lon_in[(j1+1)*nx1p+i1];
-
-      n_in = fix_lon(x_in, y_in, 4, (ll_lon+ur_lon)/2);
-      lon_in_avg = avgval_double(n_in, x_in);
-
-      if (  (n_out = clip ( x_in, y_in, n_in, ll_lon, ll_lat, ur_lon, ur_lat, x_out, y_out )) > 0 ) {
-	xarea = poly_area (x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
-	min_area = min(area_in[j1*nx1+i1], area_out[j2*nx2+i2]);
-	if(xarea/min_area > AREA_RATIO_THRESH ) {
-	  xgrid_area[nxgrid] = xarea;
-	  xgrid_clon[nxgrid] = poly_ctrlon(x_out, y_out, n_out, lon_in_avg);
-	  xgrid_clat[nxgrid] = poly_ctrlat (x_out, y_out, n_out );
-	  i_in[nxgrid]  = i1;
-	  j_in[nxgrid]  = j1;
-	  i_out[nxgrid] = i2;
-	  j_out[nxgrid] = j2;
-	  ++nxgrid;
-	  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  nchunks = xgrid_nchunks(nx2*ny2);
+  blocks = xgrid_blocks_create(nchunks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
+
+#if defined(_OPENMP)
+#pragma omp parallel for schedule(dynamic) num_threads(xgrid_nthreads()) default(none) shared(nchunks,nx1,ny1,nx1p,nx2,ny2,lon_in,lat_in, \
+                                              lon_out,lat_out,mask_in,area_in,area_out,blocks)
+#endif
+  for(m=0; m<nchunks; m++) {
+    int n2, n2_end;
+
+    n2_end = xgrid_chunk_start(m+1, nchunks, nx2*ny2);
+    for(n2=xgrid_chunk_start(m, nchunks, nx2*ny2); n2<n2_end; n2++) {
+      int i1, j1, i2, j2;
+      double ll_lon, ll_lat, ur_lon, ur_lat, x_in[MV], y_in[MV], x_out[MV], y_out[MV];
+
+      i2 = n2%nx2;
+      j2 = n2/nx2;
+      ll_lon = lon_out[i2];   ll_lat = lat_out[j2];
+      ur_lon = lon_out[i2+1]; ur_lat = lat_out[j2+1];
+      for(j1=0; j1<ny1; j1++) for(i1=0; i1<nx1; i1++) if( mask_in[j1*nx1+i1] > MASK_THRESH ) {
+	int n_in, n_out;
+	double xarea, min_area, lon_in_avg;
+
+	y_in[0] = lat_in[j1*nx1p+i1];
+	y_in[1] = lat_in[j1*nx1p+i1+1];
+	y_in[2] = lat_in[(j1+1)*nx1p+i1+1];
+	y_in[3] = lat_in[(j1+1)*nx1p+i1];
+	if (  (y_in[0]<=ll_lat) && (y_in[1]<=ll_lat)
+	      && (y_in[2]<=ll_lat) && (y_in[3]<=ll_lat) ) continue;
+	if (  (y_in[0]>=ur_lat) && (y_in[1]>=ur_lat)
+	      && (y_in[2]>=ur_lat) && (y_in[3]>=ur_lat) ) continue;
+
+	x_in[0] = lon_in[j1*nx1p+i1];
+	x_in[1] = lon_in[j1*nx1p+i1+1];
+	x_in[2] = lon_in[(j1+1)*nx1p+i1+1];
+	x_in[3] = lon_in[(j1+1)*nx1p+i1];
+
+	n_in = fix_lon(x_in, y_in, 4, (ll_lon+ur_lon)/2);
+	lon_in_avg = avgval_double(n_in, x_in);
+
+	if ( (n_out = clip ( x_in, y_in, n_in, ll_lon, ll_lat, ur_lon, ur_lat, x_out, y_out )) > 0 ) {
+	  xarea = poly_area ( x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
+	  min_area = min(area_in[j1*nx1+i1], area_out[n2]);
+	  if( xarea/min_area > AREA_RATIO_THRESH )
+	    xgrid_block_add(blocks+m, i1, j1, i2, j2, xarea, poly_ctrlon(x_out, y_out, n_out, lon_in_avg),
+			    poly_ctrlat(x_out, y_out, n_out));
 	}
       }
     }
   }
 
+  nxgrid = xgrid_block_merge(nchunks, blocks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
+  free(blocks);
   free(area_in);
   free(area_out);
 
@@ -597,6 +1012,21 @@ int create_xgrid_2dx1d_order2(const int *nlon_in, const int *nlat_in, const int
 
 }; /* create_xgrid_2dx1d_order2 */
 
+int create_xgrid_2dx1d_order2(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
+{
+  int nxgrid, maxxgrid = MAXXGRID;
+
+  nxgrid = create_xgrid_2dx1d_order2_sized(nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, lon_out, lat_out, mask_in,
+			       &maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
+  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  return nxgrid;
+
+};
+
+
 /*******************************************************************************
   void create_xgrid_2DX2D_order1
   This routine generate exchange grids between two grids for the first order
@@ -618,85 +1048,162 @@ int create_xgrid_2dx2d_order1_(const int *nlon_in, const int *nlat_in, const int
 
 };
 #endif
-int create_xgrid_2dx2d_order1(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
-			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
-			      const double *mask_in, int *i_in, int *j_in, int *i_out,
+/*******************************************************************************
+  create_xgrid_2dx2d_order1_cells
+  Same as create_xgrid_2dx2d_order1_sized, with the cell areas of both grids
+  and the output grid cells from get_grid_cells_2dx2d computed by the caller.
+*******************************************************************************/
+int create_xgrid_2dx2d_order1_cells(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *mask_in,
+			      const double *area_in, const double *area_out,
+			      const double *lon_out_min_list, const double *lon_out_max_list,
+			      const double *lat_out_min_list, const double *lat_out_max_list,
+			      const double *lon_out_avg, const int *n2_list, const double *lon_out_list,
+			      const double *lat_out_list, const int *maxxgrid,
+			      int *i_in, int *j_in, int *i_out,
 			      int *j_out, double *xgrid_area)
 {
-
-#define MAX_V 8
-  int nx1, nx2, ny1, ny2, nx1p, nx2p, nxgrid;
-  double *area_in, *area_out;
-  int nblocks =1;
-  int *istart2=NULL, *iend2=NULL;
-  int npts_left, nblks_left, pos, m, npts_my, ij;
-  double *lon_out_min_list,*lon_out_max_list,*lon_out_avg,*lat_out_min_list,*lat_out_max_list;
-  double *lon_out_list, *lat_out_list;
-  int *pnxgrid=NULL, *pstart;
-  int *pi_in=NULL, *pj_in=NULL, *pi_out=NULL, *pj_out=NULL;
-  double *pxgrid_area=NULL;
-  int    *n2_list;
-  int nthreads, nxgrid_block_max;
+  int nx1, nx2, ny1, ny2, nx1p, nxgrid;
+  int nchunks;
+  Xgrid_block *blocks=NULL;
+  Xgrid_index idx;
 
   nx1 = *nlon_in;
   ny1 = *nlat_in;
   nx2 = *nlon_out;
   ny2 = *nlat_out;
   nx1p = nx1 + 1;
-  nx2p = nx2 + 1;
 
-  area_in  = (double *)malloc(nx1*ny1*sizeof(double));
-  area_out = (double *)malloc(nx2*ny2*sizeof(double));
-  get_grid_area(nlon_in, nlat_in, lon_in, lat_in, area_in);
-  get_grid_area(nlon_out, nlat_out, lon_out, lat_out, area_out);
+  /* one index over all output cells, shared by the chunks of input cells */
+  xgrid_index_init(&idx, 0, nx2*ny2-1, lon_out_min_list, lon_out_max_list,
+		   lat_out_min_list, lat_out_max_list);
+  nchunks = xgrid_nchunks(nx1*ny1);
+  blocks = xgrid_blocks_create(nchunks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, NULL, NULL);
 
-  nthreads = 1;
 #if defined(_OPENMP)
-#pragma omp parallel
-  nthreads = omp_get_num_threads();
+#pragma omp parallel num_threads(xgrid_nthreads()) default(none) shared(nchunks,nx1,ny1,nx1p,mask_in,lon_in,lat_in,idx, \
+                                          nx2,ny2,lat_out_min_list,lat_out_max_list, \
+                                          n2_list,lon_out_list,lat_out_list,lon_out_min_list, \
+                                          lon_out_max_list,lon_out_avg,area_in,area_out,blocks)
 #endif
+  {
+    int *stamp, *cand, m, l;
 
-  nblocks = nthreads;
+    /* scratch space of the index queries, one per thread */
+    stamp = (int *)malloc(nx2*ny2*sizeof(int));
+    cand  = (int *)malloc(nx2*ny2*sizeof(int));
+    for(l=0; l<nx2*ny2; l++) stamp[l] = -1;
 
-  istart2 = (int *)malloc(nblocks*sizeof(int));
-  iend2 = (int *)malloc(nblocks*sizeof(int));
+#if defined(_OPENMP)
+#pragma omp for schedule(dynamic)
+#endif
+    for(m=0; m<nchunks; m++) {
+      int ij1, ij1_end;
+
+      ij1_end = xgrid_chunk_start(m+1, nchunks, nx1*ny1);
+      for(ij1=xgrid_chunk_start(m, nchunks, nx1*ny1); ij1<ij1_end; ij1++) {
+	int i1, j1, ij, k, ncand;
+	int n0, n1, n2, n3, l,n1_in;
+	double lat_in_min,lat_in_max,lon_in_min,lon_in_max,lon_in_avg;
+	double x1_in[MV], y1_in[MV], x_out[MV], y_out[MV];
+
+	if( mask_in[ij1] <= MASK_THRESH ) continue;
+	i1 = ij1%nx1;
+	j1 = ij1/nx1;
+
+	n0 = j1*nx1p+i1;       n1 = j1*nx1p+i1+1;
+	n2 = (j1+1)*nx1p+i1+1; n3 = (j1+1)*nx1p+i1;
+	x1_in[0] = lon_in[n0]; y1_in[0] = lat_in[n0];
+	x1_in[1] = lon_in[n1]; y1_in[1] = lat_in[n1];
+	x1_in[2] = lon_in[n2]; y1_in[2] = lat_in[n2];
+	x1_in[3] = lon_in[n3]; y1_in[3] = lat_in[n3];
+	lat_in_min = minval_double(4, y1_in);
+	lat_in_max = maxval_double(4, y1_in);
+	n1_in = fix_lon(x1_in, y1_in, 4, M_PI);
+	lon_in_min = minval_double(n1_in, x1_in);
+	lon_in_max = maxval_double(n1_in, x1_in);
+	lon_in_avg = avgval_double(n1_in, x1_in);
+	ncand = xgrid_index_query(&idx, stamp, cand, ij1, lon_in_min, lon_in_max, lat_in_min, lat_in_max);
+	for(k=0; k<ncand; k++) {
+	  int n_in, n_out, i2, j2, n2_in;
+	  double xarea, dx, lon_out_min, lon_out_max;
+	  double x2_in[MAX_V], y2_in[MAX_V];
+
+	  ij = cand[k];
+
+	  i2 = ij%nx2;
+	  j2 = ij/nx2;
+
+	  if(lat_out_min_list[ij] >= lat_in_max || lat_out_max_list[ij] <= lat_in_min ) continue;
+	  /* adjust x2_in according to lon_in_avg*/
+	  n2_in = n2_list[ij];
+	  for(l=0; l<n2_in; l++) {
+	    x2_in[l] = lon_out_list[ij*MAX_V+l];
+	    y2_in[l] = lat_out_list[ij*MAX_V+l];
+	  }
+	  lon_out_min = lon_out_min_list[ij];
+	  lon_out_max = lon_out_max_list[ij];
+	  dx = lon_out_avg[ij] - lon_in_avg;
+	  if(dx < -M_PI ) {
+	    lon_out_min += TPI;
+	    lon_out_max += TPI;
+	    for (l=0; l<n2_in; l++) x2_in[l] += TPI;
+	  }
+	  else if (dx >  M_PI) {
+	    lon_out_min -= TPI;
+	    lon_out_max -= TPI;
+	    for (l=0; l<n2_in; l++) x2_in[l] -= TPI;
+	  }
 
-  pstart = (int *)malloc(nblocks*sizeof(int));
-  pnxgrid = (int *)malloc(nblocks*sizeof(int));
+	  /* x2_in should in the same range as x1_in after lon_fix, so no need to
+	     consider cyclic condition
+	  */
+	  if(lon_out_min >= lon_in_max || lon_out_max <= lon_in_min ) continue;
+	  if (  (n_out = clip_2dx2d( x1_in, y1_in, n1_in, x2_in, y2_in, n2_in, x_out, y_out )) > 0) {
+	    double min_area;
+	    xarea = poly_area (x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
+	    min_area = min(area_in[j1*nx1+i1], area_out[j2*nx2+i2]);
+	    if( xarea/min_area > AREA_RATIO_THRESH )
+	      xgrid_block_add(blocks+m, i1, j1, i2, j2, xarea, 0, 0);
 
-  nxgrid_block_max = MAXXGRID/nblocks;
+	  }
 
-  for(m=0; m<nblocks; m++) {
-    pnxgrid[m] = 0;
-    pstart[m] = m*nxgrid_block_max;
+	}
+      }
+    }
+    free(stamp);
+    free(cand);
   }
+  xgrid_index_free(&idx);
 
-  if(nblocks == 1) {
-    pi_in = i_in;
-    pj_in = j_in;
-    pi_out = i_out;
-    pj_out = j_out;
-    pxgrid_area = xgrid_area;
-  }
-  else {
-    pi_in = (int *)malloc(MAXXGRID*sizeof(int));
-    pj_in = (int *)malloc(MAXXGRID*sizeof(int));
-    pi_out = (int *)malloc(MAXXGRID*sizeof(int));
-    pj_out = (int *)malloc(MAXXGRID*sizeof(int));
-    pxgrid_area = (double *)malloc(MAXXGRID*sizeof(double));
-  }
+  nxgrid = xgrid_block_merge(nchunks, blocks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area,
+                             NULL, NULL);
+  free(blocks);
 
-  npts_left = nx2*ny2;
-  nblks_left = nblocks;
-  pos = 0;
-  for(m=0; m<nblocks; m++) {
-    istart2[m] = pos;
-    npts_my = npts_left/nblks_left;
-    iend2[m] = istart2[m] + npts_my - 1;
-    pos = iend2[m] + 1;
-    npts_left -= npts_my;
-    nblks_left--;
-  }
+  return nxgrid;
+
+};/* create_xgrid_2dx2d_order1_cells */
+
+int create_xgrid_2dx2d_order1_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out,
+			      int *j_out, double *xgrid_area)
+{
+  int nx1, nx2, ny1, ny2, nxgrid;
+  double *area_in, *area_out;
+  double *lon_out_min_list,*lon_out_max_list,*lon_out_avg,*lat_out_min_list,*lat_out_max_list;
+  double *lon_out_list, *lat_out_list;
+  int    *n2_list;
+
+  nx1 = *nlon_in;
+  ny1 = *nlat_in;
+  nx2 = *nlon_out;
+  ny2 = *nlat_out;
+
+  area_in  = (double *)malloc(nx1*ny1*sizeof(double));
+  area_out = (double *)malloc(nx2*ny2*sizeof(double));
+  get_grid_area(nlon_in, nlat_in, lon_in, lat_in, area_in);
+  get_grid_area(nlon_out, nlat_out, lon_out, lat_out, area_out);
 
   lon_out_min_list = (double *)malloc(nx2*ny2*sizeof(double));
   lon_out_max_list = (double *)malloc(nx2*ny2*sizeof(double));
@@ -706,154 +1213,13 @@ int create_xgrid_2dx2d_order1(const int *nlon_in, const int *nlat_in, const int
   n2_list     = (int *)malloc(nx2*ny2*sizeof(int));
   lon_out_list = (double *)malloc(MAX_V*nx2*ny2*sizeof(double));
   lat_out_list = (double *)malloc(MAX_V*nx2*ny2*sizeof(double));
-#if defined(_OPENMP)
-#pragma omp parallel for default(none) shared(nx2,ny2,nx2p,lon_out,lat_out,lat_out_min_list, \
-                                              lat_out_max_list,lon_out_min_list,lon_out_max_list, \
-                                              lon_out_avg,n2_list,lon_out_list,lat_out_list)
-#endif
-  for(ij=0; ij<nx2*ny2; ij++){
-    int i2, j2, n, n0, n1, n2, n3, n2_in, l;
-    double x2_in[MV], y2_in[MV];
-    i2 = ij%nx2;
-    j2 = ij/nx2;
-    n = j2*nx2+i2;
-    n0 = j2*nx2p+i2; n1 = j2*nx2p+i2+1;
-    n2 = (j2+1)*nx2p+i2+1; n3 = (j2+1)*nx2p+i2;
-    x2_in[0] = lon_out[n0]; y2_in[0] = lat_out[n0];
-    x2_in[1] = lon_out[n1]; y2_in[1] = lat_out[n1];
-    x2_in[2] = lon_out[n2]; y2_in[2] = lat_out[n2];
-    x2_in[3] = lon_out[n3]; y2_in[3] = lat_out[n3];
-
-    lat_out_min_list[n] = minval_double(4, y2_in);
-    lat_out_max_list[n] = maxval_double(4, y2_in);
-    n2_in = fix_lon(x2_in, y2_in, 4, M_PI);
-    if(n2_in > MAX_V) error_handler("create_xgrid.c: n2_in is greater than MAX_V");
-    lon_out_min_list[n] = minval_double(n2_in, x2_in);
-    lon_out_max_list[n] = maxval_double(n2_in, x2_in);
-    lon_out_avg[n] = avgval_double(n2_in, x2_in);
-    n2_list[n] = n2_in;
-    for(l=0; l<n2_in; l++) {
-      lon_out_list[n*MAX_V+l] = x2_in[l];
-      lat_out_list[n*MAX_V+l] = y2_in[l];
-    }
-  }
+  get_grid_cells_2dx2d(nlon_out, nlat_out, lon_out, lat_out, lon_out_min_list, lon_out_max_list,
+		       lat_out_min_list, lat_out_max_list, lon_out_avg, n2_list, lon_out_list, lat_out_list);
 
-nxgrid = 0;
-
-#if defined(_OPENMP)
-#pragma omp parallel for default(none) shared(nblocks,nx1,ny1,nx1p,mask_in,lon_in,lat_in, \
-                                              istart2,iend2,nx2,lat_out_min_list,lat_out_max_list, \
-                                              n2_list,lon_out_list,lat_out_list,lon_out_min_list, \
-                                              lon_out_max_list,lon_out_avg,area_in,area_out, \
-                                              pxgrid_area,pnxgrid,pi_in,pj_in,pi_out,pj_out,pstart,nthreads)
-#endif
-  for(m=0; m<nblocks; m++) {
-    int i1, j1, ij;
-    for(j1=0; j1<ny1; j1++) for(i1=0; i1<nx1; i1++) if( mask_in[j1*nx1+i1] > MASK_THRESH ) {
-      int n0, n1, n2, n3, l,n1_in;
-      double lat_in_min,lat_in_max,lon_in_min,lon_in_max,lon_in_avg;
-      double x1_in[MV], y1_in[MV], x_out[MV], y_out[MV];
-
-      n0 = j1*nx1p+i1;       n1 = j1*nx1p+i1+1;
-      n2 = (j1+1)*nx1p+i1+1; n3 = (j1+1)*nx1p+i1;
-      x1_in[0] = lon_in[n0]; y1_in[0] = lat_in[n0];
-      x1_in[1] = lon_in[n1]; y1_in[1] = lat_in[n1];
-      x1_in[2] = lon_in[n2]; y1_in[2] = lat_in[n2];
-      x1_in[3] = lon_in[n3]; y1_in[3] = lat_in[n3];
-      lat_in_min = minval_double(4, y1_in);
-      lat_in_max = maxval_double(4, y1_in);
-      n1_in = fix_lon(x1_in, y1_in, 4, M_PI);
-      lon_in_min = minval_double(n1_in, x1_in);
-      lon_in_max = maxval_double(n1_in, x1_in);
-      lon_in_avg = avgval_double(n1_in, x1_in);
-      for(ij=istart2[m]; ij<=iend2[m]; ij++) {
-	int n_in, n_out, i2, j2, n2_in;
-	double xarea, dx, lon_out_min, lon_out_max;
-	double x2_in[MAX_V], y2_in[MAX_V];
-
-	i2 = ij%nx2;
-	j2 = ij/nx2;
-
-	if(lat_out_min_list[ij] >= lat_in_max || lat_out_max_list[ij] <= lat_in_min ) continue;
-	/* adjust x2_in according to lon_in_avg*/
-	n2_in = n2_list[ij];
-	for(l=0; l<n2_in; l++) {
-	  x2_in[l] = lon_out_list[ij*MAX_V+l];
-	  y2_in[l] = lat_out_list[ij*MAX_V+l];
-	}
-	lon_out_min = lon_out_min_list[ij];
-	lon_out_max = lon_out_max_list[ij];
-        dx = lon_out_avg[ij] - lon_in_avg;
-	if(dx < -M_PI ) {
-	  lon_out_min += TPI;
-	  lon_out_max += TPI;
-	  for (l=0; l<n2_in; l++) x2_in[l] += TPI;
-	}
-        else if (dx >  M_PI) {
-	  lon_out_min -= TPI;
-	  lon_out_max -= TPI;
-	  for (l=0; l<n2_in; l++) x2_in[l] -= TPI;
-	}
-
-	/* x2_in should in the same range as x1_in after lon_fix, so no need to
-	   consider cyclic condition
-	*/
-	if(lon_out_min >= lon_in_max || lon_out_max <= lon_in_min ) continue;
-	if (  (n_out = clip_2dx2d( x1_in, y1_in, n1_in, x2_in, y2_in, n2_in, x_out, y_out )) > 0) {
-          double min_area;
-	  int    nn;
-	  xarea = poly_area (x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
-	  min_area = min(area_in[j1*nx1+i1], area_out[j2*nx2+i2]);
-	  if( xarea/min_area > AREA_RATIO_THRESH ) {
-	    pnxgrid[m]++;
-            if(pnxgrid[m]>= MAXXGRID/nthreads)
-	      error_handler("The xgrid size is too large for resources.\n"
-        " nxgrid is greater than MAXXGRID/nthreads; increase MAXXGRID,\n"
-        " decrease nthreads, or increase number of MPI ranks.");
-	    nn = pstart[m] + pnxgrid[m]-1;
-
-	    pxgrid_area[nn] = xarea;
-	    pi_in[nn]       = i1;
-	    pj_in[nn]       = j1;
-	    pi_out[nn]      = i2;
-	    pj_out[nn]      = j2;
-	  }
-
-	}
-
-      }
-    }
-  }
-
-  /*copy data if nblocks > 1 */
-  if(nblocks == 1) {
-    nxgrid = pnxgrid[0];
-    pi_in = NULL;
-    pj_in = NULL;
-    pi_out = NULL;
-    pj_out = NULL;
-    pxgrid_area = NULL;
-  }
-  else {
-    int nn, i;
-    nxgrid = 0;
-    for(m=0; m<nblocks; m++) {
-      for(i=0; i<pnxgrid[m]; i++) {
-	nn = pstart[m] + i;
-	i_in[nxgrid] = pi_in[nn];
-	j_in[nxgrid] = pj_in[nn];
-	i_out[nxgrid] = pi_out[nn];
-	j_out[nxgrid] = pj_out[nn];
-	xgrid_area[nxgrid] = pxgrid_area[nn];
-	nxgrid++;
-      }
-    }
-    free(pi_in);
-    free(pj_in);
-    free(pi_out);
-    free(pj_out);
-    free(pxgrid_area);
-  }
+  nxgrid = create_xgrid_2dx2d_order1_cells(nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, mask_in,
+				       area_in, area_out, lon_out_min_list, lon_out_max_list,
+				       lat_out_min_list, lat_out_max_list, lon_out_avg, n2_list,
+				       lon_out_list, lat_out_list, maxxgrid, i_in, j_in, i_out, j_out, xgrid_area);
 
   free(area_in);
   free(area_out);
@@ -870,6 +1236,21 @@ nxgrid = 0;
 
 };/* get_xgrid_2Dx2D_order1 */
 
+int create_xgrid_2dx2d_order1(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, int *i_in, int *j_in, int *i_out,
+			      int *j_out, double *xgrid_area)
+{
+  int nxgrid, maxxgrid = MAXXGRID;
+
+  nxgrid = create_xgrid_2dx2d_order1_sized(nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, lon_out, lat_out, mask_in,
+			       &maxxgrid, i_in, j_in, i_out, j_out, xgrid_area);
+  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  return nxgrid;
+
+};
+
+
 /********************************************************************************
   void create_xgrid_2dx1d_order2
   This routine generate exchange grids between two grids for the second order
@@ -890,90 +1271,161 @@ int create_xgrid_2dx2d_order2_(const int *nlon_in, const int *nlat_in, const int
 
 };
 #endif
-int create_xgrid_2dx2d_order2(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
-			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
-			      const double *mask_in, int *i_in, int *j_in, int *i_out, int *j_out,
+/*******************************************************************************
+  create_xgrid_2dx2d_order2_cells
+  Same as create_xgrid_2dx2d_order2_sized, with the cell areas of both grids
+  and the output grid cells from get_grid_cells_2dx2d computed by the caller.
+*******************************************************************************/
+int create_xgrid_2dx2d_order2_cells(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *mask_in,
+			      const double *area_in, const double *area_out,
+			      const double *lon_out_min_list, const double *lon_out_max_list,
+			      const double *lat_out_min_list, const double *lat_out_max_list,
+			      const double *lon_out_avg, const int *n2_list, const double *lon_out_list,
+			      const double *lat_out_list, const int *maxxgrid,
+			      int *i_in, int *j_in, int *i_out, int *j_out,
 			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
 {
-
-#define MAX_V 8
-  int nx1, nx2, ny1, ny2, nx1p, nx2p, nxgrid;
-  double xctrlon, xctrlat;
-  double *area_in, *area_out;
-  int nblocks =1;
-  int *istart2=NULL, *iend2=NULL;
-  int npts_left, nblks_left, pos, m, npts_my, ij;
-  double *lon_out_min_list,*lon_out_max_list,*lon_out_avg,*lat_out_min_list,*lat_out_max_list;
-  double *lon_out_list, *lat_out_list;
-  int *pnxgrid=NULL, *pstart;
-  int *pi_in=NULL, *pj_in=NULL, *pi_out=NULL, *pj_out=NULL;
-  double *pxgrid_area=NULL, *pxgrid_clon=NULL, *pxgrid_clat=NULL;
-  int    *n2_list;
-  int nthreads, nxgrid_block_max;
+  int nx1, nx2, ny1, ny2, nx1p, nxgrid;
+  int nchunks;
+  Xgrid_block *blocks=NULL;
+  Xgrid_index idx;
 
   nx1 = *nlon_in;
   ny1 = *nlat_in;
   nx2 = *nlon_out;
   ny2 = *nlat_out;
   nx1p = nx1 + 1;
-  nx2p = nx2 + 1;
 
-  area_in  = (double *)malloc(nx1*ny1*sizeof(double));
-  area_out = (double *)malloc(nx2*ny2*sizeof(double));
-  get_grid_area(nlon_in, nlat_in, lon_in, lat_in, area_in);
-  get_grid_area(nlon_out, nlat_out, lon_out, lat_out, area_out);
+  /* one index over all output cells, shared by the chunks of input cells */
+  xgrid_index_init(&idx, 0, nx2*ny2-1, lon_out_min_list, lon_out_max_list,
+		   lat_out_min_list, lat_out_max_list);
+  nchunks = xgrid_nchunks(nx1*ny1);
+  blocks = xgrid_blocks_create(nchunks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
 
-  nthreads = 1;
 #if defined(_OPENMP)
-#pragma omp parallel
-  nthreads = omp_get_num_threads();
+#pragma omp parallel num_threads(xgrid_nthreads()) default(none) shared(nchunks,nx1,ny1,nx1p,mask_in,lon_in,lat_in,idx, \
+                                          nx2,ny2,lat_out_min_list,lat_out_max_list, \
+                                          n2_list,lon_out_list,lat_out_list,lon_out_min_list, \
+                                          lon_out_max_list,lon_out_avg,area_in,area_out,blocks)
 #endif
+  {
+    int *stamp, *cand, m, l;
 
-  nblocks = nthreads;
+    /* scratch space of the index queries, one per thread */
+    stamp = (int *)malloc(nx2*ny2*sizeof(int));
+    cand  = (int *)malloc(nx2*ny2*sizeof(int));
+    for(l=0; l<nx2*ny2; l++) stamp[l] = -1;
 
-  istart2 = (int *)malloc(nblocks*sizeof(int));
-  iend2 = (int *)malloc(nblocks*sizeof(int));
+#if defined(_OPENMP)
+#pragma omp for schedule(dynamic)
+#endif
+    for(m=0; m<nchunks; m++) {
+      int ij1, ij1_end;
+
+      ij1_end = xgrid_chunk_start(m+1, nchunks, nx1*ny1);
+      for(ij1=xgrid_chunk_start(m, nchunks, nx1*ny1); ij1<ij1_end; ij1++) {
+	int i1, j1, ij, k, ncand;
+	int n0, n1, n2, n3, l,n1_in;
+	double lat_in_min,lat_in_max,lon_in_min,lon_in_max,lon_in_avg;
+	double x1_in[MV], y1_in[MV], x_out[MV], y_out[MV];
+
+	if( mask_in[ij1] <= MASK_THRESH ) continue;
+	i1 = ij1%nx1;
+	j1 = ij1/nx1;
+
+	n0 = j1*nx1p+i1;       n1 = j1*nx1p+i1+1;
+	n2 = (j1+1)*nx1p+i1+1; n3 = (j1+1)*nx1p+i1;
+	x1_in[0] = lon_in[n0]; y1_in[0] = lat_in[n0];
+	x1_in[1] = lon_in[n1]; y1_in[1] = lat_in[n1];
+	x1_in[2] = lon_in[n2]; y1_in[2] = lat_in[n2];
+	x1_in[3] = lon_in[n3]; y1_in[3] = lat_in[n3];
+	lat_in_min = minval_double(4, y1_in);
+	lat_in_max = maxval_double(4, y1_in);
+	n1_in = fix_lon(x1_in, y1_in, 4, M_PI);
+	lon_in_min = minval_double(n1_in, x1_in);
+	lon_in_max = maxval_double(n1_in, x1_in);
+	lon_in_avg = avgval_double(n1_in, x1_in);
+	ncand = xgrid_index_query(&idx, stamp, cand, ij1, lon_in_min, lon_in_max, lat_in_min, lat_in_max);
+	for(k=0; k<ncand; k++) {
+	  int n_in, n_out, i2, j2, n2_in;
+	  double xarea, dx, lon_out_min, lon_out_max;
+	  double x2_in[MAX_V], y2_in[MAX_V];
+
+	  ij = cand[k];
+
+	  i2 = ij%nx2;
+	  j2 = ij/nx2;
+
+	  if(lat_out_min_list[ij] >= lat_in_max || lat_out_max_list[ij] <= lat_in_min ) continue;
+	  /* adjust x2_in according to lon_in_avg*/
+	  n2_in = n2_list[ij];
+	  for(l=0; l<n2_in; l++) {
+	    x2_in[l] = lon_out_list[ij*MAX_V+l];
+	    y2_in[l] = lat_out_list[ij*MAX_V+l];
+	  }
+	  lon_out_min = lon_out_min_list[ij];
+	  lon_out_max = lon_out_max_list[ij];
+	  dx = lon_out_avg[ij] - lon_in_avg;
+	  if(dx < -M_PI ) {
+	    lon_out_min += TPI;
+	    lon_out_max += TPI;
+	    for (l=0; l<n2_in; l++) x2_in[l] += TPI;
+	  }
+	  else if (dx >  M_PI) {
+	    lon_out_min -= TPI;
+	    lon_out_max -= TPI;
+	    for (l=0; l<n2_in; l++) x2_in[l] -= TPI;
+	  }
 
-  pstart = (int *)malloc(nblocks*sizeof(int));
-  pnxgrid = (int *)malloc(nblocks*sizeof(int));
+	  /* x2_in should in the same range as x1_in after lon_fix, so no need to
+	     consider cyclic condition
+	  */
+	  if(lon_out_min >= lon_in_max || lon_out_max <= lon_in_min ) continue;
+	  if (  (n_out = clip_2dx2d( x1_in, y1_in, n1_in, x2_in, y2_in, n2_in, x_out, y_out )) > 0) {
+	    double min_area;
+	    xarea = poly_area (x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
+	    min_area = min(area_in[j1*nx1+i1], area_out[j2*nx2+i2]);
+	    if( xarea/min_area > AREA_RATIO_THRESH )
+	      xgrid_block_add(blocks+m, i1, j1, i2, j2, xarea, poly_ctrlon(x_out, y_out, n_out, lon_in_avg),
+			      poly_ctrlat(x_out, y_out, n_out));
+	  }
+	}
+      }
+    }
+    free(stamp);
+    free(cand);
+  }
+  xgrid_index_free(&idx);
 
-  nxgrid_block_max = MAXXGRID/nblocks;
+  nxgrid = xgrid_block_merge(nchunks, blocks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area,
+                             xgrid_clon, xgrid_clat);
+  free(blocks);
 
-  for(m=0; m<nblocks; m++) {
-    pnxgrid[m] = 0;
-    pstart[m] = m*nxgrid_block_max;
-  }
+  return nxgrid;
 
-  if(nblocks == 1) {
-    pi_in = i_in;
-    pj_in = j_in;
-    pi_out = i_out;
-    pj_out = j_out;
-    pxgrid_area = xgrid_area;
-    pxgrid_clon = xgrid_clon;
-    pxgrid_clat = xgrid_clat;
-  }
-  else {
-    pi_in = (int *)malloc(MAXXGRID*sizeof(int));
-    pj_in = (int *)malloc(MAXXGRID*sizeof(int));
-    pi_out = (int *)malloc(MAXXGRID*sizeof(int));
-    pj_out = (int *)malloc(MAXXGRID*sizeof(int));
-    pxgrid_area = (double *)malloc(MAXXGRID*sizeof(double));
-    pxgrid_clon = (double *)malloc(MAXXGRID*sizeof(double));
-    pxgrid_clat = (double *)malloc(MAXXGRID*sizeof(double));
-  }
+};/* create_xgrid_2dx2d_order2_cells */
 
-  npts_left = nx2*ny2;
-  nblks_left = nblocks;
-  pos = 0;
-  for(m=0; m<nblocks; m++) {
-    istart2[m] = pos;
-    npts_my = npts_left/nblks_left;
-    iend2[m] = istart2[m] + npts_my - 1;
-    pos = iend2[m] + 1;
-    npts_left -= npts_my;
-    nblks_left--;
-  }
+int create_xgrid_2dx2d_order2_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
+{
+  int nx1, nx2, ny1, ny2, nxgrid;
+  double *area_in, *area_out;
+  double *lon_out_min_list,*lon_out_max_list,*lon_out_avg,*lat_out_min_list,*lat_out_max_list;
+  double *lon_out_list, *lat_out_list;
+  int    *n2_list;
+
+  nx1 = *nlon_in;
+  ny1 = *nlat_in;
+  nx2 = *nlon_out;
+  ny2 = *nlat_out;
+
+  area_in  = (double *)malloc(nx1*ny1*sizeof(double));
+  area_out = (double *)malloc(nx2*ny2*sizeof(double));
+  get_grid_area(nlon_in, nlat_in, lon_in, lat_in, area_in);
+  get_grid_area(nlon_out, nlat_out, lon_out, lat_out, area_out);
 
   lon_out_min_list = (double *)malloc(nx2*ny2*sizeof(double));
   lon_out_max_list = (double *)malloc(nx2*ny2*sizeof(double));
@@ -983,158 +1435,13 @@ int create_xgrid_2dx2d_order2(const int *nlon_in, const int *nlat_in, const int
   n2_list     = (int *)malloc(nx2*ny2*sizeof(int));
   lon_out_list = (double *)malloc(MAX_V*nx2*ny2*sizeof(double));
   lat_out_list = (double *)malloc(MAX_V*nx2*ny2*sizeof(double));
-#if defined(_OPENMP)
-#pragma omp parallel for default(none) shared(nx2,ny2,nx2p,lon_out,lat_out,lat_out_min_list, \
-                                              lat_out_max_list,lon_out_min_list,lon_out_max_list, \
-                                              lon_out_avg,n2_list,lon_out_list,lat_out_list)
-#endif
-  for(ij=0; ij<nx2*ny2; ij++){
-    int i2, j2, n, n0, n1, n2, n3, n2_in, l;
-    double x2_in[MV], y2_in[MV];
-    i2 = ij%nx2;
-    j2 = ij/nx2;
-    n = j2*nx2+i2;
-    n0 = j2*nx2p+i2; n1 = j2*nx2p+i2+1;
-    n2 = (j2+1)*nx2p+i2+1; n3 = (j2+1)*nx2p+i2;
-    x2_in[0] = lon_out[n0]; y2_in[0] = lat_out[n0];
-    x2_in[1] = lon_out[n1]; y2_in[1] = lat_out[n1];
-    x2_in[2] = lon_out[n2]; y2_in[2] = lat_out[n2];
-    x2_in[3] = lon_out[n3]; y2_in[3] = lat_out[n3];
-
-    lat_out_min_list[n] = minval_double(4, y2_in);
-    lat_out_max_list[n] = maxval_double(4, y2_in);
-    n2_in = fix_lon(x2_in, y2_in, 4, M_PI);
-    if(n2_in > MAX_V) error_handler("create_xgrid.c: n2_in is greater than MAX_V");
-    lon_out_min_list[n] = minval_double(n2_in, x2_in);
-    lon_out_max_list[n] = maxval_double(n2_in, x2_in);
-    lon_out_avg[n] = avgval_double(n2_in, x2_in);
-    n2_list[n] = n2_in;
-    for(l=0; l<n2_in; l++) {
-      lon_out_list[n*MAX_V+l] = x2_in[l];
-      lat_out_list[n*MAX_V+l] = y2_in[l];
-    }
-  }
-
-nxgrid = 0;
-
-#if defined(_OPENMP)
-#pragma omp parallel for default(none) shared(nblocks,nx1,ny1,nx1p,mask_in,lon_in,lat_in, \
-                                              istart2,iend2,nx2,lat_out_min_list,lat_out_max_list, \
-                                              n2_list,lon_out_list,lat_out_list,lon_out_min_list, \
-                                              lon_out_max_list,lon_out_avg,area_in,area_out, \
-                                              pxgrid_area,pnxgrid,pxgrid_clon,pxgrid_clat,pi_in, \
-                                              pj_in,pi_out,pj_out,pstart,nthreads)
-#endif
-  for(m=0; m<nblocks; m++) {
-    int i1, j1, ij;
-    for(j1=0; j1<ny1; j1++) for(i1=0; i1<nx1; i1++) if( mask_in[j1*nx1+i1] > MASK_THRESH ) {
-      int n0, n1, n2, n3, l,n1_in;
-      double lat_in_min,lat_in_max,lon_in_min,lon_in_max,lon_in_avg;
-      double x1_in[MV], y1_in[MV], x_out[MV], y_out[MV];
-
-      n0 = j1*nx1p+i1;       n1 = j1*nx1p+i1+1;
-      n2 = (j1+1)*nx1p+i1+1; n3 = (j1+1)*nx1p+i1;
-      x1_in[0] = lon_in[n0]; y1_in[0] = lat_in[n0];
-      x1_in[1] = lon_in[n1]; y1_in[1] = lat_in[n1];
-      x1_in[2] = lon_in[n2]; y1_in[2] = lat_in[n2];
-      x1_in[3] = lon_in[n3]; y1_in[3] = lat_in[n3];
-      lat_in_min = minval_double(4, y1_in);
-      lat_in_max = maxval_double(4, y1_in);
-      n1_in = fix_lon(x1_in, y1_in, 4, M_PI);
-      lon_in_min = minval_double(n1_in, x1_in);
-      lon_in_max = maxval_double(n1_in, x1_in);
-      lon_in_avg = avgval_double(n1_in, x1_in);
-      for(ij=istart2[m]; ij<=iend2[m]; ij++) {
-	int n_in, n_out, i2, j2, n2_in;
-	double xarea, dx, lon_out_min, lon_out_max;
-	double x2_in[MAX_V], y2_in[MAX_V];
-
-	i2 = ij%nx2;
-	j2 = ij/nx2;
-
-	if(lat_out_min_list[ij] >= lat_in_max || lat_out_max_list[ij] <= lat_in_min ) continue;
-	/* adjust x2_in according to lon_in_avg*/
-	n2_in = n2_list[ij];
-	for(l=0; l<n2_in; l++) {
-	  x2_in[l] = lon_out_list[ij*MAX_V+l];
-	  y2_in[l] = lat_out_list[ij*MAX_V+l];
-	}
-	lon_out_min = lon_out_min_list[ij];
-	lon_out_max = lon_out_max_list[ij];
-        dx = lon_out_avg[ij] - lon_in_avg;
-	if(dx < -M_PI ) {
-	  lon_out_min += TPI;
-	  lon_out_max += TPI;
-	  for (l=0; l<n2_in; l++) x2_in[l] += TPI;
-	}
-        else if (dx >  M_PI) {
-	  lon_out_min -= TPI;
-	  lon_out_max -= TPI;
-	  for (l=0; l<n2_in; l++) x2_in[l] -= TPI;
-	}
-
-	/* x2_in should in the same range as x1_in after lon_fix, so no need to
-	   consider cyclic condition
-	*/
-	if(lon_out_min >= lon_in_max || lon_out_max <= lon_in_min ) continue;
-	if (  (n_out = clip_2dx2d( x1_in, y1_in, n1_in, x2_in, y2_in, n2_in, x_out, y_out )) > 0) {
-          double min_area;
-	  int nn;
-	  xarea = poly_area (x_out, y_out, n_out ) * mask_in[j1*nx1+i1];
-	  min_area = min(area_in[j1*nx1+i1], area_out[j2*nx2+i2]);
-	  if( xarea/min_area > AREA_RATIO_THRESH ) {
-	    pnxgrid[m]++;
-            if(pnxgrid[m]>= MAXXGRID/nthreads)
-	      error_handler("nxgrid is greater than MAXXGRID/nthreads, increase MAXXGRID, decrease nthreads, or increase number of MPI ranks");
-	    nn = pstart[m] + pnxgrid[m]-1;
-	    pxgrid_area[nn] = xarea;
-	    pxgrid_clon[nn] = poly_ctrlon(x_out, y_out, n_out, lon_in_avg);
-	    pxgrid_clat[nn] = poly_ctrlat (x_out, y_out, n_out );
-	    pi_in[nn]       = i1;
-	    pj_in[nn]       = j1;
-	    pi_out[nn]      = i2;
-	    pj_out[nn]      = j2;
-	  }
-	}
-      }
-    }
-  }
+  get_grid_cells_2dx2d(nlon_out, nlat_out, lon_out, lat_out, lon_out_min_list, lon_out_max_list,
+		       lat_out_min_list, lat_out_max_list, lon_out_avg, n2_list, lon_out_list, lat_out_list);
 
-  /*copy data if nblocks > 1 */
-  if(nblocks == 1) {
-    nxgrid = pnxgrid[0];
-    pi_in = NULL;
-    pj_in = NULL;
-    pi_out = NULL;
-    pj_out = NULL;
-    pxgrid_area = NULL;
-    pxgrid_clon = NULL;
-    pxgrid_clat = NULL;
-  }
-  else {
-    int nn, i;
-    nxgrid = 0;
-    for(m=0; m<nblocks; m++) {
-      for(i=0; i<pnxgrid[m]; i++) {
-	nn = pstart[m] + i;
-	i_in[nxgrid] = pi_in[nn];
-	j_in[nxgrid] = pj_in[nn];
-	i_out[nxgrid] = pi_out[nn];
-	j_out[nxgrid] = pj_out[nn];
-	xgrid_area[nxgrid] = pxgrid_area[nn];
-	xgrid_clon[nxgrid] = pxgrid_clon[nn];
-	xgrid_clat[nxgrid] = pxgrid_clat[nn];
-	nxgrid++;
-      }
-    }
-    free(pi_in);
-    free(pj_in);
-    free(pi_out);
-    free(pj_out);
-    free(pxgrid_area);
-    free(pxgrid_clon);
-    free(pxgrid_clat);
-  }
+  nxgrid = create_xgrid_2dx2d_order2_cells(nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, mask_in,
+				       area_in, area_out, lon_out_min_list, lon_out_max_list,
+				       lat_out_min_list, lat_out_max_list, lon_out_avg, n2_list,
+				       lon_out_list, lat_out_list, maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
 
   free(area_in);
   free(area_out);
@@ -1151,6 +1458,21 @@ nxgrid = 0;
 
 };/* get_xgrid_2Dx2D_order2 */
 
+int create_xgrid_2dx2d_order2(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
+{
+  int nxgrid, maxxgrid = MAXXGRID;
+
+  nxgrid = create_xgrid_2dx2d_order2_sized(nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, lon_out, lat_out, mask_in,
+			       &maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
+  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  return nxgrid;
+
+};
+
+
 
 /*******************************************************************************
    Sutherland-Hodgeman algorithm sequentially clips parts outside 4 boundaries
@@ -1363,28 +1685,107 @@ int create_xgrid_great_circle_(const int *nlon_in, const int *nlat_in, const int
 };
 #endif
 
-int create_xgrid_great_circle(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+/*******************************************************************************
+  create_xgrid_great_circle_cells
+  Same as create_xgrid_great_circle_sized, with the cartesian coordinates of the
+  cell corners and the great circle cell areas of both grids computed by the caller.
+*******************************************************************************/
+int create_xgrid_great_circle_cells(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *x1, const double *y1, const double *z1, const double *area1,
+			      const double *x2, const double *y2, const double *z2, const double *area2,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
+{
+  int nx1, nx2, ny1, ny2, nx1p, nx2p, nxgrid, m, nchunks;
+  Xgrid_block *blocks;
+
+  nx1 = *nlon_in;
+  ny1 = *nlat_in;
+  nx2 = *nlon_out;
+  ny2 = *nlat_out;
+  nx1p = nx1 + 1;
+  nx2p = nx2 + 1;
+
+  nchunks = xgrid_nchunks(nx1*ny1);
+  blocks = xgrid_blocks_create(nchunks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
+
+#if defined(_OPENMP)
+#pragma omp parallel for schedule(dynamic) num_threads(xgrid_nthreads()) default(none) shared(nchunks,nx1,ny1,nx1p,nx2,ny2,nx2p,mask_in, \
+                                              x1,y1,z1,x2,y2,z2,area1,area2,blocks)
+#endif
+  for(m=0; m<nchunks; m++) {
+    int ij1, ij1_end;
+    struct NodeList nodes; /* clipping workspace of this chunk */
+
+    ij1_end = xgrid_chunk_start(m+1, nchunks, nx1*ny1);
+    for(ij1=xgrid_chunk_start(m, nchunks, nx1*ny1); ij1<ij1_end; ij1++) {
+      int n0, n1, n2, n3, i1, j1, i2, j2;
+      int n1_in = 4, n2_in = 4;
+      double x1_in[MV], y1_in[MV], z1_in[MV];
+      double x2_in[MV], y2_in[MV], z2_in[MV];
+      double x_out[MV], y_out[MV], z_out[MV];
+
+      if( mask_in[ij1] <= MASK_THRESH ) continue;
+      i1 = ij1%nx1;
+      j1 = ij1/nx1;
+      /* clockwise */
+      n0 = j1*nx1p+i1;       n1 = (j1+1)*nx1p+i1;
+      n2 = (j1+1)*nx1p+i1+1; n3 = j1*nx1p+i1+1;
+      x1_in[0] = x1[n0]; y1_in[0] = y1[n0]; z1_in[0] = z1[n0];
+      x1_in[1] = x1[n1]; y1_in[1] = y1[n1]; z1_in[1] = z1[n1];
+      x1_in[2] = x1[n2]; y1_in[2] = y1[n2]; z1_in[2] = z1[n2];
+      x1_in[3] = x1[n3]; y1_in[3] = y1[n3]; z1_in[3] = z1[n3];
+
+      for(j2=0; j2<ny2; j2++) for(i2=0; i2<nx2; i2++) {
+	int n_out;
+	double xarea, min_area;
+
+	n0 = j2*nx2p+i2;       n1 = (j2+1)*nx2p+i2;
+	n2 = (j2+1)*nx2p+i2+1; n3 = j2*nx2p+i2+1;
+	x2_in[0] = x2[n0]; y2_in[0] = y2[n0]; z2_in[0] = z2[n0];
+	x2_in[1] = x2[n1]; y2_in[1] = y2[n1]; z2_in[1] = z2[n1];
+	x2_in[2] = x2[n2]; y2_in[2] = y2[n2]; z2_in[2] = z2[n2];
+	x2_in[3] = x2[n3]; y2_in[3] = y2[n3]; z2_in[3] = z2[n3];
+
+	if (  (n_out = clip_2dx2d_great_circle_r( &nodes, x1_in, y1_in, z1_in, n1_in, x2_in, y2_in, z2_in, n2_in,
+						  x_out, y_out, z_out)) > 0) {
+	  xarea = great_circle_area ( n_out, x_out, y_out, z_out ) * mask_in[ij1];
+	  min_area = min(area1[ij1], area2[j2*nx2+i2]);
+	  if( xarea/min_area > AREA_RATIO_THRESH ) {
+#ifdef debug_test_create_xgrid
+	    printf("(i2,j2)=(%d,%d), (i1,j1)=(%d,%d), xarea=%g\n", i2, j2, i1, j1, xarea);
+#endif
+	    /*z1l: centroids will be developed very soon */
+	    xgrid_block_add(blocks+m, i1, j1, i2, j2, xarea, 0, 0);
+	  }
+	}
+      }
+    }
+  }
+
+  nxgrid = xgrid_block_merge(nchunks, blocks, *maxxgrid, i_in, j_in, i_out, j_out, xgrid_area,
+			     xgrid_clon, xgrid_clat);
+  free(blocks);
+
+  return nxgrid;
+
+};/* create_xgrid_great_circle_cells */
+
+int create_xgrid_great_circle_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
 			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
-			      const double *mask_in, int *i_in, int *j_in, int *i_out, int *j_out,
+			      const double *mask_in, const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
 			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
 {
 
-  int nx1, nx2, ny1, ny2, nx1p, nx2p, ny1p, ny2p, nxgrid, n1_in, n2_in;
-  int n0, n1, n2, n3, i1, j1, i2, j2, l, n;
-  double x1_in[MV], y1_in[MV], z1_in[MV];
-  double x2_in[MV], y2_in[MV], z2_in[MV];
-  double x_out[MV], y_out[MV], z_out[MV];
+  int nx1, nx2, ny1, ny2, nx1p, nx2p, ny1p, ny2p, nxgrid;
   double *x1=NULL, *y1=NULL, *z1=NULL;
   double *x2=NULL, *y2=NULL, *z2=NULL;
-
-  double xctrlon, xctrlat;
-  double *area1, *area2, min_area;
+  double *area1, *area2;
 
   nx1 = *nlon_in;
   ny1 = *nlat_in;
   nx2 = *nlon_out;
   ny2 = *nlat_out;
-  nxgrid = 0;
   nx1p = nx1 + 1;
   nx2p = nx2 + 1;
   ny1p = ny1 + 1;
@@ -1405,51 +1806,10 @@ int create_xgrid_great_circle(const int *nlon_in, const int *nlat_in, const int
   area2 = (double *)malloc(nx2*ny2*sizeof(double));
   get_grid_great_circle_area(nlon_in, nlat_in, lon_in, lat_in, area1);
   get_grid_great_circle_area(nlon_out, nlat_out, lon_out, lat_out, area2);
-  n1_in = 4;
-  n2_in = 4;
-
-  for(j1=0; j1<ny1; j1++) for(i1=0; i1<nx1; i1++) if( mask_in[j1*nx1+i1] > MASK_THRESH ) {
-    /* clockwise */
-    n0 = j1*nx1p+i1;       n1 = (j1+1)*nx1p+i1;
-    n2 = (j1+1)*nx1p+i1+1; n3 = j1*nx1p+i1+1;
-    x1_in[0] = x1[n0]; y1_in[0] = y1[n0]; z1_in[0] = z1[n0];
-    x1_in[1] = x1[n1]; y1_in[1] = y1[n1]; z1_in[1] = z1[n1];
-    x1_in[2] = x1[n2]; y1_in[2] = y1[n2]; z1_in[2] = z1[n2];
-    x1_in[3] = x1[n3]; y1_in[3] = y1[n3]; z1_in[3] = z1[n3];
-
-    for(j2=0; j2<ny2; j2++) for(i2=0; i2<nx2; i2++) {
-      int n_in, n_out;
-      double xarea;
-
-      n0 = j2*nx2p+i2;       n1 = (j2+1)*nx2p+i2;
-      n2 = (j2+1)*nx2p+i2+1; n3 = j2*nx2p+i2+1;
-      x2_in[0] = x2[n0]; y2_in[0] = y2[n0]; z2_in[0] = z2[n0];
-      x2_in[1] = x2[n1]; y2_in[1] = y2[n1]; z2_in[1] = z2[n1];
-      x2_in[2] = x2[n2]; y2_in[2] = y2[n2]; z2_in[2] = z2[n2];
-      x2_in[3] = x2[n3]; y2_in[3] = y2[n3]; z2_in[3] = z2[n3];
-
-      if (  (n_out = clip_2dx2d_great_circle( x1_in, y1_in, z1_in, n1_in, x2_in, y2_in, z2_in, n2_in,
-					      x_out, y_out, z_out)) > 0) {
-	xarea = great_circle_area ( n_out, x_out, y_out, z_out ) * mask_in[j1*nx1+i1];
-	min_area = min(area1[j1*nx1+i1], area2[j2*nx2+i2]);
-	if( xarea/min_area > AREA_RATIO_THRESH ) {
-#ifdef debug_test_create_xgrid
-	  printf("(i2,j2)=(%d,%d), (i1,j1)=(%d,%d), xarea=%g\n", i2, j2, i1, j1, xarea);
-#endif
-	  xgrid_area[nxgrid] = xarea;
-	  xgrid_clon[nxgrid] = 0; /*z1l: will be developed very soon */
-	  xgrid_clat[nxgrid] = 0;
-	  i_in[nxgrid]       = i1;
-	  j_in[nxgrid]       = j1;
-	  i_out[nxgrid]      = i2;
-	  j_out[nxgrid]      = j2;
-	  ++nxgrid;
-	  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
-	}
-      }
-    }
-  }
 
+  nxgrid = create_xgrid_great_circle_cells(nlon_in, nlat_in, nlon_out, nlat_out, x1, y1, z1, area1,
+					   x2, y2, z2, area2, mask_in, maxxgrid, i_in, j_in, i_out, j_out,
+					   xgrid_area, xgrid_clon, xgrid_clat);
 
   free(area1);
   free(area2);
@@ -1465,6 +1825,21 @@ int create_xgrid_great_circle(const int *nlon_in, const int *nlat_in, const int
 
 };/* create_xgrid_great_circle */
 
+int create_xgrid_great_circle(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+			      const double *lon_in, const double *lat_in, const double *lon_out, const double *lat_out,
+			      const double *mask_in, int *i_in, int *j_in, int *i_out, int *j_out,
+			      double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
+{
+  int nxgrid, maxxgrid = MAXXGRID;
+
+  nxgrid = create_xgrid_great_circle_sized(nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, lon_out, lat_out, mask_in,
+			       &maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon, xgrid_clat);
+  if(nxgrid > MAXXGRID) error_handler("nxgrid is greater than MAXXGRID, increase MAXXGRID");
+  return nxgrid;
+
+};
+
+
 /*******************************************************************************
    Revise Sutherland-Hodgeman algorithm to find the vertices of the overlapping
    between any two grid boxes. It return the number of vertices for the exchange grid.
@@ -1479,6 +1854,17 @@ int create_xgrid_great_circle(const int *nlon_in, const int *nlat_in, const int
 int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const double z1_in[], int n1_in,
 			    const double x2_in[], const double y2_in[], const double z2_in [], int n2_in,
 			    double x_out[], double y_out[], double z_out[])
+{
+  struct NodeList nodes;
+
+  return clip_2dx2d_great_circle_r(&nodes, x1_in, y1_in, z1_in, n1_in, x2_in, y2_in, z2_in, n2_in,
+				   x_out, y_out, z_out);
+}
+
+/* reentrant clip_2dx2d_great_circle, the lists are built in the caller owned nodes */
+int clip_2dx2d_great_circle_r(struct NodeList *nodes, const double x1_in[], const double y1_in[],
+			      const double z1_in[], int n1_in, const double x2_in[], const double y2_in[],
+			      const double z2_in [], int n2_in, double x_out[], double y_out[], double z_out[])
 {
   struct Node *subjList=NULL;
   struct Node *clipList=NULL;
@@ -1502,7 +1888,6 @@ int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const do
   double u1, u2;
   double min_x1, max_x1, min_y1, max_y1, min_z1, max_z1;
   double min_x2, max_x2, min_y2, max_y2, min_z2, max_z2;
-  static int first_call=1;
 
 
   /* first check the min and max of (x1_in, y1_in, z1_in) with (x2_in, y2_in, z2_in) */
@@ -1527,16 +1912,16 @@ int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const do
   min_z2 = minval_double(n2_in, z2_in);
   if(min_z2 >= max_z1+RANGE_CHECK_CRITERIA) return 0;
 
-  rewindList();
+  rewindList_r(nodes);
 
-  grid1List = getNext();
-  grid2List = getNext();
-  intersectList = getNext();
-  polyList = getNext();
+  grid1List = getNext_r(nodes);
+  grid2List = getNext_r(nodes);
+  intersectList = getNext_r(nodes);
+  polyList = getNext_r(nodes);
 
   /* insert points into SubjList and ClipList */
-  for(i1=0; i1<n1_in; i1++) addEnd(grid1List, x1_in[i1], y1_in[i1], z1_in[i1], 0, 0, 0, -1);
-  for(i2=0; i2<n2_in; i2++) addEnd(grid2List, x2_in[i2], y2_in[i2], z2_in[i2], 0, 0, 0, -1);
+  for(i1=0; i1<n1_in; i1++) addEnd_r(nodes, grid1List, x1_in[i1], y1_in[i1], z1_in[i1], 0, 0, 0, -1);
+  for(i2=0; i2<n2_in; i2++) addEnd_r(nodes, grid2List, x2_in[i2], y2_in[i2], z2_in[i2], 0, 0, 0, -1);
   npts1 = length(grid1List);
   npts2 = length(grid2List);
 
@@ -1598,8 +1983,8 @@ int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const do
     temp = temp->Next;
   }
 
-  firstIntersect=getNext();
-  curIntersect = getNext();
+  firstIntersect=getNext_r(nodes);
+  curIntersect = getNext_r(nodes);
 
 #ifdef debug_test_create_xgrid
   printf("\n\n************************ Start line_intersect_2D_3D ******************************\n");
@@ -1630,14 +2015,14 @@ int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const do
 	/* add the intersection into intersetList, The intersection might already be in
 	   intersectList and will be taken care addIntersect
 	*/
-	if(addIntersect(intersectList, intersect[0], intersect[1], intersect[2], 1, u1, u2, inbound, i1, i1p, i2, i2p)) {
+	if(addIntersect_r(nodes, intersectList, intersect[0], intersect[1], intersect[2], 1, u1, u2, inbound, i1, i1p, i2, i2p)) {
 	  /* add the intersection into the grid1List */
 
 	  if(u1 == 1) {
-	    insertIntersect(grid1List, intersect[0], intersect[1], intersect[2], 0.0, u2, inbound, p1_1[0], p1_1[1], p1_1[2]);
+	    insertIntersect_r(nodes, grid1List, intersect[0], intersect[1], intersect[2], 0.0, u2, inbound, p1_1[0], p1_1[1], p1_1[2]);
 	  }
 	  else
-	    insertIntersect(grid1List, intersect[0], intersect[1], intersect[2], u1, u2, inbound, p1_0[0], p1_0[1], p1_0[2]);
+	    insertIntersect_r(nodes, grid1List, intersect[0], intersect[1], intersect[2], u1, u2, inbound, p1_0[0], p1_0[1], p1_0[2]);
 	  /* when u1 == 0 or 1, need to adjust the vertice to intersect value for roundoff error */
 	  if(u1==1) {
 	    p1_1[0] = intersect[0];
@@ -1651,9 +2036,9 @@ int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const do
 	  }
 	  /* add the intersection into the grid2List */
 	  if(u2==1)
-	    insertIntersect(grid2List, intersect[0], intersect[1], intersect[2], 0.0, u1, 0, p2_1[0], p2_1[1], p2_1[2]);
+	    insertIntersect_r(nodes, grid2List, intersect[0], intersect[1], intersect[2], 0.0, u1, 0, p2_1[0], p2_1[1], p2_1[2]);
 	  else
-	    insertIntersect(grid2List, intersect[0], intersect[1], intersect[2], u2, u1, 0, p2_0[0], p2_0[1], p2_0[2]);
+	    insertIntersect_r(nodes, grid2List, intersect[0], intersect[1], intersect[2], u2, u1, 0, p2_0[0], p2_0[1], p2_0[2]);
 	  /* when u2 == 0 or 1, need to adjust the vertice to intersect value for roundoff error */
 	  if(u2==1) {
 	    p2_1[0] = intersect[0];
@@ -1719,7 +2104,7 @@ int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const do
 
       error_handler("firstIntersect is not in the grid1List");
     }
-    addNode(polyList, *firstIntersect);
+    addNode_r(nodes, polyList, *firstIntersect);
     nintersect--;
 #ifdef debug_test_create_xgrid
     printNode(polyList, "polyList at stage 1");
@@ -1778,7 +2163,7 @@ int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const do
 	  break;
 	}
 	else {
-	  addNode(polyList, *temp2);
+	  addNode_r(nodes, polyList, *temp2);
 #ifdef debug_test_create_xgrid
 	  printNode(polyList, "polyList at stage 2");
 #endif
@@ -1801,7 +2186,7 @@ int clip_2dx2d_great_circle(const double x1_in[], const double y1_in[], const do
       }
 
       /* add curIntersect to polyList and remove it from intersectList and curList */
-      addNode(polyList, *curIntersect);
+      addNode_r(nodes, polyList, *curIntersect);
 #ifdef debug_test_create_xgrid
       printNode(polyList, "polyList at stage 3");
 #endif
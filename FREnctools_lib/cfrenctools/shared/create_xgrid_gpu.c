@@ -159,13 +159,14 @@ int create_xgrid_2dx2d_order1_gpu(const int nlon_input_cells,  const int nlat_in
 
   int *parent_input_index  = NULL ; parent_input_index  = (int *)malloc(upbound_nxcells*sizeof(int));
   int *parent_output_index = NULL ; parent_output_index = (int *)malloc(upbound_nxcells*sizeof(int));
-  int *nxcells_per_ij1     = NULL ; nxcells_per_ij1 = (int *)malloc(input_grid_ncells*sizeof(int));
+  int *nxcells_per_ij1     = NULL ; nxcells_per_ij1 = (int *)calloc(input_grid_ncells, sizeof(int));
   double *store_xcell_area = NULL ; store_xcell_area =  (double *)malloc(upbound_nxcells*sizeof(double));
 
+  // masked cells and cells outside the overlap have no exchange cells
+#pragma acc enter data copyin(nxcells_per_ij1[:input_grid_ncells])
 #pragma acc enter data create(parent_input_index[:upbound_nxcells],  \
                               parent_output_index[:upbound_nxcells], \
-                              store_xcell_area[:upbound_nxcells],    \
-                              nxcells_per_ij1[:input_grid_ncells])
+                              store_xcell_area[:upbound_nxcells])
 
 #pragma acc data present(output_grid_lon[:output_grid_npts],         \
                          output_grid_lat[:output_grid_npts],         \
@@ -309,15 +310,16 @@ int create_xgrid_2dx2d_order2_gpu(const int nlon_input_cells,  const int nlat_in
   double *store_xcell_dclon=NULL ; store_xcell_dclon = (double *)malloc(upbound_nxcells*sizeof(double));
   double *store_xcell_dclat=NULL ; store_xcell_dclat = (double *)malloc(upbound_nxcells*sizeof(double));
 
-  int *nxcells_per_ij1=NULL ; nxcells_per_ij1 = (int *)malloc(input_grid_ncells*sizeof(int));
+  int *nxcells_per_ij1=NULL ; nxcells_per_ij1 = (int *)calloc(input_grid_ncells, sizeof(int));
   double *summed_input_area=NULL; summed_input_area = (double *)malloc(input_grid_ncells*sizeof(double));
   double *summed_input_clat=NULL; summed_input_clat = (double *)malloc(input_grid_ncells*sizeof(double));
   double *summed_input_clon=NULL; summed_input_clon = (double *)malloc(input_grid_ncells*sizeof(double));
 
+  // masked cells and cells outside the overlap have no exchange cells
+#pragma acc enter data copyin(nxcells_per_ij1[:input_grid_ncells])
 #pragma acc enter data create(parent_input_index[:upbound_nxcells],  \
                               parent_output_index[:upbound_nxcells], \
                               store_xcell_area[:upbound_nxcells],    \
-                              nxcells_per_ij1[:input_grid_ncells],   \
                               store_xcell_dclon[:upbound_nxcells],   \
                               store_xcell_dclat[:upbound_nxcells],   \
                               summed_input_area[:input_grid_ncells], \
@@ -435,33 +437,36 @@ int create_xgrid_2dx2d_order2_gpu(const int nlon_input_cells,  const int nlat_in
                                     store_xcell_dclon, store_xcell_dclat, approx_nxcells_per_ij1, parent_input_index,
                                     parent_output_index, store_xcell_area, interp_for_itile);
 
+  /* without the areas read in, the exchange cell centroids are returned as they are */
+  if(readin_input_area != NULL) {
 #pragma acc parallel loop present(interp_for_itile->dcentroid_lat[:nxcells], \
-                                  interp_for_itile->dcentroid_lat[:nxcells], \
-                                  input_grid_lon[:input_grid_ncells],   \
-                                  input_grid_lat[:input_grid_ncells],   \
-                                  summed_input_area[:input_grid_ncells], \
-                                  summed_input_clon[:input_grid_ncells], \
-                                  summed_input_clat[:input_grid_ncells], \
-                                  interp_for_itile->input_parent_cell_index[:nxcells]) \
-                           copyin(readin_input_area[:input_grid_ncells])
-    for(int ix=0 ; ix<nxcells ; ix++){
-      int ij1 = interp_for_itile->input_parent_cell_index[ix];
-      double input_area = summed_input_area[ij1];
-      double input_clon = summed_input_clon[ij1];
-      double input_clat = summed_input_clat[ij1];
-      double readin_area = readin_input_area[ij1];
-      if(fabs(input_area - readin_area)/readin_area > AREA_RATIO) {
-        double x[4], y[4], input_cell_lon_cent;
-        get_cell_vertices_gpu(ij1, nlon_input_cells, input_grid_lon, input_grid_lat, x, y);
-        int n = fix_lon_gpu(x, y, 4, M_PI);
-        input_cell_lon_cent = avgval_double_gpu(n, x);
-        poly_ctrlon_gpu(x, y, n, input_cell_lon_cent, &input_clon);
-        poly_ctrlat_gpu(x, y, n, &input_clat);
-        input_area = readin_area;
+                                    interp_for_itile->dcentroid_lat[:nxcells], \
+                                    input_grid_lon[:input_grid_ncells],   \
+                                    input_grid_lat[:input_grid_ncells],   \
+                                    summed_input_area[:input_grid_ncells], \
+                                    summed_input_clon[:input_grid_ncells], \
+                                    summed_input_clat[:input_grid_ncells], \
+                                    interp_for_itile->input_parent_cell_index[:nxcells]) \
+                             copyin(readin_input_area[:input_grid_ncells])
+      for(int ix=0 ; ix<nxcells ; ix++){
+        int ij1 = interp_for_itile->input_parent_cell_index[ix];
+        double input_area = summed_input_area[ij1];
+        double input_clon = summed_input_clon[ij1];
+        double input_clat = summed_input_clat[ij1];
+        double readin_area = readin_input_area[ij1];
+        if(fabs(input_area - readin_area)/readin_area > AREA_RATIO) {
+          double x[4], y[4], input_cell_lon_cent;
+          get_cell_vertices_gpu(ij1, nlon_input_cells, input_grid_lon, input_grid_lat, x, y);
+          int n = fix_lon_gpu(x, y, 4, M_PI);
+          input_cell_lon_cent = avgval_double_gpu(n, x);
+          poly_ctrlon_gpu(x, y, n, input_cell_lon_cent, &input_clon);
+          poly_ctrlat_gpu(x, y, n, &input_clat);
+          input_area = readin_area;
+        }
+        interp_for_itile->dcentroid_lon[ix] -= input_clon/input_area;
+        interp_for_itile->dcentroid_lat[ix] -= input_clat/input_area;
       }
-      interp_for_itile->dcentroid_lon[ix] -= input_clon/input_area;
-      interp_for_itile->dcentroid_lat[ix] -= input_clat/input_area;
-    }
+  }
 
 #pragma acc exit data delete( parent_input_index[:upbound_nxcells],     \
                               parent_output_index[:upbound_nxcells],    \
@@ -487,6 +492,139 @@ int create_xgrid_2dx2d_order2_gpu(const int nlon_input_cells,  const int nlat_in
 
 };/* get_xgrid_2Dx2D_order2 */
 
+
+/*******************************************************************************
+  create_xgrid_2dx2d_gpu_sized
+  Drives the two-pass kernels above with the interface of the host kernels
+  create_xgrid_2dx2d_order1_sized/create_xgrid_2dx2d_order2_sized: the grids
+  are copied to the device, get_upbound_nxcells_2dx2d_gpu counts the candidate
+  exchange cells of every input cell so that the work arrays are allocated
+  exactly, and create_xgrid_2dx2d_order1_gpu/create_xgrid_2dx2d_order2_gpu
+  fill them. Depending on how the library is compiled the kernels run on an
+  accelerator, on the host cores (e.g. nvc -acc=multicore) or serially.
+  When maxxgrid is too small nothing is written and the number of exchange
+  cells is returned. For order 2, xgrid_clon/xgrid_clat are the exchange cell
+  centroids multiplied by the exchange cell areas, as for the host kernels.
+*******************************************************************************/
+static int create_xgrid_2dx2d_gpu_sized(int order, const int *nlon_in, const int *nlat_in, const int *nlon_out,
+                                        const int *nlat_out, const double *lon_in, const double *lat_in,
+                                        const double *lon_out, const double *lat_out, const double *mask_in,
+                                        const int *maxxgrid, int *i_in, int *j_in, int *i_out, int *j_out,
+                                        double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
+{
+  int nx1 = *nlon_in, ny1 = *nlat_in, nx2 = *nlon_out, ny2 = *nlat_out;
+  int input_grid_ncells = nx1*ny1;
+  int input_grid_npts   = (nx1+1)*(ny1+1);
+  int output_grid_npts  = (nx2+1)*(ny2+1);
+  int upbound_nxcells, nxcells;
+  int *approx_nxcells_per_ij1=NULL, *ij2_start=NULL, *ij2_end=NULL;
+  Grid_config output_grid;
+  Grid_cells_struct_config output_grid_cells;
+  Interp_per_input_tile interp;
+  Interp_per_input_tile *p_interp = &interp;
+
+  output_grid.lonc = (double *)lon_out;
+  output_grid.latc = (double *)lat_out;
+  interp.nxcells = 0;
+
+#pragma acc enter data copyin(lon_in[:input_grid_npts], lat_in[:input_grid_npts],    \
+                              lon_out[:output_grid_npts], lat_out[:output_grid_npts], \
+                              mask_in[:input_grid_ncells])
+
+  get_grid_cell_struct_gpu(nx2, ny2, &output_grid, &output_grid_cells);
+  create_upbound_nxcells_arrays_on_device_gpu(input_grid_ncells, &approx_nxcells_per_ij1, &ij2_start, &ij2_end);
+
+  upbound_nxcells = get_upbound_nxcells_2dx2d_gpu(nx1, ny1, nx2, ny2, 0, ny1-1, lon_in, lat_in, lon_out, lat_out,
+                                                  mask_in, &output_grid_cells, approx_nxcells_per_ij1,
+                                                  ij2_start, ij2_end);
+  if(order == 2)
+    nxcells = create_xgrid_2dx2d_order2_gpu(nx1, ny1, nx2, ny2, 0, ny1-1, lon_in, lat_in, lon_out, lat_out,
+                                            upbound_nxcells, mask_in, &output_grid_cells, approx_nxcells_per_ij1,
+                                            ij2_start, ij2_end, p_interp, NULL);
+  else
+    nxcells = create_xgrid_2dx2d_order1_gpu(nx1, ny1, nx2, ny2, 0, ny1-1, lon_in, lat_in, lon_out, lat_out,
+                                            upbound_nxcells, mask_in, &output_grid_cells, approx_nxcells_per_ij1,
+                                            ij2_start, ij2_end, p_interp);
+
+  if(nxcells > 0) {
+    if(nxcells <= *maxxgrid) {
+#pragma acc update host(p_interp->input_parent_cell_index[:nxcells],  \
+                        p_interp->output_parent_cell_index[:nxcells], \
+                        p_interp->xcell_area[:nxcells])
+      if(order == 2) {
+#pragma acc update host(p_interp->dcentroid_lon[:nxcells], p_interp->dcentroid_lat[:nxcells])
+      }
+      for(int ix=0; ix<nxcells; ix++) {
+        int ij1 = interp.input_parent_cell_index[ix];
+        int ij2 = interp.output_parent_cell_index[ix];
+        i_in[ix]  = ij1%nx1; j_in[ix]  = ij1/nx1;
+        i_out[ix] = ij2%nx2; j_out[ix] = ij2/nx2;
+        xgrid_area[ix] = interp.xcell_area[ix]*mask_in[ij1];
+        if(order == 2) {
+          xgrid_clon[ix] = interp.dcentroid_lon[ix]*interp.xcell_area[ix];
+          xgrid_clat[ix] = interp.dcentroid_lat[ix]*interp.xcell_area[ix];
+        }
+      }
+    }
+#pragma acc exit data delete(p_interp->input_parent_cell_index[:nxcells],  \
+                             p_interp->output_parent_cell_index[:nxcells], \
+                             p_interp->xcell_area[:nxcells])
+    if(order == 2) {
+#pragma acc exit data delete(p_interp->dcentroid_lon[:nxcells], p_interp->dcentroid_lat[:nxcells])
+      free(interp.dcentroid_lon);
+      free(interp.dcentroid_lat);
+    }
+#pragma acc exit data delete(p_interp[:1])
+    free(interp.input_parent_cell_index);
+    free(interp.output_parent_cell_index);
+    free(interp.xcell_area);
+  }
+
+  free_upbound_nxcells_arrays_gpu(input_grid_ncells, &approx_nxcells_per_ij1, &ij2_start, &ij2_end);
+  free_grid_cell_struct_gpu(nx2*ny2, &output_grid_cells);
+
+#pragma acc exit data delete(lon_in[:input_grid_npts], lat_in[:input_grid_npts],    \
+                             lon_out[:output_grid_npts], lat_out[:output_grid_npts], \
+                             mask_in[:input_grid_ncells])
+
+  return nxcells;
+
+}
+
+int create_xgrid_2dx2d_order1_gpu_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+                                        const double *lon_in, const double *lat_in, const double *lon_out,
+                                        const double *lat_out, const double *mask_in, const int *maxxgrid,
+                                        int *i_in, int *j_in, int *i_out, int *j_out, double *xgrid_area)
+{
+  return create_xgrid_2dx2d_gpu_sized(1, nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, lon_out, lat_out,
+                                      mask_in, maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, NULL, NULL);
+}
+
+int create_xgrid_2dx2d_order2_gpu_sized(const int *nlon_in, const int *nlat_in, const int *nlon_out, const int *nlat_out,
+                                        const double *lon_in, const double *lat_in, const double *lon_out,
+                                        const double *lat_out, const double *mask_in, const int *maxxgrid,
+                                        int *i_in, int *j_in, int *i_out, int *j_out,
+                                        double *xgrid_area, double *xgrid_clon, double *xgrid_clat)
+{
+  return create_xgrid_2dx2d_gpu_sized(2, nlon_in, nlat_in, nlon_out, nlat_out, lon_in, lat_in, lon_out, lat_out,
+                                      mask_in, maxxgrid, i_in, j_in, i_out, j_out, xgrid_area, xgrid_clon,
+                                      xgrid_clat);
+}
+
+/*******************************************************************************
+  int xgrid_openacc_enabled
+  Returns 1 when the library was compiled with OpenACC, in which case the
+  _gpu kernels are offloaded or run in parallel on the host, otherwise 0.
+*******************************************************************************/
+int xgrid_openacc_enabled(void)
+{
+#if defined(_OPENACC)
+  return 1;
+#else
+  return 0;
+#endif
+}
+
 int create_xgrid_great_circle_gpu(const int *nlon_input_cells, const int *nlat_input_cells,
                                   const int *nlon_output_cells, const int *nlat_output_cells,
                                   const double *input_grid_lon, const double *input_grid_lat,
@@ -762,6 +762,14 @@ void create_upbound_nxcells_arrays_on_device_gpu(const int n, int **approx_nxcel
   p_ij2_start = *ij2_start;
   p_ij2_end = *ij2_end;
 
+  // get_upbound_nxcells_2dx2d_gpu only sets the unmasked cells in the overlap,
+  // the others have no exchange cells
+  for(int i=0 ; i<n ; i++) {
+    p_approx_nxcells_per_ij1[i] = 0;
+    p_ij2_start[i] = 0;
+    p_ij2_end[i] = -1;
+  }
+
 #pragma acc enter data copyin(p_approx_nxcells_per_ij1[:n],   \
                               p_ij2_start[:n],                \
                               p_ij2_end[:n])
@@ -355,6 +355,65 @@ void conserve_interp_great_circle(int nx_src, int ny_src, int nx_dst, int ny_dst
 
 }; /* conserve_interp_great_circle */
 
+/*------------------------------------------------------------------------------
+  void conserve_interp_accumulate()
+  add the contribution of one block of source cells to a conservative
+  interpolation: the exchange grid area is added to dst_area and the area
+  weighted source data to dst_sum. Once all blocks are added the interpolated
+  data is dst_sum/dst_area where dst_area > 0. The exchange grid arrays are
+  sized for the block, so memory use is bounded by the block size.
+  ----------------------------------------------------------------------------*/
+void conserve_interp_accumulate(int nx_src, int ny_src, int nx_dst, int ny_dst, const double *x_src,
+				const double *y_src, const double *x_dst, const double *y_dst,
+				const double *mask_src, const double *data_src, int great_circle,
+				double *dst_area, double *dst_sum)
+{
+  int n, nxgrid, maxxgrid;
+  int *xgrid_i1, *xgrid_j1, *xgrid_i2, *xgrid_j2;
+  double *xgrid_area, *xgrid_di, *xgrid_dj;
+
+  maxxgrid = 2*(nx_src*ny_src + nx_dst*ny_dst);
+  while(1) {
+    xgrid_i1   = (int    *)malloc(maxxgrid*sizeof(int));
+    xgrid_j1   = (int    *)malloc(maxxgrid*sizeof(int));
+    xgrid_i2   = (int    *)malloc(maxxgrid*sizeof(int));
+    xgrid_j2   = (int    *)malloc(maxxgrid*sizeof(int));
+    xgrid_area = (double *)malloc(maxxgrid*sizeof(double));
+    if(great_circle) {
+      xgrid_di = (double *)malloc(maxxgrid*sizeof(double));
+      xgrid_dj = (double *)malloc(maxxgrid*sizeof(double));
+      nxgrid = create_xgrid_great_circle_sized(&nx_src, &ny_src, &nx_dst, &ny_dst, x_src, y_src, x_dst, y_dst,
+					       mask_src, &maxxgrid, xgrid_i1, xgrid_j1, xgrid_i2, xgrid_j2,
+					       xgrid_area, xgrid_di, xgrid_dj);
+      free(xgrid_di);
+      free(xgrid_dj);
+    }
+    else
+      nxgrid = create_xgrid_2dx2d_order1_sized(&nx_src, &ny_src, &nx_dst, &ny_dst, x_src, y_src, x_dst, y_dst,
+					       mask_src, &maxxgrid, xgrid_i1, xgrid_j1, xgrid_i2, xgrid_j2, xgrid_area);
+    if(nxgrid <= maxxgrid) break;
+    /* the arrays were too small, nxgrid is the size needed */
+    free(xgrid_i1);
+    free(xgrid_j1);
+    free(xgrid_i2);
+    free(xgrid_j2);
+    free(xgrid_area);
+    maxxgrid = nxgrid;
+  }
+
+  for(n=0; n<nxgrid; n++) {
+    dst_area[xgrid_j2[n]*nx_dst+xgrid_i2[n]] += xgrid_area[n];
+    dst_sum[xgrid_j2[n]*nx_dst+xgrid_i2[n]] += data_src[xgrid_j1[n]*nx_src+xgrid_i1[n]]*xgrid_area[n];
+  }
+
+  free(xgrid_i1);
+  free(xgrid_j1);
+  free(xgrid_i2);
+  free(xgrid_j2);
+  free(xgrid_area);
+
+}; /* conserve_interp_accumulate */
+
 
 
 void linear_vertical_interp(int nx, int ny, int nk1, int nk2, const double *grid1, const double *grid2,
@@ -40,9 +40,14 @@
 
 const double from_pole_threshold_rad = 0.0174533;  // 1.0 deg
 
+/* process wide settings, only changed before any area is computed */
 int reproduce_siena = 0;
 int rotate_poly_flag = 0;
-double the_rotation_matrix[3][3] = { 0 };
+/* the rotation of set_the_rotation_matrix, initialized here so that rotate_poly
+   never reads it while another thread sets it */
+double the_rotation_matrix[3][3] = { {0, -1.0/M_SQRT2, 1.0/M_SQRT2},
+                                     {1.0/M_SQRT2, 0.5, 0.5},
+                                     {-1.0/M_SQRT2, 0.5, 0.5} };
 
 void set_reproduce_siena_true(void){
   reproduce_siena = 1;
@@ -1058,36 +1063,49 @@ int invert_matrix_3x3(long double m[], long double m_inv[]) {
   return 1;
 }
 
-#ifndef MAXNODELIST
-#define MAXNODELIST 100
+/* node storage of the clipping functions without a NodeList argument, which
+   every thread allocates for itself */
+static struct NodeList *nodeList=NULL;
+#if defined(_OPENMP)
+#pragma omp threadprivate(nodeList)
 #endif
 
-struct Node *nodeList=NULL;
-int curListPos=0;
+static struct NodeList *thread_node_list(void)
+{
+  if(!nodeList) {
+    nodeList = (struct NodeList *)malloc(sizeof(struct NodeList));
+    rewindList_r(nodeList);
+  }
+  return nodeList;
+}
 
 void rewindList(void)
+{
+  rewindList_r(thread_node_list());
+}
+
+struct Node *getNext()
+{
+  return getNext_r(thread_node_list());
+}
+
+/* reentrant versions of rewindList and getNext taking the node storage */
+void rewindList_r(struct NodeList *nodes)
 {
   int n;
 
-  curListPos = 0;
-  if(!nodeList) nodeList = (struct Node *)malloc(MAXNODELIST*sizeof(struct Node));
-  for(n=0; n<MAXNODELIST; n++) initNode(nodeList+n);
+  nodes->curListPos = 0;
+  for(n=0; n<MAXNODELIST; n++) initNode(nodes->nodes+n);
 
 }
 
-struct Node *getNext()
+struct Node *getNext_r(struct NodeList *nodes)
 {
   struct Node *temp=NULL;
-  int n;
-
-  if(!nodeList) {
-    nodeList = (struct Node *)malloc(MAXNODELIST*sizeof(struct Node));
-    for(n=0; n<MAXNODELIST; n++) initNode(nodeList+n);
-  }
 
-  temp = nodeList+curListPos;
-  curListPos++;
-  if(curListPos > MAXNODELIST) error_handler("getNext: curListPos >= MAXNODELIST");
+  if(nodes->curListPos >= MAXNODELIST) error_handler("getNext: curListPos >= MAXNODELIST");
+  temp = nodes->nodes+nodes->curListPos;
+  nodes->curListPos++;
 
   return (temp);
 }
@@ -1108,6 +1126,12 @@ void initNode(struct Node *node)
 }
 
 void addEnd(struct Node *list, double x, double y, double z, int intersect, double u, int inbound, int inside)
+{
+  addEnd_r(thread_node_list(), list, x, y, z, intersect, u, inbound, inside);
+}
+
+void addEnd_r(struct NodeList *nodes, struct Node *list, double x, double y, double z, int intersect, double u,
+              int inbound, int inside)
 {
 
   struct Node *temp=NULL;
@@ -1127,7 +1151,7 @@ void addEnd(struct Node *list, double x, double y, double z, int intersect, doub
       temp=temp->Next;
 
     /* Append at the end of the list.  */
-    temp->Next = getNext();
+    temp->Next = getNext_r(nodes);
     temp = temp->Next;
   }
   else {
@@ -1149,6 +1173,12 @@ void addEnd(struct Node *list, double x, double y, double z, int intersect, doub
 int addIntersect(struct Node *list, double x, double y, double z, int intersect, double u1, double u2, int inbound,
        int is1, int ie1, int is2, int ie2)
 {
+  return addIntersect_r(thread_node_list(), list, x, y, z, intersect, u1, u2, inbound, is1, ie1, is2, ie2);
+}
+
+int addIntersect_r(struct NodeList *nodes, struct Node *list, double x, double y, double z, int intersect,
+                   double u1, double u2, int inbound, int is1, int ie1, int is2, int ie2)
+{
 
   double u1_cur, u2_cur;
   int    i1_cur, i2_cur;
@@ -1180,7 +1210,7 @@ int addIntersect(struct Node *list, double x, double y, double z, int intersect,
     }
 
     /* Append at the end of the list.  */
-    temp->Next = getNext();
+    temp->Next = getNext_r(nodes);
     temp = temp->Next;
   }
   else {
@@ -1246,6 +1276,13 @@ void addNode(struct Node *list, struct Node inNode)
 
 }
 
+void addNode_r(struct NodeList *nodes, struct Node *list, struct Node inNode)
+{
+
+  addEnd_r(nodes, list, inNode.x, inNode.y, inNode.z, inNode.intersect, inNode.u, inNode.inbound, inNode.isInside);
+
+}
+
 struct Node *getNode(struct Node *list, struct Node inNode)
 {
   struct Node *thisNode=NULL;
@@ -1328,6 +1365,12 @@ int intersectInList(struct Node *list, double x, double y, double z)
 */
 void insertIntersect(struct Node *list, double x, double y, double z, double u1, double u2, int inbound,
                      double x2, double y2, double z2)
+{
+  insertIntersect_r(thread_node_list(), list, x, y, z, u1, u2, inbound, x2, y2, z2);
+}
+
+void insertIntersect_r(struct NodeList *nodes, struct Node *list, double x, double y, double z, double u1,
+                       double u2, int inbound, double x2, double y2, double z2)
 {
   struct Node *temp1=NULL, *temp2=NULL;
   struct Node *temp;
@@ -1394,7 +1437,7 @@ void insertIntersect(struct Node *list, double x, double y, double z, double u1,
   }
 
   /* assign value */
-  temp = getNext();
+  temp = getNext_r(nodes);
   temp->x = x;
   temp->y = y;
   temp->z = z;
@@ -1611,6 +1654,7 @@ int inside_a_polygon(double *lon1, double *lat1, int *npts, double *lon2, double
   double min_x2, max_x2, min_y2, max_y2, min_z2, max_z2;
   int isinside, i;
 
+  struct NodeList nodes;
   struct Node *grid1=NULL, *grid2=NULL;
 
   /* first convert to cartesian grid */
@@ -1634,12 +1678,12 @@ int inside_a_polygon(double *lon1, double *lat1, int *npts, double *lon2, double
 
 
   /* add x2,y2,z2 to a Node */
-  rewindList();
-  grid1 = getNext();
-  grid2 = getNext();
+  rewindList_r(&nodes);
+  grid1 = getNext_r(&nodes);
+  grid2 = getNext_r(&nodes);
 
-  addEnd(grid1, x1, y1, z1, 0, 0, 0, -1);
-  for(i=0; i<*npts; i++) addEnd(grid2, x2[i], y2[i], z2[i], 0, 0, 0, -1);
+  addEnd_r(&nodes, grid1, x1, y1, z1, 0, 0, 0, -1);
+  for(i=0; i<*npts; i++) addEnd_r(&nodes, grid2, x2[i], y2[i], z2[i], 0, 0, 0, -1);
 
   isinside = insidePolygon(grid1, grid2);
 
@@ -29,6 +29,10 @@
 #include "mpp.h"
 #include "mpp_domain.h"
 
+#ifndef min
+#define min(a,b) (a<b ? a:b)
+#endif
+
 /***********************************************************
    global variables
 ***********************************************************/
@@ -432,6 +436,61 @@ void mpp_global_field_all_double(domain2D domain, int sizex, int sizey, const do
   free(send_buffer);
 }; /* mpp_global_field_all_double */
 
+/*************************************************************
+    mpp_update_domain_double(domain2D domain, int halo, double *data)
+    fill the halo of data from the compute domains of the neighboring pe.
+    data is on the compute domain extended by halo points on each side.
+    halo points outside the global domain are not changed.
+************************************************************/
+void mpp_update_domain_double(domain2D domain, int halo, double *data)
+{
+  double **send_buffer=NULL, *recv_buffer=NULL;
+  int i, j, n, p, nx;
+  int is, ie, js, je;
+
+  if(npes == 1) return;
+
+  nx = domain.nxc + 2*halo;
+  send_buffer = (double **)malloc(npes*sizeof(double *));
+
+  /* send the part of the compute domain that falls in the halo of pe p */
+  for(p=0; p<npes; p++) {
+    send_buffer[p] = NULL;
+    if(p == pe) continue;
+    is = max(domain.isc, domain.isclist[p]-halo);
+    ie = min(domain.iec, domain.ieclist[p]+halo);
+    js = max(domain.jsc, domain.jsclist[p]-halo);
+    je = min(domain.jec, domain.jeclist[p]+halo);
+    if(is > ie || js > je) continue;
+    send_buffer[p] = (double *)malloc((ie-is+1)*(je-js+1)*sizeof(double));
+    n = 0;
+    for(j=js; j<=je; j++) for(i=is; i<=ie; i++)
+      send_buffer[p][n++] = data[(j-domain.jsc+halo)*nx+i-domain.isc+halo];
+    mpp_send_double(send_buffer[p], n, p);
+  }
+
+  /* receive the part of the compute domain of pe p that falls in the halo */
+  for(p=0; p<npes; p++) {
+    if(p == pe) continue;
+    is = max(domain.isc-halo, domain.isclist[p]);
+    ie = min(domain.iec+halo, domain.ieclist[p]);
+    js = max(domain.jsc-halo, domain.jsclist[p]);
+    je = min(domain.jec+halo, domain.jeclist[p]);
+    if(is > ie || js > je) continue;
+    recv_buffer = (double *)malloc((ie-is+1)*(je-js+1)*sizeof(double));
+    mpp_recv_double(recv_buffer, (ie-is+1)*(je-js+1), p);
+    n = 0;
+    for(j=js; j<=je; j++) for(i=is; i<=ie; i++)
+      data[(j-domain.jsc+halo)*nx+i-domain.isc+halo] = recv_buffer[n++];
+    free(recv_buffer);
+  }
+
+  mpp_sync_self();
+
+  for(p=0; p<npes; p++) if(send_buffer[p] != NULL) free(send_buffer[p]);
+  free(send_buffer);
+}; /* mpp_update_domain_double */
+
 
 /*************************************************************
     mpp_global_field_double(domain2D domain, int sizex, int sizey, const double *ldata, double *gdata)
@@ -0,0 +1,64 @@
+import ctypes as ct
+from typing import Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from FREnctools_lib.pyfrenctools.shared.clib import get_clib
+
+_double_array = np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS")
+_int_array = np.ctypeslib.ndpointer(dtype=np.int32, flags="C_CONTIGUOUS")
+
+# topog_read_rows in topog.h, copies the source rows jstart to jstart+nrows-1 into depth
+_read_rows_t = ct.CFUNCTYPE(None, ct.c_void_p, ct.c_int, ct.c_int, ct.POINTER(ct.c_double))
+
+
+"""
+create_realistic_topog:
+
+Remaps the (ny_src, nx_src) source topography depth_src, with cell centres
+xt_src/yt_src in degrees, onto the grid with (ny+1, nx+1) cell corners x/y in
+degrees and processes it as the realistic topography of make_topog on a
+single pe. depth_src is only read block_rows rows at a time, block_rows <= 0
+reads the latitude band covering the grid at once, so it can be a memory map
+of the source file or an array in shared memory. Source cells equal to missing
+or not deeper than 0 once multiplied by scale_factor are land. With vgrid_file
+the depth is fitted to the vertical grid and the number of levels of each cell
+is returned with it, otherwise num_levels is None.
+"""
+def create_realistic_topog(x: npt.NDArray, y: npt.NDArray, xt_src: npt.NDArray, yt_src: npt.NDArray,
+                           depth_src: npt.NDArray, missing: float, vgrid_file: Optional[str] = None,
+                           scale_factor: float = 1.0, tripolar_grid: bool = False, cyclic_x: bool = False,
+                           cyclic_y: bool = False, fill_first_row: bool = False, filter_topog: bool = False,
+                           num_filter_pass: int = 1, smooth_topo_allow_deepening: bool = False,
+                           round_shallow: bool = False, fill_shallow: bool = False, deepen_shallow: bool = False,
+                           full_cell: bool = False, flat_bottom: bool = False, adjust_topo: bool = True,
+                           fill_isolated_cells: bool = True, dont_change_landmask: bool = False,
+                           kmt_min: int = 2, min_thickness: float = 0.1, open_very_this_cell: bool = True,
+                           fraction_full_cell: float = 0.2, debug: bool = False,
+                           great_circle_algorithm: bool = False, on_grid: bool = False,
+                           block_rows: int = 0) -> Tuple[npt.NDArray, Optional[npt.NDArray]]:
+    ny, nx = x.shape[0]-1, x.shape[1]-1
+    ny_src, nx_src = depth_src.shape
+    depth = np.zeros((ny, nx), dtype=np.float64)
+    num_levels = np.zeros((ny, nx), dtype=np.int32)
+
+    # called back by the kernel, the rows are converted to double as they are copied
+    def read_rows(reader, jstart, nrows, rows):
+        np.copyto(np.ctypeslib.as_array(rows, (nrows, nx_src)), depth_src[jstart:jstart+nrows], casting="unsafe")
+
+    cfunction = get_clib().create_realistic_topog_rows
+    cfunction.restype = None
+    cfunction.argtypes = ([ct.c_int]*2 + [_double_array]*2 + [ct.c_char_p] + [ct.c_int]*2 + [_double_array]*2
+                          + [ct.c_double, _read_rows_t, ct.c_void_p, ct.c_double] + [ct.c_int]*16
+                          + [ct.c_double, ct.c_int, ct.c_double, _double_array, _int_array] + [ct.c_int]*4)
+    cfunction(nx, ny, np.ascontiguousarray(x, dtype=np.float64), np.ascontiguousarray(y, dtype=np.float64),
+              None if vgrid_file is None else vgrid_file.encode(), nx_src, ny_src,
+              np.ascontiguousarray(xt_src, dtype=np.float64), np.ascontiguousarray(yt_src, dtype=np.float64),
+              missing, _read_rows_t(read_rows), None, scale_factor,
+              tripolar_grid, cyclic_x, cyclic_y, fill_first_row, filter_topog, num_filter_pass,
+              smooth_topo_allow_deepening, round_shallow, fill_shallow, deepen_shallow, full_cell,
+              flat_bottom, adjust_topo, fill_isolated_cells, dont_change_landmask, kmt_min, min_thickness,
+              open_very_this_cell, fraction_full_cell, depth, num_levels, debug, great_circle_algorithm,
+              on_grid, block_rows)
+    return depth, (num_levels if vgrid_file is not None else None)
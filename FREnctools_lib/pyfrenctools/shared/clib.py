@@ -0,0 +1,29 @@
+import ctypes as ct
+import os
+from typing import Optional
+
+"""
+Location of the shared library built from cfrenctools by CMake
+"""
+LIBFILE = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir,
+                                       "cfrenctools", "c_build", "clib.so"))
+
+_lib: Optional[ct.CDLL] = None
+
+
+"""
+get_clib:
+
+Returns the compiled cfrenctools library, loading it on first use. A
+different build of the library can be selected by passing libfile.
+"""
+def get_clib(libfile: Optional[str] = None) -> ct.CDLL:
+    global _lib
+    if libfile is not None:
+        _lib = ct.cdll.LoadLibrary(libfile)
+    elif _lib is None:
+        if not os.path.isfile(LIBFILE):
+            raise RuntimeError(f"Cannot find the cfrenctools library \"{LIBFILE}\", "
+                               "it is built when fmsgridtools is installed")
+        _lib = ct.cdll.LoadLibrary(LIBFILE)
+    return _lib
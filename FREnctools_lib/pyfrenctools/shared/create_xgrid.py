@@ -0,0 +1,344 @@
+import contextlib
+import ctypes as ct
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import numpy.typing as npt
+
+from FREnctools_lib.pyfrenctools.shared.clib import get_clib
+
+_double_array = np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS")
+_int_array = np.ctypeslib.ndpointer(dtype=np.int32, flags="C_CONTIGUOUS")
+_int_p = ct.POINTER(ct.c_int)
+
+# initial number of exchange cells allocated per input and output grid cell,
+# the kernels report the exact count when this is not enough
+_XGRID_CELLS_PER_CELL = 2
+
+# maximum number of vertices of a cell after fix_lon, MAX_V in create_xgrid.h
+_MAX_V = 8
+
+# the host kernels run serially or threaded with OpenMP, threads runs the serial
+# host kernels on blocks of input rows in a pool of python threads, which the
+# reentrant kernels allow and ctypes releases the GIL for, openacc runs the
+# two-pass create_xgrid_*_gpu kernels, which only exist for 2dx2d
+XGRID_BACKENDS = ("serial", "openmp", "threads", "openacc")
+
+# blocks of input rows per thread of the threads backend, for load balance
+_BLOCKS_PER_THREAD = 4
+
+# keys of get_grid_cells_2dx2d in the argument order of the _cells kernels
+_CELLS_2DX2D = ("lon_min", "lon_max", "lat_min", "lat_max", "lon_avg", "nvert", "lon_list", "lat_list")
+
+
+def _get_function(name: str, order2: bool, inputs: list):
+    cfunction = getattr(get_clib(), name)
+    cfunction.restype = ct.c_int
+    cfunction.argtypes = ([_int_p]*4 + inputs + [_int_p] + [_int_array]*4
+                          + [_double_array]*(3 if order2 else 1))
+    return cfunction
+
+
+"""
+openacc_enabled:
+
+Returns True when the cfrenctools library was compiled with OpenACC, so that
+the openacc backend runs on an accelerator or in parallel on the host cores
+rather than serially.
+"""
+def openacc_enabled() -> bool:
+    cfunction = get_clib().xgrid_openacc_enabled
+    cfunction.restype = ct.c_int
+    cfunction.argtypes = []
+    return bool(cfunction())
+
+
+@contextlib.contextmanager
+def _backend(backend: str):
+    if backend not in XGRID_BACKENDS:
+        raise RuntimeError(f"exchange grid backend must be one of {XGRID_BACKENDS}, got {backend}")
+    # the number of threads only applies to the kernels called from this thread
+    cfunction = get_clib().set_xgrid_nthreads
+    cfunction.restype = None
+    cfunction.argtypes = [_int_p]
+    cfunction(ct.byref(ct.c_int(1 if backend == "serial" else 0)))
+    try:
+        yield
+    finally:
+        cfunction(ct.byref(ct.c_int(0)))
+
+
+def _run_threads(nlat_in: int, order2: bool, nthreads: Optional[int],
+                 create_block: Callable[[int, int], Dict[str, npt.NDArray]]) -> Dict[str, npt.NDArray]:
+    # create_block(j0, j1) returns the exchange grid of the input rows j0:j1, the blocks
+    # are concatenated in order so that the cells come out as from the serial kernels.
+    # nthreads defaults to the cores, callers running in a pool of workers pass their share
+    if nlat_in == 0:
+        return _xgrid_arrays(0, order2)
+    nthreads = nthreads or os.cpu_count() or 1
+    bounds = np.linspace(0, nlat_in, min(nlat_in, _BLOCKS_PER_THREAD*nthreads)+1).astype(int)
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+        blocks = list(pool.map(create_block, bounds[:-1], bounds[1:]))
+    for j0, xgrid in zip(bounds[:-1], blocks):
+        xgrid["j_in"] += j0
+    return {key: np.concatenate([xgrid[key] for xgrid in blocks]) for key in blocks[0]}
+
+
+def _xgrid_arrays(size: int, order2: bool) -> Dict[str, npt.NDArray]:
+    xgrid = dict(i_in = np.empty(size, dtype=np.int32),
+                 j_in = np.empty(size, dtype=np.int32),
+                 i_out = np.empty(size, dtype=np.int32),
+                 j_out = np.empty(size, dtype=np.int32),
+                 xgrid_area = np.empty(size, dtype=np.float64))
+    if order2:
+        xgrid["xgrid_clon"] = np.empty(size, dtype=np.float64)
+        xgrid["xgrid_clat"] = np.empty(size, dtype=np.float64)
+    return xgrid
+
+
+def _rows(array: Optional[npt.NDArray], j0: int, j1: int) -> Optional[npt.NDArray]:
+    return None if array is None else array[j0:j1]
+
+
+def _get_mask(mask_in: Optional[npt.NDArray], nlon_in: int, nlat_in: int) -> npt.NDArray:
+    if mask_in is None:
+        return np.ones((nlat_in, nlon_in), dtype=np.float64)
+    return np.ascontiguousarray(mask_in, dtype=np.float64)
+
+
+def _run_create_xgrid(cfunction, order2: bool, nlon_in: int, nlat_in: int, nlon_out: int, nlat_out: int,
+                      inputs: list) -> Dict[str, npt.NDArray]:
+
+    maxxgrid = _XGRID_CELLS_PER_CELL*(nlon_in*nlat_in + nlon_out*nlat_out)
+    while True:
+        xgrid = _xgrid_arrays(maxxgrid, order2)
+
+        nxgrid = cfunction(ct.byref(ct.c_int(nlon_in)), ct.byref(ct.c_int(nlat_in)),
+                           ct.byref(ct.c_int(nlon_out)), ct.byref(ct.c_int(nlat_out)),
+                           *inputs, ct.byref(ct.c_int(maxxgrid)), *xgrid.values())
+        if nxgrid <= maxxgrid:
+            break
+        # the arrays were too small, the kernel returned the exact size needed
+        maxxgrid = nxgrid
+
+    return {key: value[:nxgrid] for key, value in xgrid.items()}
+
+
+def _call_create_xgrid(name: str, order2: bool, nlon_in: int, nlat_in: int, nlon_out: int, nlat_out: int,
+                       lon_in: npt.NDArray, lat_in: npt.NDArray, lon_out: npt.NDArray, lat_out: npt.NDArray,
+                       mask_in: Optional[npt.NDArray], backend: str = "openmp") -> Dict[str, npt.NDArray]:
+
+    inputs = [np.ascontiguousarray(lon_in, dtype=np.float64),
+              np.ascontiguousarray(lat_in, dtype=np.float64),
+              np.ascontiguousarray(lon_out, dtype=np.float64),
+              np.ascontiguousarray(lat_out, dtype=np.float64),
+              _get_mask(mask_in, nlon_in, nlat_in)]
+    with _backend(backend):
+        # kernels without a two-pass version fall back to the threaded host kernels
+        if backend == "openacc" and hasattr(get_clib(), name + "_gpu_sized"):
+            name += "_gpu"
+        cfunction = _get_function(name + "_sized", order2, [_double_array]*5)
+        return _run_create_xgrid(cfunction, order2, nlon_in, nlat_in, nlon_out, nlat_out, inputs)
+
+
+def _call_grid_function(name: str, lon: npt.NDArray, lat: npt.NDArray, outputs: Dict[str, npt.NDArray]
+                        ) -> Dict[str, npt.NDArray]:
+    cfunction = getattr(get_clib(), name)
+    cfunction.restype = None
+    cfunction.argtypes = ([_int_p]*2 + [_double_array]*2
+                          + [_int_array if value.dtype == np.int32 else _double_array for value in outputs.values()])
+    nlat, nlon = lon.shape[0]-1, lon.shape[1]-1
+    cfunction(ct.byref(ct.c_int(nlon)), ct.byref(ct.c_int(nlat)),
+              np.ascontiguousarray(lon, dtype=np.float64), np.ascontiguousarray(lat, dtype=np.float64),
+              *outputs.values())
+    return outputs
+
+
+"""
+get_grid_area:
+
+Returns the (nlat, nlon) cell areas in m2 of the grid with (nlat+1, nlon+1)
+cell corners lon/lat in radians, as computed by the 2dx2d kernels.
+"""
+def get_grid_area(lon: npt.NDArray, lat: npt.NDArray) -> npt.NDArray:
+    area = np.empty((lon.shape[0]-1, lon.shape[1]-1), dtype=np.float64)
+    return _call_grid_function("get_grid_area", lon, lat, dict(area=area))["area"]
+
+
+"""
+get_grid_great_circle_area:
+
+Same as get_grid_area for cells whose edges are great circle arcs, as computed
+by the great circle kernel.
+"""
+def get_grid_great_circle_area(lon: npt.NDArray, lat: npt.NDArray) -> npt.NDArray:
+    area = np.empty((lon.shape[0]-1, lon.shape[1]-1), dtype=np.float64)
+    return _call_grid_function("get_grid_great_circle_area", lon, lat, dict(area=area))["area"]
+
+
+"""
+get_grid_cells_2dx2d:
+
+Returns the per cell preprocessing of the 2dx2d kernels for the grid with cell
+corners lon/lat in radians: the longitude and latitude bounds (lon_min, lon_max,
+lat_min, lat_max) and average longitude (lon_avg) of each cell, and the cell
+vertices after the longitudes are made continuous (nvert vertices in lon_list
+and lat_list, padded to MAX_V per cell). The result is passed as cells_out to
+create_xgrid_2dx2d.
+"""
+def get_grid_cells_2dx2d(lon: npt.NDArray, lat: npt.NDArray) -> Dict[str, npt.NDArray]:
+    shape = (lon.shape[0]-1, lon.shape[1]-1)
+    outputs = dict(lon_min = np.empty(shape, dtype=np.float64),
+                   lon_max = np.empty(shape, dtype=np.float64),
+                   lat_min = np.empty(shape, dtype=np.float64),
+                   lat_max = np.empty(shape, dtype=np.float64),
+                   lon_avg = np.empty(shape, dtype=np.float64),
+                   nvert = np.empty(shape, dtype=np.int32),
+                   lon_list = np.zeros(shape + (_MAX_V,), dtype=np.float64),
+                   lat_list = np.zeros(shape + (_MAX_V,), dtype=np.float64))
+    return _call_grid_function("get_grid_cells_2dx2d", lon, lat, outputs)
+
+
+"""
+create_xgrid_2dx2d:
+
+Computes the exchange grid between two curvilinear grids. lon/lat are the
+(nlat+1, nlon+1) cell corners in radians and mask_in is the (nlat_in, nlon_in)
+mask on the input grid. Returns a dictionary of numpy arrays with the input
+and output cell indices (i_in, j_in, i_out, j_out), the exchange cell areas
+(xgrid_area) and, for order=2, the exchange cell centroids (xgrid_clon, xgrid_clat).
+The cell areas from get_grid_area (area_in, area_out) and the output cells from
+get_grid_cells_2dx2d (cells_out) can be passed in when they are already known,
+the kernel then skips computing them. backend is one of XGRID_BACKENDS, the
+threads backend splits the input rows into blocks that run concurrently on
+nthreads threads of this process (by default one per core), the openacc
+backend computes its own cell geometry on the device.
+"""
+def create_xgrid_2dx2d(lon_in: npt.NDArray, lat_in: npt.NDArray, lon_out: npt.NDArray,
+                       lat_out: npt.NDArray, mask_in: Optional[npt.NDArray] = None,
+                       order: int = 1, area_in: Optional[npt.NDArray] = None,
+                       area_out: Optional[npt.NDArray] = None,
+                       cells_out: Optional[Dict[str, npt.NDArray]] = None,
+                       backend: str = "openmp", nthreads: Optional[int] = None) -> Dict[str, npt.NDArray]:
+    nlat_in, nlon_in = lon_in.shape[0]-1, lon_in.shape[1]-1
+    nlat_out, nlon_out = lon_out.shape[0]-1, lon_out.shape[1]-1
+    if backend == "threads":
+        # the output cells are computed once for all blocks
+        if area_in is None: area_in = get_grid_area(lon_in, lat_in)
+        if area_out is None: area_out = get_grid_area(lon_out, lat_out)
+        if cells_out is None: cells_out = get_grid_cells_2dx2d(lon_out, lat_out)
+        return _run_threads(nlat_in, order == 2, nthreads, lambda j0, j1: create_xgrid_2dx2d(
+            lon_in[j0:j1+1], lat_in[j0:j1+1], lon_out, lat_out, _rows(mask_in, j0, j1), order,
+            area_in[j0:j1], area_out, cells_out, "serial"))
+    if backend == "openacc" or (area_in is None and area_out is None and cells_out is None):
+        return _call_create_xgrid(f"create_xgrid_2dx2d_order{order}", order == 2,
+                                  nlon_in, nlat_in, nlon_out, nlat_out,
+                                  lon_in, lat_in, lon_out, lat_out, mask_in, backend)
+
+    if area_in is None: area_in = get_grid_area(lon_in, lat_in)
+    if area_out is None: area_out = get_grid_area(lon_out, lat_out)
+    if cells_out is None: cells_out = get_grid_cells_2dx2d(lon_out, lat_out)
+    inputs = [np.ascontiguousarray(lon_in, dtype=np.float64),
+              np.ascontiguousarray(lat_in, dtype=np.float64),
+              _get_mask(mask_in, nlon_in, nlat_in),
+              np.ascontiguousarray(area_in, dtype=np.float64),
+              np.ascontiguousarray(area_out, dtype=np.float64)]
+    inputs += [np.ascontiguousarray(cells_out[key], dtype=np.int32 if key == "nvert" else np.float64)
+               for key in _CELLS_2DX2D]
+    with _backend(backend):
+        cfunction = _get_function(f"create_xgrid_2dx2d_order{order}_cells", order == 2,
+                                  [_double_array]*10 + [_int_array] + [_double_array]*2)
+        return _run_create_xgrid(cfunction, order == 2, nlon_in, nlat_in, nlon_out, nlat_out, inputs)
+
+
+"""
+create_xgrid_1dx2d:
+
+Same as create_xgrid_2dx2d for a regular lon/lat input grid, lon_in and lat_in
+are the 1-D cell bounds of the input grid. The openacc backend falls back to the
+threaded host kernel.
+"""
+def create_xgrid_1dx2d(lon_in: npt.NDArray, lat_in: npt.NDArray, lon_out: npt.NDArray,
+                       lat_out: npt.NDArray, mask_in: Optional[npt.NDArray] = None,
+                       order: int = 1, backend: str = "openmp",
+                       nthreads: Optional[int] = None) -> Dict[str, npt.NDArray]:
+    nlon_in, nlat_in = lon_in.shape[0]-1, lat_in.shape[0]-1
+    nlat_out, nlon_out = lon_out.shape[0]-1, lon_out.shape[1]-1
+    if backend == "threads":
+        return _run_threads(nlat_in, order == 2, nthreads, lambda j0, j1: create_xgrid_1dx2d(
+            lon_in, lat_in[j0:j1+1], lon_out, lat_out, _rows(mask_in, j0, j1), order, "serial"))
+    return _call_create_xgrid(f"create_xgrid_1dx2d_order{order}", order == 2,
+                              nlon_in, nlat_in, nlon_out, nlat_out,
+                              lon_in, lat_in, lon_out, lat_out, mask_in, backend)
+
+
+"""
+create_xgrid_2dx1d:
+
+Same as create_xgrid_2dx2d for a regular lon/lat output grid, lon_out and
+lat_out are the 1-D cell bounds of the output grid. The openacc backend falls
+back to the threaded host kernel.
+"""
+def create_xgrid_2dx1d(lon_in: npt.NDArray, lat_in: npt.NDArray, lon_out: npt.NDArray,
+                       lat_out: npt.NDArray, mask_in: Optional[npt.NDArray] = None,
+                       order: int = 1, backend: str = "openmp",
+                       nthreads: Optional[int] = None) -> Dict[str, npt.NDArray]:
+    nlat_in, nlon_in = lon_in.shape[0]-1, lon_in.shape[1]-1
+    nlon_out, nlat_out = lon_out.shape[0]-1, lat_out.shape[0]-1
+    if backend == "threads":
+        return _run_threads(nlat_in, order == 2, nthreads, lambda j0, j1: create_xgrid_2dx1d(
+            lon_in[j0:j1+1], lat_in[j0:j1+1], lon_out, lat_out, _rows(mask_in, j0, j1), order, "serial"))
+    return _call_create_xgrid(f"create_xgrid_2dx1d_order{order}", order == 2,
+                              nlon_in, nlat_in, nlon_out, nlat_out,
+                              lon_in, lat_in, lon_out, lat_out, mask_in, backend)
+
+
+"""
+create_xgrid_great_circle:
+
+Same as create_xgrid_2dx2d for grids whose cell edges are great circle arcs.
+The centroids are always returned but are not computed yet by the C kernel.
+The (3, nlat+1, nlon+1) cartesian coordinates of the cell corners (xyz_in,
+xyz_out) and the cell areas from get_grid_great_circle_area (area_in, area_out)
+can be passed in when they are already known. The openacc backend falls back
+to the threaded host kernel.
+"""
+def create_xgrid_great_circle(lon_in: npt.NDArray, lat_in: npt.NDArray, lon_out: npt.NDArray,
+                              lat_out: npt.NDArray, mask_in: Optional[npt.NDArray] = None,
+                              xyz_in: Optional[npt.NDArray] = None, area_in: Optional[npt.NDArray] = None,
+                              xyz_out: Optional[npt.NDArray] = None, area_out: Optional[npt.NDArray] = None,
+                              backend: str = "openmp", nthreads: Optional[int] = None) -> Dict[str, npt.NDArray]:
+    nlat_in, nlon_in = lon_in.shape[0]-1, lon_in.shape[1]-1
+    nlat_out, nlon_out = lon_out.shape[0]-1, lon_out.shape[1]-1
+    if backend != "threads" and all(value is None for value in (xyz_in, area_in, xyz_out, area_out)):
+        return _call_create_xgrid("create_xgrid_great_circle", True,
+                                  nlon_in, nlat_in, nlon_out, nlat_out,
+                                  lon_in, lat_in, lon_out, lat_out, mask_in, backend)
+
+    if xyz_in is None: xyz_in = latlon2xyz(lon_in, lat_in)
+    if xyz_out is None: xyz_out = latlon2xyz(lon_out, lat_out)
+    if area_in is None: area_in = get_grid_great_circle_area(lon_in, lat_in)
+    if area_out is None: area_out = get_grid_great_circle_area(lon_out, lat_out)
+    if backend == "threads":
+        return _run_threads(nlat_in, True, nthreads, lambda j0, j1: create_xgrid_great_circle(
+            lon_in[j0:j1+1], lat_in[j0:j1+1], lon_out, lat_out, _rows(mask_in, j0, j1),
+            xyz_in[:, j0:j1+1], area_in[j0:j1], xyz_out, area_out, "serial"))
+    inputs = [np.ascontiguousarray(array, dtype=np.float64)
+              for array in (*xyz_in, area_in, *xyz_out, area_out)]
+    inputs.append(_get_mask(mask_in, nlon_in, nlat_in))
+    with _backend(backend):
+        cfunction = _get_function("create_xgrid_great_circle_cells", True, [_double_array]*9)
+        return _run_create_xgrid(cfunction, True, nlon_in, nlat_in, nlon_out, nlat_out, inputs)
+
+
+"""
+latlon2xyz:
+
+Returns the (3, ...) cartesian coordinates on the unit sphere of the points
+lon/lat in radians.
+"""
+def latlon2xyz(lon: npt.NDArray, lat: npt.NDArray) -> npt.NDArray:
+    coslat = np.cos(lat)
+    return np.stack((coslat*np.cos(lon), coslat*np.sin(lon), np.sin(lat)))
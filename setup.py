@@ -55,7 +55,8 @@ setup(
     cmdclass={'install': CustomInstall},
     entry_points={
         "console_scripts": [
-            "fmsgridtools make_hgrid = fmsgridtools.make_grid.hgrid.make_hgrid:main",
+            "make_hgrid = fmsgridtools.make_hgrid.make_hgrid:make_hgrid",
+            "make_mosaic = fmsgridtools.make_mosaic.make_mosaic:make_mosaic",
             "make_topog = fmsgridtools.make_topog.make_topog:make_topog",
         ]
     },
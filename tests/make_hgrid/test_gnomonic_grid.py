@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+import xarray as xr
+from click.testing import CliRunner
+
+from gridtools import GridObj
+from gridtools import create_gnomonic_cubic_grid
+from gridtools import setup_aligned_nest
+from gridtools.make_hgrid.make_hgrid import make_hgrid
+import gridtools.make_hgrid.create_gnomonic_grid as create_gnomonic_grid
+
+RADIUS = 6371000.0
+SPHERE_AREA = 4.0*np.pi*RADIUS**2
+
+NEST = {"parent_tile": 2, "refine_ratio": 3, "istart_nest": 5, "iend_nest": 20,
+        "jstart_nest": 7, "jend_nest": 30}
+
+def test_gnomonic_cubic_grid():
+    tiles = create_gnomonic_cubic_grid(24)
+    assert len(tiles) == 6
+    for n, tile in enumerate(tiles):
+        assert isinstance(tile, GridObj)
+        assert tile.tile == f"tile{n+1}" and tile.arcx == "great_circle"
+        assert tile.x.shape == tile.y.shape == tile.angle_dx.shape == (25, 25)
+        assert tile.dx.shape == (25, 24) and tile.dy.shape == (24, 25) and tile.area.shape == (24, 24)
+        assert np.all(tile.area > 0) and np.all(tile.dx > 0) and np.all(tile.dy > 0)
+        assert np.all((tile.x >= 0) & (tile.x <= 360)) and np.all(np.abs(tile.y) <= 90)
+    np.testing.assert_allclose(sum(tile.area.sum() for tile in tiles), SPHERE_AREA, rtol=1e-12)
+    # neighbouring tiles share their edges and edge lengths
+    np.testing.assert_array_equal(tiles[0].x[:, -1], tiles[1].x[:, 0])
+    np.testing.assert_array_equal(tiles[0].y[-1, ::-1], tiles[2].y[:, 0])
+    np.testing.assert_array_equal(tiles[0].dy[:, -1], tiles[1].dy[:, 0])
+    np.testing.assert_array_equal(tiles[0].dy[:, 0], tiles[4].dx[-1, ::-1])
+    # the unstretched tiles are congruent
+    for tile in tiles[1:]:
+        np.testing.assert_array_equal(tile.area, tiles[0].area)
+
+def test_gnomonic_cubic_grid_jobs(monkeypatch):
+    # several blocks of rows per tile, computed by a pool of threads
+    monkeypatch.setattr(create_gnomonic_grid, "_BLOCK_ROWS", 7)
+    serial = create_gnomonic_cubic_grid(24, do_schmidt=True, stretch_factor=2.5, target_lon=-97.5,
+                                        target_lat=36.5, nests=[dict(NEST, jend_nest=16)])
+    threaded = create_gnomonic_cubic_grid(24, do_schmidt=True, stretch_factor=2.5, target_lon=-97.5,
+                                          target_lat=36.5, nests=[dict(NEST, jend_nest=16)], jobs=3)
+    for a, b in zip(serial, threaded):
+        for name in ("x", "y", "dx", "dy", "area", "angle_dx", "angle_dy"):
+            np.testing.assert_array_equal(getattr(a, name), getattr(b, name))
+    monkeypatch.undo()
+    np.testing.assert_array_equal(create_gnomonic_cubic_grid(24, do_schmidt=True, stretch_factor=2.5,
+                                                             target_lon=-97.5, target_lat=36.5,
+                                                             nests=[dict(NEST, jend_nest=16)])[6].x,
+                                  serial[6].x)
+    # stretching refines the tile around the target and keeps the total area
+    areas = [tile.area.sum() for tile in serial[:6]]
+    np.testing.assert_allclose(sum(areas), SPHERE_AREA, rtol=1e-10)
+    assert max(areas)/min(areas) > 10.0
+
+def test_aligned_nest():
+    tiles = create_gnomonic_cubic_grid(48, nests=[NEST, dict(NEST, parent_tile=7, istart_nest=9,
+                                                             iend_nest=20, jstart_nest=9, jend_nest=30)])
+    assert len(tiles) == 8
+    nest = tiles[6]
+    assert nest.tile == "tile7"
+    assert nest.x.shape == (2*12*3+1, 2*8*3+1)
+    assert np.all(nest.angle_dx == 0) and np.all(nest.angle_dy == 0)
+    # the nest covers the parent cells it refines
+    parent = tiles[1]
+    np.testing.assert_allclose(nest.x[::6, ::6], parent.x[6:31:2, 4:21:2], atol=1e-10)
+    np.testing.assert_allclose(nest.area.sum(), parent.area[6:30, 4:20].sum(), rtol=1e-6)
+    np.testing.assert_allclose(tiles[7].area.sum(), nest.area[8:30, 8:20].sum(), rtol=1e-6)
+
+    # the nest of an existing parent grid is the same without regenerating the parent
+    rebuilt = setup_aligned_nest(parent, 3, 5, 20, 7, 30, tile="tile7", jobs=2)
+    for name in ("x", "y", "dx", "dy", "area", "angle_dx"):
+        np.testing.assert_allclose(getattr(rebuilt, name), getattr(nest, name), rtol=1e-9, atol=1e-9)
+
+    with pytest.raises(ValueError):
+        setup_aligned_nest(parent, 3, 5, 20, 7, 30, halo=3)
+    with pytest.raises(ValueError):
+        setup_aligned_nest(parent, 3, 4, 20, 7, 30)
+    with pytest.raises(ValueError):
+        create_gnomonic_cubic_grid(48, nests=[dict(NEST, parent_tile=0)])
+
+def test_make_hgrid_gnomonic_command(tmp_path):
+    grid_name = str(tmp_path / "C12_grid")
+    result = CliRunner().invoke(make_hgrid, ["--grid_type", "gnomonic_ed", "--nlon", "24",
+                                             "--do_schmidt", "--stretch_factor", "1.5",
+                                             "--target_lon", "-97.5", "--target_lat", "36.5",
+                                             "--parent_tile", "2", "--refine_ratio", "3",
+                                             "--istart_nest", "5", "--iend_nest", "20",
+                                             "--jstart_nest", "7", "--jend_nest", "16",
+                                             "--jobs", "2", "--grid_name", grid_name])
+    assert result.exit_code == 0, result.output
+    expected = create_gnomonic_cubic_grid(24, do_schmidt=True, stretch_factor=1.5, target_lon=-97.5,
+                                          target_lat=36.5, nests=[dict(NEST, jend_nest=16)])
+    for tile in expected:
+        with xr.open_dataset(f"{grid_name}.{tile.tile}.nc") as ds:
+            for name in ("x", "y", "dx", "dy", "area", "angle_dx", "angle_dy"):
+                np.testing.assert_array_equal(ds[name].values, getattr(tile, name))
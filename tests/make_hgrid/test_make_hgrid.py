@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+import xarray as xr
+from click.testing import CliRunner
+
+from gridtools import GridObj
+from gridtools import compute_grid_bound
+from gridtools import create_f_plane_grid
+from gridtools import create_regular_lonlat_grid
+from gridtools import create_simple_cartesian_grid
+from gridtools import create_tripolar_grid
+from gridtools.make_hgrid.make_hgrid import make_hgrid
+
+RADIUS = 6371000.0
+SPHERE_AREA = 4.0*np.pi*RADIUS**2
+
+def test_compute_grid_bound():
+    np.testing.assert_allclose(compute_grid_bound([0, 360], [8]), np.linspace(0, 360, 9))
+    # two regions with different resolution, the bounds are hit exactly
+    grid = compute_grid_bound([-90, -30, 90], [6, 6])
+    assert grid.size == 13
+    assert grid[0] == -90 and grid[6] == -30 and grid[12] == 90
+    assert np.all(np.diff(grid) > 0)
+    t_cell = compute_grid_bound([0, 360], [8], center="t_cell")
+    np.testing.assert_allclose(t_cell, np.linspace(0, 360, 9))
+    with pytest.raises(ValueError):
+        compute_grid_bound([0, 360], [7], center="t_cell")
+
+@pytest.mark.parametrize("great_circle", [False, True])
+def test_regular_lonlat_grid(great_circle):
+    grid = create_regular_lonlat_grid([0, 360], [-90, -30, 90], [72], [20, 24], center="t_cell",
+                                      use_great_circle_algorithm=great_circle)
+    assert isinstance(grid, GridObj)
+    assert grid.x.shape == grid.y.shape == (45, 73)
+    assert grid.dx.shape == (45, 72)
+    assert grid.dy.shape == (44, 73)
+    assert grid.area.shape == (44, 72)
+    assert grid.arcx == ("great_circle" if great_circle else "small_circle")
+    np.testing.assert_allclose(grid.dx, np.deg2rad(5.0)*RADIUS*np.cos(np.deg2rad(grid.y[:, 1:])), atol=1e-6)
+    np.testing.assert_allclose(grid.dy, np.deg2rad(np.diff(grid.y, axis=0))*RADIUS)
+    np.testing.assert_allclose(grid.area.sum(), SPHERE_AREA, rtol=1e-3 if great_circle else 1e-12)
+    assert np.all(grid.angle_dx == 0)
+    if not great_circle:
+        # the small circle cells are exact lat/lon boxes
+        expected = np.deg2rad(5.0)*np.diff(np.sin(np.deg2rad(grid.y[:, 0])))*RADIUS**2
+        np.testing.assert_allclose(grid.area, np.broadcast_to(expected[:, np.newaxis], grid.area.shape))
+
+def test_simple_cartesian_and_f_plane_grid():
+    grid = create_simple_cartesian_grid([0, 10], [0, 5], 10, 5, 1000.0, 2000.0)
+    assert grid.x.shape == (6, 11)
+    np.testing.assert_allclose(grid.x[0], np.arange(11.0))
+    assert np.all(grid.dx == 1000.0) and np.all(grid.dy == 2000.0) and np.all(grid.area == 2.0e6)
+
+    grid = create_f_plane_grid([0, 10], [20, 30], [20], [10], 45.0)
+    coslat = np.cos(np.deg2rad(45.0))
+    np.testing.assert_allclose(grid.dx, np.deg2rad(0.5)*RADIUS*coslat)
+    np.testing.assert_allclose(grid.dy, np.deg2rad(1.0)*RADIUS)
+    np.testing.assert_allclose(grid.area, np.deg2rad(0.5)*np.deg2rad(1.0)*RADIUS**2*coslat)
+
+def test_tripolar_grid():
+    grid = create_tripolar_grid([0, 360], [-80, -30, 30, 90], [72], [10, 30, 24], lat_join=62.0)
+    regular = create_regular_lonlat_grid([0, 360], [-80, -30, 30, 90], [72], [10, 30, 24])
+    j_join = int(np.argmin(np.abs(regular.y[:, 0] - 62.0)))
+    # south of the join latitude the grid is the regular lon/lat grid
+    np.testing.assert_array_equal(grid.x[:j_join], regular.x[:j_join])
+    np.testing.assert_array_equal(grid.y[:j_join], regular.y[:j_join])
+    np.testing.assert_allclose(grid.x[j_join], regular.x[j_join], atol=1e-10)
+    np.testing.assert_allclose(grid.y[j_join], regular.y[j_join], atol=1e-10)
+    np.testing.assert_array_equal(grid.dx[:j_join], regular.dx[:j_join])
+    np.testing.assert_array_equal(grid.area[:j_join-1], regular.area[:j_join-1])
+    # the bipolar rows cover the cap north of the join latitude without gaps
+    assert np.all(grid.area > 0) and np.all(grid.dx > 0) and np.all(grid.dy > 0)
+    cap = 2.0*np.pi*RADIUS**2*(1.0 - np.sin(np.deg2rad(grid.y[j_join, 0])))
+    np.testing.assert_allclose(grid.area[j_join:].sum(), cap, rtol=1e-3)
+    assert np.any(grid.angle_dx[j_join+1:] != 0)
+    assert np.all(grid.angle_dx[:, [0, -1]] == 0)
+
+def test_make_hgrid_command(tmp_path):
+    grid_name = str(tmp_path / "ocean_hgrid")
+    result = CliRunner().invoke(make_hgrid, ["--grid_type", "tripolar_grid", "--xbnds", "-280,80",
+                                             "--ybnds", "-82,-30,30,90", "--nlon", "60",
+                                             "--nlat", "12,20,16", "--center", "c_cell",
+                                             "--grid_name", grid_name])
+    assert result.exit_code == 0, result.output
+    expected = create_tripolar_grid([-280, 80], [-82, -30, 30, 90], [60], [12, 20, 16], center="c_cell")
+    with xr.open_dataset(grid_name + ".nc") as ds:
+        for name in ("x", "y", "dx", "dy", "area", "angle_dx"):
+            np.testing.assert_array_equal(ds[name].values, getattr(expected, name))
@@ -0,0 +1,86 @@
+import numpy as np
+import xarray as xr
+from click.testing import CliRunner
+
+from gridtools import GridObj
+from gridtools import MosaicObj
+from gridtools import create_gnomonic_cubic_grid
+from gridtools import create_regular_lonlat_grid
+from gridtools import create_tripolar_grid
+from gridtools import get_contacts
+from gridtools.make_mosaic.make_mosaic import make_mosaic
+
+
+def split(grid: GridObj, ibreaks, jbreaks):
+    return [GridObj(x=grid.x[j0:j1+1, i0:i1+1].copy(), y=grid.y[j0:j1+1, i0:i1+1].copy())
+            for j0, j1 in zip(jbreaks[:-1], jbreaks[1:]) for i0, i1 in zip(ibreaks[:-1], ibreaks[1:])]
+
+def test_cubic_contacts():
+    tiles = create_gnomonic_cubic_grid(12, nests=[{"parent_tile": 2, "refine_ratio": 2, "istart_nest": 3,
+                                                   "iend_nest": 8, "jstart_nest": 5, "jend_nest": 10}])
+    assert get_contacts(tiles) == [
+        (0, 1, (12, 12, 1, 12, 1, 1, 1, 12)), (0, 2, (1, 12, 12, 12, 1, 1, 12, 1)),
+        (0, 4, (1, 1, 1, 12, 12, 1, 12, 12)), (0, 5, (1, 12, 1, 1, 1, 12, 12, 12)),
+        (1, 2, (1, 12, 12, 12, 1, 12, 1, 1)), (1, 3, (12, 12, 1, 12, 12, 1, 1, 1)),
+        (1, 5, (1, 12, 1, 1, 12, 12, 12, 1)), (1, 6, (3, 8, 5, 10, 1, 12, 1, 12)),
+        (2, 3, (12, 12, 1, 12, 1, 1, 1, 12)), (2, 4, (1, 12, 12, 12, 1, 1, 12, 1)),
+        (3, 4, (1, 12, 12, 12, 1, 12, 1, 1)), (3, 5, (12, 12, 1, 12, 12, 1, 1, 1)),
+        (4, 5, (12, 12, 1, 12, 1, 1, 1, 12))]
+
+def test_tripolar_and_regional_contacts():
+    trip = create_tripolar_grid([-280, 80], [-82, -30, 30, 90], [60], [12, 20, 16], center="c_cell")
+    assert get_contacts([trip], periodx=360.0) == [(0, 0, (60, 60, 1, 48, 1, 1, 1, 48)),
+                                                   (0, 0, (1, 30, 48, 48, 60, 31, 48, 48))]
+    assert get_contacts([trip]) == [(0, 0, (1, 30, 48, 48, 60, 31, 48, 48))]
+
+    tiles = split(create_regular_lonlat_grid([0, 360], [-60, 60], [40], [20]), [0, 10, 40], [0, 8, 20])
+    assert get_contacts(tiles, periodx=360.0) == [
+        (0, 1, (10, 10, 1, 8, 1, 1, 1, 8)), (0, 1, (1, 1, 1, 8, 30, 30, 1, 8)),
+        (0, 2, (1, 10, 8, 8, 1, 10, 1, 1)), (1, 3, (1, 30, 8, 8, 1, 30, 1, 1)),
+        (2, 3, (10, 10, 1, 12, 1, 1, 1, 12)), (2, 3, (1, 1, 1, 12, 30, 30, 1, 12))]
+    # the tiles only touching at a corner are no contact
+    assert all(pair[:2] != (0, 3) and pair[:2] != (1, 2) for pair in get_contacts(tiles, periodx=360.0))
+
+def test_many_tile_contacts():
+    ibreaks, jbreaks = list(range(0, 121, 8)), list(range(0, 61, 6))
+    tiles = split(create_regular_lonlat_grid([0, 360], [-80, 80], [120], [60]), ibreaks, jbreaks)
+    ni, nj = len(ibreaks)-1, len(jbreaks)-1
+    contacts = get_contacts(tiles, periodx=360.0)
+    # every tile touches its east neighbour, periodically, and its north neighbour
+    assert len(contacts) == ni*nj + ni*(nj-1)
+    assert contacts == sorted(contacts, key=lambda contact: contact[:2])
+    for j in range(nj):
+        for i in range(ni):
+            tile, east = j*ni + i, j*ni + (i+1) % ni
+            pair = (tile, east, (8, 8, 1, 6, 1, 1, 1, 6)) if east > tile else (east, tile, (1, 1, 1, 6, 8, 8, 1, 6))
+            assert pair in contacts
+            if j < nj-1:
+                assert (tile, tile+ni, (1, 8, 6, 6, 1, 8, 1, 1)) in contacts
+
+def test_make_mosaic_command(tmp_path, monkeypatch):
+    tiles = create_gnomonic_cubic_grid(12)
+    tile_files = []
+    for tile in tiles:
+        tile_files.append(f"C6_grid.{tile.tile}.nc")
+        tile.write_out_grid(str(tmp_path / tile_files[-1]))
+
+    mosaic_name = str(tmp_path / "C6_mosaic")
+    result = CliRunner().invoke(make_mosaic, ["--tile_file", ",".join(tile_files), "--dir", str(tmp_path),
+                                              "--mosaic_name", mosaic_name])
+    assert result.exit_code == 0, result.output
+
+    with xr.open_dataset(mosaic_name + ".nc") as ds:
+        assert ds.sizes["ntiles"] == 6 and ds.sizes["ncontact"] == 12
+        assert [f.decode("ascii") for f in ds.gridfiles.values] == tile_files
+        assert ds.contacts.values[0].decode("ascii") == "C6_mosaic:tile1::C6_mosaic:tile2"
+        assert ds.contact_index.values[0].decode("ascii") == "12:12,1:12::1:1,1:12"
+        assert ds.contacts.values[-1].decode("ascii") == "C6_mosaic:tile5::C6_mosaic:tile6"
+
+    # the mosaic lists the grid files relative to its gridlocation
+    monkeypatch.chdir(tmp_path)
+    mosaic = MosaicObj(mosaic_file=mosaic_name + ".nc", mosaic_name="C6_mosaic")
+    mosaic.griddict()
+    mosaic.get_contacts()
+    assert mosaic.ncontact == 12
+    with xr.open_dataset(mosaic_name + ".nc") as ds:
+        np.testing.assert_array_equal(mosaic.contact_index, ds.contact_index.values)
@@ -0,0 +1,152 @@
+from gridtools import RemapObj, XGridObj, GridObj
+from FREnctools_lib.pyfrenctools.shared.clib import LIBFILE
+import numpy as np
+import os
+import pytest
+import xarray as xr
+
+def generate_remap(filename : str = None) :
+    # 4x2 source grid onto a 2x1 destination grid, each destination cell
+    # covers a 2x2 block of source cells, the last source cell has half the area
+    i, j = np.meshgrid(np.arange(1, 5), np.arange(1, 3))
+    tile1_cell = np.column_stack((i.ravel(), j.ravel()))
+    tile2_cell = np.column_stack(((i.ravel()+1)//2, np.ones(8, dtype=int)))
+    xgrid_area = np.ones(8)
+    xgrid_area[-1] = 0.5
+    dataset = xr.Dataset( data_vars = dict(tile1 = (("ncells"), np.ones(8, dtype=np.int32)),
+                                           tile1_cell = (("ncells", "two"), tile1_cell),
+                                           tile2_cell = (("ncells", "two"), tile2_cell),
+                                           xgrid_area = (("ncells"), xgrid_area)) )
+    if filename is not None : dataset.to_netcdf(filename, mode='w')
+    return dataset
+
+
+def test_remap_apply(tmp_path) :
+
+    filename = str(tmp_path/"remap.nc")
+    generate_remap(filename)
+    remap = RemapObj.from_file(filename, src_shape=(2,4), dst_shape=(1,2))
+
+    data = np.arange(8, dtype=np.float64).reshape(2,4)
+    expected = np.array([[(0+1+4+5)/4, (2+3+6+0.5*7)/3.5]])
+    assert np.allclose(remap.apply(data), expected)
+
+    # many fields at once give the same result as one at a time
+    fields = np.stack([data*n for n in range(5)])[:,np.newaxis]
+    out = remap.apply(fields, chunk_size=8)
+    assert out.shape == (5, 1, 1, 2)
+    for n in range(5) :
+        assert np.allclose(out[n,0], n*expected)
+
+
+def test_remap_apply_mask() :
+
+    remap = RemapObj.from_dataset(generate_remap(), src_shape=(2,4), dst_shape=(1,2))
+    data = np.arange(8, dtype=np.float64).reshape(2,4)
+    mask = np.ones((2,4))
+    mask[:,:2] = 0
+    mask[0,2] = 0
+
+    out = remap.apply(data, src_mask=mask, fill_value=-1)
+    assert np.allclose(out, [[-1, (3+6+0.5*7)/2.5]])
+
+
+def test_remap_mosaic_tiles() :
+
+    # the tile pairs of a mosaic remap have separate cell indices, one operator per pair
+    dataset = generate_remap()
+    dataset["tile2"] = (("ncells"), np.array([1, 1, 2, 2, 1, 1, 2, 2], dtype=np.int32))
+    with pytest.raises(ValueError) :
+        RemapObj.from_dataset(dataset, src_shape=(2,4), dst_shape=(1,2))
+    dataset["tile2"][:] = 1
+    dataset["tile1"][:4] = 2
+    with pytest.raises(ValueError) :
+        RemapObj.from_dataset(dataset, src_shape=(2,4), dst_shape=(1,2))
+
+    pair = generate_remap()
+    pair["tile2"] = (("ncells"), np.full(8, 2, dtype=np.int32))
+    remap = RemapObj.from_dataset(pair.isel(ncells=pair.tile2.values == 2), src_shape=(2,4), dst_shape=(1,2))
+    assert np.allclose(remap.apply(np.ones((2,4))), 1.0)
+
+    with pytest.raises(ValueError) :
+        RemapObj.from_xgrid(XGridObj(dataset=dataset))
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+def test_remap_from_xgrid() :
+
+    def supergrid(lon, lat) :
+        x, y = np.meshgrid(np.interp(np.arange(2*lon.size-1)/2, np.arange(lon.size), lon),
+                           np.interp(np.arange(2*lat.size-1)/2, np.arange(lat.size), lat))
+        return GridObj(x=x, y=y, arcx="small_circle")
+
+    xgrid = XGridObj(src_grid=supergrid(np.linspace(0, 40, 9), np.linspace(-20, 20, 5)),
+                     tgt_grid=supergrid(np.linspace(0, 40, 4), np.linspace(-20, 20, 7)))
+    xgrid.create_xgrid()
+    remap = RemapObj.from_xgrid(xgrid)
+    assert remap.src_shape == (4, 8) and remap.dst_shape == (6, 3)
+
+    # constant fields stay constant and the area integral is conserved
+    data = np.random.rand(3, 4, 8)
+    out = remap.apply(np.concatenate((np.ones((1,4,8)), data)))
+    assert np.allclose(out[0], 1)
+    src_area = np.bincount(remap.src_index, weights=remap.area, minlength=32)
+    assert np.allclose((out[1:].reshape(3,-1)*remap.dst_area).sum(axis=1),
+                       (data.reshape(3,-1)*src_area).sum(axis=1))
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+def test_remap_order2() :
+
+    def supergrid(lon, lat) :
+        x, y = np.meshgrid(np.interp(np.arange(2*lon.size-1)/2, np.arange(lon.size), lon),
+                           np.interp(np.arange(2*lat.size-1)/2, np.arange(lat.size), lat))
+        return GridObj(x=x, y=y, arcx="small_circle")
+
+    def centers(lon, lat) :
+        lon, lat = np.deg2rad(lon), np.deg2rad(lat)
+        return np.meshgrid(0.5*(lon[1:]+lon[:-1]), 0.5*(lat[1:]+lat[:-1]))
+
+    src_lon, src_lat = np.linspace(0, 40, 9), np.linspace(-20, 20, 9)
+    tgt_lon, tgt_lat = np.linspace(0, 40, 21), np.linspace(-20, 20, 17)
+    xgrid = XGridObj(src_grid=supergrid(src_lon, src_lat), tgt_grid=supergrid(tgt_lon, tgt_lat), order=2)
+    xgrid.create_xgrid()
+    remap = RemapObj.from_xgrid(xgrid)
+
+    # the gradient correction reproduces a field linear in lon and lat far better than first order
+    lon, lat = centers(src_lon, src_lat)
+    data = 3*lon + 2*lat
+    grad_lon, grad_lat = remap.gradients(data)
+    assert np.allclose(grad_lon, 3, atol=0.01) and np.allclose(grad_lat, 2, atol=0.01)
+    lon, lat = centers(tgt_lon, tgt_lat)
+    expected = 3*lon + 2*lat
+    assert np.abs(remap.apply(data, order=2) - expected).max() < 0.1*np.abs(remap.apply(data) - expected).max()
+
+    # constant fields stay constant, the area integral is conserved and fields can be batched
+    fields = np.concatenate((np.ones((1,8,8)), np.random.rand(3,8,8)))
+    out = remap.apply(fields, order=2, chunk_size=100)
+    assert np.allclose(out[0], 1)
+    src_area = np.bincount(remap.src_index, weights=remap.area, minlength=64)
+    assert np.allclose((out[1:].reshape(3,-1)*remap.dst_area).sum(axis=1),
+                       (fields[1:].reshape(3,-1)*src_area).sum(axis=1))
+    for n in range(4) :
+        assert np.allclose(out[n], remap.apply(fields[n], order=2))
+
+    # first order remap files have no centroid distances
+    with pytest.raises(RuntimeError) :
+        RemapObj.from_dataset(generate_remap(), src_shape=(2,4), dst_shape=(1,2)).apply(np.ones((2,4)), order=2)
+
+
+def test_remap_binary_file(tmp_path) :
+
+    # the binary file holds the exchange cells in destination order, memory mapped
+    filename = str(tmp_path/"remap.bin")
+    XGridObj(dataset=generate_remap(), out_remap_file=filename).write_remap_file(binary=True)
+    remap = RemapObj.from_file(filename, src_shape=(2,4), dst_shape=(1,2))
+    expected = RemapObj.from_dataset(generate_remap(), src_shape=(2,4), dst_shape=(1,2))
+
+    np.testing.assert_array_equal(remap.indptr, expected.indptr)
+    np.testing.assert_array_equal(remap.src_index, expected.src_index)
+    np.testing.assert_array_equal(remap.weights, expected.weights)
+    data = np.arange(8, dtype=np.float64).reshape(2,4)
+    np.testing.assert_array_equal(remap.apply(data), expected.apply(data))
@@ -1,6 +1,7 @@
 import os
 
 import numpy as np
+import pytest
 import xarray as xr
 
 from gridtools import GridObj
@@ -187,3 +188,111 @@ def test_gridobj_from_file(tmp_path):
     np.testing.assert_array_equal(from_file_grid_obj.area, out_grid_dataset.area.values)
     np.testing.assert_array_equal(from_file_grid_obj.angle_dx, out_grid_dataset.angle_dx.values)
     np.testing.assert_array_equal(from_file_grid_obj.angle_dy, out_grid_dataset.angle_dy)
+
+def test_gridobj_lazy_load(tmp_path):
+
+    file_path = tmp_path / "test_grid.nc"
+
+    out_grid_dataset.to_netcdf(file_path)
+
+    lazy_grid_obj = GridObj.from_file(filepath=file_path)
+
+    assert "_x" not in vars(lazy_grid_obj)
+    assert "_area" not in vars(lazy_grid_obj)
+
+    np.testing.assert_array_equal(lazy_grid_obj.x, out_grid_dataset.x.values)
+
+    assert isinstance(lazy_grid_obj.x, np.memmap)
+    assert "_x" in vars(lazy_grid_obj)
+    assert "_area" not in vars(lazy_grid_obj)
+
+    np.testing.assert_array_equal(lazy_grid_obj.area, out_grid_dataset.area.values)
+
+    lazy_grid_obj.y = np.zeros((nyp, nxp))
+    np.testing.assert_array_equal(lazy_grid_obj.y, np.zeros((nyp, nxp)))
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc to list the open files")
+def test_gridobj_close(tmp_path):
+
+    # netcdf3 files are read through xarray rather than memory mapped
+    file_path = str(tmp_path / "test_grid.nc")
+    out_grid_dataset.drop_vars(["tile", "arcx"]).to_netcdf(file_path, format="NETCDF3_64BIT")
+
+    def open_handles():
+        return sum(os.path.realpath(f"/proc/self/fd/{fd}") == os.path.realpath(file_path)
+                   for fd in os.listdir("/proc/self/fd"))
+
+    grid_obj = GridObj.from_file(file_path)
+    assert open_handles() == 1
+    for name in ("x", "y", "dx", "dy", "area", "angle_dx"):
+        getattr(grid_obj, name)
+    assert open_handles() == 1
+    # the file is closed once every array has been read
+    np.testing.assert_array_equal(grid_obj.angle_dy, out_grid_dataset.angle_dy.values)
+    assert open_handles() == 0
+    np.testing.assert_array_equal(grid_obj.x, out_grid_dataset.x.values)
+
+    with GridObj.from_file(file_path) as grid_obj:
+        assert open_handles() == 1
+    assert open_handles() == 0
+    grid_obj = GridObj.from_file(file_path)
+    grid_obj.close()
+    assert open_handles() == 0
+
+    # a dataset passed in by the caller stays open
+    with xr.open_dataset(file_path) as dataset:
+        with GridObj(grid_data=dataset) as grid_obj:
+            np.testing.assert_array_equal(grid_obj.x, out_grid_dataset.x.values)
+        grid_obj.close()
+        assert open_handles() == 1
+        np.testing.assert_array_equal(dataset.area.values, out_grid_dataset.area.values)
+    assert open_handles() == 0
+
+def test_get_agrid_lonlat():
+
+    lon = np.linspace(0.0, 60.0, 2*nx+1)
+    lat = np.linspace(-30.0, 30.0, 2*ny+1)
+    super_x, super_y = np.meshgrid(lon, lat)
+    grid_obj = GridObj(x=super_x, y=super_y)
+
+    a_lon, a_lat = grid_obj.get_agrid_lonlat()
+    np.testing.assert_allclose(a_lon, np.deg2rad(lon[1::2]))
+    np.testing.assert_allclose(a_lat, np.deg2rad(lat[1::2]))
+
+    a_lon2d, a_lat2d = grid_obj.get_agrid_lonlat(full=True, cache=True)
+    assert a_lon2d.shape == (ny, nx)
+    np.testing.assert_allclose(a_lon2d, np.deg2rad(super_x[1::2, 1::2]))
+    np.testing.assert_allclose(a_lat2d, np.deg2rad(super_y[1::2, 1::2]))
+    assert grid_obj.get_agrid_lonlat(full=True)[0] is a_lon2d
+
+    grid_obj.x = super_x + 1.0
+    np.testing.assert_allclose(grid_obj.get_agrid_lonlat(full=True)[0], np.deg2rad(super_x[1::2, 1::2] + 1.0))
+
+def test_get_cell_area_fill_metrics():
+
+    radius = 6371000.0
+
+    # the corners span the octant lon 0-90, lat 0-90
+    lon = np.array([[0.0, 45.0, 90.0]]*3)
+    lat = np.array([[0.0]*3, [45.0]*3, [90.0]*3])
+    grid_obj = GridObj(x=lon, y=lat)
+    np.testing.assert_allclose(grid_obj.get_cell_area(), [[np.pi*radius**2/2]], rtol=1e-12)
+
+    lon = np.linspace(0.0, 4.0, 2*nx+1)
+    lat = np.linspace(0.0, 3.0, 2*ny+1)
+    super_x, super_y = np.meshgrid(lon, lat)
+    grid_obj = GridObj(x=super_x, y=super_y, area=np.ones((2*ny, 2*nx)))
+
+    area = grid_obj.get_cell_area(subcells=True)
+    assert area.shape == (ny, nx)
+    np.testing.assert_allclose(area, grid_obj.get_cell_area(), rtol=1e-4)
+
+    assert grid_obj.fill_metrics() == ["dx", "dy"]
+    np.testing.assert_array_equal(grid_obj.area, np.ones((2*ny, 2*nx)))
+    assert grid_obj.dx.shape == (2*ny+1, 2*nx)
+    assert grid_obj.dy.shape == (2*ny, 2*nx+1)
+    np.testing.assert_allclose(grid_obj.dx[0], radius*np.deg2rad(lon[1]), rtol=1e-12)
+    np.testing.assert_allclose(grid_obj.dy, radius*np.deg2rad(lat[1]), rtol=1e-12)
+
+    assert grid_obj.fill_metrics(overwrite=True) == ["area", "dx", "dy"]
+    np.testing.assert_allclose(grid_obj.area.sum(), area.sum(), rtol=1e-12)
@@ -0,0 +1,66 @@
+import numpy as np
+import xarray as xr
+
+from gridtools import MosaicObj
+from gridtools.shared import mosaicobj
+
+
+def generate_mosaic(tmp_path, ntiles: int = 6, nx: int = 4, ny: int = 4) :
+
+    gridfiles = []
+    gridtiles = []
+    for n in range(ntiles) :
+        tile = f"tile{n+1}"
+        gridfile = str(tmp_path / f"grid.{tile}.nc")
+        grid = xr.Dataset( data_vars = dict(
+            tile = xr.DataArray([tile.encode("ascii")]),
+            x = xr.DataArray(np.full((2*ny+1, 2*nx+1), n, dtype=np.float64), dims=["nyp", "nxp"]),
+            y = xr.DataArray(np.full((2*ny+1, 2*nx+1), -n, dtype=np.float64), dims=["nyp", "nxp"]) ))
+        grid.to_netcdf(gridfile)
+        gridfiles.append(gridfile)
+        gridtiles.append(tile)
+
+    mosaic_file = str(tmp_path / "mosaic.nc")
+    xr.Dataset( data_vars = dict(
+        gridfiles = xr.DataArray(np.array(gridfiles, dtype="S255"), dims=["ntiles"]),
+        gridtiles = xr.DataArray(np.array(gridtiles, dtype="S255"), dims=["ntiles"]) )).to_netcdf(mosaic_file)
+    return mosaic_file
+
+
+def test_griddict(tmp_path) :
+
+    mosaic = MosaicObj(mosaic_file=generate_mosaic(tmp_path))
+    mosaic.griddict()
+
+    assert list(mosaic.grid_dict) == [f"tile{n+1}" for n in range(6)]
+    for n, grid in enumerate(mosaic.grid_dict.values()) :
+        assert grid.tile == f"tile{n+1}"
+        np.testing.assert_array_equal(grid.x, n)
+
+
+def test_griddict_threaded(tmp_path) :
+
+    mosaic = MosaicObj(mosaic_file=generate_mosaic(tmp_path))
+    mosaic.griddict(nthreads=3, max_read_bytes=1000, fields=["x", "y"])
+
+    assert len(mosaic.grid_dict) == 6
+    assert list(mosaic.tile_load_times) == list(mosaic.grid_dict)
+    assert all(load_time >= 0 for load_time in mosaic.tile_load_times.values())
+    for n, grid in enumerate(mosaic.grid_dict.values()) :
+        assert "_x" in vars(grid) and "_y" in vars(grid)
+        np.testing.assert_array_equal(grid.y, -n)
+
+
+def test_griddict_read_limit(tmp_path, monkeypatch) :
+
+    # x and y of a tile take 2*9*9*8 bytes, so the limit lets one tile be read at a time
+    peak = []
+    acquire = mosaicobj._ReadLimit.acquire
+    def record(self, nbytes) :
+        acquire(self, nbytes)
+        peak.append(self.in_flight)
+    monkeypatch.setattr(mosaicobj._ReadLimit, "acquire", record)
+
+    mosaic = MosaicObj(mosaic_file=generate_mosaic(tmp_path))
+    mosaic.griddict(nthreads=3, max_read_bytes=1300, fields=["x", "y"])
+    assert len(peak) == 6 and max(peak) == 1296
@@ -0,0 +1,96 @@
+from gridtools import XGridObj, read_binary_remap, write_binary_remap
+from gridtools.shared.remapfile import is_binary_remap
+import numpy as np
+import pytest
+import xarray as xr
+
+def generate_remap(filename : str = None, ncells : int = 500) :
+
+    # mosaic remap with unsorted target cells, netcdf int64 indices and float32 distances
+    rng = np.random.default_rng(7)
+    dataset = xr.Dataset( data_vars = dict(
+        tile1 = xr.DataArray( rng.integers(1, 7, ncells).astype(np.int32), dims = ("ncells"),
+                              attrs = dict(standard_name = "tile_number_in_mosaic1") ),
+        tile2 = xr.DataArray( rng.integers(1, 3, ncells).astype(np.int32), dims = ("ncells"),
+                              attrs = dict(standard_name = "tile_number_in_mosaic2") ),
+        tile1_cell = xr.DataArray( rng.integers(1, 40, (ncells, 2)), dims = ("ncells", "two"),
+                                   attrs = dict(standard_name = "parent_cell_indices_in_mosaic1") ),
+        tile2_cell = xr.DataArray( rng.integers(1, 10, (ncells, 2)), dims = ("ncells", "two"),
+                                   attrs = dict(standard_name = "parent_cell_indices_in_mosaic2") ),
+        xgrid_area = xr.DataArray( rng.random(ncells)*1.0e9, dims = ("ncells"),
+                                   attrs = dict(standard_name = "exchange_grid_area", units = "m2") ),
+        tile1_distance = xr.DataArray( rng.standard_normal((ncells, 2)).astype(np.float32),
+                                       dims = ("ncells", "two") ) ),
+        attrs = dict(history = "test", scale = np.float32(0.5), version = np.arange(3)) )
+    if filename is not None : dataset.to_netcdf(filename, mode='w')
+    return dataset
+
+
+def test_binary_remap_round_trip(tmp_path) :
+
+    netcdf_file, binary_file = str(tmp_path/"remap.nc"), str(tmp_path/"remap.bin")
+    generate_remap(netcdf_file)
+    answer = xr.load_dataset(netcdf_file)
+
+    write_binary_remap(answer, binary_file)
+    assert is_binary_remap(binary_file) and not is_binary_remap(netcdf_file)
+    remap = read_binary_remap(binary_file)
+    assert remap.ncells == 500
+    assert all(isinstance(column, np.memmap) for column in remap.columns.values())
+    assert remap.columns["tile1_cell"].dtype == np.int32 and remap.columns["xgrid_area"].dtype == np.float64
+
+    dataset = remap.to_dataset()
+    xr.testing.assert_identical(dataset, answer)
+    for name, variable in answer.data_vars.items() :
+        assert dataset[name].dtype == variable.dtype
+    dataset.to_netcdf(str(tmp_path/"remap2.nc"))
+    xr.testing.assert_identical(xr.load_dataset(str(tmp_path/"remap2.nc")), answer)
+
+
+def test_binary_remap_target_order(tmp_path) :
+
+    binary_file = str(tmp_path/"remap.bin")
+    answer = generate_remap()
+    write_binary_remap(answer, binary_file)
+    remap = read_binary_remap(binary_file)
+
+    sorted_dataset = remap.to_dataset(target_order=True)
+    tile2, tile2_cell = sorted_dataset.tile2.values, sorted_dataset.tile2_cell.values
+    assert np.all(np.diff(np.lexsort((tile2_cell[:,0], tile2_cell[:,1], tile2))) == 1)
+    np.testing.assert_array_equal(sorted_dataset.xgrid_area.values, answer.xgrid_area.values[remap.order])
+
+    # the exchange cells of every target cell, and only them, lie between its offsets
+    assert remap.offsets[0] == 0 and remap.offsets[-1] == remap.ncells
+    targets = np.column_stack((answer.tile2.values, answer.tile2_cell.values))
+    assert len(remap.targets) == len(np.unique(targets, axis=0))
+    for n, target in enumerate(remap.targets) :
+        cells = remap.cells(n)
+        assert np.all(cells["tile2"] == target[0]) and np.all(cells["tile2_cell"] == target[1:])
+        assert cells["xgrid_area"].sum() == pytest.approx(answer.xgrid_area.values[np.all(targets == target, axis=1)].sum())
+
+
+def test_binary_remap_errors(tmp_path) :
+
+    answer = generate_remap()
+    with pytest.raises(ValueError) :
+        write_binary_remap(answer.drop_vars("tile2_cell"), str(tmp_path/"remap.bin"))
+    answer["tile1_cell"][0,0] = 2**40
+    with pytest.raises(ValueError) :
+        write_binary_remap(answer, str(tmp_path/"remap.bin"))
+    generate_remap(str(tmp_path/"remap.nc"))
+    with pytest.raises(ValueError) :
+        read_binary_remap(str(tmp_path/"remap.nc"))
+
+
+def test_xgridobj_binary_remap_file(tmp_path) :
+
+    xgridobj = XGridObj(dataset=generate_remap(), out_remap_file=str(tmp_path/"remap.bin"))
+    xgridobj.write_remap_file(binary=True)
+
+    restart = XGridObj(restart_remap_file=str(tmp_path/"remap.bin"))
+    xr.testing.assert_identical(restart.dataset, xgridobj.dataset)
+
+    # empty exchange grids cannot be memory mapped but still round trip
+    answer = generate_remap(ncells=0)
+    write_binary_remap(answer, str(tmp_path/"empty.bin"))
+    xr.testing.assert_identical(read_binary_remap(str(tmp_path/"empty.bin")).to_dataset(), answer)
@@ -1,4 +1,7 @@
-from gridtools import XGridObj, GridObj
+from gridtools import XGridObj, XGridCache, GridObj
+from FREnctools_lib.pyfrenctools.shared.clib import LIBFILE
+from FREnctools_lib.pyfrenctools.shared.create_xgrid import create_xgrid_2dx2d
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import os
 import pytest
@@ -72,3 +75,323 @@ def test_write_remap_file() :
     del(xgridobj, test_dataset)
     
 
+
+
+def generate_supergrid(lon : np.ndarray, lat : np.ndarray, arcx : str = "small_circle") :
+
+    # supergrid points halfway between the cell bounds
+    super_lon = np.interp(np.arange(2*lon.size-1)/2, np.arange(lon.size), lon)
+    super_lat = np.interp(np.arange(2*lat.size-1)/2, np.arange(lat.size), lat)
+    x, y = np.meshgrid(super_lon, super_lat)
+    return GridObj(x=x, y=y, arcx=arcx)
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+@pytest.mark.parametrize("order", [1, 2])
+def test_create_xgrid_lonlat(order) :
+
+    src_grid = generate_supergrid(np.linspace(0, 40, 5), np.linspace(-20, 20, 5))
+    tgt_grid = generate_supergrid(np.linspace(0, 40, 9), np.linspace(-20, 20, 3))
+
+    xgridobj = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=order)
+    xgridobj.create_xgrid()
+
+    # each 10x10 degree source cell overlaps two target cells
+    assert xgridobj.dataset.sizes["ncells"] == 32
+    assert xgridobj.dataset.tile1_cell.values.min() == 1
+    assert xgridobj.dataset.tile2_cell.values.max() == 8
+
+    area = 2 * np.pi * 6371000.0**2 * 40/360 * (np.sin(np.radians(20)) - np.sin(np.radians(-20)))
+    np.testing.assert_allclose(xgridobj.dataset.xgrid_area.sum(), area, rtol=1.e-12)
+    if order == 2 :
+        assert xgridobj.dataset.tile1_distance.shape == (32, 2)
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+def test_create_xgrid_curvilinear() :
+
+    src_grid = generate_supergrid(np.linspace(0, 40, 5), np.linspace(-20, 20, 5))
+    tgt_grid = generate_supergrid(np.linspace(0, 40, 9), np.linspace(-20, 20, 3))
+    # shift the rows of the target grid so it is no longer a regular lon/lat grid
+    tgt_grid.x = tgt_grid.x + 0.5*np.arange(tgt_grid.x.shape[0])[:,None]
+
+    xgridobj = XGridObj(src_grid=tgt_grid, tgt_grid=src_grid)
+    xgridobj.create_xgrid()
+
+    assert xgridobj.dataset.sizes["ncells"] > 0
+    assert np.all(xgridobj.dataset.xgrid_area.values > 0)
+
+
+def test_create_xgrid_second_order_great_circle() :
+
+    # the great circle kernel has no exchange cell centroids for the second order distances
+    src_grid = generate_supergrid(np.linspace(0, 40, 5), np.linspace(-20, 20, 5), arcx="great_circle")
+    tgt_grid = generate_supergrid(np.linspace(0, 40, 9), np.linspace(-20, 20, 3))
+    xgridobj = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=2)
+    with pytest.raises(RuntimeError) :
+        xgridobj.create_xgrid()
+
+
+def test_second_order_distance_zero_area() :
+
+    # the second exchange cell has no area, the whole of source cell 1 neither
+    xgrid = dict(i_in = np.array([0, 0, 1]), j_in = np.array([0, 0, 0]),
+                 i_out = np.array([0, 1, 0]), j_out = np.array([0, 0, 0]),
+                 xgrid_area = np.array([2.0, 0.0, 0.0]),
+                 xgrid_clon = np.array([1.0, 0.0, 0.0]), xgrid_clat = np.array([4.0, 0.0, 0.0]))
+    xgridobj = XGridObj(dataset=generate_remap(), order=2)
+    distance = xgridobj._XGridObj__xgrid_to_dataset(xgrid, nx_src=2).tile1_distance.values
+    np.testing.assert_array_equal(distance, np.zeros((3, 2)))
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+def test_create_xgrid_grows_output(monkeypatch) :
+
+    from FREnctools_lib.pyfrenctools.shared import create_xgrid
+
+    lon = np.radians(np.linspace(0, 40, 9))
+    lat = np.radians(np.linspace(-20, 20, 5))
+    lon_in, lat_in = np.meshgrid(lon, lat)
+    lon_out, lat_out = np.meshgrid(lon[::2]+0.01, lat[::2])
+
+    expected = create_xgrid.create_xgrid_2dx2d(lon_in, lat_in, lon_out, lat_out, order=2)
+
+    # start from empty output arrays so the kernel has to report the size
+    monkeypatch.setattr(create_xgrid, "_XGRID_CELLS_PER_CELL", 0)
+    xgrid = create_xgrid.create_xgrid_2dx2d(lon_in, lat_in, lon_out, lat_out, order=2)
+
+    assert xgrid["xgrid_area"].size == expected["xgrid_area"].size > 0
+    for key in expected :
+        assert np.array_equal(xgrid[key], expected[key])
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+@pytest.mark.parametrize("arcx", ["small_circle", "great_circle"])
+def test_create_xgrid_cell_geometry(arcx) :
+
+    from FREnctools_lib.pyfrenctools.shared import create_xgrid
+
+    src_grid = generate_supergrid(np.linspace(0, 40, 9), np.linspace(-20, 20, 5), arcx)
+    tgt_grid = generate_supergrid(np.linspace(0, 40, 5), np.linspace(-20, 20, 5), arcx)
+    tgt_grid.x = tgt_grid.x + 0.5*np.arange(tgt_grid.x.shape[0])[:,None]
+    src_lon, src_lat = np.deg2rad(src_grid.x[::2,::2]), np.deg2rad(src_grid.y[::2,::2])
+    tgt_lon, tgt_lat = np.deg2rad(tgt_grid.x[::2,::2]), np.deg2rad(tgt_grid.y[::2,::2])
+
+    xgridobj = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid)
+    xgridobj.create_xgrid()
+
+    # the geometry is computed once and reused by the following exchange grids
+    geometry = tgt_grid.get_cell_geometry(great_circle = arcx == "great_circle")
+    assert tgt_grid.get_cell_geometry(great_circle = arcx == "great_circle") is geometry
+    assert geometry["xyz"].shape == (3, 5, 5)
+    assert geometry["cell_area"].shape == (4, 4)
+    np.testing.assert_allclose(np.sum(geometry["xyz"]**2, axis=0), 1.0, rtol=1.e-14)
+    np.testing.assert_array_equal(geometry["lat_max"] - geometry["lat_min"], np.deg2rad(10.0))
+
+    if arcx == "great_circle" :
+        expected = create_xgrid.create_xgrid_great_circle(src_lon, src_lat, tgt_lon, tgt_lat)
+    else :
+        expected = create_xgrid.create_xgrid_2dx2d(src_lon, src_lat, tgt_lon, tgt_lat)
+        np.testing.assert_array_equal(geometry["cell_area"], create_xgrid.get_grid_area(tgt_lon, tgt_lat))
+    assert xgridobj.dataset.sizes["ncells"] == expected["xgrid_area"].size > 0
+    np.testing.assert_allclose(xgridobj.dataset.xgrid_area.values, expected["xgrid_area"], rtol=1.e-14)
+    np.testing.assert_array_equal(xgridobj.dataset.tile2_cell.values[:,0], expected["i_out"]+1)
+
+    # reassigning the corners invalidates the geometry
+    tgt_grid.x = tgt_grid.x + 1.0
+    assert tgt_grid.get_cell_geometry(great_circle = arcx == "great_circle") is not geometry
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+@pytest.mark.parametrize("order", [1, 2])
+@pytest.mark.parametrize("backend", ["serial", "threads", "openacc"])
+def test_create_xgrid_backend(order, backend) :
+
+    src_grid = generate_supergrid(np.linspace(0, 40, 9), np.linspace(-20, 20, 5))
+    tgt_grid = generate_supergrid(np.linspace(0, 40, 5), np.linspace(-20, 20, 5))
+    tgt_grid.x = tgt_grid.x + 0.5*np.arange(tgt_grid.x.shape[0])[:,None]
+    src_mask = np.ones((4, 8))
+    src_mask[1, 2:5] = 0.0
+
+    expected = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=order)
+    expected.create_xgrid(src_mask)
+    xgridobj = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=order, backend=backend)
+    xgridobj.create_xgrid(src_mask)
+
+    # the exchange cells can come out in a different order
+    def sort(dataset) :
+        return np.lexsort(np.column_stack((dataset.tile1_cell.values, dataset.tile2_cell.values)).T)
+    order1, order2 = sort(expected.dataset), sort(xgridobj.dataset)
+    assert order1.size == order2.size > 0
+    for name in expected.dataset.data_vars :
+        np.testing.assert_allclose(xgridobj.dataset[name].values[order2], expected.dataset[name].values[order1],
+                                   rtol=1.e-12, atol=1.e-12)
+
+    with pytest.raises(RuntimeError) :
+        XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, backend="cuda").create_xgrid()
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+@pytest.mark.parametrize("order", [1, 2])
+def test_create_xgrid_threads_nthreads(order) :
+
+    src_grid = generate_supergrid(np.linspace(0, 40, 9), np.linspace(-20, 20, 5))
+    tgt_grid = generate_supergrid(np.linspace(0, 40, 5), np.linspace(-20, 20, 5))
+    tgt_grid.x = tgt_grid.x + 0.5*np.arange(tgt_grid.x.shape[0])[:,None]
+    datasets = []
+    for nthreads in (1, 3) :
+        xgridobj = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=order, backend="threads", nthreads=nthreads)
+        xgridobj.create_xgrid()
+        datasets.append(xgridobj.dataset)
+    xr.testing.assert_identical(datasets[0], datasets[1])
+
+    # a source grid without rows has no exchange cells
+    lon, lat = np.deg2rad(tgt_grid.x[::2,::2]), np.deg2rad(tgt_grid.y[::2,::2])
+    xgrid = create_xgrid_2dx2d(lon[:1], lat[:1], lon, lat, order=order, backend="threads")
+    assert all(value.size == 0 for value in xgrid.values())
+    assert ("xgrid_clon" in xgrid) == (order == 2)
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+def test_create_xgrid_cache(tmp_path) :
+
+    cache = XGridCache(cache_dir=str(tmp_path))
+    src_grid = generate_supergrid(np.linspace(0, 40, 5), np.linspace(-20, 20, 5))
+    tgt_grid = generate_supergrid(np.linspace(0, 40, 3), np.linspace(-20, 20, 9))
+
+    xgridobj = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=2, cache=cache)
+    xgridobj.create_xgrid()
+    assert cache.stats() == dict(hits=0, misses=1, evictions=0)
+    assert len(list(tmp_path.glob("*.nc"))) == 1
+
+    cached = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=2, cache=cache)
+    cached.create_xgrid()
+    assert cache.stats() == dict(hits=1, misses=1, evictions=0)
+    xr.testing.assert_identical(cached.dataset, xgridobj.dataset)
+
+    # a different order is a different entry, the older one is evicted
+    cache.max_size = os.path.getsize(next(tmp_path.glob("*.nc")))
+    XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=1, cache=cache).create_xgrid()
+    assert cache.stats() == dict(hits=1, misses=2, evictions=1)
+    assert len(list(tmp_path.glob("*.nc"))) == 1
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+def test_create_xgrid_concurrent_threads() :
+
+    # the great circle clipping is reentrant, exchange grids can be built from several threads at once
+    src_grid = generate_supergrid(np.linspace(0, 60, 13), np.linspace(-30, 30, 13), arcx="great_circle")
+    tgt_grids = [generate_supergrid(np.linspace(shift, 60+shift, 9), np.linspace(-30, 30, 7), arcx="great_circle")
+                 for shift in (0.5, 1.5, 2.5, 3.5)]
+
+    def create(tgt_grid, backend) :
+        xgridobj = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, backend=backend)
+        xgridobj.create_xgrid()
+        return xgridobj.dataset
+
+    expected = [create(tgt_grid, "serial") for tgt_grid in tgt_grids]
+    with ThreadPoolExecutor(max_workers=4) as pool :
+        datasets = list(pool.map(create, tgt_grids, ["threads"]*4))
+    for dataset, reference in zip(datasets, expected) :
+        assert reference.sizes["ncells"] > 0
+        xr.testing.assert_identical(dataset, reference)
+
+
+def generate_mosaic(path, name : str, lon_bounds : list, lat : np.ndarray) :
+
+    # one lon/lat tile between each pair of longitudes in lon_bounds
+    gridfiles = []
+    for n, (west, east) in enumerate(lon_bounds) :
+        grid = generate_supergrid(np.linspace(west, east, 5), lat)
+        gridfile = str(path / f"{name}.tile{n+1}.nc")
+        xr.Dataset( data_vars = dict(tile = xr.DataArray([f"tile{n+1}".encode("ascii")]),
+                                     x = xr.DataArray(grid.x, dims=["nyp", "nxp"]),
+                                     y = xr.DataArray(grid.y, dims=["nyp", "nxp"])) ).to_netcdf(gridfile)
+        gridfiles.append(gridfile)
+    mosaic_file = str(path / f"{name}_mosaic.nc")
+    xr.Dataset( data_vars = dict(
+        gridfiles = xr.DataArray(np.array(gridfiles, dtype="S255"), dims=["ntiles"]),
+        gridtiles = xr.DataArray(np.array([f"tile{n+1}" for n in range(len(gridfiles))], dtype="S255"),
+                                 dims=["ntiles"]) )).to_netcdf(mosaic_file)
+    return mosaic_file
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+@pytest.mark.parametrize("nprocs", [1, 2])
+def test_create_xgrid_mosaic(tmp_path, nprocs) :
+
+    lat = np.linspace(-20, 20, 5)
+    src_mosaic = generate_mosaic(tmp_path, "src", [(0, 120), (120, 240), (240, 360)], lat)
+    tgt_mosaic = generate_mosaic(tmp_path, "tgt", [(-30, 90), (90, 210), (210, 330)], lat)
+
+    xgridobj = XGridObj(src_mosaic=src_mosaic, tgt_mosaic=tgt_mosaic)
+    xgridobj.create_xgrid(nprocs=nprocs)
+    dataset = xgridobj.dataset
+
+    # each source tile overlaps two target tiles
+    pairs = set(zip(dataset.tile1.values, dataset.tile2.values))
+    assert pairs == {(1,1), (1,2), (2,2), (2,3), (3,3), (3,1)}
+
+    # the exchange grid covers the band between 20S and 20N
+    area = 4 * np.pi * 6371000.0**2 * np.sin(np.radians(20))
+    np.testing.assert_allclose(dataset.xgrid_area.sum(), area, rtol=1.e-12)
+
+    # tile pairs give the same cells as the single tile exchange grid
+    single = XGridObj(src_grid=generate_supergrid(np.linspace(120, 240, 5), lat),
+                      tgt_grid=generate_supergrid(np.linspace(90, 210, 5), lat))
+    single.create_xgrid()
+    pair = dataset.where((dataset.tile1 == 2) & (dataset.tile2 == 2), drop=True)
+    np.testing.assert_array_equal(pair.tile1_cell.values, single.dataset.tile1_cell.values)
+    np.testing.assert_allclose(pair.xgrid_area.values, single.dataset.xgrid_area.values)
+
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+@pytest.mark.parametrize("order", [1, 2])
+def test_update_xgrid(tmp_path, order) :
+
+    src_grid = generate_supergrid(np.linspace(0, 40, 9), np.linspace(-20, 20, 9))
+    tgt_grid = generate_supergrid(np.linspace(0, 40, 6), np.linspace(-20, 20, 6))
+    tgt_grid.x = tgt_grid.x + 0.5*np.arange(tgt_grid.x.shape[0])[:,None]
+    src_mask = np.ones((8, 8))
+    remap_file = str(tmp_path / "remap.nc")
+    xgridobj = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=order, out_remap_file=remap_file)
+    xgridobj.create_xgrid(src_mask)
+    xgridobj.write_remap_file()
+
+    def sort(dataset) :
+        return np.lexsort(np.column_stack((dataset.tile1_cell.values, dataset.tile2_cell.values)).T)
+
+    def check(updated, src_mask) :
+        expected = XGridObj(src_grid=src_grid, tgt_grid=tgt_grid, order=order)
+        expected.create_xgrid(src_mask)
+        order1, order2 = sort(expected.dataset), sort(updated)
+        assert order1.size == order2.size > 0
+        for name in expected.dataset.data_vars :
+            np.testing.assert_allclose(updated[name].values[order2], expected.dataset[name].values[order1],
+                                       rtol=1.e-12, atol=1.e-12)
+
+    # a land mask edit, spliced into the remap file it was read from
+    new_mask = src_mask.copy()
+    new_mask[2:4, 3:6] = 0.0
+    xgridobj = XGridObj(restart_remap_file=remap_file, out_remap_file=remap_file,
+                        src_grid=src_grid, tgt_grid=tgt_grid, order=order)
+    xgridobj.update_xgrid(new_mask, src_cells=(new_mask != src_mask))
+    xgridobj.write_remap_file()
+    with xr.open_dataset(remap_file) as dataset :
+        check(dataset.load(), new_mask)
+
+    # moving source grid points inside a region
+    src_grid.x = src_grid.x.copy()
+    src_grid.x[8:11, 4:7] += 0.3
+    xgridobj.update_xgrid(new_mask, bbox=(9.5, 16.0, -1.0, 6.0))
+    check(xgridobj.dataset, new_mask)
+
+    # moving a target corner changes the four target cells around it, which reach past bbox
+    tgt_grid.x, tgt_grid.y = tgt_grid.x.copy(), tgt_grid.y.copy()
+    tgt_grid.x[6, 6] += 1.5
+    tgt_grid.y[6, 6] += 1.5
+    xgridobj.update_xgrid(new_mask, bbox=(26.0, 29.0, 3.0, 6.0))
+    check(xgridobj.dataset, new_mask)
+
+    with pytest.raises(RuntimeError) :
+        xgridobj.update_xgrid(src_cells=np.ones((3, 3), dtype=bool))
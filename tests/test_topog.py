@@ -1,8 +1,19 @@
 # unit test for Topog.py functionality
 
+from gridtools import GridObj
 from gridtools import TopogObj
+from gridtools import create_regular_lonlat_grid
+from gridtools.make_mosaic.make_mosaic import make_mosaic
+from gridtools.make_topog.make_topog import make_topog
+from gridtools.make_topog.topogobj import _TopogSource
+from FREnctools_lib.pyfrenctools.shared.clib import LIBFILE
+from click.testing import CliRunner
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
+import os
 import pytest
+import tempfile
+import xarray as xr
 from pathlib import Path
 from os import remove
 
@@ -34,30 +45,207 @@ def test_write_multi_tile():
     assert Path(out_file).exists()
     remove(out_file)
 
-@pytest.mark.skip(reason="TODO")
-def test_generate_realistic():
-    pass
+def test_write_chunked_tiles(tmp_path):
+    out_file = str(tmp_path / "test_topog_chunked.nc")
+    test_topog = lonlat_topog(8, 4, ntiles=3)
+    test_topog.output_name = out_file
+    test_topog.make_topog_gaussian(gauss_scale=0.25, gauss_amp=0.5, slope_x=0, slope_y=0,
+                                   bottom_depth=5000, min_depth=10)
+    # the tiles are views of one contiguous array
+    tile = test_topog.get_tile_depth(1)
+    assert tile.flags.c_contiguous and np.shares_memory(tile, test_topog.depth)
+    np.testing.assert_array_equal(tile, test_topog.depth[:,:,1])
+    test_topog.write_topog_file(chunks=(2, 4), complevel=4)
+    with xr.open_dataset(out_file) as ds:
+        assert list(ds.data_vars) == ["depth_tile1", "depth_tile2", "depth_tile3"]
+        assert ds.depth_tile3.dims == ("ny", "nx")
+        assert ds.depth_tile3.encoding["chunksizes"] == (2, 4)
+        assert ds.depth_tile3.encoding["zlib"]
+        np.testing.assert_array_equal(ds.depth_tile3.values, test_topog.depth[:,:,2])
+    # nothing is written without depth
+    with pytest.raises(RuntimeError):
+        TopogObj(output_name=out_file, ntiles=1, nx=8, ny=4).write_topog_file()
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_make_topog_tiles(jobs):
+    expected = lonlat_topog(36, 18, ntiles=3)
+    expected.x = expected.x + 10.0*np.arange(3)
+    expected.make_topog_gaussian(gauss_scale=0.25, gauss_amp=0.5, slope_x=1, slope_y=0,
+                                 bottom_depth=5000, min_depth=10)
+    test_topog = lonlat_topog(36, 18, ntiles=3)
+    test_topog.x = expected.x
+    test_topog.make_topog("gaussian", jobs=jobs, gauss_scale=0.25, gauss_amp=0.5, slope_x=1, slope_y=0,
+                          bottom_depth=5000, min_depth=10)
+    np.testing.assert_array_equal(test_topog.depth, expected.depth)
+    np.testing.assert_array_equal(test_topog.ds.depth_tile3.values, expected.depth[:,:,2])
+    with pytest.raises(RuntimeError):
+        test_topog.make_topog("seamount")
+
+def write_source_topog(path, format="NETCDF4"):
+    # 1 degree source with the same depth in each 2x2 block of cells, missing south of 50S
+    blocks = np.arange(60*180, dtype=np.float32).reshape(60, 180) + 10
+    depth = np.repeat(np.repeat(blocks, 2, axis=0), 2, axis=1)
+    depth[:10] = -1.e20
+    ds = xr.Dataset(data_vars=dict(depth=(("yt", "xt"), depth)),
+                    coords=dict(xt=np.arange(0.5, 360, 1.0), yt=np.arange(-59.5, 60, 1.0)))
+    ds.to_netcdf(path, format=format, encoding=dict(depth=dict(missing_value=np.float32(-1.e20), _FillValue=None)))
+    # 2 degree cells of the model grids between 56S and 40N, land south of 50S
+    expected = blocks[2:50].astype(np.float64)
+    expected[:3] = 0
+    return expected
+
+def realistic_topog(ntiles):
+    x, y = np.meshgrid(np.linspace(0, 360, 181), np.linspace(-56, 40, 49))
+    tiles = [slice(n*180//ntiles, (n+1)*180//ntiles+1) for n in range(ntiles)]
+    return TopogObj(ntiles=ntiles, nx=180//ntiles, ny=48,
+                    x=np.stack([x[:,tile] for tile in tiles], axis=-1),
+                    y=np.stack([y[:,tile] for tile in tiles], axis=-1))
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+@pytest.mark.parametrize("format", ["NETCDF4", "NETCDF3_64BIT"])
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_generate_realistic(tmp_path, monkeypatch, format, jobs):
+    topog_file = str(tmp_path / "source_topog.nc")
+    expected = write_source_topog(topog_file, format)
+    # netcdf4 sources are memory mapped in place, netcdf3 ones through a temporary copy
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    with _TopogSource.open(topog_file, "depth") as source:
+        assert source.temporary == (format != "NETCDF4")
+        assert source.field().shape == (120, 360)
+
+    test_topog = realistic_topog(ntiles=3)
+    test_topog.make_topog("realistic", jobs=jobs, topog_file=topog_file, topog_field="depth")
+    assert test_topog.depth.shape == (48, 60, 3)
+    for tile in range(3):
+        np.testing.assert_allclose(test_topog.depth[:,:,tile], expected[:,60*tile:60*(tile+1)], rtol=1.e-12)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["source_topog.nc"]
+
+    # the source rows can also be streamed in blocks
+    blocked = realistic_topog(ntiles=1)
+    blocked.make_topog_realistic(topog_file=topog_file, topog_field="depth", block_rows=7)
+    np.testing.assert_allclose(blocked.depth[:,:,0], expected, rtol=1.e-12)
+
+def test_generate_realistic_threads(tmp_path):
+    # the realistic kernel keeps global state, its tiles are only generated by processes
+    test_topog = realistic_topog(ntiles=3)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(RuntimeError):
+            test_topog.make_topog("realistic", executor=executor, topog_file=str(tmp_path / "source_topog.nc"),
+                                  topog_field="depth")
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+def test_generate_realistic_executor(tmp_path):
+    topog_file = str(tmp_path / "source_topog.nc")
+    expected = write_source_topog(topog_file)
+    test_topog = realistic_topog(ntiles=3)
+    with ProcessPoolExecutor(max_workers=3) as executor:
+        test_topog.make_topog("realistic", executor=executor, topog_file=topog_file, topog_field="depth")
+    for tile in range(3):
+        np.testing.assert_allclose(test_topog.depth[:,:,tile], expected[:,60*tile:60*(tile+1)], rtol=1.e-12)
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+def test_generate_realistic_vgrid(tmp_path):
+    topog_file, vgrid_file = str(tmp_path / "source_topog.nc"), str(tmp_path / "vgrid.nc")
+    expected = write_source_topog(topog_file)
+    nk = 12
+    xr.Dataset(data_vars=dict(zeta=(("nzv",), np.linspace(0, 12000, 2*nk+1)))).to_netcdf(vgrid_file)
+
+    test_topog = realistic_topog(ntiles=2)
+    test_topog.output_name = str(tmp_path / "topog.nc")
+    test_topog.make_topog("realistic", jobs=2, topog_file=topog_file, topog_field="depth", vgrid_file=vgrid_file)
+    num_levels = np.concatenate([test_topog.ds.num_levels_tile1.values, test_topog.ds.num_levels_tile2.values], axis=1)
+    depth = np.concatenate([test_topog.depth[:,:,0], test_topog.depth[:,:,1]], axis=1)
+    assert np.all(num_levels[expected == 0] == 0) and np.all(depth[expected == 0] == 0)
+    assert np.all((num_levels[expected > 0] >= 2) & (num_levels[expected > 0] <= nk))
+    # the depth is fitted to the vertical levels it reaches
+    np.testing.assert_array_less(depth, np.linspace(0, 12000, 2*nk+1)[2*num_levels] + 1.e-6)
+    test_topog.write_topog_file()
+    with xr.open_dataset(test_topog.output_name) as ds:
+        assert list(ds.data_vars) == ["depth_tile1", "depth_tile2", "num_levels_tile1", "num_levels_tile2"]
+        np.testing.assert_array_equal(ds.num_levels_tile2.values, test_topog.ds.num_levels_tile2.values)
+
+@pytest.mark.skipif(not os.path.isfile(LIBFILE), reason="cfrenctools library is not built")
+def test_make_topog_realistic_command(tmp_path, monkeypatch):
+    topog_file = str(tmp_path / "source_topog.nc")
+    expected = write_source_topog(topog_file)
+    grid = create_regular_lonlat_grid([0, 360], [-56, 40], [360], [96])
+    for n, i0 in enumerate((0, 180)):
+        GridObj(x=grid.x[:, i0:i0+181].copy(), y=grid.y[:, i0:i0+181].copy(),
+                tile=f"tile{n+1}", arcx=grid.arcx).write_out_grid(str(tmp_path / f"grid.tile{n+1}.nc"))
+    monkeypatch.chdir(tmp_path)
+    result = CliRunner().invoke(make_mosaic, ["--tile_file", "grid.tile1.nc,grid.tile2.nc", "--mosaic_name", "mosaic"])
+    assert result.exit_code == 0, result.output
+
+    result = CliRunner().invoke(make_topog, ["--mosaic", "mosaic.nc", "--topog_type", "realistic", "--jobs", "2",
+                                             "--topog_file", topog_file, "--topog_field", "depth"])
+    assert result.exit_code == 0, result.output
+    with xr.open_dataset("topog.nc") as ds:
+        np.testing.assert_allclose(ds.depth_tile1.values, expected[:,:90], rtol=1.e-12)
+        np.testing.assert_allclose(ds.depth_tile2.values, expected[:,90:], rtol=1.e-12)
+
+def lonlat_topog(nx, ny, ntiles=1):
+    x, y = np.meshgrid(np.linspace(0, 360, nx+1), np.linspace(-90, 90, ny+1))
+    return TopogObj(ntiles = ntiles,
+                    nx = nx,
+                    ny = ny,
+                    x = np.repeat(x[:,:,np.newaxis], ntiles, axis=2),
+                    y = np.repeat(y[:,:,np.newaxis], ntiles, axis=2))
 
-@pytest.mark.skip(reason="TODO")
 def test_generate_rectangular_basin():
-    pass
+    test_topog = lonlat_topog(8, 4, ntiles=2)
+    test_topog.make_rectangular_basin(bottom_depth=100)
+    assert test_topog.depth.shape == (4, 8, 2)
+    assert np.all(test_topog.depth == 100)
+    assert np.all(test_topog.ds.depth_tile2.values == 100)
 
-@pytest.mark.skip(reason="TODO")
 def test_generate_gaussian():
-    pass
+    test_topog = lonlat_topog(36, 18)
+    test_topog.make_topog_gaussian(gauss_scale=0.25, gauss_amp=0.5, slope_x=0, slope_y=0,
+                                   bottom_depth=5000, min_depth=10)
+    depth = test_topog.depth[:,:,0]
+    # the bump is centred in the domain and symmetric about it
+    assert depth.min() == depth[8:10,17:19].min()
+    assert depth.min() > 2500 and depth.max() <= 5000
+    assert np.allclose(depth, depth[::-1,::-1])
 
-@pytest.mark.skip(reason="TODO")
 def test_generate_dome():
-    pass
+    test_topog = lonlat_topog(36, 18)
+    test_topog.make_topog_dome(dome_slope=0.01, dome_bottom=3600, dome_embayment_west=100,
+                               dome_embayment_east=140, dome_embayment_south=50, dome_embayment_depth=600)
+    depth = test_topog.depth[:,:,0]
+    xt, yt = [c[:,:,0] for c in test_topog._cell_centers()]
+    # the embayment bounds snap down to the cell centres
+    embayment = (xt >= 95) & (xt <= 135) & (yt >= 45)
+    assert np.all(depth[embayment] == 600)
+    assert np.all(depth[(yt >= 45) & ~embayment] == 0)
+    assert depth[0,0] == 3600
 
-@pytest.mark.skip(reason="TODO")
 def test_generate_bowl():
-    pass
+    test_topog = lonlat_topog(36, 18)
+    test_topog.make_topog_bowl(bottom_depth=5000, min_depth=10, bowl_south=-40, bowl_north=40,
+                               bowl_west=100, bowl_east=260)
+    depth = test_topog.depth[:,:,0]
+    xt, yt = [c[:,:,0] for c in test_topog._cell_centers()]
+    outside = (xt <= 100) | (xt >= 260) | (yt <= -40) | (yt >= 40)
+    assert np.all(depth[outside] == 10)
+    assert np.all(depth[~outside] > 10)
 
-@pytest.mark.skip(reason="TODO")
 def test_generate_idealized():
-    pass
+    test_topog = lonlat_topog(90, 45, ntiles=2)
+    test_topog.make_topog_box_idealized(bottom_depth=5000, min_depth=10)
+    depth = test_topog.depth
+    # antarctica is land, the ridges and undulating bottom are shallower than bottom_depth
+    assert np.all(depth[0] == 0)
+    assert np.all(depth <= 5000)
+    assert np.any(depth == 0.666*5000)
+    assert np.array_equal(depth[:,:,0], depth[:,:,1])
 
-@pytest.mark.skip(reason="TODO")
-def test_generate_idealized():
-    pass
+def test_generate_box_channel():
+    test_topog = lonlat_topog(16, 16)
+    test_topog.make_topog_box_channel(jwest_south=4, jwest_north=8, ieast_south=6, ieast_north=10,
+                                      bottom_depth=3000)
+    depth = test_topog.depth[:,:,0]
+    assert np.all(depth[[0,-1],:] == 0)
+    assert np.array_equal(np.nonzero(depth[:,0])[0], np.arange(4, 8))
+    assert np.array_equal(np.nonzero(depth[:,-1])[0], np.arange(6, 10))
+    assert np.all(depth[1:-1,1:-1] == 3000)